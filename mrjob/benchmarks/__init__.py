@@ -0,0 +1,64 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks for performance-sensitive parts of mrjob. Each module can be
+run as a script (e.g. ``python -m mrjob.benchmarks.read_input``) and
+prints its results as JSON."""
+import time
+
+try:
+    import simplejson as json
+    json  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    import json
+
+
+def make_records(num_records):
+    """Make a list of ``(key, value)`` pairs that look like what jobs pass
+    between steps: short string keys, and values that mix numbers, strings,
+    and containers."""
+    records = []
+    for i in xrange(num_records):
+        key = 'user-%d' % (i % 1000)
+        value = {
+            'id': i,
+            'score': i / 7.0,
+            'tags': ['tag-%d' % (i % 13), 'tag-%d' % (i % 17)],
+            'counts': (i % 3, i % 5, i % 256),
+            'text': 'line %d\twith a tab\nand a newline' % i,
+        }
+        records.append((key, value))
+    return records
+
+
+def best_time(func, repeat=3):
+    """Call *func* (with no arguments) *repeat* times, and return the
+    fastest wall-clock time, in seconds."""
+    best = None
+    for _ in xrange(max(repeat, 1)):
+        start = time.time()
+        func()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    # avoid dividing by zero on very fast runs
+    return max(best, 1e-9)
+
+
+def print_results(results, stream=None):
+    """Print *results* (a JSON-encodable dictionary) as JSON."""
+    if stream is None:
+        import sys
+        stream = sys.stdout
+
+    print >> stream, json.dumps(results, indent=2, sort_keys=True)
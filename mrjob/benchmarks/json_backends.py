@@ -0,0 +1,111 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the JSON backends available to
+:py:class:`~mrjob.protocol.JSONProtocol` (see
+:py:func:`~mrjob.protocol.get_json_backend`): how fast each encodes and
+decodes records, one at a time and in batches, and how many bytes each
+passes between tasks.
+
+Backends that aren't installed are reported as ``{"installed": false}``.
+
+Usage::
+
+    python -m mrjob.benchmarks.json_backends [--records N] [--repeat N]
+"""
+from optparse import OptionParser
+
+from mrjob.benchmarks import best_time
+from mrjob.benchmarks import make_records
+from mrjob.benchmarks import print_results
+from mrjob.protocol import JSONProtocol
+from mrjob.protocol import _JSON_BACKEND_FACTORIES
+from mrjob.protocol import get_json_backend
+
+
+def run(num_records=100000, repeat=3):
+    """Return a dictionary of benchmark results."""
+    records = make_records(num_records)
+
+    results = {'records': num_records}
+
+    for name in sorted(_JSON_BACKEND_FACTORIES):
+        try:
+            protocol = JSONProtocol(json_backend=name)
+            protocol._json_backend()
+        except ImportError:
+            results[name] = {'installed': False}
+            continue
+
+        write = protocol.write
+        read = protocol.read
+
+        lines = protocol.write_many(records)
+
+        def encode():
+            for k, v in records:
+                write(k, v)
+
+        def decode():
+            for line in lines:
+                read(line)
+
+        def encode_many():
+            protocol.write_many(records)
+
+        def decode_many():
+            protocol.read_many(lines)
+
+        result = {
+            'installed': True,
+            # include the newline Hadoop Streaming adds to each line
+            'bytes': sum(len(line) + 1 for line in lines),
+        }
+
+        for stat, func in [('encode', encode),
+                           ('decode', decode),
+                           ('encode_many', encode_many),
+                           ('decode_many', decode_many)]:
+            secs = best_time(func, repeat=repeat)
+            result[stat + '_seconds'] = secs
+            result[stat + '_records_per_sec'] = num_records / secs
+
+        results[name] = result
+
+    installed = [name for name in _JSON_BACKEND_FACTORIES
+                 if results[name]['installed']]
+
+    for stat in ('encode', 'decode', 'encode_many', 'decode_many'):
+        results['fastest_' + stat] = min(
+            installed, key=lambda name: results[name][stat + '_seconds'])
+
+    results['auto'] = get_json_backend('auto').name
+
+    return results
+
+
+def main():
+    option_parser = OptionParser(usage=__doc__.strip())
+    option_parser.add_option(
+        '--records', dest='records', type='int', default=100000,
+        help='Number of records to encode and decode (default: %default)')
+    option_parser.add_option(
+        '--repeat', dest='repeat', type='int', default=3,
+        help='Number of times to run each benchmark (default: %default)')
+    options, args = option_parser.parse_args()
+
+    print_results(run(num_records=options.records, repeat=options.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare how fast we can put chunked streams (like what boto gives us
+when we read from S3) back together into lines, the old way (split off one
+line at a time, and append to a buffer when a line spans chunks) and with
+:py:func:`~mrjob.util.buffer_iterator_to_line_iterator`.
+
+We try both short lines (many lines per chunk) and long lines (many chunks
+per line). Chunks are generated as we go, so ``--megabytes`` can be in
+the thousands without using much memory.
+
+If you pass an S3 connection to :py:func:`run`, we also time
+:py:meth:`~mrjob.fs.s3.S3Filesystem._cat_file` on a key of at most
+*s3_megabytes* that we write to it. This is meant for the mock connection
+in ``tests/mockboto.py`` (which keeps keys in memory); from a source
+checkout, with boto installed::
+
+    python -c 'from mrjob.benchmarks import line_splitting, print_results
+    from tests.mockboto import MockS3Connection
+    print_results(line_splitting.run(s3_conn=MockS3Connection()))'
+
+Usage::
+
+    python -m mrjob.benchmarks.line_splitting [--megabytes N]
+        [--chunk-size N] [--line-length N] [--long-line-length N]
+        [--repeat N]
+"""
+from optparse import OptionParser
+
+from mrjob.benchmarks import best_time
+from mrjob.benchmarks import print_results
+from mrjob.fs.s3 import S3Filesystem
+from mrjob.util import buffer_iterator_to_line_iterator
+
+
+def make_chunks(num_bytes, line_length, chunk_size):
+    """Yield *num_bytes* of lines, each *line_length* bytes long
+    (including the newline), in chunks of *chunk_size* bytes."""
+    line = 'x' * (line_length - 1) + '\n'
+    # a block of lines at least as long as a chunk, so that every chunk is
+    # a slice of two blocks back to back
+    block = line * max(1, -(-chunk_size // line_length))
+    blocks = block * 2
+
+    offset = 0
+    while num_bytes > 0:
+        size = min(chunk_size, num_bytes)
+        yield blocks[offset:offset + size]
+        offset = (offset + size) % len(block)
+        num_bytes -= size
+
+
+def split_lines_one_at_a_time(iterator):
+    """How :py:func:`~mrjob.util.buffer_iterator_to_line_iterator` used to
+    work. Each split copies the rest of the buffer, and each append copies
+    the whole buffer."""
+    buf = iterator.next()  # might raise StopIteration, but that's okay
+    while True:
+        if '\n' in buf:
+            (line, buf) = buf.split('\n', 1)
+            yield line + '\n'
+        else:
+            try:
+                more = iterator.next()
+                buf += more
+            except StopIteration:
+                if buf:
+                    yield buf + '\n'
+                return
+
+
+def _time_splitter(split_lines, num_bytes, line_length, chunk_size, repeat):
+    def read_all():
+        for line in split_lines(
+                make_chunks(num_bytes, line_length, chunk_size)):
+            pass
+
+    secs = best_time(read_all, repeat=repeat)
+    return {
+        'seconds': secs,
+        'megabytes_per_sec': num_bytes / secs / (1024 * 1024),
+    }
+
+
+def _time_s3_cat_file(s3_conn, num_bytes, line_length, chunk_size, repeat):
+    """Time reading a key that we write to *s3_conn*."""
+    s3_conn.create_bucket('walrus')
+    s3_conn.get_bucket('walrus').new_key('data').set_contents_from_string(
+        ''.join(make_chunks(num_bytes, line_length, chunk_size)))
+
+    fs = S3Filesystem('key_id', 'secret', 'nowhere')
+    fs.make_s3_conn = lambda: s3_conn
+
+    def cat_file():
+        for line in fs._cat_file('s3://walrus/data'):
+            pass
+
+    secs = best_time(cat_file, repeat=repeat)
+    return {
+        'bytes': num_bytes,
+        'seconds': secs,
+        'megabytes_per_sec': num_bytes / secs / (1024 * 1024),
+    }
+
+
+def run(megabytes=64, chunk_size=8192, line_length=80,
+        long_line_length=1024 * 1024, s3_conn=None, s3_megabytes=64,
+        repeat=3):
+    """Return a dictionary of benchmark results.
+
+    If *s3_conn* is set, also time reading from S3 (see above)."""
+    num_bytes = int(megabytes * 1024 * 1024)
+
+    results = {
+        'bytes': num_bytes,
+        'chunk_size': chunk_size,
+    }
+
+    for name, length in [('short_lines', line_length),
+                         ('long_lines', long_line_length)]:
+        result = {'line_length': length}
+        for splitter_name, split_lines in [
+                ('one_at_a_time', split_lines_one_at_a_time),
+                ('buffer_iterator_to_line_iterator',
+                 buffer_iterator_to_line_iterator)]:
+            result[splitter_name] = _time_splitter(
+                split_lines, num_bytes, length, chunk_size, repeat)
+
+        result['speedup'] = (
+            result['one_at_a_time']['seconds'] /
+            result['buffer_iterator_to_line_iterator']['seconds'])
+        results[name] = result
+
+    if s3_conn is not None:
+        results['s3_cat_file'] = _time_s3_cat_file(
+            s3_conn, min(num_bytes, int(s3_megabytes * 1024 * 1024)),
+            line_length, chunk_size, repeat)
+
+    return results
+
+
+def main():
+    option_parser = OptionParser(usage=__doc__.strip())
+    option_parser.add_option(
+        '--megabytes', dest='megabytes', type='float', default=64,
+        help='How much data to split into lines (default: %default)')
+    option_parser.add_option(
+        '--chunk-size', dest='chunk_size', type='int', default=8192,
+        help='Size of each chunk, in bytes (default: %default, the same as'
+             ' boto)')
+    option_parser.add_option(
+        '--line-length', dest='line_length', type='int', default=80,
+        help='Length of short lines, including newline (default: %default)')
+    option_parser.add_option(
+        '--long-line-length', dest='long_line_length', type='int',
+        default=1024 * 1024,
+        help='Length of long lines, including newline (default: %default)')
+    option_parser.add_option(
+        '--repeat', dest='repeat', type='int', default=3,
+        help='Number of times to run each benchmark (default: %default)')
+    options, args = option_parser.parse_args()
+
+    print_results(run(megabytes=options.megabytes,
+                      chunk_size=options.chunk_size,
+                      line_length=options.line_length,
+                      long_line_length=options.long_line_length,
+                      repeat=options.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare :py:class:`~mrjob.protocol.PickleProtocol` (string-escaped text
+pickles) with :py:class:`~mrjob.protocol.BinaryPickleProtocol` (escaped
+binary pickles): how fast each encodes and decodes records, and how many
+bytes each passes between tasks.
+
+Usage::
+
+    python -m mrjob.benchmarks.pickle_protocols [--records N]
+"""
+from optparse import OptionParser
+
+from mrjob.benchmarks import best_time
+from mrjob.benchmarks import make_records
+from mrjob.benchmarks import print_results
+from mrjob.protocol import BinaryPickleProtocol
+from mrjob.protocol import PickleProtocol
+
+
+PROTOCOLS = [
+    ('PickleProtocol', PickleProtocol),
+    ('BinaryPickleProtocol', BinaryPickleProtocol),
+]
+
+
+def run(num_records=100000, repeat=3):
+    """Return a dictionary of benchmark results."""
+    records = make_records(num_records)
+
+    results = {'records': num_records}
+
+    for name, protocol in PROTOCOLS:
+        write = protocol.write
+        read = protocol.read
+
+        lines = [write(k, v) for k, v in records]
+
+        def encode():
+            for k, v in records:
+                write(k, v)
+
+        def decode():
+            for line in lines:
+                read(line)
+
+        encode_secs = best_time(encode, repeat=repeat)
+        decode_secs = best_time(decode, repeat=repeat)
+
+        results[name] = {
+            # include the newline Hadoop Streaming adds to each line
+            'bytes': sum(len(line) + 1 for line in lines),
+            'encode_seconds': encode_secs,
+            'decode_seconds': decode_secs,
+            'encode_records_per_sec': num_records / encode_secs,
+            'decode_records_per_sec': num_records / decode_secs,
+        }
+
+    old = results['PickleProtocol']
+    new = results['BinaryPickleProtocol']
+    results['size_ratio'] = float(new['bytes']) / old['bytes']
+    results['encode_speedup'] = old['encode_seconds'] / new['encode_seconds']
+    results['decode_speedup'] = old['decode_seconds'] / new['decode_seconds']
+
+    return results
+
+
+def main():
+    option_parser = OptionParser(usage=__doc__.strip())
+    option_parser.add_option(
+        '--records', dest='records', type='int', default=100000,
+        help='Number of records to encode and decode (default: %default)')
+    option_parser.add_option(
+        '--repeat', dest='repeat', type='int', default=3,
+        help='Number of times to run each benchmark (default: %default)')
+    options, args = option_parser.parse_args()
+
+    print_results(run(num_records=options.records, repeat=options.repeat))
+
+
+if __name__ == '__main__':
+    main()
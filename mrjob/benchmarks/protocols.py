@@ -0,0 +1,253 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measure every protocol in :py:mod:`mrjob.protocol` on several shapes of
+keys and values (see :py:data:`SHAPES`): how fast it encodes and decodes
+records, one at a time (``read()``/``write()``) and in batches
+(``read_many()``/``write_many()``), how many bytes each record takes up
+between tasks, and how many objects each decoded record keeps alive.
+
+Python 2 can't count allocations directly, so ``objects_per_record`` is
+the number of objects the garbage collector tracks (containers like
+tuples, lists, dicts, and instances, but not strings or numbers) that
+decoding a record creates and keeps.
+
+If a protocol can't round-trip a shape (e.g.
+:py:class:`~mrjob.protocol.RawProtocol` and ints), we report
+``{"supported": false, "error": ...}`` for it.
+
+Save the output from two versions of mrjob and diff them to catch
+regressions.
+
+Usage::
+
+    python -m mrjob.benchmarks.protocols [--records N] [--repeat N]
+        [--protocol NAME ...] [--shape NAME ...]
+"""
+import gc
+from optparse import OptionParser
+
+from mrjob import protocol as protocol_module
+from mrjob.benchmarks import best_time
+from mrjob.benchmarks import print_results
+from mrjob.protocol import BaseProtocol
+from mrjob.sparse import SparseVector
+
+
+def small_ints(i):
+    return (i % 100, i)
+
+
+def long_strings(i):
+    return ('key-%d' % i, ('%08d' % i) * 125)
+
+
+def nested_dicts(i):
+    return ('user-%d' % (i % 1000), {
+        'id': i,
+        'name': 'user %d' % i,
+        'scores': [i % 7, i % 11, i % 13],
+        'address': {'city': 'city-%d' % (i % 50), 'zip': '%05d' % i},
+    })
+
+
+def string_tuples(i):
+    return ('line-%d' % i, tuple('field-%d-%d' % (i, j) for j in xrange(10)))
+
+
+def unicode_strings(i):
+    return (u'cl\xe9-%d' % (i % 1000),
+            u'\u65e5\u672c\u8a9e %d \u2014 caf\xe9' % i)
+
+
+# every byte, including tabs and newlines
+_ALL_BYTES = ''.join(chr(i) for i in xrange(256))
+
+
+def binary_blobs(i):
+    n = i % 256
+    return ('blob-%d' % i, (_ALL_BYTES[n:] + _ALL_BYTES[:n]) * 4)
+
+
+def sparse_vectors(i):
+    indices = range(i % 10, 1000, 20)
+    return (i % 100, SparseVector(indices, [1.0 / (j + 1) for j in indices]))
+
+
+#: ``(name, function)`` for each shape of key and value. *function* takes
+#: a record number and returns ``(key, value)``.
+SHAPES = [
+    ('small_ints', small_ints),
+    ('long_strings', long_strings),
+    ('nested_dicts', nested_dicts),
+    ('string_tuples', string_tuples),
+    ('unicode', unicode_strings),
+    ('sparse_vectors', sparse_vectors),
+    ('binary_blobs', binary_blobs),
+]
+
+
+def all_protocols():
+    """Return ``(name, protocol class)`` for every protocol in
+    :py:mod:`mrjob.protocol`, sorted by name."""
+    protocols = []
+    for name in sorted(dir(protocol_module)):
+        value = getattr(protocol_module, name)
+        if (isinstance(value, type) and issubclass(value, BaseProtocol) and
+                value is not BaseProtocol and not name.startswith('_')):
+            protocols.append((name, value))
+    return protocols
+
+
+def check_round_trip(protocol, key, value):
+    """Raise an exception if *protocol* can't encode *key* and *value* as
+    a bytestring and decode them back again. Value protocols may decode
+    the key as ``None``. Line-based protocols must not put newlines in
+    what they encode."""
+    encoded = protocol.write(key, value)
+    if not isinstance(encoded, str):
+        raise TypeError('encoded as %s, not str' % type(encoded).__name__)
+    if getattr(protocol, 'hadoop_io', None) != 'typedbytes' and (
+            '\n' in encoded):
+        raise ValueError('encoded with a newline')
+
+    decoded_key, decoded_value = protocol.read(encoded)
+    if decoded_value != value or decoded_key not in (key, None):
+        raise ValueError('decoded as something else')
+
+
+def objects_per_record(protocol, lines):
+    """How many gc-tracked objects decoding *lines* creates and keeps,
+    per line."""
+    gc.collect()
+    # collecting would stop tracking some tuples, and muddle the count
+    gc.disable()
+    try:
+        before = len(gc.get_objects())
+        decoded = protocol.read_many(lines)
+        # don't count the list we just made
+        after = len(gc.get_objects()) - 1
+        del decoded
+    finally:
+        gc.enable()
+    return float(after - before) / len(lines)
+
+
+def benchmark(protocol, records, repeat=3):
+    """Return a dictionary of results for *protocol* on *records*, a list
+    of ``(key, value)``."""
+    key, value = records[0]
+    try:
+        check_round_trip(protocol, key, value)
+    except Exception, e:
+        return {'supported': False,
+                'error': '%s: %s' % (e.__class__.__name__, e)}
+
+    num_records = len(records)
+    read = protocol.read
+    write = protocol.write
+
+    lines = [write(k, v) for k, v in records]
+
+    def encode():
+        for k, v in records:
+            write(k, v)
+
+    def decode():
+        for line in lines:
+            read(line)
+
+    def encode_many():
+        protocol.write_many(records)
+
+    def decode_many():
+        protocol.read_many(lines)
+
+    # typed bytes records aren't separated by newlines
+    if getattr(protocol, 'hadoop_io', None) == 'typedbytes':
+        num_bytes = sum(len(line) for line in lines)
+    else:
+        num_bytes = sum(len(line) + 1 for line in lines)
+
+    result = {
+        'supported': True,
+        'bytes_per_record': float(num_bytes) / num_records,
+        'objects_per_record': objects_per_record(protocol, lines),
+    }
+
+    for stat, func in [('write', encode),
+                       ('read', decode),
+                       ('write_many', encode_many),
+                       ('read_many', decode_many)]:
+        result[stat + '_records_per_sec'] = (
+            num_records / best_time(func, repeat=repeat))
+
+    return result
+
+
+def run(num_records=100000, repeat=3, protocol_names=None, shape_names=None):
+    """Return a dictionary of benchmark results, keyed by protocol name
+    and then by shape name.
+
+    :param protocol_names: names of protocols to benchmark (default: all)
+    :param shape_names: names of shapes from :py:data:`SHAPES` (default:
+                        all)
+    """
+    protocols = all_protocols()
+    if protocol_names:
+        protocols = [(name, p) for name, p in protocols
+                     if name in protocol_names]
+
+    shapes = SHAPES
+    if shape_names:
+        shapes = [(name, make_record) for name, make_record in SHAPES
+                  if name in shape_names]
+
+    results = {'records': num_records}
+
+    for shape_name, make_record in shapes:
+        records = [make_record(i) for i in xrange(num_records)]
+
+        for protocol_name, protocol_class in protocols:
+            results.setdefault(protocol_name, {})[shape_name] = benchmark(
+                protocol_class(), records, repeat=repeat)
+
+    return results
+
+
+def main():
+    option_parser = OptionParser(usage=__doc__.strip())
+    option_parser.add_option(
+        '--records', dest='records', type='int', default=100000,
+        help='Number of records of each shape (default: %default)')
+    option_parser.add_option(
+        '--repeat', dest='repeat', type='int', default=3,
+        help='Number of times to run each benchmark (default: %default)')
+    option_parser.add_option(
+        '--protocol', dest='protocols', action='append', default=[],
+        help=('Name of a protocol to benchmark (e.g. JSONProtocol). You'
+              ' can use this more than once. Default is all protocols.'))
+    option_parser.add_option(
+        '--shape', dest='shapes', action='append', default=[],
+        help=('Shape of keys and values to try: %s. You can use this'
+              ' more than once. Default is all shapes.' %
+              ', '.join(name for name, _ in SHAPES)))
+    options, args = option_parser.parse_args()
+
+    print_results(run(num_records=options.records, repeat=options.repeat,
+                      protocol_names=options.protocols,
+                      shape_names=options.shapes))
+
+
+if __name__ == '__main__':
+    main()
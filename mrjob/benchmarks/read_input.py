@@ -0,0 +1,175 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare how fast tasks can read records from uncompressed input, the
+old way (a line at a time, through the same generators as mrjob 0.4.0's
+:py:func:`~mrjob.util.read_input` and ``MRJob._read_input()``) and the
+new way (:py:func:`~mrjob.util.read_input_blocks`), both on their own and
+followed by the cheapest possible decoding step
+(:py:class:`~mrjob.protocol.RawValueProtocol`), decoded the way
+:py:class:`~mrjob.job.MRJob` does it in each version (one line at a
+time, or a block at a time with ``read_many()``). Our goal is for
+records to come in at least twice as fast either way.
+
+Usage::
+
+    python -m mrjob.benchmarks.read_input [--records N] [--line-length N]
+"""
+from __future__ import with_statement
+
+from optparse import OptionParser
+import glob
+import os
+import shutil
+import tempfile
+
+from mrjob.benchmarks import best_time
+from mrjob.benchmarks import print_results
+from mrjob.protocol import RawValueProtocol
+from mrjob.util import read_input_blocks
+
+
+def make_input_file(path, num_records, line_length):
+    line = ('x' * (line_length - 1)) + '\n'
+    with open(path, 'w') as f:
+        for _ in xrange(num_records):
+            f.write(line)
+
+
+# a copy of how mrjob 0.4.0 read uncompressed files, generator for
+# generator, so that we're comparing against the old code, not the new
+# read_input()
+
+def _old_read_file(path):
+    f = None
+    try:
+        f = open(path)
+        for line in f:
+            yield line
+    finally:
+        if f is not None:
+            f.close()
+
+
+def _old_read_input(path):
+    paths = glob.glob(path)
+    if not paths:
+        raise IOError(2, 'No such file or directory: %r' % path)
+    path = paths[0]
+
+    for line in _old_read_file(path):
+        yield line
+
+
+def _old_job_read_input(paths):
+    # MRJob._read_input()
+    for path in paths:
+        for line in _old_read_input(path):
+            yield line
+
+
+# these mimic how MRJob hands lines to its input protocol
+
+def read_line_at_a_time(path):
+    for line in _old_job_read_input([path]):
+        line = line.rstrip('\r\n')
+
+
+def read_in_blocks(path):
+    for lines in read_input_blocks(path):
+        for line in lines:
+            pass
+
+
+def decode_line_at_a_time(path):
+    read = RawValueProtocol.read
+
+    def read_lines():
+        for line in _old_job_read_input([path]):
+            try:
+                key, value = read(line.rstrip('\r\n'))
+                yield key, value
+            except Exception:
+                pass
+
+    for key, value in read_lines():
+        pass
+
+
+def decode_in_blocks(path):
+    read_many = RawValueProtocol.read_many
+
+    def read_lines():
+        for lines in read_input_blocks(path):
+            yield read_many(lines)
+
+    for pairs in read_lines():
+        for key, value in pairs:
+            pass
+
+
+def run(num_records=1000000, line_length=80, repeat=3):
+    """Return a dictionary of benchmark results."""
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp_dir, 'input')
+        make_input_file(path, num_records, line_length)
+
+        results = {
+            'records': num_records,
+            'bytes': num_records * line_length,
+        }
+
+        for name, func in [
+                ('read_input', read_line_at_a_time),
+                ('read_input_blocks', read_in_blocks),
+                ('read_input+RawValueProtocol', decode_line_at_a_time),
+                ('read_input_blocks+RawValueProtocol', decode_in_blocks)]:
+            secs = best_time(lambda: func(path), repeat=repeat)
+            results[name] = {
+                'seconds': secs,
+                'records_per_sec': num_records / secs,
+            }
+
+        results['speedup'] = (
+            results['read_input']['seconds'] /
+            results['read_input_blocks']['seconds'])
+        results['speedup_with_decoding'] = (
+            results['read_input+RawValueProtocol']['seconds'] /
+            results['read_input_blocks+RawValueProtocol']['seconds'])
+
+        return results
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def main():
+    option_parser = OptionParser(usage=__doc__.strip())
+    option_parser.add_option(
+        '--records', dest='records', type='int', default=1000000,
+        help='Number of records to read (default: %default)')
+    option_parser.add_option(
+        '--line-length', dest='line_length', type='int', default=80,
+        help='Length of each line, including newline (default: %default)')
+    option_parser.add_option(
+        '--repeat', dest='repeat', type='int', default=3,
+        help='Number of times to run each benchmark (default: %default)')
+    options, args = option_parser.parse_args()
+
+    print_results(run(num_records=options.records,
+                      line_length=options.line_length,
+                      repeat=options.repeat))
+
+
+if __name__ == '__main__':
+    main()
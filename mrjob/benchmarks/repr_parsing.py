@@ -0,0 +1,82 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare :py:func:`~mrjob.util.safeeval` with
+:py:func:`~mrjob.util.parse_repr` (what
+:py:class:`~mrjob.protocol.ReprProtocol` uses to decode keys and values) on
+the reprs of plain strings, ints, and the nested values jobs typically pass
+between steps.
+
+Usage::
+
+    python -m mrjob.benchmarks.repr_parsing [--records N]
+"""
+from optparse import OptionParser
+
+from mrjob.benchmarks import best_time
+from mrjob.benchmarks import make_records
+from mrjob.benchmarks import print_results
+from mrjob.util import parse_repr
+from mrjob.util import safeeval
+
+
+def run(num_records=100000, repeat=3):
+    """Return a dictionary of benchmark results."""
+    records = make_records(num_records)
+
+    inputs = {
+        'strings': [repr(k) for k, v in records],
+        'ints': [repr(v['id']) for k, v in records],
+        'values': [repr(v) for k, v in records],
+    }
+
+    results = {'records': num_records}
+
+    for name, reprs in sorted(inputs.items()):
+        def decode_with_safeeval():
+            for r in reprs:
+                safeeval(r)
+
+        def decode_with_parse_repr():
+            for r in reprs:
+                parse_repr(r)
+
+        safeeval_secs = best_time(decode_with_safeeval, repeat=repeat)
+        parse_repr_secs = best_time(decode_with_parse_repr, repeat=repeat)
+
+        results[name] = {
+            'safeeval_seconds': safeeval_secs,
+            'parse_repr_seconds': parse_repr_secs,
+            'safeeval_records_per_sec': num_records / safeeval_secs,
+            'parse_repr_records_per_sec': num_records / parse_repr_secs,
+            'speedup': safeeval_secs / parse_repr_secs,
+        }
+
+    return results
+
+
+def main():
+    option_parser = OptionParser(usage=__doc__.strip())
+    option_parser.add_option(
+        '--records', dest='records', type='int', default=100000,
+        help='Number of records to decode (default: %default)')
+    option_parser.add_option(
+        '--repeat', dest='repeat', type='int', default=3,
+        help='Number of times to run each benchmark (default: %default)')
+    options, args = option_parser.parse_args()
+
+    print_results(run(num_records=options.records, repeat=options.repeat))
+
+
+if __name__ == '__main__':
+    main()
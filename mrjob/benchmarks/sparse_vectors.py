@@ -0,0 +1,159 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare ways of passing sparse feature vectors between steps (e.g. in
+``mrjob/examples/contrib/mr_pegasos_svm.py``):
+
+* ``json_dict``: a JSON object mapping index (as a string) to value
+* ``json_lists``: a JSON list of indices and a JSON list of values
+* ``sparse``: :py:class:`~mrjob.protocol.SparseVectorValueProtocol`
+
+For each, we report how many bytes each vector takes up between tasks,
+how fast vectors are encoded and decoded, and how fast we can decode a
+vector and take its dot product with a dense weight vector (what a
+learning algorithm does with each example).
+
+Usage::
+
+    python -m mrjob.benchmarks.sparse_vectors [--records N] [--repeat N]
+        [--features N] [--dimensions N]
+"""
+from optparse import OptionParser
+import random
+
+from mrjob.benchmarks import best_time
+from mrjob.benchmarks import print_results
+from mrjob.protocol import JSONValueProtocol
+from mrjob.protocol import SparseVectorValueProtocol
+from mrjob.sparse import SparseVector
+
+
+def make_vectors(num_records, num_features=50, num_dimensions=100000):
+    """Make a list of *num_records* random
+    :py:class:`~mrjob.sparse.SparseVector` s, each with *num_features*
+    non-zero entries out of *num_dimensions*."""
+    rand = random.Random(0)
+    vectors = []
+    for _ in xrange(num_records):
+        indices = sorted(rand.sample(xrange(num_dimensions), num_features))
+        values = [rand.random() for _ in indices]
+        vectors.append(SparseVector(indices, values))
+    return vectors
+
+
+def _to_json_dict(vector):
+    return dict((str(i), v) for i, v in vector)
+
+
+def _dot_json_dict(value, weights):
+    return sum(v * weights[int(i)] for i, v in value.iteritems())
+
+
+def _to_json_lists(vector):
+    return [vector.indices.tolist(), vector.values.tolist()]
+
+
+def _dot_json_lists(value, weights):
+    indices, values = value
+    return sum(v * weights[i] for i, v in zip(indices, values))
+
+
+def _dot_sparse(value, weights):
+    return value.dot(weights)
+
+
+def run(num_records=100000, repeat=3, num_features=50, num_dimensions=100000):
+    """Return a dictionary of benchmark results."""
+    vectors = make_vectors(num_records, num_features, num_dimensions)
+    weights = [random.Random(1).random() for _ in xrange(num_dimensions)]
+
+    encodings = [
+        ('json_dict', JSONValueProtocol(), _to_json_dict, _dot_json_dict),
+        ('json_lists', JSONValueProtocol(), _to_json_lists, _dot_json_lists),
+        ('sparse', SparseVectorValueProtocol(), None, _dot_sparse),
+    ]
+
+    results = {
+        'records': num_records,
+        'features': num_features,
+        'dimensions': num_dimensions,
+    }
+
+    for name, protocol, convert, dot in encodings:
+        if convert:
+            pairs = [(None, convert(vector)) for vector in vectors]
+        else:
+            pairs = [(None, vector) for vector in vectors]
+
+        lines = protocol.write_many(pairs)
+
+        def encode():
+            protocol.write_many(pairs)
+
+        def decode():
+            protocol.read_many(lines)
+
+        def decode_and_dot():
+            for _, value in protocol.read_many(lines):
+                dot(value, weights)
+
+        result = {
+            # include the newline Hadoop Streaming adds to each line
+            'bytes_per_record': (
+                float(sum(len(line) + 1 for line in lines)) / num_records),
+        }
+
+        for stat, func in [('encode', encode),
+                           ('decode', decode),
+                           ('decode_and_dot', decode_and_dot)]:
+            result[stat + '_records_per_sec'] = (
+                num_records / best_time(func, repeat=repeat))
+
+        results[name] = result
+
+    # how much better than what the examples used to do
+    before, after = results['json_dict'], results['sparse']
+    results['sparse_vs_json_dict'] = {
+        'size_ratio': after['bytes_per_record'] / before['bytes_per_record'],
+    }
+    for stat in ('encode', 'decode', 'decode_and_dot'):
+        results['sparse_vs_json_dict'][stat + '_speedup'] = (
+            after[stat + '_records_per_sec'] /
+            before[stat + '_records_per_sec'])
+
+    return results
+
+
+def main():
+    option_parser = OptionParser(usage=__doc__.strip())
+    option_parser.add_option(
+        '--records', dest='records', type='int', default=100000,
+        help='Number of vectors to encode and decode (default: %default)')
+    option_parser.add_option(
+        '--repeat', dest='repeat', type='int', default=3,
+        help='Number of times to run each benchmark (default: %default)')
+    option_parser.add_option(
+        '--features', dest='features', type='int', default=50,
+        help='Number of non-zero entries in each vector (default: %default)')
+    option_parser.add_option(
+        '--dimensions', dest='dimensions', type='int', default=100000,
+        help='Number of possible features (default: %default)')
+    options, args = option_parser.parse_args()
+
+    print_results(run(num_records=options.records, repeat=options.repeat,
+                      num_features=options.features,
+                      num_dimensions=options.dimensions))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compression codecs, keyed by file extension.
+
+mrjob uses these to decompress input files (see
+:py:func:`mrjob.util.read_file`), to :py:meth:`~mrjob.fs.base.Filesystem.cat`
+files, and to compress the final output of the inline and local runners.
+
+Each codec decompresses and compresses streams of chunks of bytes, so
+neither side has to fit in memory. A codec can be backed by a Python module
+(like :py:mod:`zlib`) or by a command on your path (see
+:py:func:`command_codec`).
+
+Only ``.gz`` and ``.bz2`` are handled out of the box. This module also
+defines :py:data:`DEFLATE_CODEC`, :py:data:`XZ_CODEC`, and
+:py:data:`ZSTD_CODEC`, which you can turn on, or add your own::
+
+    from mrjob.compression import XZ_CODEC
+    from mrjob.compression import command_codec
+    from mrjob.compression import register_codec
+
+    register_codec(XZ_CODEC)
+    register_codec(command_codec(
+        'lzop', '.lzo', [['lzop', '-dc']], [['lzop', '-c']],
+        hadoop_codec='com.hadoop.compression.lzo.LzopCodec'))
+"""
+import os
+from subprocess import PIPE
+from subprocess import Popen
+import signal
+import sys
+import threading
+import zlib
+
+try:
+    import bz2
+    bz2  # redefine bz2 for pepflakes
+except ImportError:
+    bz2 = None
+
+
+# how many bytes to read at a time from a codec's command
+_PIPE_CHUNK_SIZE = 64 * 1024
+
+
+class CompressionCodec(object):
+    """A way of compressing and decompressing files with a particular
+    extension.
+
+    :type name: str
+    :param name: name of the codec (e.g. ``'gzip'``)
+    :type extension: str
+    :param extension: extension of files compressed with this codec,
+                      including the dot (e.g. ``'.gz'``)
+    :param decompress: function that takes an iterator of chunks of
+                       compressed bytes and yields chunks of decompressed
+                       bytes
+    :param compress: function that takes an iterator of chunks of bytes
+                     and yields chunks of compressed bytes
+    :type hadoop_codec: str
+    :param hadoop_codec: name of the equivalent Hadoop codec class, if any
+                         (e.g. ``'org.apache.hadoop.io.compress.GzipCodec'``)
+    """
+    def __init__(self, name, extension, decompress, compress,
+                 hadoop_codec=None):
+        self.name = name
+        self.extension = extension
+        self.decompress = decompress
+        self.compress = compress
+        self.hadoop_codec = hadoop_codec
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (self.__class__.__name__,
+                               self.name, self.extension)
+
+
+def _check_bz2():
+    if bz2 is None:
+        raise Exception('bz2 module was not successfully imported'
+                        ' (likely not installed).')
+
+
+def _gunzip_chunks(chunks):
+    """Decompress chunks of gzipped data, including files made of several
+    gzip members concatenated together (like ``cat a.gz b.gz``)."""
+    # 16 means expect a gzip header and trailer
+    decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    for chunk in chunks:
+        while chunk:
+            data = decomp.decompress(chunk)
+            if data:
+                yield data
+
+            # unused_data is only set once we reach the end of a member
+            chunk = decomp.unused_data
+            if chunk:
+                # ignore padding at the end of the file, like gzip does
+                if not chunk.strip('\x00'):
+                    return
+                decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    data = decomp.flush()
+    if data:
+        yield data
+
+
+def _gzip_chunks(chunks):
+    """Compress chunks of data into a single gzip member."""
+    # level 6 is what gzip and Hadoop use by default; 9 is a lot slower,
+    # and barely smaller
+    comp = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+def _inflate_chunks(chunks):
+    """Decompress chunks of zlib data (what Hadoop's ``DefaultCodec``
+    writes)."""
+    decomp = zlib.decompressobj()
+    for chunk in chunks:
+        data = decomp.decompress(chunk)
+        if data:
+            yield data
+
+    data = decomp.flush()
+    if data:
+        yield data
+
+
+def _deflate_chunks(chunks):
+    """Compress chunks of data into a zlib stream."""
+    comp = zlib.compressobj(6)
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+def _bunzip2_chunks(chunks):
+    """Decompress chunks of bzip2ed data, including files made of several
+    bzip2 streams concatenated together (like ``pbzip2`` writes)."""
+    _check_bz2()
+    decomp = bz2.BZ2Decompressor()
+
+    for chunk in chunks:
+        while chunk:
+            try:
+                data = decomp.decompress(chunk)
+            except EOFError:
+                # the last stream ended exactly at the end of a chunk, so
+                # there was no unused_data to tell us to start a new one
+                decomp = bz2.BZ2Decompressor()
+                continue
+
+            if data:
+                yield data
+
+            # unused_data is only set once we reach the end of a stream
+            chunk = decomp.unused_data
+            if chunk:
+                decomp = bz2.BZ2Decompressor()
+
+
+def _bzip2_chunks(chunks):
+    """Compress chunks of data into a single bzip2 stream."""
+    _check_bz2()
+    comp = bz2.BZ2Compressor(9)
+    for chunk in chunks:
+        data = comp.compress(chunk)
+        if data:
+            yield data
+    yield comp.flush()
+
+
+def _find_command(commands):
+    """Return the first command (a list of args) in *commands* whose
+    executable is on our path, or ``None``."""
+    path_dirs = os.environ.get('PATH', os.defpath).split(os.pathsep)
+    for args in commands:
+        for path_dir in path_dirs:
+            if os.access(os.path.join(path_dir, args[0]), os.X_OK):
+                return list(args)
+    return None
+
+
+def _pipe_chunks(args, chunks=None, chunk_size=_PIPE_CHUNK_SIZE):
+    """Run *args*, feed it *chunks* on stdin from a separate thread, and
+    yield what it writes to stdout, *chunk_size* bytes at a time. Raise
+    :py:exc:`IOError` if it returns a non-zero exit status.
+
+    If *chunks* is ``None``, the command gets :py:data:`os.devnull` as its
+    stdin (e.g. because it reads a file named in *args*), rather than
+    whatever our stdin is."""
+    if chunks is None:
+        devnull = open(os.devnull)
+        try:
+            proc = Popen(args, stdin=devnull, stdout=PIPE)
+        finally:
+            devnull.close()
+    else:
+        proc = Popen(args, stdin=PIPE, stdout=PIPE)
+    exc_infos = []
+
+    def feed():
+        try:
+            try:
+                for chunk in chunks:
+                    proc.stdin.write(chunk)
+            finally:
+                proc.stdin.close()
+        except:
+            # if the process is gone, our reader will find out
+            if proc.returncode is None:
+                exc_infos.append(sys.exc_info())
+
+    thread = None
+    if chunks is not None:
+        thread = threading.Thread(target=feed)
+        thread.setDaemon(True)
+        thread.start()
+
+    try:
+        while True:
+            data = proc.stdout.read(chunk_size)
+            if not data:
+                break
+            yield data
+
+        proc.stdout.close()
+        returncode = proc.wait()
+        if thread is not None:
+            thread.join()
+
+        if returncode:
+            raise IOError('%s returned non-zero exit status %d' %
+                          (' '.join(args), returncode))
+        if exc_infos:
+            exc_info = exc_infos[0]
+            raise exc_info[0], exc_info[1], exc_info[2]
+    finally:
+        # if our caller stopped early, don't leave the process hanging
+        if proc.returncode is None:
+            try:
+                os.kill(proc.pid, signal.SIGTERM)
+            except OSError:
+                pass
+            proc.stdout.close()
+            proc.wait()
+
+
+def command_codec(name, extension, decompress_commands, compress_commands,
+                  hadoop_codec=None):
+    """Make a :py:class:`CompressionCodec` that pipes data through an
+    external command.
+
+    :param decompress_commands: commands (lists of args) to try, in order,
+                                to decompress data. The first one on your
+                                path is used. Each should read compressed
+                                data from stdin and write the decompressed
+                                data to stdout (e.g. ``[['pixz', '-d'],
+                                ['xz', '-dc']]``).
+    :param compress_commands: commands to try, in order, to compress data,
+                              from stdin to stdout
+
+    The other arguments are the same as for :py:class:`CompressionCodec`.
+    We look for the command each time we use the codec, and raise
+    :py:exc:`IOError` if none of them are on your path.
+    """
+    def make_pipe(commands, verb):
+        def pipe(chunks):
+            args = _find_command(commands)
+            if args is None:
+                raise IOError(
+                    "Can't %s %s files; none of %s are on your path" %
+                    (verb, extension,
+                     ', '.join(repr(args[0]) for args in commands)))
+            return _pipe_chunks(args, chunks)
+        return pipe
+
+    return CompressionCodec(
+        name, extension,
+        make_pipe(decompress_commands, 'decompress'),
+        make_pipe(compress_commands, 'compress'),
+        hadoop_codec=hadoop_codec)
+
+
+# map from extension (e.g. '.gz') to codec
+_CODECS = {}
+
+
+def register_codec(codec):
+    """Make *codec* (a :py:class:`CompressionCodec`) available to
+    :py:func:`get_codec` and :py:func:`get_codec_by_name`, replacing
+    any codec registered for the same extension."""
+    _CODECS[codec.extension] = codec
+
+
+def get_codec(path):
+    """Get the :py:class:`CompressionCodec` for *path*, based on its
+    extension, or ``None`` if it's not compressed (that we know of).
+
+    The built-in codecs are ``'bzip2'`` (``.bz2``), using :py:mod:`bz2`,
+    and ``'gzip'`` (``.gz``), using :py:mod:`zlib`. Others have to be
+    registered with :py:func:`register_codec` first.
+    """
+    # check longer extensions first, in case one ends with another
+    for ext in sorted(_CODECS, key=len, reverse=True):
+        if path.endswith(ext):
+            return _CODECS[ext]
+    return None
+
+
+def get_codec_by_name(name):
+    """Get a :py:class:`CompressionCodec` by its name (e.g. ``'gzip'``),
+    its extension (e.g. ``'.gz'``), or the name of the equivalent Hadoop
+    codec class (e.g. ``'org.apache.hadoop.io.compress.GzipCodec'``).
+
+    Raise :py:exc:`ValueError` if there is no such codec.
+    """
+    if name:
+        for codec in _CODECS.itervalues():
+            if name in (codec.name, codec.extension, codec.hadoop_codec):
+                return codec
+    raise ValueError('unknown compression codec: %r' % (name,))
+
+
+register_codec(CompressionCodec(
+    'bzip2', '.bz2', _bunzip2_chunks, _bzip2_chunks,
+    hadoop_codec='org.apache.hadoop.io.compress.BZip2Codec'))
+register_codec(CompressionCodec(
+    'gzip', '.gz', _gunzip_chunks, _gzip_chunks,
+    hadoop_codec='org.apache.hadoop.io.compress.GzipCodec'))
+
+
+# codecs you can turn on with register_codec()
+
+#: ``'deflate'`` (``.deflate``), using :py:mod:`zlib`; this is what Hadoop's
+#: ``DefaultCodec`` writes
+DEFLATE_CODEC = CompressionCodec(
+    'deflate', '.deflate', _inflate_chunks, _deflate_chunks,
+    hadoop_codec='org.apache.hadoop.io.compress.DefaultCodec')
+
+#: ``'xz'`` (``.xz``), using the ``xz`` command
+XZ_CODEC = command_codec(
+    'xz', '.xz', [['xz', '-dc']], [['xz', '-c']])
+
+#: ``'zstd'`` (``.zst``), using the ``zstd`` command
+ZSTD_CODEC = command_codec(
+    'zstd', '.zst', [['zstd', '-dcq']], [['zstd', '-cq']],
+    hadoop_codec='org.apache.hadoop.io.compress.ZStandardCodec')
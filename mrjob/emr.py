@@ -828,6 +828,10 @@ class EMRJobRunner(MRJobRunner):
 
         self._launch_emr_job()
         self._wait_for_job_to_complete()
+        self._collect_task_profiles()
+
+    def _task_profiles_dir(self):
+        return self._s3_tmp_uri + 'profiles/'
 
     def _prepare_for_launch(self):
         self._check_input_exists()
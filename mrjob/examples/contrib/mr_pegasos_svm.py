@@ -1,4 +1,5 @@
 # Copyright 2011 Peter Harrington
+# Copyright 2013 Yelp and Contributors
 #
 # Licensed under the Apache License, Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
@@ -11,97 +12,171 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-'''
-MapReduce version of Pegasos SVM, using mrjob to automate job flow
-More information on Pegasos can be found here:
-http://citeseerx.ist.psu.edu/viewdoc/download?doi=10.1.1.161.9629&rep=rep1&type=pdf
+"""Train a linear SVM with the Pegasos algorithm (stochastic sub-gradient
+descent):
 
-usage: python mr_pegasos_svm.py < kickStart.txt
-where: kickStart.txt contains simulated outputs from the reducer
+http://www.ee.oulu.fi/research/imag/courses/Vedaldi/ShalevSiSr07.pdf
 
-A pickled matrix of the data set is assumed to reside on disk
-in the file svmDat.txt.  The last column of this matrix is assumed
-to be the class labels: i.e. -1 or 1.
+This takes as its input examples in the sparse format used by libsvm, one
+per line::
 
-Pegasos does not explicitly solve for a bias term b like the SMO
-algorithm.  To account for this you can add a 0th column of all 1s
-to your data set -if you wish.
+    <label> <index>:<value> <index>:<value> ...
 
-For questions or comments you can contact me at:
-peter.b.harrington@gmail.com
-'''
-import pickle
-from numpy import mat, zeros, shape, random
+Labels greater than zero are positive examples; anything else is negative.
+Indices are non-negative integers.
+
+The first step parses examples into sparse feature vectors and shuffles
+them (Pegasos works best when positive and negative examples are mixed
+together). The second step trains a separate model in each mapper, and
+averages them in the reducer. The output is the weight for each feature,
+as ``index<tab>weight``.
+
+Feature vectors are passed between steps with
+:py:class:`~mrjob.protocol.SparseVectorProtocol`, which is several times
+smaller and faster than passing them as JSON.
+
+Usage::
+
+    python mr_pegasos_svm.py [--lambda L] [--epochs N] < examples.txt
+
+Originally by Peter Harrington (peter.b.harrington@gmail.com), as a job
+that read its examples from a pickled numpy matrix.
+"""
+from array import array
+import hashlib
 
 from mrjob.job import MRJob
-from mrjob.protocol import JSONValueProtocol
+from mrjob.protocol import JSONProtocol
+from mrjob.protocol import RawValueProtocol
+from mrjob.protocol import SparseVectorProtocol
+from mrjob.sparse import SparseVector
+
+# rescale the weight vector when its scale gets this small, to avoid
+# losing precision
+MIN_SCALE = 1e-9
+
+
+def parse_example(line):
+    """Parse an example in libsvm format into ``(label, vector)``, where
+    *label* is ``1`` or ``-1``, and *vector* is a
+    :py:class:`~mrjob.sparse.SparseVector`."""
+    fields = line.split()
+    label = 1 if float(fields[0]) > 0 else -1
+
+    features = {}
+    for field in fields[1:]:
+        index, value = field.split(':')
+        features[int(index)] = float(value)
+
+    return label, SparseVector.from_dict(features)
+
+
+def train_pegasos(examples, regularization, epochs=1):
+    """Train a linear SVM on *examples*, a list of ``(label, vector)``, and
+    return the weights as a :py:class:`~mrjob.sparse.SparseVector`.
+
+    We store the weights as ``scale * weights``, so that shrinking them at
+    each step doesn't have to touch every feature.
+    """
+    weights = array('d')
+    scale = 1.0
+    t = 0
+
+    for _ in xrange(epochs):
+        for label, vector in examples:
+            t += 1
+            eta = 1.0 / (regularization * t)
+
+            # make room for new features
+            num_new = vector.max_index() + 1 - len(weights)
+            if num_new > 0:
+                weights.extend(array('d', [0.0]) * num_new)
+
+            # w <- (1 - eta * lambda) * w
+            shrink = 1.0 - eta * regularization
+            if shrink <= 0.0:
+                # happens on the first step; start over from zero
+                weights = array('d', [0.0]) * len(weights)
+                scale = 1.0
+            else:
+                scale *= shrink
+
+            # if the margin is too small, w <- w + eta * y * x
+            if label * scale * vector.dot(weights) < 1.0:
+                vector.add_to(weights, eta * label / scale)
+
+            if scale < MIN_SCALE:
+                weights = array('d', [w * scale for w in weights])
+                scale = 1.0
+
+    return SparseVector(
+        [i for i, w in enumerate(weights) if w],
+        [w * scale for w in weights if w])
+
 
 class MRsvm(MRJob):
-    INPUT_PROTOCOL = JSONValueProtocol
-
-    def __init__(self, *args, **kwargs):
-        super(MRsvm, self).__init__(*args, **kwargs)
-        self.data = pickle.load(open('<path to pickled matrix>/svmDat.txt'))
-        self.w = []                     #weights vector
-        self.eta = 0.69                 #learning rate
-        self.dataList = []              #list of data points to evaluate
-        self.k = self.options.batchsize #number of data points to evaluate
-        self.numMappers = 1             #number of mappers
-        self.t = 1                      #iteration number
+
+    INPUT_PROTOCOL = RawValueProtocol
+    INTERNAL_PROTOCOL = SparseVectorProtocol
+    OUTPUT_PROTOCOL = JSONProtocol
 
     def configure_options(self):
         super(MRsvm, self).configure_options()
+
         self.add_passthrough_option(
-            '--iterations', dest='iterations', default=2, type='int',
-            help='T: number of iterations to run')
+            '--lambda', dest='regularization', default=0.0001, type='float',
+            help='regularization parameter (default: %default)')
+
         self.add_passthrough_option(
-            '--batchsize', dest='batchsize', default=100, type='int',
-            help='k: number of data points in a batch')
-
-    def map(self, mapperId, inVals): #needs exactly 2 arguments
-        #input: mapperId, ['w', w-vector] OR mapperId, ['x', int]
-        #output: none
-        if False: yield
-        if inVals[0]=='w':                  #accumulate W-vector
-            self.w = inVals[1]
-        elif inVals[0]=='x':
-            self.dataList.append(inVals[1]) #accumulate data points to calc
-        elif inVals[0]=='t': self.t = inVals[1]
-
-    def map_fin(self):
-        #input: none
-        #output: 0, ['w', w-vector] OR 0, ['u', int] OR 0, ['t', int]
-        labels = self.data[:,-1]; X=self.data[:,0:-1]#reshape data into X and Y
-        for index in self.dataList:
-            p = mat(self.w)*X[index,:].T    #calc p=w*dataSet[key].T
-            if labels[index]*p < 1.0:       #check to see if this index is correctly classified
-                yield (0, ['u', index])     #make sure everything has the same key
-        yield (0, ['w', self.w])            #so it ends up at the same reducer
-        yield (0, ['t', self.t])
-
-    def reduce(self, _, packedVals):
-        #input: 0, ['w', w-vector] OR 0, ['u', int] OR 0, ['t', int]
-        #output: mapperId, ['w', w-vector] OR mapperId, ['x', int] OR mapperId, ['t', int]
-        for valArr in packedVals:                       #unpack inputs
-            if valArr[0]=='u':  self.dataList.append(valArr[1])
-            elif valArr[0]=='w': self.w = valArr[1]
-            elif valArr[0]=='t':  self.t = valArr[1]
-        labels = self.data[:,-1]; X=self.data[:,0:-1]
-        wMat = mat(self.w);   wDelta = mat(zeros(len(self.w)))
-        for index in self.dataList:                     #accumulate changes to w
-            wDelta += float(labels[index])*X[index,:]   #wDelta += label*dataSet
-        eta = 1.0/(2.0*self.t)
-        wMat = (1.0 - 1.0/self.t)*wMat + (eta/self.k)*wDelta #update w
-        for mapperNum in range(self.numMappers):
-            yield (mapperNum, ['w', wMat.tolist()[0] ]) #emit w
-            if self.t < self.options.iterations:        #if this is not the last iteration
-                yield (mapperNum, ['t', self.t+1])      #increment t
-                for j in range(self.k/self.numMappers): #emit random ints for mappers iid
-                    yield (mapperNum, ['x', random.randint(shape(self.data)[0]) ])
+            '--epochs', dest='epochs', default=5, type='int',
+            help='number of passes over the examples in each mapper'
+                 ' (default: %default)')
 
     def steps(self):
-        return ([self.mr(mapper=self.map, reducer=self.reduce,
-                         mapper_final=self.map_fin)]*self.options.iterations)
+        return [self.mr(mapper=self.parse_and_shuffle,
+                        reducer=self.unshuffle),
+                self.mr(mapper_init=self.start_training,
+                        mapper=self.collect_example,
+                        mapper_final=self.train,
+                        reducer=self.average_models)]
+
+    def parse_and_shuffle(self, _, line):
+        if not line.strip():
+            return
+
+        label, vector = parse_example(line)
+        # sort examples by the hash of their line, to mix them up
+        yield [hashlib.md5(line).hexdigest(), label], vector
+
+    def unshuffle(self, shuffle_key_and_label, vectors):
+        _, label = shuffle_key_and_label
+        for vector in vectors:
+            yield label, vector
+
+    def start_training(self):
+        self.examples = []
+
+    def collect_example(self, label, vector):
+        self.examples.append((label, vector))
+        # keep mapper() a generator
+        return iter(())
+
+    def train(self):
+        if self.examples:
+            yield None, train_pegasos(
+                self.examples, self.options.regularization,
+                epochs=self.options.epochs)
+
+    def average_models(self, _, models):
+        totals = {}
+        num_models = 0
+        for model in models:
+            model.add_to(totals)
+            num_models += 1
+
+        for index in sorted(totals):
+            yield index, totals[index] / num_models
+
 
 if __name__ == '__main__':
     MRsvm.run()
@@ -33,7 +33,7 @@ from mrjob.parse import parse_s3_uri
 from mrjob.retry import RetryWrapper
 from mrjob.runner import GLOB_RE
 from mrjob.util import buffer_iterator_to_line_iterator
-from mrjob.util import read_file
+from mrjob.util import read_file_chunks
 
 
 log = logging.getLogger('mrjob.fs.s3')
@@ -173,7 +173,8 @@ class S3Filesystem(Filesystem):
         s3_key.get_file(stream)
         stream.seek(0)
 
-        buffer_iterator = read_file(s3_key_to_uri(s3_key), fileobj=stream)
+        buffer_iterator = read_file_chunks(s3_key_to_uri(s3_key),
+                                           fileobj=stream)
         return buffer_iterator_to_line_iterator(buffer_iterator)
 
     def write(self, path, content):
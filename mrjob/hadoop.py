@@ -214,6 +214,10 @@ class HadoopJobRunner(MRJobRunner):
         self._add_job_files_for_upload()
         self._upload_local_files_to_hdfs()
         self._run_job_in_hadoop()
+        self._collect_task_profiles()
+
+    def _task_profiles_dir(self):
+        return posixpath.join(self._hdfs_tmp_dir, 'profiles')
 
     def _check_input_exists(self):
         """Make sure all input exists before continuing with our job.
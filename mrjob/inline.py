@@ -32,6 +32,10 @@ except ImportError:
 from mrjob.sim import SimMRJobRunner
 from mrjob.sim import SimRunnerOptionStore
 from mrjob.job import MRJob
+from mrjob.runner import _step_io
+from mrjob.typedbytes import chunks_to_record_lists
+from mrjob.typedbytes import sort_records
+from mrjob.util import read_input
 from mrjob.util import save_current_environment
 
 log = logging.getLogger('mrjob.inline')
@@ -122,8 +126,16 @@ class InlineMRJobRunner(SimMRJobRunner):
     def run_step(self, step_dict, input_file, outfile_name,
                  step_number, step_type, env,
                 child_stdin=None):
+        if step_type == 'mapper' and 'mapper' not in step_dict:
+            # no mapper, so just copy input, like Hadoop Streaming's cat
+            with open(outfile_name, 'w') as outfile:
+                for line in read_input(input_file):
+                    outfile.write(line)
+            return
+
         common_args = (['--step-num=%d' % step_number] +
-                       self._mr_job_extra_args(local=True))
+                       self._mr_job_extra_args(local=True) +
+                       self._task_profile_args())
 
         if step_type == 'mapper':
             child_args = (
@@ -150,8 +162,13 @@ class InlineMRJobRunner(SimMRJobRunner):
             child_instance.execute()
 
         if has_combiner:
-            sorted_lines = sorted(child_stdout.getvalue().splitlines())
-            combiner_stdin = StringIO('\n'.join(sorted_lines))
+            if _step_io(step_dict)['map_output'] == 'typedbytes':
+                records = [record for records in chunks_to_record_lists(
+                    [child_stdout.getvalue()]) for record in records]
+                combiner_stdin = StringIO(''.join(sort_records(records)))
+            else:
+                sorted_lines = sorted(child_stdout.getvalue().splitlines())
+                combiner_stdin = StringIO('\n'.join(sorted_lines))
         else:
             child_stdout.flush()
 
@@ -159,7 +176,7 @@ class InlineMRJobRunner(SimMRJobRunner):
 
         while len(self._counters) <= step_number:
             self._counters.append({})
-        child_instance.parse_counters(self._counters[step_number - 1])
+        child_instance.parse_counters(self._counters[step_number])
 
         if has_combiner:
             self.run_step(step_dict, "", outfile_name, step_number, 'combiner',
@@ -18,11 +18,17 @@ for more information."""
 from __future__ import with_statement
 
 import codecs
+import cProfile
 import inspect
 import itertools
 import logging
 from optparse import OptionGroup
+import os
+import os.path
+from subprocess import PIPE
+from subprocess import Popen
 import sys
+import time
 
 try:
     from cStringIO import StringIO
@@ -37,21 +43,133 @@ except ImportError:
     import json
 
 # don't use relative imports, to allow this script to be invoked as __main__
+from mrjob.compat import get_jobconf_value
 from mrjob.conf import combine_dicts
 
+from mrjob.parse import is_uri
 from mrjob.parse import parse_mr_job_stderr
 from mrjob.protocol import JSONProtocol
+from mrjob.protocol import _ClassBasedKeyCachingProtocol
+from mrjob.protocol import _JSONBackendMixin
+from mrjob.protocol import _overridden
 from mrjob.protocol import RawValueProtocol
 from mrjob.launch import MRJobLauncher
 from mrjob.launch import _READ_ARGS_FROM_SYS_ARGV
+from mrjob.options import add_task_opts
 from mrjob.step import JarStep
 from mrjob.step import MRJobStep
+from mrjob.step import _IDENTITY_MAPPER
+from mrjob.step import _IDENTITY_REDUCER
 from mrjob.step import _JOB_STEP_PARAMS
+from mrjob.step import _MRJOB_STEP_OPT_FUNCS
+from mrjob.typedbytes import chunks_to_record_lists
+from mrjob.util import BufferedLineWriter
+from mrjob.util import DEFAULT_OUTPUT_BUFFER_SIZE
 from mrjob.util import read_input
+from mrjob.util import read_input_blocks
 
 
 log = logging.getLogger('mrjob.job')
 
+# inside tasks, write out counters after this many seconds or this many
+# calls to increment_counter(), whichever comes first
+_COUNTER_FLUSH_INTERVAL = 5.0
+_COUNTER_FLUSH_INCREMENTS = 100000
+
+
+#: counter group that tasks report timing and throughput in (see
+#: :option:`--task-perf-counters`)
+PERF_COUNTER_GROUP = 'mrjob.perf'
+
+
+class _PerfStats(object):
+    """Time spent reading and writing, and records and bytes in and out,
+    for a single task."""
+
+    __slots__ = ('read_time', 'write_time', 'records_in', 'bytes_in',
+                 'records_out', 'bytes_out')
+
+    def __init__(self):
+        self.read_time = 0.0
+        self.write_time = 0.0
+        self.records_in = 0
+        self.bytes_in = 0
+        self.records_out = 0
+        self.bytes_out = 0
+
+
+# when reporting perf counters, time one in this many of the records that
+# we decode or encode one at a time
+_PERF_SAMPLE_RATE = 64
+
+
+class _PerfLineWriter(BufferedLineWriter):
+    """A :py:class:`~mrjob.util.BufferedLineWriter` that adds the time it
+    spends flushing, and the records and bytes it has written, to a
+    :py:class:`_PerfStats`."""
+
+    def __init__(self, perf, *args, **kwargs):
+        BufferedLineWriter.__init__(self, *args, **kwargs)
+        self._perf = perf
+
+    def flush(self):
+        start = time.time()
+        BufferedLineWriter.flush(self)
+        self._perf.write_time += time.time() - start
+        self._perf.records_out = self.lines_written
+        self._perf.bytes_out = self.bytes_written
+
+
+def _protocol_class(protocol):
+    """Protocols may be classes or instances; return the class."""
+    if isinstance(protocol, type):
+        return protocol
+    else:
+        return protocol.__class__
+
+
+def _can_copy_lines(read_protocol, write_protocol):
+    """True if decoding a line with *read_protocol* and encoding it again
+    with *write_protocol* would give back the same data, so we can just copy
+    the line. The protocols have to be of the same class, and that class
+    has to set ``_PASS_THROUGH_SAFE`` itself (a subclass might change how
+    lines are decoded, e.g. to drop some fields)."""
+    cls = _protocol_class(read_protocol)
+    return (cls is _protocol_class(write_protocol) and
+            cls.__dict__.get('_PASS_THROUGH_SAFE', False))
+
+
+def _hadoop_io(protocol_method):
+    """How Hadoop Streaming should frame the data that a protocol's
+    ``read()`` or ``write()`` method handles: ``'text'`` (lines) unless the
+    protocol sets *hadoop_io* (e.g. ``'typedbytes'``)."""
+    protocol = getattr(protocol_method, 'im_self', None)
+    return getattr(protocol, 'hadoop_io', None) or 'text'
+
+
+def _batch_method(protocol_method):
+    """Given a protocol's ``read()`` or ``write()`` method, return its
+    ``read_many()`` or ``write_many()`` method, or ``None`` if it doesn't
+    have one (or *protocol_method* isn't a method of a protocol, or a
+    subclass overrides ``read()`` or ``write()`` but not the batch method,
+    which would then bypass the override)."""
+    protocol = getattr(protocol_method, 'im_self', None)
+    name = getattr(protocol_method, '__name__', None)
+    if protocol is None or name not in ('read', 'write'):
+        return None
+    if _overridden(protocol, name, name + '_many'):
+        return None
+    return getattr(protocol, name + '_many', None)
+
+
+def _getsizeof(obj):
+    """Approximate size of *obj* in memory (not counting anything it
+    refers to). :py:func:`sys.getsizeof` isn't available in Python 2.5."""
+    try:
+        return sys.getsizeof(obj)
+    except AttributeError:
+        return len(repr(obj))
+
 
 class UsageError(Exception):
     pass
@@ -65,6 +183,12 @@ class MRJob(MRJobLauncher):
     # process as the launcher
     _DEFAULT_RUNNER = 'inline'
 
+    # counter increments added up in memory while a task is running
+    _counter_deltas = None
+
+    # timing and throughput for the task we're running, if we're reporting it
+    _perf_stats = None
+
     def __init__(self, args=None):
         """Entry point for running your job from other Python code.
 
@@ -141,6 +265,70 @@ class MRJob(MRJobLauncher):
         """
         raise NotImplementedError
 
+    def mapper_batch(self, pairs):
+        """Re-define this to define the mapper for a one-step job as a
+        function that processes many records at once. Use this instead of
+        (not in addition to) :py:meth:`mapper` when the per-record overhead
+        of a Python function call dominates, or when you can vectorize
+        your work (e.g. with NumPy).
+
+        Yields zero or more tuples of ``(out_key, out_value)``.
+
+        :param pairs: a list of up to :py:attr:`MAPPER_BATCH_SIZE` tuples of
+                      ``(key, value)``, in input order, decoded just as they
+                      would be for :py:meth:`mapper`.
+
+        The last batch may be smaller than the batch size. Output is written
+        as soon as each batch is processed.
+        """
+        raise NotImplementedError
+
+    #: How many input records to pass to :py:meth:`mapper_batch` at a time,
+    #: for one-step jobs. ``None`` means to use the default (1000). For
+    #: multi-step jobs, use the *mapper_batch_size* keyword argument to
+    #: :py:meth:`mr`.
+    MAPPER_BATCH_SIZE = None
+
+    def mapper_merge(self, value1, value2):
+        """Re-define this to aggregate your mapper's output in memory
+        before it's written out (*in-mapper combining*). This is often much
+        cheaper than a :py:meth:`combiner`, which requires mapper output to
+        be encoded, sorted, and decoded again.
+
+        Whenever the mapper (including :py:meth:`mapper_init` and
+        :py:meth:`mapper_final`) yields a key that's already being held in
+        memory, this is called with the held value and the new one, and
+        should return a single merged value. For example, to sum counts::
+
+            def mapper_merge(self, count1, count2):
+                return count1 + count2
+
+        This function must be associative, and its return value must be
+        something your mapper could have yielded itself, since it may be
+        called on values that have already been merged. Keys that can't be
+        hashed (e.g. lists) are written out unmerged.
+
+        Held values are written out when the mapper has seen
+        :py:attr:`MAPPER_MERGE_MAX_ENTRIES` distinct keys or (optionally)
+        used about :py:attr:`MAPPER_MERGE_MAX_BYTES` of memory, and at the
+        end of the task. Flushes, hits, and misses are reported through the
+        ``In-mapper combining`` counter group.
+        """
+        raise NotImplementedError
+
+    #: How many distinct keys :py:meth:`mapper_merge` holds in memory before
+    #: writing them out, for one-step jobs. ``None`` means to use the
+    #: default (10000). For multi-step jobs, use the
+    #: *mapper_merge_max_entries* keyword argument to :py:meth:`mr`.
+    MAPPER_MERGE_MAX_ENTRIES = None
+
+    #: Roughly how many bytes of keys and values :py:meth:`mapper_merge`
+    #: holds in memory before writing them out, for one-step jobs, as
+    #: measured by :py:func:`sys.getsizeof`. ``None`` means no limit. For
+    #: multi-step jobs, use the *mapper_merge_max_bytes* keyword argument to
+    #: :py:meth:`mr`.
+    MAPPER_MERGE_MAX_BYTES = None
+
     def mapper_init(self):
         """Re-define this to define an action to run before the mapper
         processes any input.
@@ -301,10 +489,10 @@ class MRJob(MRJobLauncher):
         """Re-define this to make a multi-step job.
 
         If you don't re-define this, we'll automatically create a one-step
-        job using any of :py:meth:`mapper`, :py:meth:`mapper_init`,
-        :py:meth:`mapper_final`, :py:meth:`reducer_init`,
-        :py:meth:`reducer_final`, and :py:meth:`reducer` that you've
-        re-defined. For example::
+        job using any of :py:meth:`mapper`, :py:meth:`mapper_batch`,
+        :py:meth:`mapper_init`, :py:meth:`mapper_final`,
+        :py:meth:`reducer_init`, :py:meth:`reducer_final`, and
+        :py:meth:`reducer` that you've re-defined. For example::
 
             def steps(self):
                 return [self.mr(mapper=self.transform_input,
@@ -329,6 +517,13 @@ class MRJob(MRJobLauncher):
 
         kwargs.update(updates)
 
+        # options for the functions above come from class attributes
+        # (e.g. mapper_batch_size from MAPPER_BATCH_SIZE)
+        for opt, func_name in _MRJOB_STEP_OPT_FUNCS.iteritems():
+            value = getattr(self, opt.upper())
+            if func_name in kwargs and value is not None:
+                kwargs[opt] = value
+
         return [self.mr(**kwargs)]
 
     @classmethod
@@ -347,6 +542,19 @@ class MRJob(MRJobLauncher):
                         :py:meth:`reducer`, or ``None`` for no reducer.
         :param combiner: function with same function signature as
                          :py:meth:`combiner`, or ``None`` for no combiner.
+        :param mapper_batch: function with same function signature as
+                             :py:meth:`mapper_batch`. Can't be used together
+                             with *mapper*.
+        :param mapper_batch_size: how many records to pass to *mapper_batch*
+                                  at a time (default 1000).
+        :param mapper_merge: function with same function signature as
+                             :py:meth:`mapper_merge`, or ``None`` to write
+                             mapper output immediately.
+        :param mapper_merge_max_entries: how many distinct keys to hold in
+                                         memory for *mapper_merge* (default
+                                         10000).
+        :param mapper_merge_max_bytes: roughly how much memory to use for
+                                       *mapper_merge* (default no limit).
         :param mapper_init: function with same function signature as
                             :py:meth:`mapper_init`, or ``None`` for no initial
                             mapper action.
@@ -368,6 +576,20 @@ class MRJob(MRJobLauncher):
         :param jobconf: dictionary with custom jobconf arguments to pass to
                         hadoop.
 
+        If a step's mapper, combiner, or reducer is the identity function
+        (with no ``_init`` or ``_final`` function) and would read and write
+        the same protocol class, and that class is one of mrjob's raw,
+        JSON, pickle, repr, or typed bytes protocols (which give back what
+        they decode), we copy its lines from input to output without
+        decoding and re-encoding them (if the first step has no mapper,
+        Hadoop Streaming runs ``cat``). Lines the protocol can't
+        decode are copied too, rather than counted as ``Undecodable input``,
+        and lines aren't normalized by re-encoding them. We only do this if
+        you haven't re-defined :py:meth:`pick_protocols`,
+        :py:meth:`input_protocol`, :py:meth:`internal_protocol`, or
+        :py:meth:`output_protocol` (e.g. to configure a protocol), and
+        :option:`--strict-protocols` isn't set.
+
         Please consider the way we represent steps to be opaque, and expect
         it to change in future versions of ``mrjob``.
         """
@@ -419,6 +641,10 @@ class MRJob(MRJobLauncher):
 
         Commas in ``counter`` or ``group`` will be automatically replaced
         with semicolons (commas confuse Hadoop streaming).
+
+        Inside a task (e.g. :py:meth:`run_mapper`), increments are added up
+        in memory, and written out every few seconds, before each
+        :py:meth:`set_status`, and at the end of the task.
         """
         # don't allow people to pass in floats
         if not isinstance(amount, (int, long)):
@@ -434,15 +660,58 @@ class MRJob(MRJobLauncher):
         if isinstance(group, unicode) or isinstance(counter, unicode):
             group = unicode(group).replace(',', ';')
             counter = unicode(counter).replace(',', ';')
-            stderr = codecs.getwriter('utf-8')(self.stderr)
         else:
             group = str(group).replace(',', ';')
             counter = str(counter).replace(',', ';')
-            stderr = self.stderr
 
-        stderr.write(
-            u'reporter:counter:%s,%s,%d\n' % (group, counter, amount))
-        stderr.flush()
+        deltas = self._counter_deltas
+        if deltas is None:
+            self._write_counters([((group, counter), amount)])
+            return
+
+        key = (group, counter)
+        deltas[key] = deltas.get(key, 0) + amount
+
+        self._num_counter_increments += 1
+        if (self._num_counter_increments >= _COUNTER_FLUSH_INCREMENTS or
+            time.time() >= self._counter_flush_time):
+            self._flush_counters()
+
+    def _write_counters(self, counter_amounts):
+        """Write ``((group, counter), amount)`` pairs to stderr, and flush
+        it."""
+        for (group, counter), amount in counter_amounts:
+            if isinstance(group, unicode):
+                stderr = codecs.getwriter('utf-8')(self.stderr)
+            else:
+                stderr = self.stderr
+
+            stderr.write(
+                u'reporter:counter:%s,%s,%d\n' % (group, counter, amount))
+
+        self.stderr.flush()
+
+    def _buffer_counters(self):
+        """Start adding up counter increments in memory. Called at the
+        start of each task."""
+        self._counter_deltas = {}
+        self._num_counter_increments = 0
+        self._counter_flush_time = time.time() + _COUNTER_FLUSH_INTERVAL
+
+    def _flush_counters(self):
+        """Write out counter increments added up in memory, if any."""
+        if self._counter_deltas:
+            self._write_counters(self._counter_deltas.iteritems())
+            self._counter_deltas.clear()
+
+        self._num_counter_increments = 0
+        self._counter_flush_time = time.time() + _COUNTER_FLUSH_INTERVAL
+
+    def _stop_buffering_counters(self):
+        """Write out counter increments, and go back to writing them
+        immediately. Called at the end of each task."""
+        self._flush_counters()
+        self._counter_deltas = None
 
     def set_status(self, msg):
         """Set the job status in hadoop streaming by printing to stderr.
@@ -454,6 +723,10 @@ class MRJob(MRJobLauncher):
         If the type of **msg** is ``unicode``, then the message will be written
         as unicode. Otherwise, it will be written as ASCII.
         """
+        # keep counters in order with status messages
+        if self._counter_deltas:
+            self._flush_counters()
+
         if isinstance(msg, unicode):
             status = u'reporter:status:%s\n' % (msg,)
             stderr = codecs.getwriter('utf-8')(self.stderr)
@@ -491,17 +764,116 @@ class MRJob(MRJobLauncher):
             self.show_steps()
 
         elif self.options.run_mapper:
-            self.run_mapper(self.options.step_num)
+            self._run_task(self.run_mapper, 'mapper')
 
         elif self.options.run_combiner:
-            self.run_combiner(self.options.step_num)
+            self._run_task(self.run_combiner, 'combiner')
 
         elif self.options.run_reducer:
-            self.run_reducer(self.options.step_num)
+            self._run_task(self.run_reducer, 'reducer')
 
         else:
             super(MRJob, self).execute()
 
+    def _run_task(self, run_method, step_type):
+        """Run a mapper, combiner, or reducer for the current step, under
+        :py:mod:`cProfile` if the runner asked us to profile tasks, and
+        report how long it took."""
+        step_num = self.options.step_num
+
+        if self.options.task_perf_counters:
+            self._perf_stats = _PerfStats()
+            start = time.time()
+
+        if self.options.profile_tasks or self.options.profile_tasks_dir:
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(run_method, step_num)
+            finally:
+                self._dump_task_profile(profiler, step_num, step_type)
+        else:
+            run_method(step_num)
+
+        if self._perf_stats is not None:
+            self._write_perf_counters(step_type, time.time() - start)
+
+    def _write_perf_counters(self, step_type, total_time):
+        """Report the time and throughput of the task that just finished
+        in the ``mrjob.perf`` counter group, e.g. ``mapper user code ms``.
+
+        User code time is whatever wasn't spent reading and decoding input
+        or encoding and writing output."""
+        stats = self._perf_stats
+        self._perf_stats = None
+
+        def ms(t):
+            return int(round(t * 1000))
+
+        user_time = max(total_time - stats.read_time - stats.write_time, 0)
+
+        self._write_counters(
+            ((PERF_COUNTER_GROUP, '%s %s' % (step_type, name)), amount)
+            for name, amount in [
+                ('input records', stats.records_in),
+                ('input bytes', stats.bytes_in),
+                ('output records', stats.records_out),
+                ('output bytes', stats.bytes_out),
+                ('read and decode ms', ms(stats.read_time)),
+                ('user code ms', ms(user_time)),
+                ('encode and write ms', ms(stats.write_time)),
+                ('total ms', ms(total_time)),
+            ])
+
+    def _dump_task_profile(self, profiler, step_num, step_type):
+        """Write this task's stats where the runner can find them.
+
+        Stats go into ``--profile-tasks-dir`` if it's a local path, and
+        into the task's working directory otherwise. If
+        ``--profile-tasks-dir`` is a URI (i.e. the task is running on a
+        cluster), we also copy the stats there with ``hadoop fs -put``.
+        """
+        attempt_id = get_jobconf_value(
+            'mapreduce.task.attempt.id', str(os.getpid()))
+        filename = 'mrjob-profile-step-%d-%s-%s.prof' % (
+            step_num, step_type, attempt_id)
+
+        profiles_dir = self.options.profile_tasks_dir
+
+        if profiles_dir and not is_uri(profiles_dir):
+            try:
+                os.makedirs(profiles_dir)
+            except OSError:
+                # another task beat us to it
+                if not os.path.isdir(profiles_dir):
+                    raise
+            path = os.path.join(profiles_dir, filename)
+        else:
+            path = filename
+
+        profiler.dump_stats(path)
+
+        if profiles_dir and is_uri(profiles_dir):
+            hadoop_bin = 'hadoop'
+            if os.environ.get('HADOOP_HOME'):
+                hadoop_bin = os.path.join(
+                    os.environ['HADOOP_HOME'], 'bin', 'hadoop')
+
+            dest = profiles_dir.rstrip('/') + '/' + filename
+            try:
+                proc = Popen([hadoop_bin, 'fs', '-put', path, dest],
+                             stdout=PIPE, stderr=PIPE)
+                _, stderr = proc.communicate()
+                returncode = proc.returncode
+            except OSError, e:
+                returncode, stderr = None, str(e)
+
+            # a missing profile shouldn't fail the task
+            if returncode != 0:
+                self.stderr.write(
+                    'Could not upload task profile %s to %s: %s\n' % (
+                        path, dest, stderr))
+                self.stderr.flush()
+
     def make_runner(self):
         """Make a runner based on command-line arguments, so we can
         launch this job on EMR, on Hadoop, or locally.
@@ -539,29 +911,70 @@ class MRJob(MRJobLauncher):
         Called from :py:meth:`run`. You'd probably only want to call this
         directly from automated tests.
         """
-        steps = self.steps()
+        steps = self._steps()
         if not 0 <= step_num < len(steps):
             raise ValueError('Out-of-range step: %d' % step_num)
         step = steps[step_num]
         mapper = step['mapper']
+        mapper_batch = step['mapper_batch']
         mapper_init = step['mapper_init']
         mapper_final = step['mapper_final']
 
         # pick input and output protocol
-        read_lines, write_line = self._wrap_protocols(step_num, 'mapper')
-
-        if mapper_init:
-            for out_key, out_value in mapper_init() or ():
-                write_line(out_key, out_value)
-
-        # run the mapper on each line
-        for key, value in read_lines():
-            for out_key, out_value in mapper(key, value) or ():
-                write_line(out_key, out_value)
-
-        if mapper_final:
-            for out_key, out_value in mapper_final() or ():
-                write_line(out_key, out_value)
+        read_lines, write_line, write_lines, flush_output = (
+            self._wrap_protocols(
+                step_num, 'mapper',
+                pass_through=self._can_pass_through(step, step_num, 'mapper')))
+
+        if step['mapper_merge']:
+            write_line, flush_merged = self._merge_mapper_output(
+                step, write_line, write_lines)
+            write_lines = None
+        else:
+            flush_merged = None
+
+        self._buffer_counters()
+        try:
+            if mapper_init:
+                for out_key, out_value in mapper_init() or ():
+                    write_line(out_key, out_value)
+
+            if mapper_batch:
+                # run the mapper on batches of lines
+                batch_size = step['mapper_batch_size']
+                pairs = read_lines()
+                while True:
+                    batch = list(itertools.islice(pairs, batch_size))
+                    if not batch:
+                        break
+                    output = mapper_batch(batch)
+                    # a list is already fully built, so it's safe to
+                    # encode it all at once
+                    if write_lines and isinstance(output, list):
+                        write_lines(output)
+                    else:
+                        for out_key, out_value in output or ():
+                            write_line(out_key, out_value)
+            else:
+                # run the mapper on each line (decoded a block at a time,
+                # so there's no generator to resume for each line)
+                for pairs in read_lines(in_blocks=True):
+                    for key, value in pairs:
+                        for out_key, out_value in mapper(key, value) or ():
+                            write_line(out_key, out_value)
+
+            if mapper_final:
+                flush_output()
+                for out_key, out_value in mapper_final() or ():
+                    write_line(out_key, out_value)
+
+            if flush_merged:
+                flush_merged()
+
+            self._increment_decode_cache_counters(step_num, 'mapper')
+        finally:
+            flush_output()
+            self._stop_buffering_counters()
 
     def run_reducer(self, step_num=0):
         """Run the reducer for the given step.
@@ -577,7 +990,7 @@ class MRJob(MRJobLauncher):
         Called from :py:meth:`run`. You'd probably only want to call this
         directly from automated tests.
         """
-        steps = self.steps()
+        steps = self._steps()
         if not 0 <= step_num < len(steps):
             raise ValueError('Out-of-range step: %d' % step_num)
         step = steps[step_num]
@@ -588,25 +1001,33 @@ class MRJob(MRJobLauncher):
             raise ValueError('No reducer in step %d' % step_num)
 
         # pick input and output protocol
-        read_lines, write_line = self._wrap_protocols(step_num, 'reducer')
-
-        if reducer_init:
-            for out_key, out_value in reducer_init() or ():
-                write_line(out_key, out_value)
-
-        # group all values of the same key together, and pass to the reducer
-        #
-        # be careful to use generators for everything, to allow for
-        # very large groupings of values
-        for key, kv_pairs in itertools.groupby(read_lines(),
-                                               key=lambda(k, v): k):
-            values = (v for k, v in kv_pairs)
-            for out_key, out_value in reducer(key, values) or ():
-                write_line(out_key, out_value)
-
-        if reducer_final:
-            for out_key, out_value in reducer_final() or ():
-                write_line(out_key, out_value)
+        read_lines, write_line, _, flush_output = self._wrap_protocols(
+            step_num, 'reducer',
+            pass_through=self._can_pass_through(step, step_num, 'reducer'))
+
+        self._buffer_counters()
+        try:
+            if reducer_init:
+                for out_key, out_value in reducer_init() or ():
+                    write_line(out_key, out_value)
+
+            # group all values of the same key together, and pass to the
+            # reducer
+            #
+            # values are generators, to allow for very large groupings
+            for key, values in read_lines(group_by_key=True):
+                for out_key, out_value in reducer(key, values) or ():
+                    write_line(out_key, out_value)
+
+            if reducer_final:
+                flush_output()
+                for out_key, out_value in reducer_final() or ():
+                    write_line(out_key, out_value)
+
+            self._increment_decode_cache_counters(step_num, 'reducer')
+        finally:
+            flush_output()
+            self._stop_buffering_counters()
 
     def run_combiner(self, step_num=0):
         """Run the combiner for the given step.
@@ -622,7 +1043,7 @@ class MRJob(MRJobLauncher):
         Called from :py:meth:`run`. You'd probably only want to call this
         directly from automated tests.
         """
-        steps = self.steps()
+        steps = self._steps()
         if not 0 <= step_num < len(steps):
             raise ValueError('Out-of-range step: %d' % step_num)
         step = steps[step_num]
@@ -633,25 +1054,33 @@ class MRJob(MRJobLauncher):
             raise ValueError('No combiner in step %d' % step_num)
 
         # pick input and output protocol
-        read_lines, write_line = self._wrap_protocols(step_num, 'combiner')
-
-        if combiner_init:
-            for out_key, out_value in combiner_init() or ():
-                write_line(out_key, out_value)
-
-        # group all values of the same key together, and pass to the combiner
-        #
-        # be careful to use generators for everything, to allow for
-        # very large groupings of values
-        for key, kv_pairs in itertools.groupby(read_lines(),
-                                               key=lambda(k, v): k):
-            values = (v for k, v in kv_pairs)
-            for out_key, out_value in combiner(key, values) or ():
-                write_line(out_key, out_value)
-
-        if combiner_final:
-            for out_key, out_value in combiner_final() or ():
-                write_line(out_key, out_value)
+        read_lines, write_line, _, flush_output = self._wrap_protocols(
+            step_num, 'combiner',
+            pass_through=self._can_pass_through(step, step_num, 'combiner'))
+
+        self._buffer_counters()
+        try:
+            if combiner_init:
+                for out_key, out_value in combiner_init() or ():
+                    write_line(out_key, out_value)
+
+            # group all values of the same key together, and pass to the
+            # combiner
+            #
+            # values are generators, to allow for very large groupings
+            for key, values in read_lines(group_by_key=True):
+                for out_key, out_value in combiner(key, values) or ():
+                    write_line(out_key, out_value)
+
+            if combiner_final:
+                flush_output()
+                for out_key, out_value in combiner_final() or ():
+                    write_line(out_key, out_value)
+
+            self._increment_decode_cache_counters(step_num, 'combiner')
+        finally:
+            flush_output()
+            self._stop_buffering_counters()
 
     def show_steps(self):
         """Print information about how many steps there are, and whether
@@ -667,10 +1096,105 @@ class MRJob(MRJobLauncher):
         """
         print >> self.stdout, json.dumps(self._steps_desc())
 
+    def _cache(self):
+        """Dictionary for caching things computed from :py:meth:`steps`
+        and our options (step descriptions, protocols, etc.), so that each
+        task only computes them once.
+
+        This is cleared whenever ``self.options`` is replaced (e.g. by
+        :py:meth:`load_options`).
+        """
+        if self.__dict__.get('_cache_options') is not self.options:
+            self._cache_dict = {}
+            self._cache_options = self.options
+        return self._cache_dict
+
+    def _steps(self):
+        """Cached version of :py:meth:`steps`."""
+        cache = self._cache()
+        if 'steps' not in cache:
+            cache['steps'] = self.steps()
+        return cache['steps']
+
     def _steps_desc(self):
+        cache = self._cache()
+        if 'steps_desc' not in cache:
+            cache['steps_desc'] = self._make_steps_desc()
+            # picking protocols uses the step descriptions, so do this last
+            self._add_hadoop_io_to_steps_desc(cache['steps_desc'])
+        return cache['steps_desc']
+
+    def _add_hadoop_io_to_steps_desc(self, steps_desc):
+        """If any of our protocols read or write something other than lines
+        (e.g. :py:class:`~mrjob.protocol.TypedBytesProtocol`), add an
+        ``'io'`` field to the description of each affected step, telling
+        the runner how Hadoop Streaming should frame mapper input and
+        output (``'map_input'``, ``'map_output'``) and reducer input and
+        output (``'reduce_input'``, ``'reduce_output'``).
+
+        Substeps that Hadoop runs as ``cat`` pass data through in
+        whatever format it's already in.
+        """
+        def substep_io(step_num, step_desc, step_type):
+            if step_desc[step_type]['type'] == 'script':
+                read, write = self.pick_protocols(step_num, step_type)
+                return _hadoop_io(read), _hadoop_io(write)
+            else:
+                return 'text', 'text'
+
+        # format of the data going into the current step
+        if self._picks_default_protocols():
+            data_io = _hadoop_io(self.input_protocol().read)
+        else:
+            data_io = 'text'
+
+        for step_num, step_desc in enumerate(steps_desc):
+            if step_desc['type'] != 'streaming':
+                data_io = 'text'
+                continue
+
+            if 'mapper' in step_desc:
+                map_input, map_output = substep_io(
+                    step_num, step_desc, 'mapper')
+            else:
+                map_input = map_output = data_io
+
+            if 'reducer' in step_desc:
+                reduce_input, reduce_output = substep_io(
+                    step_num, step_desc, 'reducer')
+            else:
+                reduce_input = reduce_output = map_output
+
+            io = {
+                'map_input': map_input,
+                'map_output': map_output,
+                'reduce_input': reduce_input,
+                'reduce_output': reduce_output,
+            }
+            if set(io.values()) != set(['text']):
+                step_desc['io'] = io
+
+            data_io = reduce_output
+
+    def _make_steps_desc(self):
+        steps = self._steps()
         step_descs = []
-        for step_num, step in enumerate(self.steps()):
+        for step_num, step in enumerate(steps):
             step_descs.append(step.description(step_num))
+
+        # The first step always gets a mapper, so that input is decoded
+        # with the input protocol. If it would just be re-encoded with the
+        # same protocol, let Hadoop Streaming use cat instead.
+        if (steps and isinstance(steps[0], MRJobStep) and
+            'mapper' in step_descs[0] and
+            not steps[0].has_explicit_mapper and
+            not steps[0].has_explicit_combiner and
+            self._protocols_allow_pass_through()):
+            step_map = self._script_step_mapping(step_descs)
+            if _can_copy_lines(self.input_protocol(),
+                               self._mapper_output_protocol(0, step_map)):
+                del step_descs[0]['mapper']
+
         return step_descs
 
     @classmethod
@@ -686,7 +1210,8 @@ class MRJob(MRJobLauncher):
         Yield one line at time.
 
         - Resolve globs (``foo_*.gz``).
-        - Decompress ``.gz`` and ``.bz2`` files.
+        - Decompress ``.gz``, ``.bz2``, etc. files (see
+          :py:mod:`mrjob.compression`).
         - If path is ``-``, read from STDIN.
         - Recursively read all files in a directory
         """
@@ -695,40 +1220,302 @@ class MRJob(MRJobLauncher):
             for line in read_input(path, stdin=self.stdin):
                 yield line
 
-    def _wrap_protocols(self, step_num, step_type):
+    def _read_input_blocks(self, hadoop_io='text'):
+        """Like :py:meth:`_read_input`, but read input in large chunks,
+        and yield lists of lines, with trailing newlines stripped. See
+        :py:func:`mrjob.util.read_input_blocks`.
+
+        If *hadoop_io* is ``'typedbytes'``, yield lists of typed bytes
+        records instead.
+        """
+        if hadoop_io == 'typedbytes':
+            chunks_to_records = chunks_to_record_lists
+        else:
+            chunks_to_records = None
+
+        paths = self.args or ['-']
+        for path in paths:
+            for lines in read_input_blocks(
+                    path, stdin=self.stdin,
+                    chunks_to_records=chunks_to_records,
+                    decompress_in_background=(
+                        self.options.decompress_in_background)):
+                yield lines
+
+    def _picks_default_protocols(self):
+        """True unless :py:meth:`pick_protocols` has been re-defined."""
+        return self.pick_protocols.im_func is MRJob.pick_protocols.im_func
+
+    def _protocols_allow_pass_through(self):
+        """True if protocols are all unconfigured instances of
+        :py:attr:`INPUT_PROTOCOL` etc. (i.e. none of the methods that pick
+        and make protocols have been re-defined), so that protocols of the
+        same class are interchangeable, and :option:`--strict-protocols`
+        isn't set (copying lines wouldn't catch ones we can't decode)."""
+        if self.options.strict_protocols:
+            return False
+
+        for name in ('pick_protocols', 'input_protocol', 'internal_protocol',
+                     'output_protocol'):
+            if getattr(self, name).im_func is not getattr(MRJob, name).im_func:
+                return False
+
+        return True
+
+    def _can_pass_through(self, step, step_num, step_type):
+        """True if the given substep would just decode each line of input
+        and encode it again with the same protocol, meaning we can copy
+        lines from input to output without decoding them."""
+        if step_type == 'mapper':
+            if (step['mapper'] is not _IDENTITY_MAPPER or
+                step['mapper_batch'] or step['mapper_merge']):
+                return False
+        elif step[step_type] is not _IDENTITY_REDUCER:
+            return False
+
+        if step[step_type + '_init'] or step[step_type + '_final']:
+            return False
+
+        if not self._protocols_allow_pass_through():
+            return False
+
+        p_read, p_write = self._pick_protocol_instances(step_num, step_type)
+        return _can_copy_lines(p_read, p_write)
+
+    def _wrap_protocols(self, step_num, step_type, pass_through=False):
         """Pick the protocol classes to use for reading and writing
         for the given step, and wrap them so that bad input and output
         trigger a counter rather than an exception unless --strict-protocols
         is set.
 
-        Returns a tuple of ``(read_lines, write_line)``
+        Returns a tuple of
+        ``(read_lines, write_line, write_lines, flush_output)``
 
         ``read_lines()`` is a function that reads lines from input, decodes
-            them, and yields key, value pairs.
+            them, and yields key, value pairs. ``read_lines(True)`` instead
+            yields ``(key, values)`` for each run of lines with the same key,
+            where ``values`` is a generator, and
+            ``read_lines(in_blocks=True)`` yields a list of key, value pairs
+            for each block of input.
         ``write_line()`` is a function that takes key and value as args,
-            encodes them, and writes a line to output.
+            encodes them, and buffers a line of output.
+        ``write_lines()`` is a function that takes a list of
+            ``(key, value)`` pairs, and encodes and buffers them all at
+            once (if the protocol has ``write_many()``).
+        ``flush_output()`` is a function that writes out any buffered
+            lines. Call this before the task exits!
 
         :param step_num: which step to run (e.g. 0)
         :param step_type: ``'mapper'``, ``'reducer'``, or ``'combiner'`` from
                           :py:mod:`mrjob.step`
+        :param pass_through: if true, read and write lines as-is, as
+                             ``(None, line)``
         """
-        read, write = self.pick_protocols(step_num, step_type)
+        if pass_through:
+            read, write = RawValueProtocol.read, RawValueProtocol.write
+
+            # we don't have protocols to go by, so copy records in whatever
+            # format Hadoop passes them to us
+            io = self._steps_desc()[step_num].get('io') or {}
+            if step_type == 'reducer':
+                read_io = io.get('reduce_input')
+                write_io = io.get('reduce_output')
+            elif step_type == 'combiner':
+                read_io = write_io = io.get('map_output')
+            else:
+                read_io = io.get('map_input')
+                write_io = io.get('map_output')
+            read_io, write_io = (read_io or 'text'), (write_io or 'text')
+        else:
+            read, write = self.pick_protocols(step_num, step_type)
+            read_io, write_io = _hadoop_io(read), _hadoop_io(write)
+
+        # decode and encode whole blocks of records at once if we can
+        read_many, write_many = _batch_method(read), _batch_method(write)
+
+        # typed bytes records aren't separated by newlines
+        if write_io == 'typedbytes':
+            newline = ''
+        else:
+            newline = '\n'
+
+        # If we're reading two tab-separated fields (e.g. JSONProtocol), we
+        # can group lines by their raw key, and only decode each key once.
+        if (getattr(read, 'im_func', None) is
+            _ClassBasedKeyCachingProtocol.read.im_func):
+            # use the protocol's decode cache, if any
+            load_from_string = read.im_self._decoder()
+        else:
+            load_from_string = None
+
+        buffer_size = self.options.task_output_buffer_size
+        if buffer_size is None:
+            buffer_size = DEFAULT_OUTPUT_BUFFER_SIZE
+
+        # if we're reporting perf counters, time reading and writing a
+        # block (or a flush) at a time. Records that we decode or encode
+        # one at a time are too quick to time individually, so time one in
+        # every _PERF_SAMPLE_RATE of them, and scale up.
+        perf = self._perf_stats
+        if perf is None:
+            writer = BufferedLineWriter(
+                self.stdout, buffer_size, newline=newline)
+            sample = itertools.repeat(False).next
+        else:
+            writer = _PerfLineWriter(
+                perf, self.stdout, buffer_size, newline=newline)
+            sample = itertools.cycle(
+                [False] * (_PERF_SAMPLE_RATE - 1) + [True]).next
+
+        buffer_line = writer.write_line
+        buffer_lines = writer.write_lines
+        flush_output = writer.flush
+
+        if perf is not None:
+            clock = time.time
+
+            def time_reads(f, scale=1):
+                def timed(*args):
+                    start = clock()
+                    result = f(*args)
+                    perf.read_time += (clock() - start) * scale
+                    return result
+                return timed
+
+            def time_writes(f, scale=1):
+                def timed(*args):
+                    start = clock()
+                    result = f(*args)
+                    perf.write_time += (clock() - start) * scale
+                    return result
+                return timed
+
+            if read_many:
+                read_many = time_reads(read_many)
+            if write_many:
+                write_many = time_writes(write_many)
+
+            # only called for sampled records
+            read_sample = time_reads(read, _PERF_SAMPLE_RATE)
+            write_sample = time_writes(write, _PERF_SAMPLE_RATE)
+            if load_from_string:
+                load_sample = time_reads(load_from_string, _PERF_SAMPLE_RATE)
+
+            if read_io == 'typedbytes':
+                input_newline_len = 0
+            else:
+                input_newline_len = 1
+
+        def input_blocks():
+            blocks = self._read_input_blocks(read_io)
+            if perf is None:
+                for lines in blocks:
+                    yield lines
+                return
 
-        def read_lines():
-            for line in self._read_input():
+            while True:
+                start = clock()
                 try:
-                    key, value = read(line.rstrip('\r\n'))
+                    lines = blocks.next()
+                except StopIteration:
+                    return
+                perf.records_in += len(lines)
+                perf.bytes_in += (sum(map(len, lines)) +
+                                  input_newline_len * len(lines))
+                perf.read_time += clock() - start
+                yield lines
+
+        def undecodable(e):
+            if self.options.strict_protocols:
+                raise
+            else:
+                self.increment_counter('Undecodable input',
+                                       e.__class__.__name__)
+
+        def decode_blocks():
+            for lines in input_blocks():
+                if read_many:
+                    try:
+                        pairs = read_many(lines)
+                    except Exception:
+                        # decode one line at a time to find the bad ones
+                        pass
+                    else:
+                        yield pairs
+                        continue
+
+                pairs = []
+                for line in lines:
+                    try:
+                        if sample():
+                            key, value = read_sample(line)
+                        else:
+                            key, value = read(line)
+                        pairs.append((key, value))
+                    except Exception, e:
+                        undecodable(e)
+                yield pairs
+
+        def decode_lines():
+            for pairs in decode_blocks():
+                for key, value in pairs:
                     yield key, value
+
+        def decode_values(key_len, lines):
+            for line in lines:
+                try:
+                    raw_value = line[key_len + 1:]
+                    if len(line) == key_len or '\t' in raw_value:
+                        raise ValueError(
+                            'expected one tab, not %d' % line.count('\t'))
+                    if sample():
+                        yield load_sample(raw_value)
+                    else:
+                        yield load_from_string(raw_value)
                 except Exception, e:
-                    if self.options.strict_protocols:
-                        raise
+                    undecodable(e)
+
+        def decode_key_groups():
+            lines = (line for lines in input_blocks()
+                     for line in lines)
+
+            for raw_key, key_lines in itertools.groupby(
+                    lines, key=lambda line: line.partition('\t')[0]):
+                try:
+                    if sample():
+                        key = load_sample(raw_key)
                     else:
-                        self.increment_counter('Undecodable input',
-                                                e.__class__.__name__)
+                        key = load_from_string(raw_key)
+                except Exception, e:
+                    for line in key_lines:
+                        undecodable(e)
+                    continue
+
+                # values are decoded lazily, but skip the key entirely if
+                # none of them can be decoded
+                values = decode_values(len(raw_key), key_lines)
+                for value in values:
+                    yield key, itertools.chain([value], values)
+                    break
+
+        def read_lines(group_by_key=False, in_blocks=False):
+            if in_blocks:
+                return decode_blocks()
+            elif not group_by_key:
+                return decode_lines()
+            elif load_from_string:
+                return decode_key_groups()
+            else:
+                return ((key, (v for k, v in kv_pairs))
+                        for key, kv_pairs in itertools.groupby(
+                            decode_lines(), key=lambda(k, v): k))
 
         def write_line(key, value):
             try:
-                print >> self.stdout, write(key, value)
+                if sample():
+                    buffer_line(write_sample(key, value))
+                else:
+                    buffer_line(write(key, value))
             except Exception, e:
                 if self.options.strict_protocols:
                     raise
@@ -736,7 +1523,87 @@ class MRJob(MRJobLauncher):
                     self.increment_counter('Unencodable output',
                                             e.__class__.__name__)
 
-        return read_lines, write_line
+        def write_lines(pairs):
+            if write_many:
+                try:
+                    buffer_lines(write_many(pairs))
+                    return
+                except Exception:
+                    # encode one pair at a time to find the bad ones
+                    pass
+
+            for key, value in pairs:
+                write_line(key, value)
+
+        return read_lines, write_line, write_lines, flush_output
+
+    def _merge_mapper_output(self, step, write_line, write_lines):
+        """Wrap *write_line* so that output is held in memory and merged
+        by key with the step's *mapper_merge* function. Held output is
+        written with *write_lines*.
+
+        Returns ``(write_line, flush_merged)``. Call ``flush_merged()`` at
+        the end of the task to write out whatever is still held, and to
+        update counters.
+        """
+        merge = step['mapper_merge']
+        max_entries = step['mapper_merge_max_entries']
+        max_bytes = step['mapper_merge_max_bytes']
+
+        held = {}
+        # bytes held, flushes, hits, misses, unhashable keys
+        stats = [0, 0, 0, 0, 0]
+
+        def flush():
+            write_lines(held.items())
+            held.clear()
+            stats[0] = 0
+            stats[1] += 1
+
+        def merge_line(key, value):
+            try:
+                held_value = held[key]
+            except KeyError:
+                stats[3] += 1
+                held[key] = value
+                if max_bytes:
+                    stats[0] += _getsizeof(key) + _getsizeof(value)
+                if (len(held) >= max_entries or
+                    (max_bytes and stats[0] >= max_bytes)):
+                    flush()
+            except TypeError:
+                # unhashable key
+                stats[4] += 1
+                write_line(key, value)
+            else:
+                stats[2] += 1
+                held[key] = merge(held_value, value)
+
+        def flush_merged():
+            if held:
+                flush()
+
+            group = 'In-mapper combining'
+            self.increment_counter(group, 'Flushes', stats[1])
+            self.increment_counter(group, 'Hits', stats[2])
+            self.increment_counter(group, 'Misses', stats[3])
+            if stats[4]:
+                self.increment_counter(group, 'Unhashable keys', stats[4])
+
+        return merge_line, flush_merged
+
+    def _increment_decode_cache_counters(self, step_num, step_type):
+        """If the protocol we read input with has a decode cache (see
+        :py:attr:`~mrjob.protocol.JSONProtocol.decode_cache_size`), report
+        its hits and misses since we last checked."""
+        read, _ = self.pick_protocols(step_num, step_type)
+        cache = getattr(getattr(read, 'im_self', None), '_decode_cache', None)
+        if cache is None:
+            return
+
+        self.increment_counter('Decode cache', 'Hits', cache.hits)
+        self.increment_counter('Decode cache', 'Misses', cache.misses)
+        cache.hits = cache.misses = 0
 
     def _step_key(self, step_num, step_type):
         return '%d-%s' % (step_num, step_type)
@@ -776,9 +1643,33 @@ class MRJob(MRJobLauncher):
             return RawValueProtocol()
 
     def _pick_protocol_instances(self, step_num, step_type):
-        steps_desc = self._steps_desc()
-
-        step_map = self._script_step_mapping(steps_desc)
+        cache = self._cache()
+        key = ('protocols', step_num, step_type)
+        if key not in cache:
+            protocols = self._make_protocol_instances(step_num, step_type)
+            for protocol in protocols:
+                self._set_json_backend(protocol)
+            cache[key] = protocols
+        return cache[key]
+
+    def _set_json_backend(self, protocol):
+        """Apply :option:`--json-backend` to *protocol* if it's one of our
+        JSON protocols, and make sure its backend is available."""
+        if not isinstance(protocol, _JSONBackendMixin):
+            return
+
+        if self.options.json_backend:
+            protocol.json_backend = self.options.json_backend
+            protocol._json = None
+
+        # fail now, rather than on every line of input
+        protocol._json_backend()
+
+    def _make_protocol_instances(self, step_num, step_type):
+        cache = self._cache()
+        if 'step_map' not in cache:
+            cache['step_map'] = self._script_step_mapping(self._steps_desc())
+        step_map = cache['step_map']
 
         # pick input protocol
 
@@ -874,6 +1765,16 @@ class MRJob(MRJobLauncher):
             '--step-num', dest='step_num', type='int', default=0,
             help='which step to execute (default is 0)')
 
+        self.mux_opt_group.add_option(
+            '--profile-tasks-dir', dest='profile_tasks_dir', default=None,
+            help=('profile the mapper, combiner, or reducer, and write its'
+                  ' stats into this directory (set by the runner when you'
+                  ' use --profile-tasks)'))
+
+        # Tuning how tasks run (these need to be passed through to tasks)
+        self._passthrough_options.extend(
+            add_task_opts(self.mux_opt_group))
+
         # To describe the steps
         self.mux_opt_group.add_option(
             '--steps', dest='show_steps', action='store_true', default=False,
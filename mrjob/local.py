@@ -24,12 +24,15 @@ from subprocess import PIPE
 import sys
 from time import sleep
 
+from mrjob.compression import get_codec
 from mrjob.conf import combine_dicts
 from mrjob.sim import SimMRJobRunner
 from mrjob.sim import SimRunnerOptionStore
 from mrjob.parse import find_python_traceback
 from mrjob.parse import parse_mr_job_stderr
+from mrjob.runner import _step_io
 from mrjob.util import cmd_line
+from mrjob.util import read_file_chunks
 from mrjob.util import shlex_split
 
 
@@ -237,7 +240,10 @@ class LocalMRJobRunner(SimMRJobRunner):
 
     def _mapper_arg_chain(self, step_dict, step_num, input_file):
         # sometimes the mapper isn't actually there, so if it isn't, use cat
+        # (Hadoop decompresses input for us, so we should too)
         if 'mapper' not in step_dict:
+            if get_codec(input_file):
+                input_file = self._decompress_input_file(input_file)
             new_step_dict = {
                 'mapper': {
                     'type': 'command',
@@ -251,12 +257,38 @@ class LocalMRJobRunner(SimMRJobRunner):
             'mapper', step_dict, step_num, input_file)
 
         if 'combiner' in step_dict:
-            procs_args.append(['sort'])
+            if _step_io(step_dict)['map_output'] == 'typedbytes':
+                # sort can't handle binary records; see mrjob.typedbytes
+                procs_args.append(
+                    self._opts['python_bin'] + ['-m', 'mrjob.typedbytes'])
+            else:
+                procs_args.append(['sort'])
             # _substep_args may return more than one process
             procs_args.extend(self._combiner_arg_chain(step_dict, step_num))
 
         return procs_args
 
+    def _decompress_input_file(self, path):
+        """Decompress *path* into our tmp dir with the codec registered for
+        its extension (see :py:mod:`mrjob.compression`), and return the
+        path of the decompressed copy. We do this in our own process so
+        that codecs registered by the job's launcher work too."""
+        decompressed_dir = os.path.join(
+            self._get_local_tmp_dir(), 'decompressed_input')
+        if not os.path.isdir(decompressed_dir):
+            os.makedirs(decompressed_dir)
+
+        # input files from different directories may have the same name
+        decompressed_path = os.path.join(
+            decompressed_dir, 'input-%05d' % len(os.listdir(decompressed_dir)))
+
+        log.info('Decompressing %s -> %s' % (path, decompressed_path))
+        with open(decompressed_path, 'wb') as f:
+            for chunk in read_file_chunks(path):
+                f.write(chunk)
+
+        return decompressed_path
+
     def _combiner_arg_chain(self, step_dict, step_num):
         # simpler than mapper or reducer arg logic because it never takes an
         # input file, always reads from stdin
@@ -45,6 +45,42 @@ def add_protocol_opts(opt_group):
             '--strict-protocols', dest='strict_protocols', default=None,
             action='store_true', help='If something violates an input/output '
             'protocol then raise an exception'),
+
+        opt_group.add_option(
+            '--json-backend', dest='json_backend', default=None,
+            help=('How JSONProtocol and JSONValueProtocol encode and decode'
+                  ' JSON: default, compact, json, simplejson, ujson, or auto'
+                  ' (the fastest one installed). Overrides the'
+                  " protocols' json_backend attribute.")),
+    ]
+
+
+def add_task_opts(opt_group):
+    """Add options that tune how mappers, combiners, and reducers run.
+    """
+    return [
+        opt_group.add_option(
+            '--task-output-buffer-size', dest='task_output_buffer_size',
+            default=None, type='int',
+            help=('Number of bytes of output each mapper, combiner, and'
+                  ' reducer buffers in memory before writing it out'
+                  ' (default: 1048576). Use 0 to write every line as soon as'
+                  ' it is produced.')),
+
+        opt_group.add_option(
+            '--decompress-in-background', dest='decompress_in_background',
+            default=False, action='store_true',
+            help=('Decompress .gz and .bz2 input while the mapper runs,'
+                  ' using pigz, gzip, pbzip2, lbzip2, or bzip2 (whichever is'
+                  ' found first) in a separate process, or a separate thread'
+                  ' if none of them are installed')),
+
+        opt_group.add_option(
+            '--task-perf-counters', dest='task_perf_counters',
+            default=False, action='store_true',
+            help=('Report time spent reading, running user code, and'
+                  ' writing, and records and bytes in and out, in the'
+                  ' mrjob.perf counter group')),
     ]
 
 
@@ -136,6 +172,13 @@ def add_runner_opts(opt_group, default_runner='local'):
             'for EMR, an HDFS path for Hadoop, and a system path for local,' +
             'and must be empty'),
 
+        opt_group.add_option(
+            '--profile-tasks', dest='profile_tasks', default=None,
+            action='store_true',
+            help=('Run each mapper, combiner, and reducer under cProfile, and'
+                  ' put a merged pstats file for each step and substep in'
+                  ' _profiles/ in the output directory')),
+
         opt_group.add_option(
             '--python-archive', dest='python_archives', default=[],
             action='append',
@@ -19,8 +19,14 @@ information, see :ref:`job-protocols` and :ref:`writing-protocols`.
 # don't add imports here that aren't part of the standard Python library,
 # since MRJobs need to run in Amazon's generic EMR environment
 import cPickle
+import inspect
+from itertools import repeat
+from operator import itemgetter
+import types
 
-from mrjob.util import safeeval
+from mrjob import sparse
+from mrjob import typedbytes
+from mrjob.util import parse_repr
 
 try:
     import simplejson as json  # preferred because of C speedups
@@ -29,29 +35,327 @@ except ImportError:
     import json  # built in to Python 2.6 and later
 
 
+class JSONBackend(object):
+    """A way of encoding and decoding JSON, for use by
+    :py:class:`JSONProtocol` and :py:class:`JSONValueProtocol`.
+
+    :type name: str
+    :param name: name of the backend
+    :param loads: function that decodes a JSON string
+    :param dumps: function that encodes an object as a JSON string
+    """
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.name)
+
+
+def _default_json_backend():
+    return JSONBackend('default', json.loads, json.dumps)
+
+
+def _json_module_backend(module_name):
+    def make_backend():
+        module = __import__(module_name)
+        return JSONBackend(module_name, module.loads, module.dumps)
+    return make_backend
+
+
+def _compact_json_backend():
+    # a pre-built encoder that doesn't put spaces after separators or
+    # check for circular references
+    encoder = json.JSONEncoder(separators=(',', ':'), check_circular=False)
+    return JSONBackend('compact', json.loads, encoder.encode)
+
+
+# map from backend name to a function that builds the backend, raising
+# ImportError if what it needs isn't installed
+_JSON_BACKEND_FACTORIES = {
+    'default': _default_json_backend,
+    'compact': _compact_json_backend,
+    'json': _json_module_backend('json'),
+    'simplejson': _json_module_backend('simplejson'),
+    'ujson': _json_module_backend('ujson'),
+}
+
+#: Backends that ``'auto'`` tries, fastest first
+JSON_BACKEND_PREFERENCE = ['ujson', 'compact', 'default']
+
+# backends we've already built, by name
+_json_backends = {}
+
+
+def register_json_backend(name, factory):
+    """Make a JSON backend available to :py:func:`get_json_backend`
+    (and :option:`--json-backend`) by name.
+
+    :param factory: function that takes no arguments and returns a
+                    :py:class:`JSONBackend`. It should raise
+                    :py:exc:`ImportError` if the backend isn't installed.
+    """
+    _JSON_BACKEND_FACTORIES[name] = factory
+    _json_backends.pop(name, None)
+
+
+def get_json_backend(name=None):
+    """Get a :py:class:`JSONBackend` by name.
+
+    The built-in backends are:
+
+    * ``'default'``: :py:mod:`simplejson` if it's installed, otherwise
+      :py:mod:`json`, with default arguments. This is what you get if
+      *name* is ``None``.
+    * ``'compact'``: the same module, but with a pre-built encoder that
+      doesn't put spaces after separators or check for circular references
+    * ``'json'``, ``'simplejson'``, ``'ujson'``: that module's ``loads()``
+      and ``dumps()``
+    * ``'auto'``: the first backend in :py:data:`JSON_BACKEND_PREFERENCE`
+      that's installed
+
+    Raise :py:exc:`ValueError` if there is no such backend, or
+    :py:exc:`ImportError` if it isn't installed.
+    """
+    if name is None:
+        name = 'default'
+
+    if name == 'auto':
+        for preferred_name in JSON_BACKEND_PREFERENCE:
+            try:
+                return get_json_backend(preferred_name)
+            except ImportError:
+                pass
+        raise ImportError('none of %s are installed' %
+                          ', '.join(JSON_BACKEND_PREFERENCE))
+
+    if name not in _json_backends:
+        if name not in _JSON_BACKEND_FACTORIES:
+            raise ValueError('unknown JSON backend: %r' % (name,))
+        _json_backends[name] = _JSON_BACKEND_FACTORIES[name]()
+
+    return _json_backends[name]
+
+
 # DEPRECATED: Abstract base class for all protocols. Now just an alias for
 # ``object``.
 HadoopStreamingProtocol = object
 
 
-class _ClassBasedKeyCachingProtocol(object):
-    """Protocol that caches the last decoded key and uses class methods
-    instead of instance methods. Do not inherit from this.
+class BaseProtocol(object):
+    """Optional base class for protocols. Subclasses define ``read()`` and
+    ``write()``, and get ``read_many()`` and ``write_many()``, which mrjob
+    uses to decode and encode whole batches of records at once.
+
+    The defaults just call ``read()`` or ``write()`` once per record;
+    override them if your protocol can handle a batch faster. If a
+    subclass overrides ``read()`` or ``write()`` but not the matching batch
+    method, mrjob won't use the batch method, so the override still counts.
     """
 
-    _last_key_encoded = None
-    _last_key_decoded = None
+    def read_many(self, lines):
+        """Decode a list of lines.
+
+        :type lines: list of str
+        :param lines: Lines of raw input, without trailing newlines.
+
+        :return: A list of ``(key, value)`` tuples. If any line can't be
+                 decoded, raise an exception (mrjob will then fall back to
+                 calling ``read()`` on each line)."""
+        return map(self.read, lines)
+
+    def write_many(self, pairs):
+        """Encode a list of keys and values.
+
+        :type pairs: list of tuples
+        :param pairs: ``(key, value)`` tuples yielded by a mapper/reducer
+
+        :return: A list of lines, without trailing newlines. If any pair
+                 can't be encoded, raise an exception (mrjob will then fall
+                 back to calling ``write()`` on each pair)."""
+        return [self.write(key, value) for key, value in pairs]
+
+
+def _overridden(protocol, name, batch_name):
+    """Return true if *protocol* (a class or an instance) re-defines the
+    method *name* (e.g. ``load_from_string``) in a subclass of the class
+    that defines *batch_name* (e.g. ``load_many``).
+
+    Specialized batch methods don't call the per-item method, so when this
+    is true, they should fall back to calling it once per item; otherwise
+    the override would be silently ignored."""
+    if not isinstance(protocol, (type, types.ClassType)):
+        protocol = protocol.__class__
+
+    for cls in inspect.getmro(protocol):
+        if batch_name in cls.__dict__:
+            return False
+        if name in cls.__dict__:
+            return True
+    return False
+
+
+class _hybridmethod(object):
+    """Like :py:func:`classmethod`, except that when the method is called
+    on an instance, it's bound to the instance rather than its class.
+
+    This lets protocols keep their caches on the instance while still
+    supporting calls like ``JSONProtocol.read(line)``."""
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            obj = cls
+        return types.MethodType(self.func, obj, cls)
+
+
+class _DecodeCache(object):
+    """Decode strings with *load*, remembering the results for up to
+    *max_size* of the most recently used strings, and counting hits and
+    misses."""
+
+    def __init__(self, load, max_size):
+        self.hits = 0
+        self.misses = 0
+
+        self._load = load
+        self._max_size = max_size
+        self._links = {}
+        # circular doubly linked list of [prev, next, data, decoded], from
+        # least to most recently used
+        self._root = root = []
+        root[:] = [root, root, None, None]
+
+    def decode(self, data):
+        root = self._root
+        link = self._links.get(data)
+
+        if link is not None:
+            self.hits += 1
+            # move link to the most recently used end of the list
+            prev, next = link[0], link[1]
+            prev[1] = next
+            next[0] = prev
+            last = root[0]
+            last[1] = root[0] = link
+            link[0] = last
+            link[1] = root
+            return link[3]
+
+        self.misses += 1
+        decoded = self._load(data)
+
+        if len(self._links) >= self._max_size:
+            oldest = root[1]
+            root[1] = oldest[1]
+            oldest[1][0] = root
+            del self._links[oldest[2]]
+
+        last = root[0]
+        last[1] = root[0] = self._links[data] = [last, root, data, decoded]
+        return decoded
+
+
+class _DecodeCachingProtocol(BaseProtocol):
+    """Protocol that decodes each key and/or value with
+    :py:meth:`load_from_string`, optionally through a cache that belongs
+    to the protocol instance. Do not inherit from this.
+    """
+
+    #: If more than zero, keep up to this many decoded keys and values in
+    #: memory, and re-use them when the same string comes up again,
+    #: discarding the least recently used ones. You can also pass
+    #: *decode_cache_size* to the constructor.
+    #:
+    #: This helps when keys or values come from a small set of distinct
+    #: strings (e.g. country codes). Decoded objects are shared between
+    #: records, so don't turn this on if you modify them.
+    decode_cache_size = 0
+
+    # set up by _decoder() the first time an instance decodes something
+    _decode = None
+    _decode_cache = None
+
+    def __init__(self, decode_cache_size=None):
+        if decode_cache_size is not None:
+            self.decode_cache_size = decode_cache_size
 
     @classmethod
     def load_from_string(self, value):
         raise NotImplementedError
 
+    @classmethod
+    def load_many(cls, values):
+        """Decode a sequence of keys or values. Re-define this if you can
+        do better than calling :py:meth:`load_from_string` on each one."""
+        return map(cls.load_from_string, values)
+
+    @_hybridmethod
+    def _decoder(self):
+        """Return a function that decodes a single key or value, using
+        the decode cache if there is one."""
+        if isinstance(self, type):
+            # no caching for calls on the class
+            return self.load_from_string
+
+        if self._decode is None:
+            load = self._load_function()
+            if self.decode_cache_size > 0:
+                self._decode_cache = _DecodeCache(load, self.decode_cache_size)
+                self._decode = self._decode_cache.decode
+            else:
+                self._decode = load
+
+        return self._decode
+
+    def _load_function(self):
+        """The function :py:meth:`_decoder` uses to decode a key or value.
+        Defaults to :py:meth:`load_from_string`."""
+        return self.load_from_string
+
+    @_hybridmethod
+    def _decode_many(self, values):
+        """Decode a sequence of keys or values, using the decode cache if
+        there is one."""
+        decode = self._decode or self._decoder()
+        if self._decode_cache is None:
+            return self.load_many(values)
+        else:
+            return map(decode, values)
+
+
+class _ClassBasedKeyCachingProtocol(_DecodeCachingProtocol):
+    """Protocol that encodes ``(key, value)`` as two strings separated by
+    a tab, and caches the last decoded key. Encoding uses class methods.
+    Do not inherit from this.
+    """
+
+    _last_key_encoded = None
+    _last_key_decoded = None
+
+    def __init__(self, decode_cache_size=None):
+        super(_ClassBasedKeyCachingProtocol, self).__init__(
+            decode_cache_size=decode_cache_size)
+        # don't pick up the last key from calls to read() on the class
+        self._last_key_encoded = None
+        self._last_key_decoded = None
+
     @classmethod
     def dump_to_string(self, value):
         raise NotImplementedError
 
     @classmethod
-    def read(cls, line):
+    def dump_many(cls, values):
+        """Encode a sequence of keys or values. Re-define this if you can
+        do better than calling :py:meth:`dump_to_string` on each one."""
+        return map(cls.dump_to_string, values)
+
+    @_hybridmethod
+    def read(self, line):
         """Decode a line of input.
 
         :type line: str
@@ -60,14 +364,20 @@ class _ClassBasedKeyCachingProtocol(object):
         :return: A tuple of ``(key, value)``."""
 
         raw_key, raw_value = line.split('\t')
+        decode = self._decode or self._decoder()
 
-        if raw_key != cls._last_key_encoded:
-            cls._last_key_encoded = raw_key
-            cls._last_key_decoded = cls.load_from_string(raw_key)
-        return (cls._last_key_decoded, cls.load_from_string(raw_value))
+        if isinstance(self, type):
+            # no caching for calls on the class (subclasses would see
+            # their parent's cached key)
+            return (decode(raw_key), decode(raw_value))
 
-    @classmethod
-    def write(cls, key, value):
+        if raw_key != self._last_key_encoded:
+            self._last_key_decoded = decode(raw_key)
+            self._last_key_encoded = raw_key
+        return (self._last_key_decoded, decode(raw_value))
+
+    @_hybridmethod
+    def write(self, key, value):
         """Encode a key and value.
 
         :param key: A key (of any type) yielded by a mapper/reducer
@@ -75,36 +385,178 @@ class _ClassBasedKeyCachingProtocol(object):
 
         :rtype: str
         :return: A line, without trailing newline."""
-        return '%s\t%s' % (cls.dump_to_string(key),
-                           cls.dump_to_string(value))
+        return '%s\t%s' % (self.dump_to_string(key),
+                           self.dump_to_string(value))
+
+    @_hybridmethod
+    def read_many(self, lines):
+        """Decode a list of lines, returning a list of ``(key, value)``
+        tuples. Raise an exception if any line can't be decoded."""
+        if not lines:
+            return []
+
+        fields = [line.split('\t') for line in lines]
+        # same check as unpacking the fields in read()
+        if set(map(len, fields)) != set([2]):
+            raise ValueError('expected exactly one tab in every line')
+
+        raw_keys, raw_values = zip(*fields)
+        return zip(self._decode_many(raw_keys), self._decode_many(raw_values))
+
+    @_hybridmethod
+    def write_many(self, pairs):
+        """Encode a list of ``(key, value)`` tuples, returning a list of
+        lines. Raise an exception if any pair can't be encoded."""
+        if not pairs:
+            return []
+
+        keys, values = zip(*pairs)
+        return map('\t'.join,
+                   zip(self.dump_many(keys), self.dump_many(values)))
+
+
+# goes before each JSON that _json_loads_many() decodes
+_JSON_MARKER = '"\\u0001"'
+
+
+def _json_loads_many(loads, values):
+    """Decode a sequence of JSONs with a single call to *loads*, which is
+    much faster than decoding them one by one.
+
+    Just checking that we get the right number of results isn't enough;
+    bad JSONs can make up for each other (e.g. ``'[1'``, ``'2]'``, and
+    ``'3,4'``). Instead, we put a marker before each JSON, and check that
+    every other thing we decode is a marker. JSON strings can't contain raw
+    newlines, so a JSON can't swallow the markers after it, and if it
+    leaves a list or object open, or has a stray comma, the markers end up
+    in the wrong place. If any JSON contains the marker itself, we decode
+    them one by one."""
+    if not values:
+        return []
+
+    s = '[%s,%s]' % (_JSON_MARKER, (',\n%s,' % _JSON_MARKER).join(values))
+    if s.count('\\u0001') != len(values) or '\x01' in s:
+        return map(loads, values)
+
+    decoded = loads(s)
+    if (len(decoded) != 2 * len(values) or
+        decoded[::2].count(u'\x01') != len(values)):
+        raise ValueError("JSONs weren't separate")
+    return decoded[1::2]
+
+
+class _JSONBackendMixin(object):
+    """Let JSON protocols choose their :py:class:`JSONBackend`. Do not
+    inherit from this."""
+
+    #: Name of the :py:class:`JSONBackend` to use (see
+    #: :py:func:`get_json_backend`). ``None`` means ``'default'``. You can
+    #: also pass *json_backend* to the constructor, and
+    #: :option:`--json-backend` overrides both.
+    json_backend = None
+
+    # set by _json_backend() the first time an instance needs it
+    _json = None
 
+    def __init__(self, decode_cache_size=None, json_backend=None):
+        super(_JSONBackendMixin, self).__init__(
+            decode_cache_size=decode_cache_size)
+        if json_backend is not None:
+            self.json_backend = json_backend
 
-class JSONProtocol(_ClassBasedKeyCachingProtocol):
+    @_hybridmethod
+    def _json_backend(self):
+        """Return our :py:class:`JSONBackend`."""
+        if isinstance(self, type):
+            return get_json_backend(self.json_backend)
+
+        if self._json is None:
+            self._json = get_json_backend(self.json_backend)
+        return self._json
+
+    # The methods below call the backend directly rather than going
+    # through load_from_string() or dump_to_string(), unless a subclass
+    # overrides those, in which case we respect the override.
+
+    def _load_function(self):
+        if _overridden(self, 'load_from_string', '_load_function'):
+            return self.load_from_string
+        return self._json_backend().loads
+
+    @_hybridmethod
+    def load_from_string(self, value):
+        return (self._json or self._json_backend()).loads(value)
+
+    @_hybridmethod
+    def load_many(self, values):
+        if _overridden(self, 'load_from_string', 'load_many'):
+            return map(self.load_from_string, values)
+        return _json_loads_many(
+            (self._json or self._json_backend()).loads, values)
+
+
+class JSONProtocol(_JSONBackendMixin, _ClassBasedKeyCachingProtocol):
     """Encode ``(key, value)`` as two JSONs separated by a tab.
 
     Note that JSON has some limitations; dictionary keys must be strings,
-    and there's no distinction between lists and tuples."""
+    and there's no distinction between lists and tuples.
 
-    @classmethod
-    def load_from_string(cls, value):
-        return json.loads(value)
+    To encode and decode with something other than :py:mod:`simplejson`
+    (or :py:mod:`json`), see :py:attr:`json_backend`."""
+    _PASS_THROUGH_SAFE = True
 
-    @classmethod
-    def dump_to_string(cls, value):
-        return json.dumps(value)
+    @_hybridmethod
+    def dump_to_string(self, value):
+        return (self._json or self._json_backend()).dumps(value)
+
+    # set by _dumper() the first time an instance encodes something
+    _dumps = None
+
+    @_hybridmethod
+    def _dumper(self):
+        """Return the function that :py:meth:`write` and
+        :py:meth:`dump_many` use to encode a key or value."""
+        if _overridden(self, 'dump_to_string', '_dumper'):
+            dumps = self.dump_to_string
+        else:
+            dumps = self._json_backend().dumps
 
+        if not isinstance(self, type):
+            self._dumps = dumps
+        return dumps
 
-class JSONValueProtocol(object):
+    @_hybridmethod
+    def dump_many(self, values):
+        return map(self._dumps or self._dumper(), values)
+
+    @_hybridmethod
+    def write(self, key, value):
+        dumps = self._dumps or self._dumper()
+        return '%s\t%s' % (dumps(key), dumps(value))
+
+
+class JSONValueProtocol(_JSONBackendMixin, _DecodeCachingProtocol):
     """Encode ``value`` as a JSON and discard ``key``
     (``key`` is read in as ``None``).
     """
-    @classmethod
-    def read(cls, line):
-        return (None, json.loads(line))
+    _PASS_THROUGH_SAFE = True
 
-    @classmethod
-    def write(cls, key, value):
-        return json.dumps(value)
+    @_hybridmethod
+    def read(self, line):
+        return (None, (self._decode or self._decoder())(line))
+
+    @_hybridmethod
+    def write(self, key, value):
+        return (self._json or self._json_backend()).dumps(value)
+
+    @_hybridmethod
+    def read_many(self, lines):
+        return zip(repeat(None), self._decode_many(lines))
+
+    @_hybridmethod
+    def write_many(self, pairs):
+        return map((self._json or self._json_backend()).dumps,
+                   [value for _, value in pairs])
 
 
 class PickleProtocol(_ClassBasedKeyCachingProtocol):
@@ -117,6 +569,7 @@ class PickleProtocol(_ClassBasedKeyCachingProtocol):
 
     Ugly, but should work for any type.
     """
+    _PASS_THROUGH_SAFE = True
 
     @classmethod
     def load_from_string(cls, value):
@@ -126,22 +579,188 @@ class PickleProtocol(_ClassBasedKeyCachingProtocol):
     def dump_to_string(cls, value):
         return cPickle.dumps(value).encode('string_escape')
 
+    @classmethod
+    def load_many(cls, values):
+        if _overridden(cls, 'load_from_string', 'load_many'):
+            return map(cls.load_from_string, values)
+        return map(cPickle.loads,
+                   [value.decode('string_escape') for value in values])
+
+    @classmethod
+    def dump_many(cls, values):
+        if _overridden(cls, 'dump_to_string', 'dump_many'):
+            return map(cls.dump_to_string, values)
+        return [data.encode('string_escape')
+                for data in map(cPickle.dumps, values)]
+
 
-class PickleValueProtocol(object):
+class PickleValueProtocol(_DecodeCachingProtocol):
     """Encode ``value`` as a string-escaped pickle and discard ``key``
     (``key`` is read in as ``None``).
     """
+    _PASS_THROUGH_SAFE = True
+
+    load_from_string = PickleProtocol.load_from_string
+    # bind to our class, not PickleProtocol, so that load_many() notices
+    # if a subclass overrides load_from_string()
+    load_many = classmethod(PickleProtocol.load_many.im_func)
+
+    @_hybridmethod
+    def read(self, line):
+        return (None, (self._decode or self._decoder())(line))
+
+    @classmethod
+    def write(cls, key, value):
+        return cPickle.dumps(value).encode('string_escape')
+
+    @_hybridmethod
+    def read_many(self, lines):
+        return zip(repeat(None), self._decode_many(lines))
+
+    @classmethod
+    def write_many(cls, pairs):
+        return PickleProtocol.dump_many([value for _, value in pairs])
+
+
+# Escape byte for binary protocols. Binary data can contain any byte,
+# so we replace the ones that Hadoop Streaming would split records on with
+# two-byte sequences starting with this byte (and escape it, too)
+_BINARY_ESCAPE = '\x1b'
+
+
+def _frame_binary(data):
+    """Escape tabs, newlines, and carriage returns in *data*, so that it
+    can be passed through Hadoop Streaming as part of a line."""
+    return (data.replace(_BINARY_ESCAPE, '\x1b0')
+                .replace('\t', '\x1b1')
+                .replace('\n', '\x1b2')
+                .replace('\r', '\x1b3'))
+
+
+def _unframe_binary(data):
+    """Undo :py:func:`_frame_binary`."""
+    # every escape byte starts a two-byte sequence, so this is unambiguous
+    # as long as we un-escape the escape byte itself last
+    if _BINARY_ESCAPE not in data:
+        return data
+    return (data.replace('\x1b3', '\r')
+                .replace('\x1b2', '\n')
+                .replace('\x1b1', '\t')
+                .replace('\x1b0', _BINARY_ESCAPE))
+
+
+class BinaryPickleProtocol(_ClassBasedKeyCachingProtocol):
+    """Encode ``(key, value)`` as two binary pickles (using the highest
+    pickle protocol) separated by a tab.
+
+    Tabs, newlines, and carriage returns inside the pickles are replaced
+    with two-byte escape sequences. This is much cheaper than
+    :py:class:`PickleProtocol`'s string escaping, and binary pickles are
+    typically a fraction of the size of text pickles, so this is a good
+    choice for :py:attr:`~mrjob.job.MRJob.INTERNAL_PROTOCOL`.
+
+    The encoded data is not human-readable, and may contain any byte
+    other than ``\\t``, ``\\n``, and ``\\r``.
+    """
+    _PASS_THROUGH_SAFE = True
+
+    @classmethod
+    def load_from_string(cls, value):
+        return cPickle.loads(_unframe_binary(value))
+
+    @classmethod
+    def dump_to_string(cls, value):
+        return _frame_binary(
+            cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL))
+
+
+class BinaryPickleValueProtocol(_DecodeCachingProtocol):
+    """Encode ``value`` as an escaped binary pickle (see
+    :py:class:`BinaryPickleProtocol`) and discard ``key`` (``key`` is read
+    in as ``None``).
+    """
+    _PASS_THROUGH_SAFE = True
+
+    load_from_string = BinaryPickleProtocol.load_from_string
+
+    @_hybridmethod
+    def read(self, line):
+        return (None, (self._decode or self._decoder())(line))
+
+    @classmethod
+    def write(cls, key, value):
+        return _frame_binary(
+            cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL))
+
+    @_hybridmethod
+    def read_many(self, lines):
+        return zip(repeat(None), self._decode_many(lines))
+
+    @classmethod
+    def write_many(cls, pairs):
+        return BinaryPickleProtocol.dump_many([value for _, value in pairs])
+
+
+class SparseVectorProtocol(BaseProtocol):
+    """Encode ``key`` as a JSON and ``value`` (a
+    :py:class:`~mrjob.sparse.SparseVector`) as the raw bytes of its index
+    and value arrays (see :py:func:`mrjob.sparse.dumps`), separated by a
+    tab.
+
+    This is much smaller and faster than passing feature vectors as JSON
+    dicts or lists, and decoded values support dot products and scaled
+    addition (see :py:class:`~mrjob.sparse.SparseVector`) without
+    building a dictionary. Tabs, newlines, and carriage returns in the
+    encoded vector are escaped as in :py:class:`BinaryPickleProtocol`.
+    """
+
     @classmethod
     def read(cls, line):
-        return (None, cPickle.loads(line.decode('string_escape')))
+        raw_key, raw_value = line.split('\t')
+        return (json.loads(raw_key),
+                sparse.loads(_unframe_binary(raw_value)))
 
     @classmethod
     def write(cls, key, value):
-        return cPickle.dumps(value).encode('string_escape')
+        return '%s\t%s' % (json.dumps(key),
+                           _frame_binary(sparse.dumps(value)))
+
+    @classmethod
+    def read_many(cls, lines):
+        return map(cls.read, lines)
+
+    @classmethod
+    def write_many(cls, pairs):
+        return [cls.write(key, value) for key, value in pairs]
+
+
+class SparseVectorValueProtocol(BaseProtocol):
+    """Encode ``value`` (a :py:class:`~mrjob.sparse.SparseVector`) as in
+    :py:class:`SparseVectorProtocol` and discard ``key`` (``key`` is read
+    in as ``None``).
+    """
+
+    @classmethod
+    def read(cls, line):
+        return (None, sparse.loads(_unframe_binary(line)))
+
+    @classmethod
+    def write(cls, key, value):
+        return _frame_binary(sparse.dumps(value))
+
+    @classmethod
+    def read_many(cls, lines):
+        loads = sparse.loads
+        return [(None, loads(_unframe_binary(line))) for line in lines]
+
+    @classmethod
+    def write_many(cls, pairs):
+        dumps = sparse.dumps
+        return [_frame_binary(dumps(value)) for _, value in pairs]
 
 
 # This was added in 0.3, so no @classmethod for backwards compatibility
-class RawProtocol(object):
+class RawProtocol(BaseProtocol):
     """Encode ``(key, value)`` as ``key`` and ``value`` separated by
     a tab (``key`` and ``value`` should be bytestrings).
 
@@ -153,6 +772,8 @@ class RawProtocol(object):
     Your key should probably not be ``None`` or have tab characters in it, but
     we don't check.
     """
+    _PASS_THROUGH_SAFE = True
+
     def read(cls, line):
         key_value = line.split('\t', 1)
         if len(key_value) == 1:
@@ -163,13 +784,27 @@ class RawProtocol(object):
     def write(cls, key, value):
         return '\t'.join(x for x in (key, value) if x is not None)
 
+    def read_many(cls, lines):
+        return [(key, value if tab else None)
+                for key, tab, value in
+                [line.partition('\t') for line in lines]]
+
+    def write_many(cls, pairs):
+        try:
+            return map('\t'.join, pairs)
+        except TypeError:
+            # key or value is None
+            return [cls.write(key, value) for key, value in pairs]
 
-class RawValueProtocol(object):
+
+class RawValueProtocol(BaseProtocol):
     """Read in a line as ``(None, line)``. Write out ``(key, value)``
     as ``value``. ``value`` must be a ``str``.
 
     The default way for a job to read its initial input.
     """
+    _PASS_THROUGH_SAFE = True
+
     @classmethod
     def read(cls, line):
         return (None, line)
@@ -178,32 +813,397 @@ class RawValueProtocol(object):
     def write(cls, key, value):
         return value
 
+    @classmethod
+    def read_many(cls, lines):
+        return zip(repeat(None), lines)
+
+    @classmethod
+    def write_many(cls, pairs):
+        return [value for _, value in pairs]
+
+
+def _make_record_class(name, field_names):
+    """Make a lightweight, immutable record class: a :py:class:`tuple`
+    whose items can also be read as attributes (like
+    :py:func:`collections.namedtuple`, which isn't in Python 2.5)."""
+    def __new__(cls, *values):
+        if len(values) != len(field_names):
+            raise TypeError('%s takes %d values (%d given)' %
+                            (name, len(field_names), len(values)))
+        return tuple.__new__(cls, values)
+
+    def __repr__(self):
+        return '%s(%s)' % (name, ', '.join(
+            '%s=%r' % (field_name, value)
+            for field_name, value in zip(field_names, self)))
+
+    attrs = {
+        '__slots__': (),
+        '__new__': __new__,
+        '__repr__': __repr__,
+        '_fields': tuple(field_names),
+    }
+    for i, field_name in enumerate(field_names):
+        attrs[field_name] = property(itemgetter(i))
+
+    return type(name, (tuple,), attrs)
+
+
+def _dump_field(value):
+    """Convert a field to a string for :py:class:`DelimitedValueProtocol`.
+    Floats get :py:func:`repr` so they don't lose precision."""
+    if isinstance(value, str):
+        return value
+    elif isinstance(value, float):
+        return repr(value)
+    elif isinstance(value, unicode):
+        return value.encode('utf_8')
+    else:
+        return str(value)
+
+
+class DelimitedValueProtocol(BaseProtocol):
+    """Read a line of delimited fields (tab-separated by default) as
+    ``(None, record)``, and write ``(key, value)`` as the fields of
+    ``value`` joined by the delimiter.
+
+    Declare the fields in :py:attr:`fields`, and each record will be a
+    tuple whose items can also be read as attributes (``record.user``),
+    already converted to the right type::
+
+        class LogLineProtocol(DelimitedValueProtocol):
+
+            fields = ['time', 'user', ('status', int), ('bytes', int),
+                      'url', 'referrer', 'user_agent']
+
+            # the only fields the job uses
+            columns = ['user', 'bytes']
+
+    Only the fields in :py:attr:`columns` are converted and included in the
+    record (in that order), and the line is only split as far as the last
+    of them. Without :py:attr:`columns`, you get every field.
+
+    You can also pass *fields*, *columns*, and *delimiter* to the
+    constructor.
+
+    Fields can't be quoted or escaped, so they shouldn't contain the
+    delimiter or newlines (we don't check). Use :py:mod:`csv` inside your
+    job for that.
+    """
+    #: Field names, in order. Each one is either a name or a tuple of
+    #: ``(name, type)``, where *type* is a function that converts a string
+    #: (e.g. :py:class:`int`, :py:class:`float`). Fields with no type are
+    #: left as strings. If this is ``None``, records are plain tuples of
+    #: every field, as strings.
+    fields = None
+
+    #: Names of the fields to include in each record, or ``None`` for all
+    #: of them.
+    columns = None
+
+    #: String that separates fields.
+    delimiter = '\t'
+
+    def __init__(self, fields=None, columns=None, delimiter=None):
+        if fields is not None:
+            self.fields = fields
+        if columns is not None:
+            self.columns = columns
+        if delimiter is not None:
+            self.delimiter = delimiter
+
+        if self.fields is None:
+            if self.columns is not None:
+                raise ValueError("can't pick columns without fields")
+            self.record_class = tuple
+            self._parse = self._split
+            return
+
+        field_names = []
+        field_types = {}
+        for field in self.fields:
+            if isinstance(field, basestring):
+                field_names.append(field)
+            else:
+                field_name, field_type = field
+                field_names.append(field_name)
+                if field_type is not str:
+                    field_types[field_name] = field_type
+
+        columns = self.columns
+        if columns is None:
+            columns = field_names
+
+        indexes = []
+        for column in columns:
+            if column not in field_names:
+                raise ValueError('unknown column: %r' % (column,))
+            indexes.append(field_names.index(column))
+
+        #: Class of the records that :py:meth:`read` returns. You can use
+        #: this to build output records too.
+        self.record_class = _make_record_class(
+            self.__class__.__name__ + 'Record', columns)
+
+        self._num_splits = max(indexes)
+        if len(indexes) == 1:
+            # itemgetter() with one index doesn't return a tuple
+            index = indexes[0]
+            self._get_columns = lambda fields: (fields[index],)
+        else:
+            self._get_columns = itemgetter(*indexes)
+        self._types = [field_types.get(column) for column in columns]
+
+        if not any(self._types):
+            self._parse = self._pick
+        else:
+            self._parse = self._pick_and_convert
+
+    def _split(self, line):
+        return tuple(line.split(self.delimiter))
+
+    def _fields_needed(self, line):
+        fields = line.split(self.delimiter, self._num_splits + 1)
+        if len(fields) <= self._num_splits:
+            raise ValueError('expected at least %d fields, got %d' %
+                             (self._num_splits + 1, len(fields)))
+        return fields
+
+    def _pick(self, line):
+        return tuple.__new__(self.record_class,
+                             self._get_columns(self._fields_needed(line)))
+
+    def _pick_and_convert(self, line):
+        values = self._get_columns(self._fields_needed(line))
+        return tuple.__new__(self.record_class, [
+            value if field_type is None else field_type(value)
+            for field_type, value in zip(self._types, values)])
+
+    def _join(self, record):
+        try:
+            return self.delimiter.join(record)
+        except TypeError:
+            return self.delimiter.join(map(_dump_field, record))
+
+    def read(self, line):
+        return (None, self._parse(line))
+
+    def write(self, key, value):
+        return self._join(value)
+
+    def read_many(self, lines):
+        return zip(repeat(None), map(self._parse, lines))
+
+    def write_many(self, pairs):
+        return map(self._join, [value for _, value in pairs])
+
+
+class DelimitedProtocol(DelimitedValueProtocol):
+    """Like :py:class:`DelimitedValueProtocol`, except that everything
+    before the first tab is the key (a string, like
+    :py:class:`RawProtocol`), and the delimited fields come after it.
+
+    If ``key`` is ``None``, we just write the fields.
+    """
+    def read(self, line):
+        key, tab, rest = line.partition('\t')
+        if not tab:
+            raise ValueError('no tab in line')
+        return (key, self._parse(rest))
+
+    def write(self, key, value):
+        if key is None:
+            return self._join(value)
+        return '%s\t%s' % (_dump_field(key), self._join(value))
+
+    def read_many(self, lines):
+        return map(self.read, lines)
+
+    def write_many(self, pairs):
+        return [self.write(key, value) for key, value in pairs]
+
 
 class ReprProtocol(_ClassBasedKeyCachingProtocol):
     """Encode ``(key, value)`` as two reprs separated by a tab.
 
-    This only works for basic types (we use :py:func:`mrjob.util.safeeval`).
+    This only works for basic types (we use :py:func:`mrjob.util.parse_repr`,
+    which falls back to :py:func:`mrjob.util.safeeval`).
     """
+    _PASS_THROUGH_SAFE = True
 
     @classmethod
     def load_from_string(cls, value):
-        return safeeval(value)
+        return parse_repr(value)
 
     @classmethod
     def dump_to_string(cls, value):
         return repr(value)
 
 
-class ReprValueProtocol(object):
+class ReprValueProtocol(_DecodeCachingProtocol):
     """Encode ``value`` as a repr and discard ``key`` (``key`` is read
     in as None).
 
-    This only works for basic types (we use :py:func:`mrjob.util.safeeval`).
+    This only works for basic types (we use :py:func:`mrjob.util.parse_repr`,
+    which falls back to :py:func:`mrjob.util.safeeval`).
     """
-    @classmethod
-    def read(cls, line):
-        return (None, safeeval(line))
+    _PASS_THROUGH_SAFE = True
+
+    load_from_string = ReprProtocol.load_from_string
+
+    @_hybridmethod
+    def read(self, line):
+        return (None, (self._decode or self._decoder())(line))
 
     @classmethod
     def write(cls, key, value):
         return repr(value)
+
+    @_hybridmethod
+    def read_many(self, lines):
+        return zip(repeat(None), self._decode_many(lines))
+
+    @classmethod
+    def write_many(cls, pairs):
+        return map(repr, [value for _, value in pairs])
+
+
+class TypedBytesProtocol(BaseProtocol):
+    """Encode ``(key, value)`` as Hadoop typed bytes (see
+    :py:mod:`mrjob.typedbytes`), a binary format that doesn't need tabs,
+    newlines, or escaping.
+
+    Jobs that use this protocol tell Hadoop Streaming to pass typed bytes
+    to and from tasks (``-io typedbytes``), and store data between steps
+    as SequenceFiles. It's a compact, fast choice for
+    :py:attr:`~mrjob.job.MRJob.INTERNAL_PROTOCOL`.
+    """
+    _PASS_THROUGH_SAFE = True
+
+    #: Tell Hadoop Streaming (and mrjob's simulated runners) to frame
+    #: records as typed bytes rather than lines
+    hadoop_io = 'typedbytes'
+
+    @classmethod
+    def read(cls, record):
+        key, pos = typedbytes.decode(record)
+        value, pos = typedbytes.decode(record, pos)
+        if pos != len(record):
+            raise ValueError('%d extra bytes after typed bytes record' %
+                             (len(record) - pos))
+        return key, value
+
+    @classmethod
+    def write(cls, key, value):
+        return typedbytes.dumps(key) + typedbytes.dumps(value)
+
+    @classmethod
+    def read_many(cls, records):
+        return map(cls.read, records)
+
+    @classmethod
+    def write_many(cls, pairs):
+        dumps = typedbytes.dumps
+        return [dumps(key) + dumps(value) for key, value in pairs]
+
+
+class TypedBytesValueProtocol(BaseProtocol):
+    """Encode ``value`` as Hadoop typed bytes and discard ``key`` (``key``
+    is read in as ``None``, and written out as an empty byte string).
+
+    Useful for reading input that Hadoop Streaming converts to typed bytes
+    (e.g. SequenceFiles), where you don't care about the key.
+    """
+    hadoop_io = 'typedbytes'
+
+    _EMPTY_KEY = typedbytes.dumps('')
+
+    @classmethod
+    def read(cls, record):
+        return (None, typedbytes.loads(record[typedbytes.key_end(record):]))
+
+    @classmethod
+    def write(cls, key, value):
+        return cls._EMPTY_KEY + typedbytes.dumps(value)
+
+    @classmethod
+    def read_many(cls, records):
+        return map(cls.read, records)
+
+    @classmethod
+    def write_many(cls, pairs):
+        return [cls._EMPTY_KEY + data for data in
+                map(typedbytes.dumps, [value for _, value in pairs])]
+
+
+class RawBytesProtocol(BaseProtocol):
+    """Encode ``(key, value)`` as two raw byte strings, each prefixed with
+    its length, using the same framing as :py:class:`TypedBytesProtocol`
+    (``key`` and ``value`` must be ``str``).
+
+    Unlike :py:class:`RawProtocol`, keys and values may contain any byte,
+    including tabs and newlines, and nothing is escaped, so this is a
+    cheap way to pass binary data (images, serialized models, etc.)
+    between steps without base64-encoding it yourself.
+
+    When decoding, any length-prefixed typed bytes object (bytes,
+    strings, or application-specific types) is read in as its raw data;
+    anything else raises :py:exc:`ValueError`.
+    """
+    _PASS_THROUGH_SAFE = True
+
+    hadoop_io = 'typedbytes'
+
+    @classmethod
+    def read(cls, record):
+        key, pos = typedbytes.decode_raw(record)
+        value, pos = typedbytes.decode_raw(record, pos)
+        if pos != len(record):
+            raise ValueError('%d extra bytes after typed bytes record' %
+                             (len(record) - pos))
+        return key, value
+
+    @classmethod
+    def write(cls, key, value):
+        return typedbytes.dumps_bytes(key) + typedbytes.dumps_bytes(value)
+
+    @classmethod
+    def read_many(cls, records):
+        return map(cls.read, records)
+
+    @classmethod
+    def write_many(cls, pairs):
+        dumps_bytes = typedbytes.dumps_bytes
+        return [dumps_bytes(key) + dumps_bytes(value) for key, value in pairs]
+
+
+class RawBytesValueProtocol(BaseProtocol):
+    """Encode ``value`` as a length-prefixed raw byte string (see
+    :py:class:`RawBytesProtocol`) and discard ``key`` (``key`` is read in
+    as ``None``, and written out as an empty byte string).
+    """
+    hadoop_io = 'typedbytes'
+
+    _EMPTY_KEY = typedbytes.dumps_bytes('')
+
+    @classmethod
+    def read(cls, record):
+        value, pos = typedbytes.decode_raw(record, typedbytes.key_end(record))
+        if pos != len(record):
+            raise ValueError('%d extra bytes after typed bytes record' %
+                             (len(record) - pos))
+        return (None, value)
+
+    @classmethod
+    def write(cls, key, value):
+        return cls._EMPTY_KEY + typedbytes.dumps_bytes(value)
+
+    @classmethod
+    def read_many(cls, records):
+        return map(cls.read, records)
+
+    @classmethod
+    def write_many(cls, pairs):
+        empty_key = cls._EMPTY_KEY
+        dumps_bytes = typedbytes.dumps_bytes
+        return [empty_key + dumps_bytes(value) for _, value in pairs]
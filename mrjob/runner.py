@@ -23,7 +23,9 @@ import logging
 import os
 import os.path
 import pipes
+import posixpath
 import pprint
+import pstats
 import re
 import shutil
 import sys
@@ -62,6 +64,7 @@ from mrjob.conf import combine_path_lists
 from mrjob.conf import load_opts_from_mrjob_confs
 from mrjob.conf import OptionStore
 from mrjob.fs.local import LocalFilesystem
+from mrjob.parse import is_uri
 from mrjob.step import STEP_TYPES
 from mrjob.util import bash_wrap
 from mrjob.util import cmd_line
@@ -96,6 +99,46 @@ _STEP_RE = re.compile(r'^M?C?R?$')
 # buffer for piping files into sort on Windows
 _BUFFER_SIZE = 4096
 
+# stats files written by tasks run with --profile-tasks-dir
+_TASK_PROFILE_RE = re.compile(
+    r'^mrjob-profile-step-(?P<step_num>\d+)-'
+    r'(?P<step_type>mapper|combiner|reducer)-.*\.prof$')
+
+# how Hadoop Streaming frames the input and output of each substep; see
+# MRJob._add_hadoop_io_to_steps_desc()
+_STEP_IO_KEYS = ('map_input', 'map_output', 'reduce_input', 'reduce_output')
+
+# jobconf variable that sets each of the above
+_STEP_IO_JOBCONF = {
+    'map_input': 'stream.map.input',
+    'map_output': 'stream.map.output',
+    'reduce_input': 'stream.reduce.input',
+    'reduce_output': 'stream.reduce.output',
+}
+
+# formats used to pass typed bytes between steps
+_SEQUENCE_FILE_INPUT_FORMAT = 'org.apache.hadoop.mapred.SequenceFileInputFormat'
+_SEQUENCE_FILE_OUTPUT_FORMAT = (
+    'org.apache.hadoop.mapred.SequenceFileOutputFormat')
+
+
+def _step_io(step):
+    """Return a dictionary mapping each of ``'map_input'``,
+    ``'map_output'``, ``'reduce_input'``, and ``'reduce_output'`` to how
+    Hadoop Streaming should frame that data (``'text'`` or
+    ``'typedbytes'``) in the given step description."""
+    io = step.get('io') or {}
+    return dict((key, io.get(key) or 'text') for key in _STEP_IO_KEYS)
+
+
+def _step_output_io(step):
+    """How the data written by the given step is framed."""
+    io = _step_io(step)
+    if 'reducer' in step:
+        return io['reduce_output']
+    else:
+        return io['map_output']
+
 
 class RunnerOptionStore(OptionStore):
 
@@ -115,6 +158,7 @@ class RunnerOptionStore(OptionStore):
         'jobconf',
         'label',
         'owner',
+        'profile_tasks',
         'python_archives',
         'python_bin',
         'setup',
@@ -748,7 +792,7 @@ class MRJobRunner(object):
         args = self._executable() + [
             '--step-num=%d' % step_num,
             '--%s' % mrc,
-        ] + self._mr_job_extra_args()
+        ] + self._mr_job_extra_args() + self._task_profile_args()
 
         if self._setup_wrapper_script_path:
             return (self._opts['sh_bin'] +
@@ -830,6 +874,76 @@ class MRJobRunner(object):
         """
         return self._get_file_upload_args(local=local) + self._extra_args
 
+    def _task_profiles_dir(self):
+        """Directory that tasks should put their profiling stats in when
+        the *profile_tasks* option is set. Runners that support profiling
+        should re-define this."""
+        return None
+
+    def _task_profile_args(self):
+        """Arguments to add to task invocations to make them profile
+        themselves, if the *profile_tasks* option is set."""
+        if self._opts['profile_tasks'] and self._task_profiles_dir():
+            return ['--profile-tasks-dir', self._task_profiles_dir()]
+        else:
+            return []
+
+    def _collect_task_profiles(self):
+        """Merge the stats written by profiled tasks into one
+        :py:mod:`pstats` file per step and substep, and put them in
+        ``_profiles/`` in the output directory (e.g.
+        ``_profiles/step-0-mapper.prof``).
+        """
+        profiles_dir = self._task_profiles_dir()
+        if not (self._opts['profile_tasks'] and profiles_dir and
+                self.path_exists(profiles_dir)):
+            return
+
+        # group task stats by step and substep
+        step_to_paths = {}
+        for path in self.ls(profiles_dir):
+            if is_uri(path):
+                filename = posixpath.basename(path)
+            else:
+                filename = os.path.basename(path)
+
+            m = _TASK_PROFILE_RE.match(filename)
+            if m:
+                key = (int(m.group('step_num')), m.group('step_type'))
+                step_to_paths.setdefault(key, []).append(path)
+
+        if not step_to_paths:
+            log.warning('no task profiles found in %s' % profiles_dir)
+            return
+
+        local_dir = os.path.join(self._get_local_tmp_dir(), 'profiles-merged')
+        if not os.path.isdir(local_dir):
+            os.makedirs(local_dir)
+
+        for (step_num, step_type), paths in sorted(step_to_paths.items()):
+            local_paths = []
+            for i, path in enumerate(sorted(paths)):
+                if is_uri(path):
+                    # fetch remote stats so pstats can read them
+                    local_path = os.path.join(
+                        local_dir, 'task-%d-%s-%05d.prof' % (
+                            step_num, step_type, i))
+                    with open(local_path, 'wb') as f:
+                        for line in self.cat(path):
+                            f.write(line)
+                    local_paths.append(local_path)
+                else:
+                    local_paths.append(path)
+
+            name = 'step-%d-%s.prof' % (step_num, step_type)
+            merged_path = os.path.join(local_dir, name)
+            pstats.Stats(*local_paths).dump_stats(merged_path)
+
+            dest = self.path_join(
+                self.path_join(self._output_dir, '_profiles'), name)
+            log.info('Writing merged task profile to %s' % dest)
+            self.copy_from_local(dest, merged_path)
+
     def _get_file_upload_args(self, local=False):
         """Arguments used to pass through config files, etc from the job
         runner through to the local directory where the script is run.
@@ -1050,7 +1164,9 @@ class MRJobRunner(object):
         """Build a list of extra arguments to the hadoop binary.
 
         This handles *cmdenv*, *hadoop_extra_args*, *hadoop_input_format*,
-        *hadoop_output_format*, *jobconf*, and *partitioner*.
+        *hadoop_output_format*, *jobconf*, and *partitioner*, as well as
+        how the step's mapper and reducer read and write their data
+        (e.g. ``-io typedbytes``).
 
         This doesn't handle input, output, mappers, reducers, or uploading
         files.
@@ -1059,7 +1175,19 @@ class MRJobRunner(object):
 
         args = []
 
-        jobconf = combine_dicts(self._opts['jobconf'], step.get('jobconf'))
+        io = _step_io(step)
+        if set(io.itervalues()) == set(['typedbytes']):
+            io_args = ['-io', 'typedbytes']
+            io_jobconf = {}
+        else:
+            io_args = []
+            # let the user override these with jobconf if they must
+            io_jobconf = dict((_STEP_IO_JOBCONF[key], value)
+                              for key, value in io.iteritems()
+                              if value != 'text')
+
+        jobconf = combine_dicts(
+            io_jobconf, self._opts['jobconf'], step.get('jobconf'))
         job_name = jobconf.get('mapred.job.name', None)
 
         # Set a default job name
@@ -1090,6 +1218,9 @@ class MRJobRunner(object):
             for key, value in sorted(jobconf.iteritems()):
                 args.extend(['-jobconf', '%s=%s' % (key, value)])
 
+        # -io
+        args.extend(io_args)
+
         # partitioner
         if self._partitioner:
             args.extend(['-partitioner', self._partitioner])
@@ -1102,10 +1233,17 @@ class MRJobRunner(object):
         # hadoop_input_format
         if (step_num == 0 and self._hadoop_input_format):
             args.extend(['-inputformat', self._hadoop_input_format])
+        # typed bytes from the previous step
+        elif step_num > 0 and io['map_input'] == 'typedbytes':
+            args.extend(['-inputformat', _SEQUENCE_FILE_INPUT_FORMAT])
 
         # hadoop_output_format
         if (step_num == num_steps - 1 and self._hadoop_output_format):
             args.extend(['-outputformat', self._hadoop_output_format])
+        # typed bytes for the next step
+        elif (step_num < num_steps - 1 and
+              _step_output_io(step) == 'typedbytes'):
+            args.extend(['-outputformat', _SEQUENCE_FILE_OUTPUT_FORMAT])
 
         return args
 
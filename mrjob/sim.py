@@ -16,6 +16,7 @@
 them together. Useful for testing."""
 from __future__ import with_statement
 
+import hashlib
 import itertools
 import logging
 import os
@@ -23,17 +24,52 @@ import shutil
 import stat
 
 from mrjob.compat import translate_jobconf
+from mrjob.compression import get_codec
+from mrjob.compression import get_codec_by_name
 from mrjob.conf import combine_dicts
 from mrjob.conf import combine_local_envs
 from mrjob.runner import MRJobRunner
 from mrjob.runner import RunnerOptionStore
+from mrjob.runner import _step_io
+from mrjob.splits import INDEX_SUFFIX
+from mrjob.splits import get_index
+from mrjob.splits import index_path
+from mrjob.splits import is_index_path
+from mrjob.splits import plan_splits
+from mrjob.splits import write_split
+from mrjob.typedbytes import chunks_to_record_lists
+from mrjob.typedbytes import key_end
+from mrjob.typedbytes import sort_records
+from mrjob.util import read_file_chunks
+from mrjob.util import read_file_range
 from mrjob.util import read_input
+from mrjob.util import read_input_blocks
 from mrjob.util import unarchive
 
 
 log = logging.getLogger(__name__)
 
 
+def _line_splits(path, split_size):
+    """Yield ``(start, length)`` for each split of the uncompressed file at
+    *path*. Each split ends with the first line that brings it to at least
+    *split_size* bytes. An empty file has one empty split."""
+    size = os.stat(path)[stat.ST_SIZE]
+    with open(path, 'rb') as f:
+        start = 0
+        while True:
+            # find the end of the line containing the split's last byte
+            f.seek(start + max(split_size, 1) - 1)
+            f.readline()
+            end = min(f.tell(), size)
+
+            yield start, end - start
+
+            start = end
+            if start >= size:
+                return
+
+
 class SimRunnerOptionStore(RunnerOptionStore):
 
     COMBINERS = combine_dicts(RunnerOptionStore.COMBINERS, {
@@ -67,6 +103,8 @@ class SimMRJobRunner(MRJobRunner):
     * ``mapreduce.map.input.file``
     * ``mapreduce.map.input.length``
     * ``mapreduce.map.input.start``
+    * ``mapreduce.output.fileoutputformat.compress``
+    * ``mapreduce.output.fileoutputformat.compress.codec``
     * ``mapreduce.task.attempt.id``
     * ``mapreduce.task.id``
     * ``mapreduce.task.ismap``
@@ -192,7 +230,12 @@ class SimMRJobRunner(MRJobRunner):
                     self._get_local_tmp_dir(),
                     'step-%d-mapper-sorted' % step_num)
 
-                self._invoke_sort(self._step_input_paths(), sort_output_path)
+                if _step_io(step)['reduce_input'] == 'typedbytes':
+                    self._invoke_typedbytes_sort(
+                        self._step_input_paths(), sort_output_path)
+                else:
+                    self._invoke_sort(
+                        self._step_input_paths(), sort_output_path)
                 self._prev_outfiles = [sort_output_path]
 
                 # run the reducer
@@ -200,11 +243,42 @@ class SimMRJobRunner(MRJobRunner):
                     step, 'step-%d-reducer' % step_num, step_num, 'reducer',
                     num_tasks=self._reduce_tasks)
 
-        # move final output to output directory
+        # move final output to output directory, compressing it if
+        # the job asked us to
         for i, outfile in enumerate(self._prev_outfiles):
             final_outfile = os.path.join(self._output_dir, 'part-%05d' % i)
-            log.info('Moving %s -> %s' % (outfile, final_outfile))
-            shutil.move(outfile, final_outfile)
+            if self._output_codec:
+                final_outfile += self._output_codec.extension
+                log.info('Compressing %s -> %s' % (outfile, final_outfile))
+                with open(final_outfile, 'wb') as f:
+                    for chunk in self._output_codec.compress(
+                            read_file_chunks(outfile)):
+                        f.write(chunk)
+                os.remove(outfile)
+            else:
+                log.info('Moving %s -> %s' % (outfile, final_outfile))
+                shutil.move(outfile, final_outfile)
+
+        self._collect_task_profiles()
+
+    def _task_profiles_dir(self):
+        return os.path.join(self._get_local_tmp_dir(), 'profiles')
+
+    def _invoke_typedbytes_sort(self, input_paths, output_path):
+        """Sort typed bytes records from one or more input files by key,
+        and write them to *output_path*. Typed bytes can't be sorted by
+        the ``sort`` command, so we do this in memory."""
+        log.info('writing to %s' % output_path)
+
+        records = []
+        for input_path in input_paths:
+            for block in read_input_blocks(
+                    input_path, chunks_to_records=chunks_to_record_lists):
+                records.extend(block)
+
+        with open(output_path, 'wb') as output:
+            for record in sort_records(records):
+                output.write(record)
 
     def _invoke_step(self, step_dict, outfile_name, step_num, step_type,
                      num_tasks=1):
@@ -231,8 +305,13 @@ class SimMRJobRunner(MRJobRunner):
 
         # get file splits for mappers and reducers
         keep_sorted = (step_type == 'reducer')
+        if step_type == 'mapper':
+            io = _step_io(step_dict)['map_input']
+        else:
+            io = _step_io(step_dict)['reduce_input']
         file_splits = self._get_file_splits(
-            self._step_input_paths(), num_tasks, keep_sorted=keep_sorted)
+            self._step_input_paths(), num_tasks, keep_sorted=keep_sorted,
+            io=io)
 
         # since we have grapped the files from the _prev_outfiles as input
         # to this step reset _prev_outfiles
@@ -286,13 +365,19 @@ class SimMRJobRunner(MRJobRunner):
         """
         pass
 
-    def _get_file_splits(self, input_paths, num_splits, keep_sorted=False):
-        """ Split the input files into (roughly) *num_splits* files. Gzipped
-        files are not split, but each gzipped file counts as one split.
+    def _get_file_splits(self, input_paths, num_splits, keep_sorted=False,
+                         io='text'):
+        """ Split the input files into (roughly) *num_splits* files.
+        Compressed text files are split between units that can be
+        decompressed on their own (see :py:mod:`mrjob.splits`); gzipped
+        files made of one gzip member are not split, but each counts as one
+        split.
 
         :param input_paths: Iterable of paths to be split
         :param num_splits: Number of splits to target
         :param keep_sorted: If True, group lines by key
+        :param io: ``'typedbytes'`` if the input is made of typed bytes
+                   records rather than lines
 
         Returns a dictionary that maps split_file names to a dictionary of
         properties:
@@ -301,12 +386,15 @@ class SimMRJobRunner(MRJobRunner):
                           the split
         * *start*: where the split starts
         * *length*: the length of the split
+
+        For compressed files, *start* and *length* are in compressed bytes.
         """
         # sanity check: if keep_sorted is True, we should only have one file
         assert(not keep_sorted or len(input_paths) == 1)
 
         file_names = {}
         input_paths_to_split = []
+        compressed_paths_to_split = []
 
         # Each file is assigned a 'task number' as if coming from some previous
         # task. The task number is used to choose the split file name, and
@@ -314,25 +402,49 @@ class SimMRJobRunner(MRJobRunner):
         # when the output files are combined after the final step, they are in
         # sorted order due to already being lexicographically sorted.
 
+        paths = []
         for input_path in input_paths:
             for path in self.ls(input_path):
-                if path.endswith('.gz'):
-                    # do not split compressed files
-                    absolute_path = os.path.abspath(path)
-                    file_names[absolute_path] = {
-                        'orig_name': absolute_path,
-                        'start': 0,
-                        'task_num': len(file_names),
-                        'length': os.stat(absolute_path)[stat.ST_SIZE],
-                    }
-                    # this counts as "one split"
-                    num_splits -= 1
-                else:
-                    # do split uncompressed files
-                    input_paths_to_split.append(path)
+                if is_index_path(path):
+                    # mrjob.splits wrote this
+                    continue
+                paths.append(path)
+
+        # Indexing a compressed file means decompressing all of it, so
+        # only bother if it's bigger than one task's share of the input
+        # (otherwise it'd end up in one split anyway)
+        if io == 'text' and not keep_sorted and num_splits > 1:
+            min_size_to_index = (
+                sum(os.stat(path)[stat.ST_SIZE] for path in paths) /
+                float(num_splits))
+        else:
+            min_size_to_index = None
+
+        for path in paths:
+            index = None
+            if (min_size_to_index is not None and get_codec(path) and
+                os.stat(path)[stat.ST_SIZE] > min_size_to_index):
+                index = self._get_split_index(path)
+
+            if index and len(index['units']) > 1:
+                compressed_paths_to_split.append((path, index))
+            elif path.endswith('.gz'):
+                # do not split compressed files
+                absolute_path = os.path.abspath(path)
+                file_names[absolute_path] = {
+                    'orig_name': absolute_path,
+                    'start': 0,
+                    'task_num': len(file_names),
+                    'length': os.stat(absolute_path)[stat.ST_SIZE],
+                }
+                # this counts as "one split"
+                num_splits -= 1
+            else:
+                # do split uncompressed files
+                input_paths_to_split.append(path)
 
-        # exit early if no uncompressed files given
-        if not input_paths_to_split:
+        # exit early if no files to split
+        if not (input_paths_to_split or compressed_paths_to_split):
             return file_names
 
         # account for user giving fewer splits than there are compressed files
@@ -343,6 +455,8 @@ class SimMRJobRunner(MRJobRunner):
         for input_path in input_paths_to_split:
             for path in self.ls(input_path):
                 total_size += os.stat(path)[stat.ST_SIZE]
+        for path, index in compressed_paths_to_split:
+            total_size += index['size']
         split_size = total_size / num_splits
 
         # we want each file split to be as close to split_size as possible
@@ -350,11 +464,11 @@ class SimMRJobRunner(MRJobRunner):
         tmp_directory = self._get_local_tmp_dir()
 
         # Helper functions:
-        def create_outfile(orig_name='', start=''):
+        def create_outfile(orig_name='', start='', ext=''):
             # create a new output file and initialize its properties dict
             task_num = len(file_names)
             outfile_name = os.path.join(tmp_directory,
-                                        'input_part-%05d' % task_num)
+                                        'input_part-%05d%s' % (task_num, ext))
             new_file = {
                 'orig_name': orig_name,
                 'start': start,
@@ -368,20 +482,49 @@ class SimMRJobRunner(MRJobRunner):
             # group lines by key; otherwise have one line per group
             # concatenate all lines with the same key and yield them
             # together
-            if keep_sorted:
-                def reducer_key(line):
-                    return line.split('\t')[0]
+            if io == 'typedbytes':
+                lines = (record for records in read_input_blocks(
+                    input_path, chunks_to_records=chunks_to_record_lists)
+                    for record in records)
+
+                def reducer_key(record):
+                    return record[:key_end(record)]
+            else:
+                lines = read_input(input_path)
 
                 # assume that input is a collection of key <tab> value pairs
                 # match all non-tab characters
-                for _, lines in itertools.groupby(
-                    read_input(input_path), key=reducer_key):
+                def reducer_key(line):
+                    return line.split('\t')[0]
+
+            if keep_sorted:
+                for _, lines in itertools.groupby(lines, key=reducer_key):
                     yield lines
             else:
-                for line in read_input(input_path):
+                for line in lines:
                     yield (line,)
 
+        for path, index in compressed_paths_to_split:
+            # split between compressed units, and keep each split compressed
+            absolute_path = os.path.abspath(path)
+            ext = os.path.splitext(path)[1]
+            for first, stop, start, length in plan_splits(index, split_size):
+                outfile_name = create_outfile(absolute_path, start, ext)
+                file_names[outfile_name]['length'] = length
+                write_split(path, index, first, stop, outfile_name)
+
         for path in input_paths_to_split:
+            if (io == 'text' and not keep_sorted and os.path.isfile(path)
+                and not get_codec(path)):
+                # copy whole ranges of lines, rather than a line at a time
+                for start, length in _line_splits(path, split_size):
+                    outfile_name = create_outfile(path, start)
+                    file_names[outfile_name]['length'] = length
+                    with open(outfile_name, 'w') as outfile:
+                        for chunk in read_file_range(path, start, length):
+                            outfile.write(chunk)
+                continue
+
             # create a new split file for each new path
 
             # initialize file and accumulators
@@ -418,7 +561,35 @@ class SimMRJobRunner(MRJobRunner):
 
         return file_names
 
+    def _get_split_index(self, path):
+        """Get the index of compressed units for *path*, or ``None`` if
+        it can't be split (see :py:func:`mrjob.splits.get_index`).
+
+        We keep the index next to the input, so that later runs can re-use
+        it, unless we can't write there, in which case we keep it in our
+        tmp dir."""
+        index_file = index_path(path)
+
+        if not (os.path.exists(index_file) or
+                os.access(os.path.dirname(os.path.abspath(path)), os.W_OK)):
+            index_dir = os.path.join(
+                self._get_local_tmp_dir(), 'split_indexes')
+            if not os.path.isdir(index_dir):
+                os.makedirs(index_dir)
+            index_file = os.path.join(
+                index_dir,
+                hashlib.md5(os.path.abspath(path)).hexdigest() + INDEX_SUFFIX)
+
+        try:
+            return get_index(path, index_file=index_file)
+        except ValueError, e:
+            log.warning("Can't split %s: %s" % (path, e))
+            return None
+
     def _process_jobconf_args(self, jobconf):
+        compress_output = False
+        output_codec_name = None
+
         if jobconf:
             for (conf_arg, value) in jobconf.iteritems():
                 # Internally, use one canonical Hadoop version
@@ -439,6 +610,20 @@ class SimMRJobRunner(MRJobRunner):
                     if not os.path.isdir(value):
                         raise IOError("Directory %s does not exist" % value)
                     self._working_dir = value
+                elif canon_arg == 'mapreduce.output.fileoutputformat.compress':
+                    compress_output = str(value).lower() == 'true'
+                elif canon_arg == (
+                        'mapreduce.output.fileoutputformat.compress.codec'):
+                    output_codec_name = value
+
+        # Hadoop would use DefaultCodec (.deflate) if the job doesn't pick
+        # a codec, but that's not one of our built-in codecs (see
+        # mrjob.compression), so use gzip
+        if compress_output:
+            self._output_codec = get_codec_by_name(
+                output_codec_name or 'gzip')
+        else:
+            self._output_codec = None
 
     def _subprocess_env(self, step_type, step_num, task_num, input_file=None,
                         input_start=None, input_length=None):
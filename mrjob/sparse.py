@@ -0,0 +1,225 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Sparse vectors for machine-learning jobs, and a compact binary encoding
+for them.
+
+A :py:class:`SparseVector` stores its non-zero entries as two
+:py:mod:`array` s, one of indices and one of values, rather than as a
+dictionary. :py:func:`dumps` encodes it as a count followed by the raw bytes
+of both arrays (little-endian), so decoding is just a couple of memory
+copies. See :py:class:`~mrjob.protocol.SparseVectorProtocol` for how to
+pass them between steps.
+"""
+# don't add imports here that aren't part of the standard Python library,
+# since MRJobs need to run in Amazon's generic EMR environment
+from array import array
+from bisect import bisect_left
+from itertools import izip
+import struct
+import sys
+
+# indices are C ints, values are C doubles
+_INDEX_TYPECODE = 'i'
+_VALUE_TYPECODE = 'd'
+
+_INDEX_SIZE = array(_INDEX_TYPECODE).itemsize
+_VALUE_SIZE = array(_VALUE_TYPECODE).itemsize
+
+# number of entries
+_HEADER = struct.Struct('<I')
+
+_BIG_ENDIAN = (sys.byteorder == 'big')
+
+
+class SparseVector(object):
+    """A vector of floats where most entries are zero.
+
+    :type indices: sequence of int
+    :param indices: indices of the non-zero entries, in increasing order
+    :type values: sequence of float
+    :param values: the entries at those indices
+
+    Both are stored as :py:class:`array.array` s (in :py:attr:`indices` and
+    :py:attr:`values`). You can also build a vector with
+    :py:meth:`from_dict`.
+
+    Iterating over a vector yields ``(index, value)`` for each non-zero
+    entry, and ``len(vector)`` is the number of non-zero entries.
+    """
+    __slots__ = ('indices', 'values')
+
+    def __init__(self, indices=(), values=()):
+        self.indices = array(_INDEX_TYPECODE, indices)
+        self.values = array(_VALUE_TYPECODE, values)
+
+        if len(self.indices) != len(self.values):
+            raise ValueError('%d indices but %d values' %
+                             (len(self.indices), len(self.values)))
+
+        prev = -1
+        for i in self.indices:
+            if i <= prev:
+                raise ValueError('indices must be non-negative and increasing')
+            prev = i
+
+    @classmethod
+    def from_dict(cls, index_to_value):
+        """Make a vector from a dictionary mapping index to value."""
+        indices = sorted(index_to_value)
+        return cls(indices, [index_to_value[i] for i in indices])
+
+    @classmethod
+    def _from_arrays(cls, indices, values):
+        # skip the checks in __init__(); for vectors we built ourselves
+        vector = object.__new__(cls)
+        vector.indices = indices
+        vector.values = values
+        return vector
+
+    def to_dict(self):
+        """Return a dictionary mapping index to value."""
+        return dict(izip(self.indices, self.values))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        return izip(self.indices, self.values)
+
+    def __getitem__(self, index):
+        pos = bisect_left(self.indices, index)
+        if pos < len(self.indices) and self.indices[pos] == index:
+            return self.values[pos]
+        else:
+            return 0.0
+
+    def __eq__(self, other):
+        return (isinstance(other, SparseVector) and
+                self.indices == other.indices and
+                self.values == other.values)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (self.__class__.__name__,
+                               self.indices.tolist(), self.values.tolist())
+
+    def __reduce__(self):
+        return (self.__class__, (self.indices, self.values))
+
+    def dot(self, other):
+        """Return the dot product of this vector and *other*, which can be
+        another :py:class:`SparseVector`, or a dense sequence of floats
+        (e.g. a :py:class:`list` or :py:class:`array.array`). Entries past
+        the end of a dense sequence count as zero."""
+        if isinstance(other, SparseVector):
+            return self._dot_sparse(other)
+
+        total = 0.0
+        n = len(other)
+        for i, v in izip(self.indices, self.values):
+            if i < n:
+                total += v * other[i]
+        return total
+
+    def _dot_sparse(self, other):
+        # walk through both lists of indices together
+        a_indices, a_values = self.indices, self.values
+        b_indices, b_values = other.indices, other.values
+        a_len, b_len = len(a_indices), len(b_indices)
+
+        total = 0.0
+        a = b = 0
+        while a < a_len and b < b_len:
+            a_index = a_indices[a]
+            b_index = b_indices[b]
+            if a_index == b_index:
+                total += a_values[a] * b_values[b]
+                a += 1
+                b += 1
+            elif a_index < b_index:
+                a += 1
+            else:
+                b += 1
+        return total
+
+    def add_to(self, target, scale=1.0):
+        """Add *scale* times this vector to *target*, in place.
+
+        *target* can be a dense, mutable sequence of floats (e.g. a
+        :py:class:`list` or :py:class:`array.array`) long enough to hold
+        our largest index, or a :py:class:`dict` mapping index to value.
+        """
+        if isinstance(target, dict):
+            get = target.get
+            for i, v in izip(self.indices, self.values):
+                target[i] = get(i, 0.0) + scale * v
+        else:
+            for i, v in izip(self.indices, self.values):
+                target[i] += scale * v
+
+    def scaled(self, scale):
+        """Return a new vector: this one, times *scale*."""
+        return self._from_arrays(
+            array(_INDEX_TYPECODE, self.indices),
+            array(_VALUE_TYPECODE, [v * scale for v in self.values]))
+
+    def max_index(self):
+        """Return the largest index of a non-zero entry, or -1 if there
+        are none (so ``vector.max_index() + 1`` is big enough for a dense
+        vector to hold it)."""
+        if self.indices:
+            return self.indices[-1]
+        else:
+            return -1
+
+
+def dumps(vector):
+    """Encode a :py:class:`SparseVector` as a string: the number of entries
+    (4 bytes), then the indices (4 bytes each), then the values (8 bytes
+    each), all little-endian. The result may contain any byte."""
+    indices, values = vector.indices, vector.values
+    if _BIG_ENDIAN:
+        indices = array(_INDEX_TYPECODE, indices)
+        indices.byteswap()
+        values = array(_VALUE_TYPECODE, values)
+        values.byteswap()
+
+    return ''.join((_HEADER.pack(len(indices)),
+                    indices.tostring(), values.tostring()))
+
+
+def loads(data):
+    """Decode a :py:class:`SparseVector` encoded by :py:func:`dumps`."""
+    if len(data) < _HEADER.size:
+        raise ValueError('sparse vector is too short')
+
+    n, = _HEADER.unpack_from(data)
+    values_start = _HEADER.size + n * _INDEX_SIZE
+    if len(data) != values_start + n * _VALUE_SIZE:
+        raise ValueError('sparse vector with %d entries should be %d bytes,'
+                         ' not %d' % (n, values_start + n * _VALUE_SIZE,
+                                      len(data)))
+
+    indices = array(_INDEX_TYPECODE)
+    indices.fromstring(data[_HEADER.size:values_start])
+    values = array(_VALUE_TYPECODE)
+    values.fromstring(data[values_start:])
+
+    if _BIG_ENDIAN:
+        indices.byteswap()
+        values.byteswap()
+
+    return SparseVector._from_arrays(indices, values)
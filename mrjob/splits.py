@@ -0,0 +1,598 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Split compressed input files, so that the inline and local runners can
+give different parts of one big ``.gz`` or ``.bz2`` file to different
+mappers (like Hadoop does with splittable codecs).
+
+A file can be split wherever a new piece of it can be decompressed on its
+own:
+
+- ``.gz`` files made of several gzip members concatenated together (e.g.
+  ``cat a.gz b.gz``, the output of ``pigz --independent``, or BGZF files
+  from ``bgzip``) can be split between members. A file with just one
+  member (what ``gzip`` makes) can't be split.
+- ``.bz2`` files can be split between compressed blocks (every 100-900k
+  of uncompressed data). Blocks aren't aligned on byte boundaries, so we
+  find them by scanning for the 48-bit magic number that starts each one.
+
+Finding these *units* means reading (and decompressing) the whole file,
+so :py:func:`get_index` saves an index of them (by default, in a hidden
+file next to the compressed file; see :py:func:`index_path`), and re-uses
+it as long as the compressed file doesn't change. Hadoop ignores files
+whose names start with ``.``, so the index won't be mistaken for input.
+The inline and local runners only index files big enough to be split
+between mappers, and keep the index in their tmp dir if they can't write
+next to the file.
+
+Like Hadoop's ``LineRecordReader``, each split gets the lines that *start*
+in it; the first (partial) line of a split belongs to the split before it.
+We write each split as a valid compressed file of the same type, copying
+compressed units as-is, and only re-compressing the partial lines at
+either end.
+"""
+from __future__ import with_statement
+
+from binascii import hexlify
+from binascii import unhexlify
+import logging
+import os
+from StringIO import StringIO
+import zlib
+
+try:
+    import bz2
+    bz2  # redefine bz2 for pepflakes
+except ImportError:
+    bz2 = None
+
+try:
+    import simplejson as json  # preferred because of C speedups
+    json  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    import json  # built in to Python 2.6 and later
+
+
+log = logging.getLogger(__name__)
+
+#: Bump this when the format of indexes changes, so we'll ignore old ones
+INDEX_VERSION = 1
+
+#: Suffix for index files. The index for ``foo/bar.gz`` is
+#: ``foo/.bar.gz.mrjob-splits``
+INDEX_SUFFIX = '.mrjob-splits'
+
+# how many bytes to read at a time
+_READ_SIZE = 1024 * 1024
+
+# magic numbers at the start of each bzip2 block and the end of each stream
+_BZIP2_BLOCK_MAGIC = 0x314159265359
+_BZIP2_EOS_MAGIC = 0x177245385090
+
+# these two are 48 bits each; the block CRC takes up the 32 after
+_BZIP2_MAGIC_BITS = 48
+_BZIP2_CRC_BITS = 32
+
+
+def index_path(path):
+    """Where we save the index for the compressed file at *path*."""
+    dir_name, base_name = os.path.split(path)
+    return os.path.join(dir_name, '.' + base_name + INDEX_SUFFIX)
+
+
+def is_index_path(path):
+    """Is *path* an index file written by :py:func:`get_index`?"""
+    base_name = os.path.basename(path)
+    return base_name.startswith('.') and base_name.endswith(INDEX_SUFFIX)
+
+
+def get_index(path, index_file=None):
+    """Return the index of splittable units for the ``.gz`` or ``.bz2``
+    file at *path* (or ``None`` if *path* doesn't have one of those
+    extensions).
+
+    Load the index from *index_file* (by default,
+    :py:func:`index_path`) if it's up to date; otherwise build it, and
+    save it there if we can.
+
+    The index is a dictionary with the keys:
+
+    * *format*: ``'gzip'`` or ``'bzip2'``
+    * *size*: size of the compressed file, in bytes
+    * *mtime*: modification time of the compressed file
+    * *units*: list of units that can be decompressed on their own. For
+      gzip, these are ``[start, end, line_start]``, where *start* and *end*
+      are byte offsets. For bzip2, these are
+      ``[start_bit, end_bit, line_start, crc]``. *line_start* is the
+      offset (in the decompressed unit) of the first line that starts in
+      the unit, or ``None`` if there isn't one.
+
+    Raises :py:class:`ValueError` if *path* isn't validly compressed.
+    """
+    if path.endswith('.gz'):
+        build_index = _index_gzip
+    elif path.endswith('.bz2'):
+        build_index = _index_bzip2
+    else:
+        return None
+
+    if index_file is None:
+        index_file = index_path(path)
+
+    st = os.stat(path)
+
+    try:
+        with open(index_file) as f:
+            index = json.load(f)
+        if (index.get('version') == INDEX_VERSION and
+            index.get('size') == st.st_size and
+            index.get('mtime') == st.st_mtime):
+            return index
+    except (IOError, ValueError):
+        pass
+
+    log.info('indexing %s for splitting' % path)
+    with open(path, 'rb') as f:
+        index = build_index(f)
+
+    index['version'] = INDEX_VERSION
+    index['size'] = st.st_size
+    index['mtime'] = st.st_mtime
+
+    # write to a temp file and rename it, so that another run reading
+    # the same input never sees half an index
+    tmp_path = '%s.%d' % (index_file, os.getpid())
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.rename(tmp_path, index_file)
+    except (IOError, OSError), e:
+        # that's okay, we'll just have to index it again next time
+        log.debug("couldn't save index for %s: %s" % (path, e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return index
+
+
+def plan_splits(index, split_size):
+    """Group the units in *index* into splits of at least *split_size*
+    compressed bytes (except the last). We only start a new split at a
+    unit that has the start of a line in it.
+
+    Returns a list of ``(first_unit, stop_unit, start, length)``, where
+    *start* and *length* are the byte range of the compressed file the
+    split covers (what Hadoop calls ``map.input.start`` and
+    ``map.input.length``).
+    """
+    units = index['units']
+    starts = [_unit_offset(index, unit) for unit in units] + [index['size']]
+
+    # indexes of the first unit of each split
+    firsts = [0]
+    for i in xrange(1, len(units)):
+        if (units[i][2] is not None and
+            starts[i] - starts[firsts[-1]] >= split_size):
+            firsts.append(i)
+
+    plan = []
+    for first, stop in zip(firsts, firsts[1:] + [len(units)]):
+        start = 0 if first == 0 else starts[first]
+        plan.append((first, stop, start, starts[stop] - start))
+
+    return plan
+
+
+def write_split(path, index, first_unit, stop_unit, out_path):
+    """Write the lines that start in units *first_unit* through
+    *stop_unit* - 1 of the compressed file at *path* to *out_path*, as a
+    compressed file of the same type."""
+    units = index['units']
+
+    # skip the partial line at the start (it belongs to the previous split)
+    if first_unit == 0:
+        skip = 0
+    else:
+        skip = units[first_unit][2]
+
+    # and finish the last line, which ends in the next split's first unit
+    if stop_unit < len(units):
+        finish = units[stop_unit][2]
+    else:
+        finish = 0
+
+    if index['format'] == 'gzip':
+        write = _write_gzip_split
+    else:
+        write = _write_bzip2_split
+
+    with open(path, 'rb') as f:
+        with open(out_path, 'wb') as out:
+            write(f, out, units, first_unit, stop_unit, skip, finish)
+
+
+def _unit_offset(index, unit):
+    """Byte offset where *unit* starts in the compressed file."""
+    if index['format'] == 'gzip':
+        return unit[0]
+    else:
+        return unit[0] // 8
+
+
+def _find_line_start(pieces, at_line_start):
+    """Find the first line that starts in a unit, given the decompressed
+    data in the unit (*pieces*) and whether the data before the unit
+    ended with a newline.
+
+    Returns ``(line_start, at_line_start)``, where *line_start* is the
+    offset of the first line in the unit (or ``None``) and
+    *at_line_start* is whether the unit ends with a newline.
+    """
+    line_start = None
+    offset = 0
+
+    for data in pieces:
+        if not data:
+            continue
+
+        if line_start is None:
+            if at_line_start:
+                line_start = offset
+            else:
+                i = data.find('\n') + 1
+                if 0 < i < len(data):
+                    line_start = offset + i
+
+        offset += len(data)
+        at_line_start = data.endswith('\n')
+
+    return line_start, at_line_start
+
+
+def _slice_pieces(pieces, start, stop=None):
+    """Yield the part of the data in *pieces* from offset *start* to
+    *stop* (or the end)."""
+    offset = 0
+    for data in pieces:
+        data_start = max(start - offset, 0)
+        if stop is None:
+            data_stop = len(data)
+        else:
+            data_stop = min(stop - offset, len(data))
+        offset += len(data)
+
+        if data_start < data_stop:
+            yield data[data_start:data_stop]
+
+        if stop is not None and offset >= stop:
+            return
+
+
+def _read_range(f, start, end):
+    """Yield the bytes from *start* to *end* of *f*, in chunks."""
+    f.seek(start)
+    while start < end:
+        chunk = f.read(min(_READ_SIZE, end - start))
+        if not chunk:
+            raise ValueError('unexpected end of file')
+        start += len(chunk)
+        yield chunk
+
+
+### gzip ###
+
+def _gunzip_members(f):
+    """Decompress the gzip members in *f*, and yield ``(data, end)``, where
+    *end* is the byte offset where the member ends if *data* is the last
+    of it, and ``None`` otherwise."""
+    decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    member_start = 0
+    pos = 0
+
+    try:
+        while True:
+            chunk = f.read(_READ_SIZE)
+            if not chunk:
+                break
+
+            while chunk:
+                data = decomp.decompress(chunk)
+                pos += len(chunk) - len(decomp.unused_data)
+
+                # unused_data is only set once we reach the end of a member
+                chunk = decomp.unused_data
+                if chunk:
+                    yield data, pos
+                    member_start = pos
+
+                    # ignore padding at the end of the file, like gzip does
+                    if not chunk.strip('\x00'):
+                        return
+
+                    decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                else:
+                    yield data, None
+
+        data = decomp.flush()
+    except zlib.error, e:
+        raise ValueError('bad gzip data: %s' % e)
+
+    if pos > member_start:
+        yield data, pos
+
+
+def _index_gzip(f):
+    """Find the gzip members in *f*, and where lines start in them."""
+    units = []
+
+    member_start = 0
+    line_start = None
+    size = 0
+    at_line_start = True
+
+    for data, member_end in _gunzip_members(f):
+        data_line_start, at_line_start = _find_line_start(
+            [data], at_line_start)
+        if line_start is None and data_line_start is not None:
+            line_start = size + data_line_start
+        size += len(data)
+
+        if member_end is not None:
+            units.append([member_start, member_end, line_start])
+            member_start = member_end
+            line_start = None
+            size = 0
+
+    return {'format': 'gzip', 'units': units}
+
+
+def _gunzip_unit(f, unit):
+    """Yield the decompressed data in a gzip member."""
+    decomp = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in _read_range(f, unit[0], unit[1]):
+        data = decomp.decompress(chunk)
+        if data:
+            yield data
+
+    data = decomp.flush()
+    if data:
+        yield data
+
+
+def _gzip_member(pieces):
+    """Compress *pieces* into a gzip member."""
+    comp = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    parts = [comp.compress(data) for data in pieces]
+    parts.append(comp.flush())
+    return ''.join(parts)
+
+
+def _write_gzip_split(f, out, units, first, stop, skip, finish):
+    if skip:
+        out.write(_gzip_member(
+            _slice_pieces(_gunzip_unit(f, units[first]), skip)))
+        first += 1
+
+    # members are contiguous, so copy them all at once
+    if first < stop:
+        for chunk in _read_range(f, units[first][0], units[stop - 1][1]):
+            out.write(chunk)
+
+    if finish:
+        out.write(_gzip_member(
+            _slice_pieces(_gunzip_unit(f, units[stop]), 0, finish)))
+
+
+### bzip2 ###
+
+def _magic_patterns(magic):
+    """Return a list of ``(shift, middle, first, first_mask, last,
+    last_mask)`` for each of the 8 ways the 48-bit number *magic* can be
+    aligned in a string of bytes.
+
+    *shift* is how many bits into its first byte *magic* starts. *middle*
+    is the 5 bytes that are entirely *magic*; *first* and *last* are the
+    bytes on either side of *middle*, which are only partly *magic*
+    (according to *first_mask* and *last_mask*).
+    """
+    patterns = []
+    for shift in xrange(8):
+        # 7 bytes, with magic starting *shift* bits in
+        data = unhexlify('%014x' % (magic << (8 - shift)))
+        patterns.append((shift, data[1:6],
+                         ord(data[0]), 0xff >> shift,
+                         ord(data[6]), (0xff << (8 - shift)) & 0xff))
+    return patterns
+
+
+def _find_bits(f, magics):
+    """Scan *f* for each 48-bit number in *magics*, and return a list of
+    the (sorted) bit offsets where each one appears."""
+    all_patterns = [_magic_patterns(magic) for magic in magics]
+    found = [set() for _ in magics]
+
+    f.seek(0)
+    buf = ''
+    buf_offset = 0
+
+    while True:
+        chunk = f.read(_READ_SIZE)
+        if not chunk:
+            break
+        buf += chunk
+
+        for patterns, bit_offsets in zip(all_patterns, found):
+            for shift, middle, first, first_mask, last, last_mask in patterns:
+                i = buf.find(middle, 1)
+                while i != -1:
+                    if (ord(buf[i - 1]) & first_mask == first and
+                        (not last_mask or (
+                            i + 5 < len(buf) and
+                            ord(buf[i + 5]) & last_mask == last))):
+                        bit_offsets.add((buf_offset + i - 1) * 8 + shift)
+                    i = buf.find(middle, i + 1)
+
+        # keep enough bytes to find magic numbers split across chunks
+        buf_offset += len(buf) - 6
+        buf = buf[-6:]
+
+    return [sorted(bit_offsets) for bit_offsets in found]
+
+
+def _read_bits(f, start_bit, end_bit):
+    """Read the bits from *start_bit* to *end_bit* of *f*, and return
+    them as a number."""
+    start = start_bit // 8
+    f.seek(start)
+    data = f.read((end_bit + 7) // 8 - start)
+    if len(data) * 8 < end_bit - start * 8:
+        raise ValueError('unexpected end of file')
+
+    value = int(hexlify(data), 16) >> (len(data) * 8 - (end_bit - start * 8))
+    return value & ((1 << (end_bit - start_bit)) - 1)
+
+
+class _BitWriter(object):
+    """Write numbers of any number of bits to a file."""
+
+    def __init__(self, f):
+        self._f = f
+        self._value = 0
+        self._num_bits = 0
+
+    def write(self, value, num_bits):
+        value = (self._value << num_bits) | value
+        num_bits += self._num_bits
+
+        extra_bits = num_bits % 8
+        num_bytes = num_bits // 8
+        if num_bytes:
+            self._f.write(
+                unhexlify('%0*x' % (num_bytes * 2, value >> extra_bits)))
+
+        self._value = value & ((1 << extra_bits) - 1)
+        self._num_bits = extra_bits
+
+    def flush(self):
+        """Pad the last byte with zeros."""
+        if self._num_bits:
+            self.write(0, 8 - self._num_bits)
+
+
+def _write_bzip2_stream(f, blocks):
+    """Write a bzip2 stream containing *blocks*, an iterable of
+    ``(bits, num_bits, crc)``."""
+    # blocks compressed at any level fit in a level 9 stream
+    f.write('BZh9')
+
+    writer = _BitWriter(f)
+    combined_crc = 0
+    for bits, num_bits, crc in blocks:
+        writer.write(bits, num_bits)
+        combined_crc = ((combined_crc << 1) | (combined_crc >> 31)) ^ crc
+        combined_crc &= 0xffffffff
+
+    writer.write(_BZIP2_EOS_MAGIC, _BZIP2_MAGIC_BITS)
+    writer.write(combined_crc, _BZIP2_CRC_BITS)
+    writer.flush()
+
+
+def _bzip2_blocks(f):
+    """Find the blocks in bzip2 data in *f*, and return a list of
+    ``[start_bit, end_bit, crc]``."""
+    f.seek(0)
+    if not f.read(3) == 'BZh':
+        raise ValueError('not bzip2 data')
+
+    block_starts, eos_starts = _find_bits(
+        f, [_BZIP2_BLOCK_MAGIC, _BZIP2_EOS_MAGIC])
+
+    # a block ends where the next block or the end of its stream starts
+    ends = sorted(block_starts[1:] + eos_starts)
+
+    blocks = []
+    i = 0
+    for start in block_starts:
+        while i < len(ends) and ends[i] <= start:
+            i += 1
+        if i == len(ends):
+            raise ValueError('bzip2 data is truncated')
+        end = ends[i]
+
+        header_bits = _BZIP2_MAGIC_BITS + _BZIP2_CRC_BITS
+        if end - start < header_bits:
+            raise ValueError('bad bzip2 block at bit %d' % start)
+        crc = _read_bits(f, start + _BZIP2_MAGIC_BITS, start + header_bits)
+
+        blocks.append([start, end, crc])
+
+    return blocks
+
+
+def _bunzip2_block(bits, num_bits, crc):
+    """Decompress a single bzip2 block."""
+    if bz2 is None:
+        raise Exception('bz2 module was not successfully imported'
+                        ' (likely not installed).')
+    stream = StringIO()
+    _write_bzip2_stream(stream, [(bits, num_bits, crc)])
+    try:
+        return bz2.decompress(stream.getvalue())
+    except (EOFError, IOError), e:
+        raise ValueError('bad bzip2 block: %s' % e)
+
+
+def _index_bzip2(f):
+    """Find the blocks in *f*, and where lines start in them."""
+    units = []
+
+    at_line_start = True
+    for start, end, crc in _bzip2_blocks(f):
+        data = _bunzip2_block(_read_bits(f, start, end), end - start, crc)
+        line_start, at_line_start = _find_line_start([data], at_line_start)
+        units.append([start, end, line_start, crc])
+
+    return {'format': 'bzip2', 'units': units}
+
+
+def _recompress_bzip2(data):
+    """Compress *data*, and yield the blocks as ``(bits, num_bits, crc)``
+    so that we can put them in a bzip2 stream of our own."""
+    if not data:
+        return
+
+    f = StringIO(bz2.compress(data, 9))
+    for start, end, crc in _bzip2_blocks(f):
+        yield _read_bits(f, start, end), end - start, crc
+
+
+def _write_bzip2_split(f, out, units, first, stop, skip, finish):
+    def blocks():
+        for i in xrange(first, stop):
+            start, end, _, crc = units[i]
+            bits = _read_bits(f, start, end)
+            if i == first and skip:
+                data = _bunzip2_block(bits, end - start, crc)[skip:]
+                for block in _recompress_bzip2(data):
+                    yield block
+            else:
+                yield bits, end - start, crc
+
+        if finish:
+            start, end, _, crc = units[stop]
+            data = _bunzip2_block(
+                _read_bits(f, start, end), end - start, crc)[:finish]
+            for block in _recompress_bzip2(data):
+                yield block
+
+    _write_bzip2_stream(out, blocks())
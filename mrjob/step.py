@@ -20,7 +20,7 @@ STEP_TYPES = ('streaming', 'jar')
 
 # Function names mapping to mapper, reducer, and combiner operations
 _MAPPER_FUNCS = ('mapper', 'mapper_init', 'mapper_final', 'mapper_cmd',
-                 'mapper_pre_filter')
+                 'mapper_pre_filter', 'mapper_batch', 'mapper_merge')
 _COMBINER_FUNCS = ('combiner', 'combiner_init', 'combiner_final',
                    'combiner_cmd', 'combiner_pre_filter')
 _REDUCER_FUNCS = ('reducer', 'reducer_init', 'reducer_final', 'reducer_cmd',
@@ -29,8 +29,28 @@ _HADOOP_OPTS = ('jobconf',)
 
 # params to specify how to run the step. need at least one of these
 _JOB_STEP_FUNC_PARAMS = _MAPPER_FUNCS + _COMBINER_FUNCS + _REDUCER_FUNCS
-# all allowable step params
+# all step params that can be defined as methods of MRJob
 _JOB_STEP_PARAMS = _JOB_STEP_FUNC_PARAMS + _HADOOP_OPTS
+# params that control how mrjob runs the step's Python code, mapped to
+# the function they apply to
+_MRJOB_STEP_OPT_FUNCS = {
+    'mapper_batch_size': 'mapper_batch',
+    'mapper_merge_max_bytes': 'mapper_merge',
+    'mapper_merge_max_entries': 'mapper_merge',
+}
+_MRJOB_STEP_OPTS = tuple(sorted(_MRJOB_STEP_OPT_FUNCS))
+
+# how many input records to pass to mapper_batch() at a time, by default
+DEFAULT_MAPPER_BATCH_SIZE = 1000
+
+# how many distinct keys mapper_merge holds in memory before writing them
+# out, by default
+DEFAULT_MAPPER_MERGE_MAX_ENTRIES = 10000
+
+_MRJOB_STEP_OPT_DEFAULTS = {
+    'mapper_batch_size': DEFAULT_MAPPER_BATCH_SIZE,
+    'mapper_merge_max_entries': DEFAULT_MAPPER_MERGE_MAX_ENTRIES,
+}
 
 
 log = logging.getLogger('mrjob.step')
@@ -51,7 +71,8 @@ class MRJobStep(object):
 
     def __init__(self, **kwargs):
         # limit which keyword args can be specified
-        bad_kwargs = sorted(set(kwargs) - set(_JOB_STEP_PARAMS))
+        bad_kwargs = sorted(
+            set(kwargs) - set(_JOB_STEP_PARAMS + _MRJOB_STEP_OPTS))
         if bad_kwargs:
             raise TypeError(
                 'mr() got an unexpected keyword argument %r' % bad_kwargs[0])
@@ -68,12 +89,14 @@ class MRJobStep(object):
         self.has_explicit_reducer = any(
             name for name in kwargs if name in _REDUCER_FUNCS)
 
-        steps = dict((f, None) for f in _JOB_STEP_PARAMS)
+        steps = dict((f, None)
+                     for f in _JOB_STEP_PARAMS + _MRJOB_STEP_OPTS)
 
         steps.update(kwargs)
 
         def _prefix_set(prefix):
-            return set(k for k in steps if k.startswith(prefix) and steps[k])
+            return set(k for k in _JOB_STEP_FUNC_PARAMS
+                       if k.startswith(prefix) and steps[k])
 
         def _check_cmd(cmd, prefix_set):
             if len(prefix_set) > 1 and cmd in prefix_set:
@@ -85,6 +108,21 @@ class MRJobStep(object):
         _check_cmd('combiner_cmd', _prefix_set('combiner'))
         _check_cmd('reducer_cmd', _prefix_set('reducer'))
 
+        if steps['mapper'] and steps['mapper_batch']:
+            raise ValueError("Can't specify both mapper and mapper_batch")
+
+        for opt in _MRJOB_STEP_OPTS:
+            if steps[opt] is None:
+                continue
+            func = _MRJOB_STEP_OPT_FUNCS[opt]
+            if not steps[func]:
+                raise ValueError(
+                    "Can't specify %s without %s" % (opt, func))
+            if not (isinstance(steps[opt], (int, long)) and steps[opt] > 0):
+                raise ValueError(
+                    '%s must be a positive integer, not %r' % (
+                        opt, steps[opt]))
+
         self._steps = steps
 
     def __repr__(self):
@@ -113,6 +151,9 @@ class MRJobStep(object):
         if (key == 'combiner' and self._steps['combiner'] is None and
             self.has_explicit_combiner):
             return _IDENTITY_REDUCER
+        if (key in _MRJOB_STEP_OPT_DEFAULTS and self._steps[key] is None and
+            self._steps[_MRJOB_STEP_OPT_FUNCS[key]]):
+            return _MRJOB_STEP_OPT_DEFAULTS[key]
         return self._steps[key]
 
     def _render_substep(self, cmd_key, pre_filter_key=None):
@@ -132,7 +173,10 @@ class MRJobStep(object):
             return substep
 
     def render_mapper(self):
-        return self._render_substep('mapper_cmd', 'mapper_pre_filter')
+        substep = self._render_substep('mapper_cmd', 'mapper_pre_filter')
+        if self._steps['mapper_batch']:
+            substep['batch_size'] = self['mapper_batch_size']
+        return substep
 
     def render_combiner(self):
         return self._render_substep('combiner_cmd', 'combiner_pre_filter')
@@ -0,0 +1,376 @@
+# Copyright 2009-2012 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Encode and decode Hadoop's *typed bytes*, the binary format Hadoop
+Streaming uses when you pass it ``-io typedbytes``.
+
+Each object is a one-byte type code followed by its data. A record is just
+a key followed by a value; there are no tabs or newlines, and nothing needs
+to be escaped.
+
+Python objects are encoded like this:
+
+============= ================= ===============
+Python        typed bytes       decoded as
+============= ================= ===============
+``str``       bytes (0)         ``str``
+``bool``      bool (2)          ``bool``
+``int``       int (3) or        ``int``
+              long (4)
+``float``     double (6)        ``float``
+``unicode``   string (7)        ``unicode``
+``tuple``     vector (8)        ``tuple``
+``list``      list (9)          ``list``
+``dict``      map (10)          ``dict``
+anything else pickle (100)      (unpickled)
+============= ================= ===============
+
+We also decode byte (1), float (5), and any other application-specific type
+(50-200), which we return as a ``str``.
+"""
+# don't add imports here that aren't part of the standard Python library,
+# since MRJobs need to run in Amazon's generic EMR environment
+import cPickle
+import struct
+import sys
+
+# type codes
+BYTES = 0
+BYTE = 1
+BOOL = 2
+INT = 3
+LONG = 4
+FLOAT = 5
+DOUBLE = 6
+STRING = 7
+VECTOR = 8
+LIST = 9
+MAP = 10
+PICKLE = 100  # application-specific type code for pickled Python objects
+MARKER = 255  # ends a list
+
+_INT32 = struct.Struct('>i')
+_BYTES_HEADER = struct.Struct('>Bi')
+
+_MIN_INT = -2 ** 31
+_MAX_INT = 2 ** 31 - 1
+_MIN_LONG = -2 ** 63
+_MAX_LONG = 2 ** 63 - 1
+
+# size of the data that follows fixed-size type codes
+_FIXED_SIZES = {BYTE: 1, BOOL: 1, INT: 4, LONG: 8, FLOAT: 4, DOUBLE: 8}
+
+
+def _is_length_prefixed(code):
+    return code in (BYTES, STRING) or 50 <= code <= 200
+
+
+### encoding ###
+
+def _encode(obj, out):
+    """Encode *obj* as typed bytes, passing strings to *out*."""
+    t = type(obj)
+
+    if t is str:
+        out(struct.pack('>Bi', BYTES, len(obj)))
+        out(obj)
+    elif t is unicode:
+        obj = obj.encode('utf_8')
+        out(struct.pack('>Bi', STRING, len(obj)))
+        out(obj)
+    elif t is bool:
+        out(struct.pack('>BB', BOOL, obj))
+    elif (t is int or t is long) and _MIN_INT <= obj <= _MAX_INT:
+        out(struct.pack('>Bi', INT, obj))
+    elif (t is int or t is long) and _MIN_LONG <= obj <= _MAX_LONG:
+        out(struct.pack('>Bq', LONG, obj))
+    elif t is float:
+        out(struct.pack('>Bd', DOUBLE, obj))
+    elif t is tuple:
+        out(struct.pack('>Bi', VECTOR, len(obj)))
+        for item in obj:
+            _encode(item, out)
+    elif t is list:
+        out(chr(LIST))
+        for item in obj:
+            _encode(item, out)
+        out(chr(MARKER))
+    elif t is dict:
+        out(struct.pack('>Bi', MAP, len(obj)))
+        for key, value in obj.iteritems():
+            _encode(key, out)
+            _encode(value, out)
+    else:
+        data = cPickle.dumps(obj, cPickle.HIGHEST_PROTOCOL)
+        out(struct.pack('>Bi', PICKLE, len(data)))
+        out(data)
+
+
+def dumps(obj):
+    """Encode *obj* as typed bytes, and return a ``str``."""
+    parts = []
+    _encode(obj, parts.append)
+    return ''.join(parts)
+
+
+def dumps_bytes(data):
+    """Encode a ``str`` as typed bytes (type code 0). Same as
+    ``dumps(data)``, but faster, and raises :py:exc:`TypeError` for
+    anything that isn't a ``str``."""
+    if type(data) is not str:
+        raise TypeError('expected str, not %s' % type(data).__name__)
+    return _BYTES_HEADER.pack(BYTES, len(data)) + data
+
+
+### decoding ###
+
+def _read_length_prefixed(data, pos):
+    (length,) = _INT32.unpack_from(data, pos)
+    pos += 4
+    end = pos + length
+    if length < 0 or end > len(data):
+        raise ValueError('truncated typed bytes')
+    return data[pos:end], end
+
+
+def _decode(data, pos):
+    """Decode the object starting at *pos* in *data*. Return
+    ``(obj, end)``, where *end* is the position after the object."""
+    code = ord(data[pos])
+    pos += 1
+
+    if code == BYTES:
+        return _read_length_prefixed(data, pos)
+    elif code == STRING:
+        value, pos = _read_length_prefixed(data, pos)
+        return value.decode('utf_8'), pos
+    elif code == INT:
+        return _INT32.unpack_from(data, pos)[0], pos + 4
+    elif code == LONG:
+        return struct.unpack_from('>q', data, pos)[0], pos + 8
+    elif code == DOUBLE:
+        return struct.unpack_from('>d', data, pos)[0], pos + 8
+    elif code == BOOL:
+        return data[pos] != '\x00', pos + 1
+    elif code == BYTE:
+        return struct.unpack_from('>b', data, pos)[0], pos + 1
+    elif code == FLOAT:
+        return struct.unpack_from('>f', data, pos)[0], pos + 4
+    elif code == VECTOR:
+        (length,) = _INT32.unpack_from(data, pos)
+        pos += 4
+        items = []
+        for _ in xrange(length):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return tuple(items), pos
+    elif code == LIST:
+        items = []
+        while data[pos] != '\xff':
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return items, pos + 1
+    elif code == MAP:
+        (length,) = _INT32.unpack_from(data, pos)
+        pos += 4
+        d = {}
+        for _ in xrange(length):
+            key, pos = _decode(data, pos)
+            value, pos = _decode(data, pos)
+            d[key] = value
+        return d, pos
+    elif code == PICKLE:
+        value, pos = _read_length_prefixed(data, pos)
+        return cPickle.loads(value), pos
+    elif _is_length_prefixed(code):
+        return _read_length_prefixed(data, pos)
+    else:
+        raise ValueError('unknown typed bytes type code: %d' % code)
+
+
+def decode(data, pos=0):
+    """Decode the object starting at *pos* in *data*, and return
+    ``(obj, end)``, where *end* is the position just after it."""
+    try:
+        return _decode(data, pos)
+    except (IndexError, struct.error):
+        raise ValueError('truncated typed bytes')
+
+
+def decode_raw(data, pos=0):
+    """Return the data of the length-prefixed object (bytes, string, or
+    application-specific type) starting at *pos* in *data*, as a ``str``,
+    without decoding it. Return ``(raw_data, end)``, where *end* is the
+    position just after the object. Raise :py:exc:`ValueError` if the
+    object is of some other type."""
+    try:
+        code = ord(data[pos])
+        if not _is_length_prefixed(code):
+            raise ValueError('expected bytes or string, not typed bytes'
+                             ' type code %d' % code)
+        return _read_length_prefixed(data, pos + 1)
+    except (IndexError, struct.error):
+        raise ValueError('truncated typed bytes')
+
+
+def loads(data):
+    """Decode a ``str`` containing exactly one typed bytes object."""
+    obj, end = decode(data)
+    if end != len(data):
+        raise ValueError('%d extra bytes after typed bytes object' %
+                         (len(data) - end))
+    return obj
+
+
+### records ###
+
+class _Incomplete(Exception):
+    """We need at least *need* bytes of data to get to the end of the
+    current object."""
+
+    def __init__(self, need):
+        Exception.__init__(self, need)
+        self.need = need
+
+
+def _object_end(data, pos):
+    """Find the end of the object starting at *pos* in *data* without
+    decoding it. Raise :py:class:`_Incomplete` if *data* is too short."""
+    if pos >= len(data):
+        raise _Incomplete(pos + 1)
+
+    code = ord(data[pos])
+    pos += 1
+
+    if code in _FIXED_SIZES:
+        end = pos + _FIXED_SIZES[code]
+    elif _is_length_prefixed(code):
+        if pos + 4 > len(data):
+            raise _Incomplete(pos + 4)
+        length = _INT32.unpack_from(data, pos)[0]
+        if length < 0:
+            raise ValueError('negative typed bytes length: %d' % length)
+        end = pos + 4 + length
+    elif code in (VECTOR, MAP):
+        if pos + 4 > len(data):
+            raise _Incomplete(pos + 4)
+        num_items = _INT32.unpack_from(data, pos)[0]
+        if num_items < 0:
+            raise ValueError('negative typed bytes length: %d' % num_items)
+        if code == MAP:
+            num_items *= 2
+        end = pos + 4
+        for _ in xrange(num_items):
+            end = _object_end(data, end)
+    elif code == LIST:
+        end = pos
+        while True:
+            if end >= len(data):
+                raise _Incomplete(end + 1)
+            if data[end] == '\xff':
+                end += 1
+                break
+            end = _object_end(data, end)
+    else:
+        raise ValueError('unknown typed bytes type code: %d' % code)
+
+    if end > len(data):
+        raise _Incomplete(end)
+
+    return end
+
+
+def key_end(record):
+    """Return the position in *record* where its value starts (i.e.
+    ``record[:key_end(record)]`` is the raw key)."""
+    try:
+        return _object_end(record, 0)
+    except _Incomplete:
+        raise ValueError('truncated typed bytes')
+
+
+def chunks_to_record_lists(chunks):
+    """Take an iterator of chunks of bytes, which may start and end in the
+    middle of records, and yield a list of complete typed bytes records
+    (key followed by value) for each chunk.
+
+    Records that span chunks are only re-scanned once we have as many bytes
+    as we know they need, so large records don't make this quadratic. If
+    the input ends in the middle of a record, the leftover bytes are
+    yielded as a record of their own (which won't decode).
+    """
+    pending = []  # pieces of a record that spans more than one chunk
+    pending_len = 0
+    need = 0
+
+    for chunk in chunks:
+        if pending:
+            pending.append(chunk)
+            pending_len += len(chunk)
+            if pending_len < need:
+                continue
+            data = ''.join(pending)
+            pending = []
+        else:
+            data = chunk
+
+        records = []
+        pos = 0
+        while pos < len(data):
+            try:
+                end = _object_end(data, _object_end(data, pos))
+            except _Incomplete, e:
+                need = e.need - pos
+                break
+            records.append(data[pos:end])
+            pos = end
+
+        if pos < len(data):
+            pending = [data[pos:]]
+            pending_len = len(data) - pos
+
+        if records:
+            yield records
+
+    if pending:
+        yield [''.join(pending)]
+
+
+def sort_records(records):
+    """Sort typed bytes *records* by their raw keys, like Hadoop does."""
+    return sorted(records, key=lambda record: record[:key_end(record)])
+
+
+def main(stdin=None, stdout=None):
+    """Sort the typed bytes records from *stdin* by key, and write them to
+    *stdout*. This is how the local runner sorts typed bytes mapper output
+    before passing it to a combiner."""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+
+    def read_chunks():
+        while True:
+            chunk = stdin.read(65536)
+            if not chunk:
+                return
+            yield chunk
+
+    records = [record for records in chunks_to_record_lists(read_chunks())
+               for record in records]
+    for record in sort_records(records):
+        stdout.write(record)
+    stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
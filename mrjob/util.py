@@ -23,32 +23,147 @@ import contextlib
 from copy import deepcopy
 from datetime import timedelta
 import glob
-import gzip
 import hashlib
 import itertools
 import logging
+import mmap
 import os
 import pipes
+from Queue import Full
+from Queue import Queue
+import re
 import shlex
+import stat
 import sys
 import tarfile
+import threading
 import zipfile
 
 try:
-    import bz2
-    bz2  # redefine bz2 for pepflakes
+    from cStringIO import StringIO
+    StringIO  # quiet "redefinition of unused ..." warning from pyflakes
 except ImportError:
-    bz2 = None
+    from StringIO import StringIO
+
+from mrjob.compression import _find_command
+from mrjob.compression import _pipe_chunks
+from mrjob.compression import get_codec
 
 #: .. deprecated:: 0.4
 is_ironpython = "IronPython" in sys.version
 
 
+#: Default number of bytes to read at a time from input files (see
+#: :py:func:`read_input_blocks`)
+DEFAULT_INPUT_CHUNK_SIZE = 256 * 1024
+
+#: Default number of bytes :py:class:`BufferedLineWriter` holds before
+#: writing them out
+DEFAULT_OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+#: Commands to try, in order, to decompress files in a separate process
+#: when reading input with *decompress_in_background* (see
+#: :py:func:`read_file_chunks`). Each is followed by the path of the file
+#: and should write the decompressed data to stdout.
+BACKGROUND_DECOMPRESS_COMMANDS = {
+    '.gz': [['pigz', '-dc'], ['gzip', '-dc']],
+    '.bz2': [['pbzip2', '-dc'], ['lbzip2', '-dc'], ['bzip2', '-dc']],
+}
+
+# how many decompressed chunks a background thread may get ahead of the
+# task (see _decompress_chunks_in_thread())
+_BACKGROUND_QUEUE_SIZE = 8
+
+
 class NullHandler(logging.Handler):
     def emit(self, record):
         pass
 
 
+class BufferedLineWriter(object):
+    """Collect lines in memory and write them to *fileobj* in large chunks,
+    rather than making a call to ``write()`` for every line.
+
+    Used by :py:class:`~mrjob.job.MRJob` to write task output.
+
+    *lines_written* and *bytes_written* count the lines (and their
+    newlines) written out so far; they're only updated when we flush.
+    """
+
+    def __init__(self, fileobj, buffer_size=DEFAULT_OUTPUT_BUFFER_SIZE,
+                 newline='\n'):
+        """
+        :param fileobj: file object to write to
+        :type buffer_size: int
+        :param buffer_size: flush once we have at least this many bytes
+                            buffered. If this is zero or less, we flush
+                            after every line.
+        :type newline: str
+        :param newline: what to write after each line. Use ``''`` to write
+                        records that frame themselves (e.g. typed bytes)
+                        back-to-back.
+        """
+        self._fileobj = fileobj
+        self._buffer_size = buffer_size
+        self._newline = newline
+        self._lines = []
+        self._num_bytes = 0
+        # lines in the buffer beyond one per entry in _lines (see
+        # write_lines())
+        self._num_extra_lines = 0
+
+        self.lines_written = 0
+        self.bytes_written = 0
+
+    def write_line(self, line):
+        """Buffer *line* (which should not include a trailing newline),
+        flushing the buffer if it's full."""
+        # match print's behavior when writing to a stream with no encoding
+        if isinstance(line, unicode):
+            line = line.encode('ascii')
+
+        self._lines.append(line)
+        self._num_bytes += len(line) + len(self._newline)
+
+        if self._num_bytes >= self._buffer_size:
+            self.flush()
+
+    def write_lines(self, lines):
+        """Buffer a list of *lines* (which should not include trailing
+        newlines), flushing the buffer if it's full.
+
+        If the lines can't be encoded, raise an exception without buffering
+        any of them."""
+        if not lines:
+            return
+
+        chunk = self._newline.join(lines)
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode('ascii')
+
+        self._lines.append(chunk)
+        self._num_bytes += len(chunk) + len(self._newline)
+        self._num_extra_lines += len(lines) - 1
+
+        if self._num_bytes >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write out all buffered lines, and flush *fileobj*."""
+        if self._lines:
+            self.lines_written += len(self._lines) + self._num_extra_lines
+            self.bytes_written += self._num_bytes
+
+            # add an empty "line" so we get a trailing newline for free
+            self._lines.append('')
+            self._fileobj.write(self._newline.join(self._lines))
+            self._lines = []
+            self._num_bytes = 0
+            self._num_extra_lines = 0
+
+        self._fileobj.flush()
+
+
 def bash_wrap(cmd_str):
     """Escape single quotes in a shell command string and wrap it with ``bash
     -c '<string>'``.
@@ -63,20 +178,63 @@ def bash_wrap(cmd_str):
 def buffer_iterator_to_line_iterator(iterator):
     """boto's file iterator splits by buffer size instead of by newline. This
     wrapper puts them back into lines.
+
+    This uses :py:func:`chunks_to_line_lists`, so it takes linear time,
+    no matter how many lines are in each buffer or how many buffers a line
+    spans.
     """
-    buf = iterator.next()  # might raise StopIteration, but that's okay
-    while True:
-        if '\n' in buf:
-            (line, buf) = buf.split('\n', 1)
+    for lines in chunks_to_line_lists(iterator):
+        for line in lines:
             yield line + '\n'
-        else:
-            try:
-                more = iterator.next()
-                buf += more
-            except StopIteration:
-                if buf:
-                    yield buf + '\n'
-                return
+
+
+def chunks_to_line_lists(chunks, strip_cr=False):
+    """Take an iterator of chunks of bytes, which may start and end in the
+    middle of lines, and yield a list of complete lines (without trailing
+    newlines) for each chunk.
+
+    Each chunk is split all at once, and lines that span chunks are
+    assembled with a single join, so this runs in linear time no matter
+    how long the lines and chunks are. If the last line doesn't have a
+    trailing newline, it's yielded in a list by itself.
+
+    :type strip_cr: bool
+    :param strip_cr: if true, also strip trailing carriage returns from each
+                     line (like ``line.rstrip('\\r\\n')``)
+    """
+    pieces = []  # pieces of a line that spans more than one chunk
+
+    for chunk in chunks:
+        lines = chunk.split('\n')
+
+        if len(lines) == 1:
+            # no newline; keep reading
+            if chunk:
+                pieces.append(chunk)
+            continue
+
+        if pieces:
+            pieces.append(lines[0])
+            lines[0] = ''.join(pieces)
+            pieces = []
+            if strip_cr:
+                lines[0] = lines[0].rstrip('\r')
+
+        # the last element is the start of the next line (or '')
+        last = lines.pop()
+        if last:
+            pieces.append(last)
+
+        if strip_cr and '\r' in chunk:
+            lines = [line.rstrip('\r') for line in lines]
+
+        yield lines
+
+    if pieces:
+        line = ''.join(pieces)
+        if strip_cr:
+            line = line.rstrip('\r')
+        yield [line]
 
 
 def cmd_line(args):
@@ -311,6 +469,159 @@ def parse_and_save_options(option_parser, args):
     return arg_map
 
 
+# a token in a repr(), with the comma or colon before it (if any). Numbers,
+# None, True, and False are all "words", which _parse_repr_tokens() checks
+# more carefully. Anything else becomes a one-character token that it
+# rejects.
+_REPR_TOKEN_RE = re.compile(r"""
+    [ \t\n]*([,:]?)[ \t\n]*(
+        [\[\](){}] |
+        '[^'\\\n]*(?:\\[^\n][^'\\\n]*)*' |
+        "[^"\\\n]*(?:\\[^\n][^"\\\n]*)*" |
+        [uUbB]'[^'\\\n]*(?:\\[^\n][^'\\\n]*)*' |
+        [uUbB]"[^"\\\n]*(?:\\[^\n][^"\\\n]*)*" |
+        [-+.\w]+ |
+        [\s\S]
+    )""", re.VERBOSE)
+
+_REPR_CONSTS = {'None': None, 'True': True, 'False': False}
+
+_REPR_BRACKETS = {'[': ']', '(': ')', '{': '}'}
+
+
+class _NotARepr(Exception):
+    """Raised by :py:func:`_parse_repr_tokens` when it finds something it
+    doesn't understand."""
+
+
+def _parse_repr_number(token):
+    """Decode an int, long, or float token, or raise
+    :py:exc:`ValueError`."""
+    if '.' in token or 'e' in token or 'E' in token:
+        # float() also accepts inf and nan, which aren't literals
+        if token[-1] not in '0123456789.':
+            raise ValueError
+        return float(token)
+
+    digits = token.lstrip('-')
+    if digits[:1] == '0' and len(digits.rstrip('lL')) > 1:
+        raise ValueError  # octal
+
+    if token[-1] in 'lL':
+        return long(token[:-1])
+    else:
+        return int(token)
+
+
+def _parse_repr_tokens(tokens):
+    """Parse a list of ``(separator, token)`` from
+    :py:data:`_REPR_TOKEN_RE` into a single value. This handles nesting
+    with a stack rather than recursion, since function calls are
+    expensive."""
+    brackets = _REPR_BRACKETS
+
+    # containers we're inside, as (open_token, items, sep_needed)
+    stack = []
+    open_token = items = None
+    # the separator the next value needs in front of it
+    sep_needed = ''
+
+    for sep, token in tokens:
+        first = token[0]
+
+        if first in ')]}':
+            if (open_token is None or open_token == '$' or
+                    first != brackets[open_token] or
+                    not (sep == '' or sep == ',' and items) or
+                    (open_token == '{' and sep_needed == ':')):
+                raise _NotARepr
+
+            if open_token == '[':
+                value = items
+            elif open_token == '{':
+                value = dict(zip(items[::2], items[1::2]))
+            elif len(items) == 1 and sep != ',':
+                value = items[0]  # just parentheses, not a tuple
+            else:
+                value = tuple(items)
+            open_token, items, sep_needed = stack.pop()
+        elif sep != sep_needed:
+            raise _NotARepr
+        elif first in '[({':
+            stack.append((open_token, items, sep_needed))
+            open_token = first
+            items = []
+            sep_needed = ''
+            continue
+        elif first == "'" or first == '"':
+            if len(token) < 2:
+                raise _NotARepr
+            value = token[1:-1]
+            if '\\' in value:
+                value = value.decode('string_escape')
+        elif first in '0123456789-.':
+            value = _parse_repr_number(token)
+        elif token in _REPR_CONSTS:
+            value = _REPR_CONSTS[token]
+        elif len(token) < 3 or token[1] not in '\'"':
+            raise _NotARepr
+        elif first in 'uU':
+            value = token[2:-1].decode('unicode_escape')
+        elif first in 'bB':
+            value = token[2:-1]
+            if '\\' in value:
+                value = value.decode('string_escape')
+        else:
+            raise _NotARepr
+
+        if open_token is None:
+            # that's the whole thing; nothing may follow
+            result = value
+            open_token = '$'
+            sep_needed = None
+        elif open_token == '{' and sep_needed != ':':
+            items.append(value)  # a key
+            sep_needed = ':'
+        else:
+            items.append(value)
+            sep_needed = ','
+
+    if open_token != '$':
+        raise _NotARepr
+
+    return result
+
+
+def parse_repr(expr):
+    """Decode the :py:func:`repr` of an int, long, float, string, tuple,
+    list, dict, ``None``, ``True``, or ``False`` (or any combination of
+    these), without compiling any Python.
+
+    Anything else (e.g. sets) is handed to :py:func:`safeeval`, so this
+    returns what ``safeeval(expr)`` would, just faster.
+    """
+    if not isinstance(expr, str):
+        return safeeval(expr)
+
+    # fast paths for plain strings and ints
+    if expr:
+        first = expr[0]
+        if first == "'" or first == '"':
+            body = expr[1:-1]
+            if (len(expr) > 1 and expr[-1] == first and first not in body and
+                    '\\' not in body and '\n' not in body):
+                return body
+        elif expr.isdigit():
+            if first != '0' or len(expr) == 1:
+                return int(expr)
+
+    try:
+        return _parse_repr_tokens(
+            _REPR_TOKEN_RE.findall(expr.rstrip(' \t\n')))
+    except (_NotARepr, ValueError):
+        return safeeval(expr)
+
+
 def populate_option_groups_with_options(assignments, indexed_options):
     """Given a dictionary mapping :py:class:`OptionGroup` and
     :py:class:`OptionParser` objects to a list of strings represention option
@@ -340,11 +651,39 @@ def populate_option_groups_with_options(assignments, indexed_options):
                                        key=lambda item: item.get_opt_string())
 
 
+def _expand_input_path(path):
+    """Resolve globs in *path*, and recurse through directories, yielding
+    the paths of the files to read."""
+    # resolve globs
+    paths = glob.glob(path)
+    if not paths:
+        raise IOError(2, 'No such file or directory: %r' % path)
+    elif len(paths) > 1:
+        for path in paths:
+            for file_path in _expand_input_path(path):
+                yield file_path
+        return
+    else:
+        path = paths[0]
+
+    # recurse through directories
+    if os.path.isdir(path):
+        for dirname, _, filenames in os.walk(path):
+            for filename in filenames:
+                for file_path in _expand_input_path(
+                        os.path.join(dirname, filename)):
+                    yield file_path
+        return
+
+    yield path
+
+
 def read_input(path, stdin=None):
     """Stream input the way Hadoop would.
 
     - Resolve globs (``foo_*.gz``).
-    - Decompress ``.gz`` and ``.bz2`` files.
+    - Decompress ``.gz``, ``.bz2``, etc. files (see
+      :py:mod:`mrjob.compression`).
     - If path is ``'-'``, read from stdin
     - If path is a directory, recursively read its contents.
 
@@ -360,77 +699,325 @@ def read_input(path, stdin=None):
             yield line
         return
 
-    # resolve globs
-    paths = glob.glob(path)
-    if not paths:
-        raise IOError(2, 'No such file or directory: %r' % path)
-    elif len(paths) > 1:
-        for path in paths:
-            for line in read_input(path, stdin=stdin):
-                yield line
-        return
-    else:
-        path = paths[0]
+    # read from files
+    for file_path in _expand_input_path(path):
+        for line in read_file(file_path):
+            yield line
 
-    # recurse through directories
-    if os.path.isdir(path):
-        for dirname, _, filenames in os.walk(path):
-            for filename in filenames:
-                for line in read_input(os.path.join(dirname, filename),
-                                       stdin=stdin):
-                    yield line
+
+def read_input_blocks(path, stdin=None, chunk_size=DEFAULT_INPUT_CHUNK_SIZE,
+                      chunks_to_records=None, decompress_in_background=False):
+    """Like :py:func:`read_input`, but read input *chunk_size* bytes at a
+    time, and yield lists of lines, with trailing ``\\r`` and ``\\n``
+    stripped.
+
+    This is a lot faster than :py:func:`read_input` when you have many
+    short lines, because it splits each chunk into lines all at once.
+
+    *stdin* may be any iterable that yields lines (e.g. a list); if it
+    doesn't have a ``read()`` method, we read it a line at a time.
+
+    If your input isn't made of lines, set *chunks_to_records* to a function
+    that takes an iterator of chunks of bytes and yields lists of records
+    (e.g. :py:func:`mrjob.typedbytes.chunks_to_record_lists`). In that case,
+    if *stdin* is an iterable, each thing it yields is treated as a chunk.
+
+    *decompress_in_background* is passed through to
+    :py:func:`read_file_chunks`. Uncompressed files are read with
+    :py:func:`read_file_range`.
+    """
+    if stdin is None:
+        stdin = sys.stdin
+
+    # handle '-' (special case)
+    if path == '-':
+        if chunks_to_records:
+            if hasattr(stdin, 'read'):
+                chunks = _read_chunks(stdin, chunk_size)
+            else:
+                chunks = iter(stdin)
+            for records in chunks_to_records(chunks):
+                yield records
+        elif hasattr(stdin, 'read'):
+            chunks = _read_chunks(stdin, chunk_size)
+            for lines in chunks_to_line_lists(chunks, strip_cr=True):
+                yield lines
+        else:
+            # stdin is just an iterable of lines
+            lines = iter(stdin)
+            while True:
+                block = [line.rstrip('\r\n') for line in
+                         itertools.islice(lines, _STDIN_LINES_PER_BLOCK)]
+                if not block:
+                    return
+                yield block
         return
 
     # read from files
-    for line in read_file(path):
-        yield line
+    for file_path in _expand_input_path(path):
+        if chunks_to_records or get_codec(file_path):
+            chunks = read_file_chunks(
+                file_path, chunk_size=chunk_size,
+                decompress_in_background=decompress_in_background)
+        else:
+            # each chunk ends on a line boundary, so there's nothing to
+            # reassemble
+            chunks = read_file_range(file_path, chunk_size=chunk_size)
+
+        if chunks_to_records:
+            for records in chunks_to_records(chunks):
+                yield records
+        else:
+            for lines in chunks_to_line_lists(chunks, strip_cr=True):
+                yield lines
+
+
+# how many lines to put in each block when reading from an iterable
+# that isn't a file object (see read_input_blocks())
+_STDIN_LINES_PER_BLOCK = 1000
 
 
 def read_file(path, fileobj=None):
     """Reads a file.
 
-    - Decompress ``.gz`` and ``.bz2`` files.
-    - If *fileobj* is not ``None``, stream lines from the *fileobj*
+    - Decompress files with a registered extension (``.gz``, ``.bz2``,
+      etc.; see :py:mod:`mrjob.compression`)
+    - If *fileobj* is not ``None``, stream lines from the *fileobj*. It can
+      also be any iterable (e.g. of chunks of a compressed file).
+    """
+    # return an iterator rather than yielding from one; with a million
+    # lines, the extra generator adds up
+    if get_codec(path):
+        return _chunks_to_lines(read_file_chunks(path, fileobj=fileobj))
+    elif fileobj is None:
+        return _read_lines(path)
+    else:
+        return iter(fileobj)
+
+
+def _read_lines(path):
+    """Yield the lines of the uncompressed file at *path*."""
+    f = open(path)
+    try:
+        for line in f:
+            yield line
+    finally:
+        f.close()
+
+
+def read_file_chunks(path, fileobj=None,
+                     chunk_size=DEFAULT_INPUT_CHUNK_SIZE,
+                     decompress_in_background=False):
+    """Like :py:func:`read_file`, but yield the (decompressed) contents of
+    the file *chunk_size* bytes at a time, rather than a line at a time.
+    Chunks will generally not end on a line boundary; see
+    :py:func:`chunks_to_line_lists`.
+
+    - Decompress files with a registered extension (see
+      :py:mod:`mrjob.compression`).
+    - If *fileobj* is not ``None``, stream data from the *fileobj* (or
+      from any iterable that yields chunks of bytes)
+
+    If *decompress_in_background* is true (and *fileobj* is ``None``),
+    decompress files while the caller is busy with the data we've already
+    yielded: in a separate process, using the first command in
+    :py:data:`BACKGROUND_DECOMPRESS_COMMANDS` for the file's extension
+    that's on your path (e.g. ``pigz``), or failing that, in a thread
+    (:py:mod:`zlib` and :py:mod:`bz2` let other threads run while they
+    decompress).
     """
-    # sometimes values declared in the ``try`` block aren't accessible from the
-    # ``finally`` block. not sure why.
+    codec = get_codec(path)
+
+    if codec and decompress_in_background and fileobj is None:
+        args = _find_command(
+            BACKGROUND_DECOMPRESS_COMMANDS.get(codec.extension, ()))
+        if args:
+            # the pipe between us is the buffer between decompressing
+            # and reading
+            chunks = _pipe_chunks(args + [path], chunk_size=chunk_size)
+        else:
+            chunks = _decompress_chunks_in_thread(path, chunk_size)
+
+        for chunk in chunks:
+            yield chunk
+        return
+
     f = None
     try:
-        if path.endswith('.gz'):
-            f = gzip.GzipFile(path, fileobj=fileobj, mode="r")
-        elif path.endswith('.bz2'):
-            if bz2 is None:
-                f = None
-                raise Exception('bz2 module was not successfully imported'
-                                ' (likely not installed).')
-            elif fileobj is None:
-                f = bz2.BZ2File(path)
-            else:
-                f = bunzip2_stream(fileobj)
-        elif fileobj is None:
-            f = open(path)
+        if fileobj is None:
+            f = open(path, 'rb')
+            chunks = _read_chunks(f, chunk_size)
+        elif hasattr(fileobj, 'read'):
+            chunks = _read_chunks(fileobj, chunk_size)
         else:
-            f = fileobj
+            chunks = iter(fileobj)
 
-        for line in f:
-            yield line
+        if codec:
+            chunks = codec.decompress(chunks)
+
+        for chunk in chunks:
+            yield chunk
     finally:
-        if fileobj is None and not f is None:
+        if f is not None:
             f.close()
 
 
+def read_file_range(path, start=0, length=None,
+                    chunk_size=DEFAULT_INPUT_CHUNK_SIZE):
+    """Yield the lines that start between byte *start* and
+    *start* + *length* of the uncompressed local file at *path*, in chunks
+    of about *chunk_size* bytes. Like Hadoop, we skip the (partial) line
+    that *start* falls in, and finish the line that *start* + *length*
+    falls in. If *length* is ``None``, read to the end of the file.
+
+    Each chunk ends with a newline (except maybe the last chunk in the
+    file), so you can split it into lines without reassembling lines that
+    span chunks.
+
+    We memory-map regular files, so each chunk is copied straight out of
+    the file's pages. Anything else (e.g. a named pipe, or
+    ``/dev/stdin``) we read through a buffer; we can only read the whole
+    thing (raise :py:class:`ValueError` if *start* or *length* is set).
+    """
+    f = open(path, 'rb')
+    try:
+        if not stat.S_ISREG(os.fstat(f.fileno()).st_mode):
+            if start or length is not None:
+                raise ValueError("Can't read a range of %s; it's not a"
+                                 " regular file" % path)
+            for chunk in _read_chunks(f, chunk_size):
+                yield chunk
+            return
+
+        size = os.fstat(f.fileno()).st_size
+        if length is None:
+            end = size
+        else:
+            end = min(start + length, size)
+
+        # can't map an empty file
+        if start >= end:
+            return
+
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            # skip to the first line that starts at or after *start*
+            pos = start
+            if pos > 0 and mapped[pos - 1] != '\n':
+                pos = mapped.find('\n', pos) + 1 or size
+
+            # end each chunk with the line containing its last byte
+            while pos < end:
+                stop = mapped.find('\n', min(pos + chunk_size, end) - 1) + 1
+                if not stop:
+                    stop = size
+                yield mapped[pos:stop]
+                pos = stop
+        finally:
+            mapped.close()
+    finally:
+        f.close()
+
+
+def _put_unless_stopped(queue, item, stop):
+    """Put *item* on *queue*, waiting for room unless *stop* gets set.
+    Return ``False`` if we stopped."""
+    while not stop.isSet():
+        try:
+            queue.put(item, True, 0.1)
+            return True
+        except Full:
+            pass
+    return False
+
+
+def _decompress_chunks_in_thread(path, chunk_size):
+    """Read and decompress the compressed file at *path* in a separate
+    thread, and yield the decompressed data as it becomes available. The
+    thread gets at most :py:data:`_BACKGROUND_QUEUE_SIZE` chunks ahead of
+    us."""
+    decompress = get_codec(path).decompress
+
+    # items are (data, exc_info); data is None when we're done
+    queue = Queue(_BACKGROUND_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def decompress_file():
+        try:
+            f = open(path, 'rb')
+            try:
+                for data in decompress(_read_chunks(f, chunk_size)):
+                    if not _put_unless_stopped(queue, (data, None), stop):
+                        return
+            finally:
+                f.close()
+        except:
+            _put_unless_stopped(queue, (None, sys.exc_info()), stop)
+        else:
+            _put_unless_stopped(queue, (None, None), stop)
+
+    thread = threading.Thread(target=decompress_file)
+    thread.setDaemon(True)
+    thread.start()
+
+    try:
+        while True:
+            data, exc_info = queue.get()
+            if exc_info:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            if data is None:
+                return
+            yield data
+    finally:
+        stop.set()
+
+
+def _read_chunks(fileobj, chunk_size):
+    """Yield chunks of data from *fileobj* until it's exhausted."""
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
 def bunzip2_stream(fileobj):
-    """Return an uncompressed bz2 stream from a file object
+    """Return an uncompressed bz2 stream from a file object, as a list of
+    lines.
     """
-    # decompress chunks into a buffer, then stream from the buffer
-    buffer = ''
-    if bz2 is None:
-        raise Exception('bz2 module was not successfully imported (likely not installed).')
-    decomp = bz2.BZ2Decompressor()
-    for part in fileobj:
-        buffer = buffer.join(decomp.decompress(part))
-    f = buffer.splitlines(True)
-    return f
+    return list(_chunks_to_lines(
+        get_codec('.bz2').decompress(fileobj)))
+
+
+def _chunks_to_lines(chunks):
+    """Like :py:func:`buffer_iterator_to_line_iterator`, but don't add a
+    newline to the last line if it doesn't have one."""
+    pieces = []  # pieces of a line that spans more than one chunk
+
+    for chunk in chunks:
+        end = chunk.rfind('\n') + 1
+        if not end:
+            # no newline; keep reading
+            if chunk:
+                pieces.append(chunk)
+            continue
+
+        # iterating through a StringIO splits lines in C, and (unlike
+        # splitlines()) only on \n
+        f = StringIO(chunk)
+        if pieces:
+            pieces.append(f.readline())
+            yield ''.join(pieces)
+            pieces = []
+
+        for line in StringIO(chunk[f.tell():end]):
+            yield line
+
+        if end < len(chunk):
+            pieces.append(chunk[end:])
+
+    if pieces:
+        yield ''.join(pieces)
 
 
 @contextlib.contextmanager
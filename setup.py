@@ -39,6 +39,7 @@ setup(
     long_description=open('README.rst').read(),
     name='mrjob',
     packages=['mrjob',
+              'mrjob.benchmarks',
               'mrjob.examples',
               'mrjob.fs',
               'mrjob.tools',
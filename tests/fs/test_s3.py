@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from StringIO import StringIO
+import bz2
 import os
 import gzip
 
@@ -89,6 +90,21 @@ class S3FSTestCase(SandboxedTestCase):
         self.assertEqual(list(self.fs._cat_file(remote_path)),
                          ['foo\n', 'foo\n'])
 
+    def test_cat_bz2(self):
+        remote_path = self.add_mock_s3_data(
+            'walrus', 'data/foo.bz2', bz2.compress('foo\nfoo\n'))
+
+        self.assertEqual(list(self.fs._cat_file(remote_path)),
+                         ['foo\n', 'foo\n'])
+
+    def test_cat_long_lines(self):
+        long_line = 'x' * 1000000 + '\n'
+        remote_path = self.add_mock_s3_data(
+            'walrus', 'data/foo', long_line * 3 + 'no newline')
+
+        self.assertEqual(list(self.fs._cat_file(remote_path)),
+                         [long_line] * 3 + ['no newline\n'])
+
     def test_ls_basic(self):
         remote_path = self.add_mock_s3_data('walrus', 'data/foo', 'foo\nfoo\n')
 
@@ -0,0 +1,35 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Pass binary values (containing tabs, newlines, and nulls) between tasks
+with RawBytesProtocol."""
+from mrjob.job import MRJob
+from mrjob.protocol import JSONProtocol
+from mrjob.protocol import RawBytesProtocol
+
+
+class MRRawBytesJob(MRJob):
+
+    INTERNAL_PROTOCOL = RawBytesProtocol
+    OUTPUT_PROTOCOL = JSONProtocol
+
+    def mapper(self, _, line):
+        for word in line.split():
+            yield word, '\t\n\x00\r%s\n' % word
+
+    def reducer(self, word, blobs):
+        yield word, sorted(blobs)
+
+
+if __name__ == '__main__':
+    MRRawBytesJob.run()
@@ -0,0 +1,45 @@
+# Copyright 2009-2012 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Two-step word count that passes typed bytes between its tasks."""
+from mrjob.job import MRJob
+from mrjob.protocol import TypedBytesProtocol
+
+
+class MRTypedBytesJob(MRJob):
+
+    INTERNAL_PROTOCOL = TypedBytesProtocol
+
+    def mapper(self, _, line):
+        for word in line.split():
+            yield word, 1
+
+    def combiner(self, word, counts):
+        yield word, sum(counts)
+
+    def reducer(self, word, counts):
+        # keys that would break a line-based protocol
+        yield ('%s\t\n' % word, len(word)), sum(counts)
+
+    def reducer2(self, key, counts):
+        yield key[0].rstrip(), sum(counts)
+
+    def steps(self):
+        return [self.mr(mapper=self.mapper,
+                        combiner=self.combiner,
+                        reducer=self.reducer),
+                self.mr(reducer=self.reducer2)]
+
+
+if __name__ == '__main__':
+    MRTypedBytesJob.run()
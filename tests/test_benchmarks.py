@@ -0,0 +1,217 @@
+# Copyright 2009-2012 Yelp
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Make sure the benchmarks in mrjob.benchmarks still run. We use tiny
+inputs; we don't care about the numbers, just that nothing is broken."""
+from StringIO import StringIO
+
+try:
+    import unittest2 as unittest
+    unittest  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    import unittest
+
+try:
+    import simplejson as json  # preferred because of C speedups
+    json  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    import json  # built in to Python 2.6 and later
+
+from mrjob.benchmarks import json_backends
+from mrjob.benchmarks import line_splitting
+from mrjob.benchmarks import pickle_protocols
+from mrjob.benchmarks import print_results
+from mrjob.benchmarks import protocols
+from mrjob.benchmarks import read_input
+from mrjob.benchmarks import repr_parsing
+from mrjob.benchmarks import sparse_vectors
+from mrjob.util import buffer_iterator_to_line_iterator
+from tests.mockboto import MockS3Connection
+
+
+class PrintResultsTestCase(unittest.TestCase):
+
+    def test_prints_json(self):
+        stream = StringIO()
+        print_results({'foo': {'seconds': 1.5}}, stream=stream)
+        self.assertEqual(json.loads(stream.getvalue()),
+                         {'foo': {'seconds': 1.5}})
+
+
+class ReadInputBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = read_input.run(num_records=100, repeat=1)
+
+        for name in ('read_input', 'read_input_blocks',
+                     'read_input+RawValueProtocol',
+                     'read_input_blocks+RawValueProtocol'):
+            self.assertIn(name, results)
+            self.assertGreater(results[name]['seconds'], 0)
+
+        self.assertIn('speedup', results)
+        self.assertIn('speedup_with_decoding', results)
+
+
+class PickleProtocolsBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = pickle_protocols.run(num_records=100, repeat=1)
+
+        for name in ('PickleProtocol', 'BinaryPickleProtocol'):
+            self.assertIn(name, results)
+            self.assertGreater(results[name]['bytes'], 0)
+            self.assertGreater(results[name]['encode_seconds'], 0)
+            self.assertGreater(results[name]['decode_seconds'], 0)
+
+        self.assertLess(results['size_ratio'], 1)
+        self.assertIn('encode_speedup', results)
+        self.assertIn('decode_speedup', results)
+
+
+class JSONBackendsBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = json_backends.run(num_records=100, repeat=1)
+
+        # these are always installed
+        for name in ('default', 'compact', 'json'):
+            self.assertIn(name, results)
+            self.assertEqual(results[name]['installed'], True)
+            self.assertGreater(results[name]['bytes'], 0)
+            self.assertGreater(results[name]['encode_seconds'], 0)
+            self.assertGreater(results[name]['decode_many_seconds'], 0)
+
+        self.assertLess(results['compact']['bytes'],
+                        results['default']['bytes'])
+        self.assertIn(results['fastest_encode'], results)
+        self.assertIn(results['fastest_decode'], results)
+        self.assertIn(results['auto'], results)
+
+
+class ReprParsingBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = repr_parsing.run(num_records=100, repeat=1)
+
+        for name in ('strings', 'ints', 'values'):
+            self.assertIn(name, results)
+            self.assertGreater(results[name]['safeeval_seconds'], 0)
+            self.assertGreater(results[name]['parse_repr_seconds'], 0)
+            self.assertIn('speedup', results[name])
+
+
+class ProtocolsBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = protocols.run(num_records=20, repeat=1)
+
+        self.assertEqual(
+            sorted(name for name in results if name != 'records'),
+            sorted(name for name, _ in protocols.all_protocols()))
+
+        for shape_name, _ in protocols.SHAPES:
+            result = results['JSONValueProtocol'][shape_name]
+            if shape_name in ('string_tuples', 'sparse_vectors',
+                              'binary_blobs'):
+                # JSON turns tuples into lists, and can't encode
+                # SparseVectors or non-UTF-8 bytes at all
+                self.assertEqual(result['supported'], False)
+                continue
+
+            self.assertEqual(result['supported'], True)
+            self.assertGreater(result['bytes_per_record'], 0)
+            self.assertGreater(result['read_records_per_sec'], 0)
+            self.assertGreater(result['write_many_records_per_sec'], 0)
+            # at least the (key, value) tuple
+            self.assertGreaterEqual(result['objects_per_record'], 1)
+
+        sparse_result = results['SparseVectorValueProtocol']['sparse_vectors']
+        self.assertEqual(sparse_result['supported'], True)
+
+        self.assertEqual(results['RawProtocol']['binary_blobs'],
+                         {'supported': False,
+                          'error': 'ValueError: encoded with a newline'})
+        self.assertEqual(
+            results['RawBytesProtocol']['binary_blobs']['supported'], True)
+
+        self.assertEqual(results['RawValueProtocol']['small_ints'],
+                         {'supported': False,
+                          'error': 'TypeError: encoded as int, not str'})
+
+    def test_pick_protocols_and_shapes(self):
+        results = protocols.run(num_records=20, repeat=1,
+                                protocol_names=['RawValueProtocol'],
+                                shape_names=['long_strings'])
+
+        self.assertEqual(sorted(results), ['RawValueProtocol', 'records'])
+        self.assertEqual(list(results['RawValueProtocol']), ['long_strings'])
+
+
+class SparseVectorsBenchmarkTestCase(unittest.TestCase):
+
+    def test_run(self):
+        results = sparse_vectors.run(num_records=10, repeat=1,
+                                     num_features=5, num_dimensions=100)
+
+        self.assertEqual(results['records'], 10)
+        for name in ('json_dict', 'json_lists', 'sparse'):
+            self.assertIn('bytes_per_record', results[name])
+            self.assertIn('decode_and_dot_records_per_sec', results[name])
+
+        self.assertLess(results['sparse']['bytes_per_record'],
+                        results['json_dict']['bytes_per_record'])
+        self.assertIn('decode_speedup', results['sparse_vs_json_dict'])
+
+
+class LineSplittingBenchmarkTestCase(unittest.TestCase):
+
+    def test_make_chunks(self):
+        chunks = list(line_splitting.make_chunks(100, 7, 16))
+        self.assertEqual([len(chunk) for chunk in chunks],
+                         [16, 16, 16, 16, 16, 16, 4])
+        self.assertEqual(''.join(chunks)[:14], 'xxxxxx\nxxxxxx\n')
+        self.assertEqual(''.join(chunks).count('\n'), 14)
+
+    def test_old_and_new_agree(self):
+        for line_length, chunk_size in [(7, 16), (40, 16), (16, 16)]:
+            def chunks():
+                return line_splitting.make_chunks(1000, line_length,
+                                                  chunk_size)
+
+            self.assertEqual(
+                list(line_splitting.split_lines_one_at_a_time(chunks())),
+                list(buffer_iterator_to_line_iterator(chunks())))
+
+    def test_run(self):
+        results = line_splitting.run(megabytes=0.01, chunk_size=100,
+                                     long_line_length=1000, repeat=1)
+
+        self.assertEqual(results['bytes'], 10485)
+        for name in ('short_lines', 'long_lines'):
+            for splitter in ('one_at_a_time',
+                             'buffer_iterator_to_line_iterator'):
+                self.assertGreater(results[name][splitter]['seconds'], 0)
+            self.assertIn('speedup', results[name])
+
+        self.assertNotIn('s3_cat_file', results)
+
+    def test_run_with_s3_conn(self):
+        results = line_splitting.run(megabytes=0.01, chunk_size=100,
+                                     long_line_length=1000,
+                                     s3_conn=MockS3Connection(),
+                                     s3_megabytes=0.005, repeat=1)
+
+        self.assertEqual(results['s3_cat_file']['bytes'], 5242)
+        self.assertGreater(results['s3_cat_file']['seconds'], 0)
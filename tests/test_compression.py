@@ -0,0 +1,239 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for compression codecs."""
+import bz2
+import gzip
+import os
+from StringIO import StringIO
+from subprocess import Popen
+import zlib
+
+from mock import patch
+
+try:
+    import unittest2 as unittest
+    unittest  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    import unittest
+
+from mrjob.compression import CompressionCodec
+from mrjob.compression import DEFLATE_CODEC
+from mrjob.compression import XZ_CODEC
+from mrjob.compression import ZSTD_CODEC
+from mrjob.compression import _find_command
+from mrjob.compression import _pipe_chunks
+from mrjob.compression import command_codec
+from mrjob.compression import get_codec
+from mrjob.compression import get_codec_by_name
+from mrjob.compression import register_codec
+
+
+DATA = ''.join('%d bottles of beer on the wall\n' % i
+               for i in xrange(10000, 0, -1))
+
+
+def in_chunks(data, chunk_size=1000):
+    return [data[i:i + chunk_size] for i in xrange(0, len(data), chunk_size)]
+
+
+def gzip_compress(data):
+    out = StringIO()
+    f = gzip.GzipFile(fileobj=out, mode='w')
+    f.write(data)
+    f.close()
+    return out.getvalue()
+
+
+class GetCodecTestCase(unittest.TestCase):
+
+    def test_get_codec(self):
+        self.assertEqual(get_codec('foo/bar.gz').name, 'gzip')
+        self.assertEqual(get_codec('.bz2').name, 'bzip2')
+
+    def test_other_codecs_are_opt_in(self):
+        for path in ('bar.deflate', 'bar.xz', 'bar.zst'):
+            self.assertEqual(get_codec(path), None)
+
+        with patch.dict('mrjob.compression._CODECS'):
+            for codec in (DEFLATE_CODEC, XZ_CODEC, ZSTD_CODEC):
+                register_codec(codec)
+
+            self.assertEqual(get_codec('bar.deflate').name, 'deflate')
+            self.assertEqual(get_codec('bar.xz').name, 'xz')
+            self.assertEqual(get_codec('bar.zst').name, 'zstd')
+
+    def test_not_compressed(self):
+        self.assertEqual(get_codec('foo/bar'), None)
+        self.assertEqual(get_codec('foo/bar.txt'), None)
+        self.assertEqual(get_codec('foo/bar.gz.txt'), None)
+
+    def test_get_codec_by_name(self):
+        self.assertEqual(get_codec_by_name('gzip').extension, '.gz')
+        self.assertEqual(get_codec_by_name('.bz2').name, 'bzip2')
+        self.assertEqual(
+            get_codec_by_name('org.apache.hadoop.io.compress.GzipCodec'),
+            get_codec('.gz'))
+        self.assertRaises(ValueError, get_codec_by_name, 'deflate')
+        self.assertRaises(ValueError, get_codec_by_name, 'snappy')
+        self.assertRaises(ValueError, get_codec_by_name, None)
+
+    def test_register_codec(self):
+        with patch.dict('mrjob.compression._CODECS'):
+            rot13 = CompressionCodec('rot13', '.rot13', None, None)
+            register_codec(rot13)
+
+            self.assertEqual(get_codec('foo.rot13'), rot13)
+            self.assertEqual(get_codec_by_name('rot13'), rot13)
+
+        self.assertEqual(get_codec('foo.rot13'), None)
+
+    def test_longest_extension_wins(self):
+        with patch.dict('mrjob.compression._CODECS'):
+            tgz = CompressionCodec('tgz', '.tar.gz', None, None)
+            register_codec(tgz)
+
+            self.assertEqual(get_codec('foo.tar.gz'), tgz)
+            self.assertEqual(get_codec('foo.gz').name, 'gzip')
+
+    def test_repr(self):
+        self.assertEqual(repr(get_codec('.gz')),
+                         "CompressionCodec('gzip', '.gz')")
+
+
+class BuiltInCodecTestCase(unittest.TestCase):
+
+    def assertRoundTrips(self, codec):
+        compressed = ''.join(codec.compress(in_chunks(DATA)))
+        self.assertTrue(len(compressed) < len(DATA))
+        self.assertEqual(
+            ''.join(codec.decompress(in_chunks(compressed, 7))), DATA)
+        return compressed
+
+    def test_gzip(self):
+        compressed = self.assertRoundTrips(get_codec('.gz'))
+        self.assertEqual(gzip.GzipFile(fileobj=StringIO(compressed)).read(),
+                         DATA)
+
+    def test_gzip_multiple_members(self):
+        compressed = gzip_compress('foo\n') + gzip_compress('bar\n')
+        self.assertEqual(
+            ''.join(get_codec('.gz').decompress(in_chunks(compressed, 3))),
+            'foo\nbar\n')
+
+    def test_gzip_with_padding(self):
+        compressed = gzip_compress('foo\n') + '\x00' * 100
+        self.assertEqual(
+            ''.join(get_codec('.gz').decompress([compressed])), 'foo\n')
+
+    def test_bzip2(self):
+        compressed = self.assertRoundTrips(get_codec('.bz2'))
+        self.assertEqual(bz2.decompress(compressed), DATA)
+
+    def test_bzip2_multiple_streams(self):
+        # like pbzip2 writes
+        compressed = bz2.compress('foo\n') + bz2.compress('bar\n')
+        self.assertEqual(
+            ''.join(get_codec('.bz2').decompress(in_chunks(compressed, 3))),
+            'foo\nbar\n')
+
+    def test_bzip2_chunk_ends_with_stream(self):
+        chunks = [bz2.compress('foo\n'), bz2.compress('bar\n')]
+        self.assertEqual(''.join(get_codec('.bz2').decompress(chunks)),
+                         'foo\nbar\n')
+
+    def test_deflate(self):
+        compressed = self.assertRoundTrips(DEFLATE_CODEC)
+        self.assertEqual(zlib.decompress(compressed), DATA)
+
+    def test_empty(self):
+        for codec in (get_codec('.bz2'), DEFLATE_CODEC, get_codec('.gz')):
+            self.assertEqual(
+                ''.join(codec.decompress(codec.compress([]))), '')
+
+    def test_xz(self):
+        if not _find_command([['xz']]):
+            self.skipTest('xz is not installed')
+        self.assertRoundTrips(XZ_CODEC)
+
+
+class CommandCodecTestCase(unittest.TestCase):
+
+    def test_round_trip(self):
+        # reverse each line on the way in and out
+        codec = command_codec('rev', '.rev', [['rev']], [['rev']])
+        compressed = ''.join(codec.compress(in_chunks('foo\nbar\n', 3)))
+
+        self.assertEqual(compressed, 'oof\nrab\n')
+        self.assertEqual(''.join(codec.decompress([compressed])),
+                         'foo\nbar\n')
+
+    def test_lots_of_data(self):
+        # make sure we don't deadlock when the pipe buffers fill up
+        codec = command_codec('cat', '.cat', [['cat']], [['cat']])
+        self.assertEqual(''.join(codec.decompress(in_chunks(DATA * 10))),
+                         DATA * 10)
+
+    def test_first_command_on_path(self):
+        codec = command_codec(
+            'cat', '.cat',
+            [['mrjob-no-such-command'], ['cat']], [['cat']])
+        self.assertEqual(''.join(codec.decompress(['foo\n'])), 'foo\n')
+
+    def test_no_command_on_path(self):
+        codec = command_codec(
+            'nope', '.nope', [['mrjob-no-such-command']],
+            [['mrjob-no-such-command']])
+        self.assertRaises(IOError, codec.decompress, ['foo\n'])
+        self.assertRaises(IOError, codec.compress, ['foo\n'])
+
+    def test_command_fails(self):
+        codec = command_codec('gzip', '.gz', [['gzip', '-dc']], [['gzip']])
+        chunks = codec.decompress(['this is not gzipped'])
+        self.assertRaises(IOError, list, chunks)
+
+    def test_stop_early(self):
+        codec = command_codec('cat', '.cat', [['cat']], [['cat']])
+        chunks = codec.decompress(in_chunks(DATA * 10))
+        self.assertTrue(chunks.next())
+        # shouldn't hang
+        chunks.close()
+
+    def test_error_reading_input(self):
+        def bad_chunks():
+            yield 'foo\n'
+            raise ValueError('oops')
+
+        codec = command_codec('cat', '.cat', [['cat']], [['cat']])
+        self.assertRaises(ValueError, list, codec.decompress(bad_chunks()))
+
+
+class PipeChunksTestCase(unittest.TestCase):
+
+    def test_no_chunks(self):
+        # the command shouldn't read our stdin (e.g. a mapper's input)
+        with patch('mrjob.compression.Popen', wraps=Popen) as mock_popen:
+            self.assertEqual(''.join(_pipe_chunks(['cat'])), '')
+
+        self.assertEqual(mock_popen.call_args[1]['stdin'].name, os.devnull)
+
+    def test_chunks(self):
+        self.assertEqual(''.join(_pipe_chunks(['cat'], ['foo\n', 'bar\n'])),
+                         'foo\nbar\n')
+
+
+class FindCommandTestCase(unittest.TestCase):
+
+    def test_path(self):
+        with patch.dict(os.environ, {'PATH': '/mrjob-no-such-dir'}):
+            self.assertEqual(_find_command([['cat']]), None)
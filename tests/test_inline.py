@@ -20,6 +20,7 @@ from StringIO import StringIO
 
 import gzip
 import os
+import pstats
 
 try:
     from unittest2 import TestCase
@@ -32,10 +33,12 @@ from mock import patch
 from mrjob import conf
 from mrjob.inline import InlineMRJobRunner
 from mrjob.protocol import JSONValueProtocol
+from tests.mr_raw_bytes_job import MRRawBytesJob
 from tests.mr_test_cmdenv import MRTestCmdenv
 from mrjob.job import MRJob
 from tests.mr_test_jobconf import MRTestJobConf
 from tests.mr_two_step_job import MRTwoStepJob
+from tests.mr_typed_bytes_job import MRTypedBytesJob
 from tests.mr_word_count import MRWordCount
 from tests.sandbox import EmptyMrjobConfTestCase
 from tests.sandbox import SandboxedTestCase
@@ -80,6 +83,74 @@ class InlineMRJobRunnerEndToEndTestCase(SandboxedTestCase):
         self.assertEqual(sorted(results),
                          [(1, 'qux'), (2, 'bar'), (2, 'foo'), (5, None)])
 
+    def test_perf_counters(self):
+        mr_job = MRTwoStepJob(['-r', 'inline', '--task-perf-counters', '-'])
+        mr_job.sandbox(stdin=StringIO('foo\nbar\n'))
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+
+            perf_counters = [c['mrjob.perf'] for c in runner.counters()]
+
+        self.assertEqual(len(perf_counters), 2)
+        self.assertEqual(perf_counters[0]['mapper input records'], 2)
+        self.assertEqual(perf_counters[0]['combiner output records'], 4)
+        self.assertEqual(perf_counters[0]['reducer output records'], 3)
+        self.assertEqual(perf_counters[1]['mapper input records'], 3)
+        self.assertIn('mapper user code ms', perf_counters[1])
+
+    def test_typed_bytes(self):
+        mr_job = MRTypedBytesJob(['-r', 'inline', '-'])
+        mr_job.sandbox(stdin=StringIO('a b c a\nb a\nd\n'))
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+            output = sorted(mr_job.parse_output_line(line)
+                            for line in runner.stream_output())
+
+        self.assertEqual(output, [('a', 3), ('b', 2), ('c', 1), ('d', 1)])
+
+    def test_raw_bytes(self):
+        mr_job = MRRawBytesJob(['-r', 'inline', '-'])
+        mr_job.sandbox(stdin=StringIO('a b\tc a\nb a\n'))
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+            output = sorted(mr_job.parse_output_line(line)
+                            for line in runner.stream_output())
+
+        self.assertEqual(output, [
+            ('a', ['\t\n\x00\ra\n'] * 3),
+            ('b', ['\t\n\x00\rb\n'] * 2),
+            ('c', ['\t\n\x00\rc\n']),
+        ])
+
+    def test_profile_tasks(self):
+        stdin = StringIO('foo\nbar\n')
+        output_dir = os.path.join(self.tmp_dir, 'output')
+
+        mr_job = MRTwoStepJob(['-r', 'inline', '--profile-tasks',
+                               '--output-dir', output_dir, '-'])
+        mr_job.sandbox(stdin=stdin)
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(output_dir, '_profiles'))),
+                ['step-0-combiner.prof', 'step-0-mapper.prof',
+                 'step-0-reducer.prof', 'step-1-mapper.prof'])
+
+            # profiles shouldn't show up in the job's output
+            self.assertEqual(
+                sorted(mr_job.parse_output_line(line)
+                       for line in runner.stream_output()),
+                [(1, 'bar'), (1, 'foo'), (2, None)])
+
+        stats = pstats.Stats(
+            os.path.join(output_dir, '_profiles', 'step-0-reducer.prof'))
+        self.assertIn('run_reducer', [func[2] for func in stats.stats])
+
 
 class InlineMRJobRunnerCmdenvTest(EmptyMrjobConfTestCase):
 
@@ -243,3 +314,54 @@ class InlineMRJobRunnerTestJobConfCase(SandboxedTestCase):
                          runner._output_dir)
         self.assertEqual(results['mapreduce.task.partition'], '0')
         self.assertEqual(results['user.defined'], 'something')
+
+    def _run_word_count(self, *jobconf_args):
+        input_path = os.path.join(self.tmp_dir, 'input')
+        with open(input_path, 'w') as input_file:
+            input_file.write('bar\nqux\nfoo\n')
+
+        output_dir = os.path.join(self.tmp_dir, 'output')
+        mr_job = MRWordCount(['-r', 'inline', '--output-dir', output_dir] +
+                             list(jobconf_args) + [input_path])
+        mr_job.sandbox()
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+            results = [mr_job.parse_output_line(line)
+                       for line in runner.stream_output()]
+
+        self.assertEqual(results, [(input_path, 3)])
+        return output_dir
+
+    def test_compress_output(self):
+        output_dir = self._run_word_count(
+            '--jobconf=mapred.output.compress=true',
+            '--jobconf=mapred.output.compression.codec='
+            'org.apache.hadoop.io.compress.GzipCodec')
+
+        self.assertEqual(sorted(os.listdir(output_dir)),
+                         ['part-00000.gz'])
+        self.assertEqual(
+            gzip.GzipFile(os.path.join(output_dir, 'part-00000.gz')).read(),
+            '"%s"\t3\n' % os.path.join(self.tmp_dir, 'input'))
+
+    def test_compress_output_with_default_codec(self):
+        output_dir = self._run_word_count(
+            '--jobconf=mapreduce.output.fileoutputformat.compress=true')
+
+        self.assertEqual(sorted(os.listdir(output_dir)),
+                         ['part-00000.gz'])
+
+    def test_dont_compress_output(self):
+        output_dir = self._run_word_count(
+            '--jobconf=mapred.output.compress=false',
+            '--jobconf=mapred.output.compression.codec=bzip2')
+
+        self.assertEqual(sorted(os.listdir(output_dir)),
+                         ['part-00000'])
+
+    def test_unknown_output_codec(self):
+        self.assertRaises(
+            ValueError, self._run_word_count,
+            '--jobconf=mapred.output.compress=true',
+            '--jobconf=mapred.output.compression.codec=snappy')
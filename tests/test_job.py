@@ -17,7 +17,9 @@
 
 from __future__ import with_statement
 
+import gzip
 import os
+import pstats
 from subprocess import Popen
 from subprocess import PIPE
 from StringIO import StringIO
@@ -30,22 +32,31 @@ try:
 except ImportError:
     import unittest
 
+from mock import patch
+
 from mrjob.conf import combine_envs
 from mrjob.job import MRJob
 from mrjob.job import UsageError
+from mrjob.job import _protocol_class
 from mrjob.parse import parse_mr_job_stderr
+from mrjob.protocol import DelimitedValueProtocol
 from mrjob.protocol import JSONProtocol
 from mrjob.protocol import JSONValueProtocol
 from mrjob.protocol import PickleProtocol
+from mrjob.protocol import RawProtocol
 from mrjob.protocol import RawValueProtocol
 from mrjob.protocol import ReprProtocol
+from mrjob.protocol import TypedBytesProtocol
 from mrjob.step import JarStep
 from mrjob.step import MRJobStep
+from mrjob.typedbytes import dumps
 from mrjob.util import log_to_stream
+from mrjob.util import read_file_chunks
 from tests.mr_hadoop_format_job import MRHadoopFormatJob
 from mrjob.job import MRJob
 from tests.mr_tower_of_powers import MRTowerOfPowers
 from tests.mr_two_step_job import MRTwoStepJob
+from tests.mr_typed_bytes_job import MRTypedBytesJob
 from tests.quiet import logger_disabled
 from tests.quiet import no_handlers_for_logger
 from tests.sandbox import EmptyMrjobConfTestCase
@@ -202,6 +213,92 @@ class CountersAndStatusTestCase(unittest.TestCase):
                           'girl; interrupted': {'movie': 1}})
 
 
+class CounterBufferingTestCase(unittest.TestCase):
+
+    class MRCountingMapperJob(MRJob):
+
+        def mapper(self, _, line):
+            self.increment_counter('Lines', 'seen')
+            if line == 'status':
+                self.set_status('got status')
+            yield None, line
+
+    def counter_lines(self, mr_job):
+        return [line for line in mr_job.stderr.getvalue().splitlines()
+                if line.startswith('reporter:counter:')]
+
+    def test_counters_are_added_up(self):
+        mr_job = self.MRCountingMapperJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a\n' * 100))
+        mr_job.run_mapper()
+
+        self.assertEqual(self.counter_lines(mr_job),
+                         ['reporter:counter:Lines,seen,100'])
+
+    def test_flush_before_status(self):
+        mr_job = self.MRCountingMapperJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a\nstatus\na\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.stderr.getvalue(),
+                         'reporter:counter:Lines,seen,2\n' +
+                         'reporter:status:got status\n' +
+                         'reporter:counter:Lines,seen,1\n')
+
+    def test_flush_after_many_increments(self):
+        mr_job = self.MRCountingMapperJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a\n' * 5))
+
+        with patch('mrjob.job._COUNTER_FLUSH_INCREMENTS', 2):
+            mr_job.run_mapper()
+
+        self.assertEqual(self.counter_lines(mr_job),
+                         ['reporter:counter:Lines,seen,2'] * 2 +
+                         ['reporter:counter:Lines,seen,1'])
+
+    def test_flush_after_interval(self):
+        mr_job = self.MRCountingMapperJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a\n' * 3))
+
+        with patch('mrjob.job._COUNTER_FLUSH_INTERVAL', -1):
+            mr_job.run_mapper()
+
+        self.assertEqual(self.counter_lines(mr_job),
+                         ['reporter:counter:Lines,seen,1'] * 3)
+
+    def test_flush_on_error(self):
+        class MRErrorJob(self.MRCountingMapperJob):
+            def mapper_final(self):
+                raise ValueError
+
+        mr_job = MRErrorJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a\n'))
+
+        self.assertRaises(ValueError, mr_job.run_mapper)
+        self.assertEqual(mr_job.parse_counters(), {'Lines': {'seen': 1}})
+
+    def test_unicode_counters(self):
+        class MRUnicodeCounterJob(MRJob):
+            def mapper(self, _, line):
+                self.increment_counter(u'\u00e9', 'x')
+                self.increment_counter('y', 'z')
+                yield None, line
+
+        mr_job = MRUnicodeCounterJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a\na\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.parse_counters(),
+                         {'\xc3\xa9': {'x': 2}, 'y': {'z': 2}})
+
+    def test_no_buffering_outside_tasks(self):
+        mr_job = MRJob().sandbox()
+        mr_job.increment_counter('Foo', 'Bar')
+
+        self.assertEqual(mr_job.stderr.getvalue(),
+                         'reporter:counter:Foo,Bar,1\n')
+
+
 class ProtocolsTestCase(unittest.TestCase):
     # not putting these in their own files because we're not going to invoke
     # it as a script anyway.
@@ -225,33 +322,40 @@ class ProtocolsTestCase(unittest.TestCase):
         def mapper(self, key, value):
             yield key, value
 
+    def picked_protocols(self, mr_job, step_num, step_type):
+        # protocols keep their caches on the instance, so read() is bound
+        # to a protocol instance rather than its class
+        read, write = mr_job.pick_protocols(step_num, step_type)
+        self.assertEqual((read.__name__, write.__name__), ('read', 'write'))
+        return (_protocol_class(read.im_self), _protocol_class(write.im_self))
+
     def test_default_protocols(self):
         mr_job = MRBoringJob()
-        self.assertEqual(mr_job.pick_protocols(0, 'mapper'),
-                         (RawValueProtocol.read, JSONProtocol.write))
-        self.assertEqual(mr_job.pick_protocols(0, 'reducer'),
-                         (JSONProtocol.read, JSONProtocol.write))
+        self.assertEqual(self.picked_protocols(mr_job, 0, 'mapper'),
+                         (RawValueProtocol, JSONProtocol))
+        self.assertEqual(self.picked_protocols(mr_job, 0, 'reducer'),
+                         (JSONProtocol, JSONProtocol))
 
     def test_explicit_default_protocols(self):
         mr_job2 = self.MRBoringJob2().sandbox()
-        self.assertEqual(mr_job2.pick_protocols(0, 'mapper'),
-                         (JSONProtocol.read, PickleProtocol.write))
-        self.assertEqual(mr_job2.pick_protocols(0, 'reducer'),
-                         (PickleProtocol.read, ReprProtocol.write))
+        self.assertEqual(self.picked_protocols(mr_job2, 0, 'mapper'),
+                         (JSONProtocol, PickleProtocol))
+        self.assertEqual(self.picked_protocols(mr_job2, 0, 'reducer'),
+                         (PickleProtocol, ReprProtocol))
 
         mr_job3 = self.MRBoringJob3()
-        self.assertEqual(mr_job3.pick_protocols(0, 'mapper'),
-                         (RawValueProtocol.read, ReprProtocol.write))
+        self.assertEqual(self.picked_protocols(mr_job3, 0, 'mapper'),
+                         (RawValueProtocol, ReprProtocol))
         # output protocol should default to JSON
-        self.assertEqual(mr_job3.pick_protocols(0, 'reducer'),
-                         (ReprProtocol.read, JSONProtocol.write))
+        self.assertEqual(self.picked_protocols(mr_job3, 0, 'reducer'),
+                         (ReprProtocol, JSONProtocol))
 
         mr_job4 = self.MRBoringJob4()
-        self.assertEqual(mr_job4.pick_protocols(0, 'mapper'),
-                         (RawValueProtocol.read, ReprProtocol.write))
+        self.assertEqual(self.picked_protocols(mr_job4, 0, 'mapper'),
+                         (RawValueProtocol, ReprProtocol))
         # output protocol should default to JSON
-        self.assertEqual(mr_job4.pick_protocols(0, 'reducer'),
-                         (ReprProtocol.read, JSONProtocol.write))
+        self.assertEqual(self.picked_protocols(mr_job4, 0, 'reducer'),
+                         (ReprProtocol, JSONProtocol))
 
     def test_mapper_raw_value_to_json(self):
         RAW_INPUT = StringIO('foo\nbar\nbaz\n')
@@ -311,6 +415,49 @@ class ProtocolsTestCase(unittest.TestCase):
         self.assertEqual(counters.keys(), ['Undecodable input'])
         self.assertEqual(sum(counters['Undecodable input'].itervalues()), 3)
 
+    def test_protocol_without_batch_methods(self):
+        class MRUpperCaseJob(MRBoringJob):
+
+            class UpperCaseProtocol(object):
+
+                def read(self, line):
+                    return None, line.upper()
+
+                def write(self, key, value):
+                    return value.lower()
+
+            INPUT_PROTOCOL = UpperCaseProtocol
+            INTERNAL_PROTOCOL = UpperCaseProtocol
+
+        mr_job = MRUpperCaseJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('foo\nBar\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.stdout.getvalue(), 'foo\nbar\n')
+
+    def test_protocol_overriding_read_and_write(self):
+        # read_many() and write_many() don't know about the overrides,
+        # so they shouldn't be used
+        class MRUpperCaseJob(MRBoringJob):
+
+            class UpperCaseProtocol(JSONValueProtocol):
+
+                def read(self, line):
+                    key, value = JSONValueProtocol.read(line)
+                    return key, value.upper()
+
+                def write(self, key, value):
+                    return JSONValueProtocol.write(key, value) + '!'
+
+            INPUT_PROTOCOL = UpperCaseProtocol
+            INTERNAL_PROTOCOL = UpperCaseProtocol
+
+        mr_job = MRUpperCaseJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('"foo"\n"Bar"\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.stdout.getvalue(), '"FOO"!\n"BAR"!\n')
+
     def test_undecodable_input_strict(self):
         BAD_JSON_INPUT = StringIO('BAD\tJSON\n' +
                                   '"foo"\t"bar"\n' +
@@ -351,6 +498,717 @@ class ProtocolsTestCase(unittest.TestCase):
         self.assertRaises(Exception, mr_job.run_mapper)
 
 
+class OutputBufferingTestCase(unittest.TestCase):
+
+    class MRFinalJob(MRJob):
+
+        def mapper(self, key, value):
+            yield key, value
+
+        def mapper_final(self):
+            # output from mapper() should already be written out
+            yield 'output_so_far', self.stdout.getvalue()
+
+    def test_output_is_flushed(self):
+        mr_job = MRBoringJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('foo\nbar\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.stdout.getvalue(),
+                         'null\t"foo"\nnull\t"bar"\n')
+
+    def test_small_buffer_size(self):
+        mr_job = MRBoringJob(['--reducer', '--task-output-buffer-size', '1'])
+        mr_job.sandbox(stdin=StringIO('"foo"\t"bar"\n' +
+                                      '"foo"\t"baz"\n' +
+                                      '"bar"\t"qux"\n'))
+        mr_job.run_reducer()
+
+        self.assertEqual(mr_job.stdout.getvalue(),
+                         ('"foo"\t["bar", "baz"]\n' +
+                          '"bar"\t["qux"]\n'))
+
+    def test_flush_before_final(self):
+        mr_job = self.MRFinalJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('foo\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.parse_output(),
+                         [(None, 'foo'),
+                          ('output_so_far', 'null\t"foo"\n')])
+
+    def test_buffer_size_is_passed_through(self):
+        mr_job = MRBoringJob(['--task-output-buffer-size', '0'])
+        self.assertEqual(mr_job.generate_passthrough_arguments(),
+                         ['--task-output-buffer-size', '0'])
+
+
+class MapperBatchTestCase(unittest.TestCase):
+
+    class MRBatchJob(MRJob):
+
+        MAPPER_BATCH_SIZE = 2
+
+        def mapper_batch(self, pairs):
+            yield len(pairs), [value for key, value in pairs]
+
+    class MRMultiStepBatchJob(MRJob):
+
+        def batch_sizes(self, pairs):
+            yield None, len(pairs)
+
+        def steps(self):
+            return [self.mr(mapper_batch=self.batch_sizes,
+                            mapper_batch_size=3)]
+
+    class MRListBatchJob(MRJob):
+
+        def mapper_batch(self, pairs):
+            return [(None, value) for _, value in pairs]
+
+    def test_batches(self):
+        mr_job = self.MRBatchJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a\nb\nc\nd\ne\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.parse_output(),
+                         [(2, ['a', 'b']), (2, ['c', 'd']), (1, ['e'])])
+
+    def test_no_input(self):
+        mr_job = self.MRBatchJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO(''))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.parse_output(), [])
+
+    def test_list_output(self):
+        mr_job = self.MRListBatchJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a\nb\nc\n'))
+
+        with patch.object(JSONProtocol, 'write_many',
+                          wraps=JSONProtocol.write_many) as m_write_many:
+            mr_job.run_mapper()
+            # whole batch is encoded at once
+            m_write_many.assert_called_once_with(
+                [(None, 'a'), (None, 'b'), (None, 'c')])
+
+        self.assertEqual(mr_job.parse_output(),
+                         [(None, 'a'), (None, 'b'), (None, 'c')])
+
+    def test_unencodable_list_output(self):
+        mr_job = self.MRListBatchJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a\n\xaa\nc\n'))
+        mr_job.run_mapper()
+
+        # good data should still get through
+        self.assertEqual(mr_job.parse_output(), [(None, 'a'), (None, 'c')])
+        self.assertEqual(mr_job.parse_counters(),
+                         {'Unencodable output': {'UnicodeDecodeError': 1}})
+
+    def test_batch_size_in_step(self):
+        mr_job = self.MRMultiStepBatchJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a\n' * 7))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.parse_output(),
+                         [(None, 3), (None, 3), (None, 1)])
+
+    def test_steps_desc(self):
+        self.assertEqual(
+            self.MRBatchJob()._steps_desc(),
+            [{'type': 'streaming',
+              'mapper': {'type': 'script', 'batch_size': 2}}])
+        self.assertEqual(
+            self.MRMultiStepBatchJob()._steps_desc(),
+            [{'type': 'streaming',
+              'mapper': {'type': 'script', 'batch_size': 3}}])
+
+    def test_inline_runner(self):
+        mr_job = self.MRBatchJob(['-r', 'inline', '-'])
+        mr_job.sandbox(stdin=StringIO('a\nb\nc\n'))
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+            output = sorted(mr_job.parse_output_line(line)
+                            for line in runner.stream_output())
+
+        self.assertEqual(output, [(1, ['c']), (2, ['a', 'b'])])
+
+
+class MapperMergeTestCase(unittest.TestCase):
+
+    class MRMergeJob(MRJob):
+
+        def mapper(self, _, line):
+            for word in line.split():
+                yield word, 1
+
+        def mapper_merge(self, count1, count2):
+            return count1 + count2
+
+    class MRSmallMergeJob(MRMergeJob):
+
+        MAPPER_MERGE_MAX_ENTRIES = 2
+
+    def counters(self, mr_job):
+        return mr_job.parse_counters().get('In-mapper combining')
+
+    def test_merge(self):
+        mr_job = self.MRMergeJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a b a\nc a b\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(sorted(mr_job.parse_output()),
+                         [('a', 3), ('b', 2), ('c', 1)])
+        self.assertEqual(self.counters(mr_job),
+                         {'Flushes': 1, 'Hits': 3, 'Misses': 3})
+
+    def test_flush_when_full(self):
+        mr_job = self.MRSmallMergeJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a a b c c\n'))
+        mr_job.run_mapper()
+
+        output = mr_job.parse_output()
+        # a and b are flushed as soon as we have two keys
+        self.assertEqual(sorted(output[:2]), [('a', 2), ('b', 1)])
+        self.assertEqual(output[2:], [('c', 2)])
+        self.assertEqual(self.counters(mr_job),
+                         {'Flushes': 2, 'Hits': 2, 'Misses': 3})
+
+    def test_max_bytes(self):
+        class MRTinyMergeJob(self.MRMergeJob):
+            MAPPER_MERGE_MAX_BYTES = 1
+
+        mr_job = MRTinyMergeJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a a b\n'))
+        mr_job.run_mapper()
+
+        # every new key is flushed immediately
+        self.assertEqual(mr_job.parse_output(),
+                         [('a', 1), ('a', 1), ('b', 1)])
+        self.assertEqual(self.counters(mr_job),
+                         {'Flushes': 3, 'Hits': 0, 'Misses': 3})
+
+    def test_merge_final_output(self):
+        class MRFinalMergeJob(self.MRMergeJob):
+            def mapper_final(self):
+                yield 'a', 10
+
+        mr_job = MRFinalMergeJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a b\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(sorted(mr_job.parse_output()),
+                         [('a', 11), ('b', 1)])
+
+    def test_unhashable_keys(self):
+        class MRListKeyJob(self.MRMergeJob):
+            def mapper(self, _, line):
+                yield line.split(), 1
+
+        mr_job = MRListKeyJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a b\na b\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.parse_output(),
+                         [(['a', 'b'], 1), (['a', 'b'], 1)])
+        self.assertEqual(self.counters(mr_job)['Unhashable keys'], 2)
+
+    def test_multi_step(self):
+        class MRMultiStepMergeJob(MRJob):
+            INPUT_PROTOCOL = JSONProtocol
+
+            def steps(self):
+                return [self.mr(mapper_merge=max,
+                                mapper_merge_max_entries=100,
+                                reducer=self.reducer)]
+
+            def reducer(self, key, values):
+                yield key, max(values)
+
+        mr_job = MRMultiStepMergeJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('"x"\t2\n"x"\t5\n"x"\t3\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.parse_output(), [('x', 5)])
+
+    def test_end_to_end(self):
+        class MRSumJob(self.MRSmallMergeJob):
+            def reducer(self, word, counts):
+                yield word, sum(counts)
+
+        mr_job = MRSumJob(['-r', 'inline', '-'])
+        mr_job.sandbox(stdin=StringIO('a b a\nc a b\n'))
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+            output = sorted(mr_job.parse_output_line(line)
+                            for line in runner.stream_output())
+
+        self.assertEqual(output, [('a', 3), ('b', 2), ('c', 1)])
+
+
+class GroupByKeyTestCase(unittest.TestCase):
+
+    class CountingJSONProtocol(JSONProtocol):
+
+        num_decoded = 0
+
+        @classmethod
+        def load_from_string(cls, value):
+            cls.num_decoded += 1
+            return JSONProtocol.load_from_string(value)
+
+    class MRCountingJob(MRBoringJob):
+
+        def internal_protocol(self):
+            return GroupByKeyTestCase.CountingJSONProtocol
+
+    def setUp(self):
+        self.CountingJSONProtocol.num_decoded = 0
+
+    def test_decode_each_key_once(self):
+        mr_job = self.MRCountingJob(['--reducer'])
+        mr_job.sandbox(stdin=StringIO('"foo"\t1\n' +
+                                      '"foo"\t2\n' +
+                                      '"foo"\t3\n' +
+                                      '"bar"\t4\n'))
+        mr_job.run_reducer()
+
+        self.assertEqual(mr_job.parse_output(),
+                         [('foo', [1, 2, 3]), ('bar', [4])])
+        # two keys, four values
+        self.assertEqual(self.CountingJSONProtocol.num_decoded, 6)
+
+    def test_values_are_decoded_lazily(self):
+        class MRFirstValueJob(self.MRCountingJob):
+            def reducer(self, key, values):
+                yield key, values.next()
+
+        mr_job = MRFirstValueJob(['--reducer'])
+        mr_job.sandbox(stdin=StringIO('"foo"\t1\n' * 100))
+        mr_job.run_reducer()
+
+        self.assertEqual(mr_job.parse_output(), [('foo', 1)])
+        self.assertLess(self.CountingJSONProtocol.num_decoded, 100)
+
+    def test_undecodable_key(self):
+        mr_job = MRBoringJob(['--reducer'])
+        mr_job.sandbox(stdin=StringIO('BAD\t1\n' +
+                                      'BAD\t2\n' +
+                                      '"foo"\t3\n'))
+        mr_job.run_reducer()
+
+        self.assertEqual(mr_job.parse_output(), [('foo', [3])])
+        counters = mr_job.parse_counters()
+        self.assertEqual(sum(counters['Undecodable input'].itervalues()), 2)
+
+    def test_key_with_only_undecodable_values_is_skipped(self):
+        mr_job = MRBoringJob(['--reducer'])
+        mr_job.sandbox(stdin=StringIO('"foo"\tBAD\n' +
+                                      '"bar"\t1\n' +
+                                      '"bar"\tBAD\n' +
+                                      '"bar"\t2\n'))
+        mr_job.run_reducer()
+
+        self.assertEqual(mr_job.parse_output(), [('bar', [1, 2])])
+        counters = mr_job.parse_counters()
+        self.assertEqual(sum(counters['Undecodable input'].itervalues()), 2)
+
+    def test_combiner(self):
+        class MRCombinerJob(self.MRCountingJob):
+            def combiner(self, key, values):
+                yield key, sum(values)
+
+        mr_job = MRCombinerJob(['--combiner'])
+        mr_job.sandbox(stdin=StringIO('"foo"\t1\n' +
+                                      '"foo"\t2\n' +
+                                      '"bar"\t4\n'))
+        mr_job.run_combiner()
+
+        self.assertEqual(mr_job.parse_output(), [('foo', 3), ('bar', 4)])
+        self.assertEqual(self.CountingJSONProtocol.num_decoded, 5)
+
+    def test_other_protocols(self):
+        # protocols that don't just split on a tab get grouped after
+        # decoding
+        class MRRawJob(MRBoringJob):
+            INTERNAL_PROTOCOL = RawProtocol
+
+        mr_job = MRRawJob(['--reducer'])
+        mr_job.sandbox(stdin=StringIO('foo\t1\tx\nfoo\t2\nbar\n'))
+        mr_job.run_reducer()
+
+        self.assertEqual(mr_job.parse_output(),
+                         [('foo', ['1\tx', '2']), ('bar', [None])])
+
+
+class PassThroughTestCase(unittest.TestCase):
+
+    class MRJSONReducerJob(MRJob):
+
+        INPUT_PROTOCOL = JSONProtocol
+
+        def reducer(self, key, values):
+            yield key, sum(values)
+
+    class MRFilterJob(MRJob):
+
+        INPUT_PROTOCOL = JSONProtocol
+
+        def steps(self):
+            return [self.mr(combiner_pre_filter='cat',
+                            reducer_pre_filter='cat')]
+
+    def test_identity_mapper_is_dropped(self):
+        self.assertEqual(self.MRJSONReducerJob()._steps_desc(),
+                         [{'type': 'streaming',
+                           'reducer': {'type': 'script'}}])
+
+    def test_identity_mapper_kept_for_different_protocols(self):
+        self.assertEqual(MRBoringJob()._steps_desc(),
+                         [{'type': 'streaming',
+                           'mapper': {'type': 'script'},
+                           'reducer': {'type': 'script'}}])
+
+    def test_identity_mapper_kept_if_pick_protocols_redefined(self):
+        class MRPickyJob(self.MRJSONReducerJob):
+            def pick_protocols(self, step_num, step_type):
+                return JSONProtocol.read, JSONProtocol.write
+
+        self.assertEqual(MRPickyJob()._steps_desc(),
+                         [{'type': 'streaming',
+                           'mapper': {'type': 'script'},
+                           'reducer': {'type': 'script'}}])
+
+    def test_identity_mapper_kept_if_protocol_is_configured(self):
+        class MRConfiguredJob(self.MRJSONReducerJob):
+            def input_protocol(self):
+                return JSONProtocol(decode_cache_size=100)
+
+        self.assertEqual(MRConfiguredJob()._steps_desc(),
+                         [{'type': 'streaming',
+                           'mapper': {'type': 'script'},
+                           'reducer': {'type': 'script'}}])
+
+    def test_identity_mapper_kept_with_strict_protocols(self):
+        mr_job = self.MRJSONReducerJob(['--strict-protocols'])
+        self.assertEqual(mr_job._steps_desc(),
+                         [{'type': 'streaming',
+                           'mapper': {'type': 'script'},
+                           'reducer': {'type': 'script'}}])
+
+    def test_reducer_decodes_lines_with_strict_protocols(self):
+        mr_job = self.MRFilterJob(['--reducer', '--strict-protocols'])
+        mr_job.sandbox(stdin=StringIO('"x"\t1\nBAD\n'))
+        self.assertRaises(ValueError, mr_job.run_reducer)
+
+    def test_mapper_decodes_lines_for_configured_protocols(self):
+        class MRColumnsJob(MRJob):
+            INTERNAL_PROTOCOL = DelimitedValueProtocol
+
+            def input_protocol(self):
+                return DelimitedValueProtocol(fields=['a', 'b'],
+                                              columns=['b'])
+
+            def reducer(self, key, values):
+                for value in values:
+                    yield key, value
+
+        mr_job = MRColumnsJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('1\t2\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.stdout.getvalue(), '2\n')
+
+    def test_mapper_decodes_lines_for_projecting_protocol(self):
+        class ColumnsProtocol(DelimitedValueProtocol):
+            fields = ['a', 'b']
+            columns = ['b']
+
+        class MRProjectingJob(MRJob):
+            INPUT_PROTOCOL = ColumnsProtocol
+            INTERNAL_PROTOCOL = ColumnsProtocol
+
+            def reducer(self, key, values):
+                for value in values:
+                    yield key, value
+
+        mr_job = MRProjectingJob()
+        self.assertEqual(mr_job._steps_desc(),
+                         [{'type': 'streaming',
+                           'mapper': {'type': 'script'},
+                           'reducer': {'type': 'script'}}])
+
+        mr_job = MRProjectingJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('1\t2\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.stdout.getvalue(), '2\n')
+
+    def test_mapper_decodes_lines_for_subclass_of_safe_protocol(self):
+        class SortedJSONProtocol(JSONProtocol):
+            def write(self, key, value):
+                return JSONProtocol.write(key, sorted(value))
+
+        class MRSortingJob(self.MRJSONReducerJob):
+            INPUT_PROTOCOL = SortedJSONProtocol
+            INTERNAL_PROTOCOL = SortedJSONProtocol
+
+        mr_job = MRSortingJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('"x"\t[2, 1]\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.stdout.getvalue(), '"x"\t[1, 2]\n')
+
+    def test_mapper_copies_lines(self):
+        mr_job = self.MRJSONReducerJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('{"a":1}\t[1,2]\nBAD\n'))
+        mr_job.run_mapper()
+
+        # lines aren't decoded, so they aren't re-encoded either
+        self.assertEqual(mr_job.stdout.getvalue(),
+                         '{"a":1}\t[1,2]\nBAD\n')
+        self.assertEqual(mr_job.parse_counters(), {})
+
+    def test_mapper_decodes_lines_for_different_protocols(self):
+        mr_job = MRBoringJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('foo\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.stdout.getvalue(), 'null\t"foo"\n')
+
+    def test_identity_combiner_and_reducer_copy_lines(self):
+        for args, run in [(['--combiner'], 'run_combiner'),
+                          (['--reducer'], 'run_reducer')]:
+            mr_job = self.MRFilterJob(args)
+            mr_job.sandbox(stdin=StringIO('"x"\t1\n"x"\t 2\n'))
+            getattr(mr_job, run)()
+
+            self.assertEqual(mr_job.stdout.getvalue(),
+                             '"x"\t1\n"x"\t 2\n')
+
+    def test_end_to_end(self):
+        mr_job = self.MRJSONReducerJob(['-r', 'inline', '-'])
+        mr_job.sandbox(stdin=StringIO('"x"\t1\n"y"\t2\n"x"\t3\n'))
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+            output = sorted(mr_job.parse_output_line(line)
+                            for line in runner.stream_output())
+
+        self.assertEqual(output, [('x', 4), ('y', 2)])
+
+
+class TypedBytesTestCase(unittest.TestCase):
+
+    class MRTypedBytesReducerJob(MRJob):
+
+        INPUT_PROTOCOL = TypedBytesProtocol
+        INTERNAL_PROTOCOL = TypedBytesProtocol
+
+        def reducer(self, key, values):
+            yield key, sum(values)
+
+    def test_text_jobs_have_no_io(self):
+        self.assertNotIn('io', MRBoringJob()._steps_desc()[0])
+        self.assertNotIn('io', MRTwoStepJob()._steps_desc()[1])
+
+    def test_steps_desc(self):
+        self.assertEqual(
+            [step['io'] for step in MRTypedBytesJob()._steps_desc()],
+            [{'map_input': 'text',
+              'map_output': 'typedbytes',
+              'reduce_input': 'typedbytes',
+              'reduce_output': 'typedbytes'},
+             {'map_input': 'typedbytes',
+              'map_output': 'typedbytes',
+              'reduce_input': 'typedbytes',
+              'reduce_output': 'text'}])
+
+    def test_input_protocol_affects_dropped_mapper(self):
+        self.assertEqual(
+            self.MRTypedBytesReducerJob()._steps_desc(),
+            [{'type': 'streaming',
+              'reducer': {'type': 'script'},
+              'io': {'map_input': 'typedbytes',
+                     'map_output': 'typedbytes',
+                     'reduce_input': 'typedbytes',
+                     'reduce_output': 'text'}}])
+
+    def test_mapper_writes_records(self):
+        mr_job = MRTypedBytesJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('a b\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.stdout.getvalue(),
+                         dumps('a') + dumps(1) + dumps('b') + dumps(1))
+
+    def test_reducer_reads_records(self):
+        mr_job = MRTypedBytesJob(['--reducer'])
+        # use a value with newlines and tabs in it
+        mr_job.sandbox(stdin=StringIO(
+            dumps('a') + dumps(1) + dumps('a') + dumps(2) +
+            dumps('b\n\t') + dumps(3)))
+        mr_job.run_reducer()
+
+        self.assertEqual(
+            mr_job.stdout.getvalue(),
+            dumps(('a\t\n', 1)) + dumps(3) + dumps(('b\n\t\t\n', 3)) + dumps(3))
+
+    def test_identity_mapper_copies_records(self):
+        # identity mapper, with a record that spans input chunks
+        mr_job = self.MRTypedBytesReducerJob(['--mapper'])
+        data = dumps('a' * 10000) + dumps(1) + dumps('b') + dumps(2)
+        mr_job.sandbox(stdin=StringIO(data))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.stdout.getvalue(), data)
+
+
+class DelimitedInputTestCase(unittest.TestCase):
+
+    class MRBytesPerUserJob(MRJob):
+
+        class INPUT_PROTOCOL(DelimitedValueProtocol):
+            fields = ['time', 'user', ('status', int), ('bytes', int), 'url']
+            columns = ['user', 'bytes']
+
+        def mapper(self, _, record):
+            yield record.user, record.bytes
+
+    def test_mapper(self):
+        mr_job = self.MRBytesPerUserJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('12:00\tdave\t200\t512\t/\n'
+                                      '12:01\tbob\t-\t64\t/a\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.parse_output(), [('dave', 512), ('bob', 64)])
+
+
+class DecodeCacheCountersTestCase(unittest.TestCase):
+
+    class MRCachingJob(MRBoringJob):
+
+        def internal_protocol(self):
+            return JSONProtocol(decode_cache_size=100)
+
+    def test_reducer(self):
+        mr_job = self.MRCachingJob(['--reducer'])
+        mr_job.sandbox(stdin=StringIO('"US"\t"a"\n' +
+                                      '"US"\t"a"\n' +
+                                      '"FR"\t"b"\n'))
+        mr_job.run_reducer()
+
+        self.assertEqual(mr_job.parse_output(),
+                         [('US', ['a', 'a']), ('FR', ['b'])])
+        self.assertEqual(mr_job.parse_counters(),
+                         {'Decode cache': {'Hits': 1, 'Misses': 4}})
+
+    def test_no_counters_without_cache(self):
+        mr_job = MRBoringJob(['--reducer'])
+        mr_job.sandbox(stdin=StringIO('"US"\t"a"\n'))
+        mr_job.run_reducer()
+
+        self.assertEqual(mr_job.parse_counters(), {})
+
+
+class JSONBackendTestCase(unittest.TestCase):
+
+    def test_default_backend(self):
+        mr_job = MRBoringJob(['--reducer'])
+        mr_job.sandbox(stdin=StringIO('"US"\t{"a":1}\n'))
+        mr_job.run_reducer()
+
+        self.assertEqual(mr_job.stdout.getvalue(), '"US"\t[{"a": 1}]\n')
+
+    def test_compact_backend(self):
+        mr_job = MRBoringJob(['--reducer', '--json-backend', 'compact'])
+        mr_job.sandbox(stdin=StringIO('"US"\t{"a": 1}\n'))
+        mr_job.run_reducer()
+
+        self.assertEqual(mr_job.stdout.getvalue(), '"US"\t[{"a":1}]\n')
+
+    def test_protocol_overriding_load_and_dump(self):
+        class UpperCaseJSONProtocol(JSONProtocol):
+
+            @classmethod
+            def load_from_string(cls, value):
+                value = JSONProtocol.load_from_string(value)
+                if isinstance(value, basestring):
+                    value = value.upper()
+                return value
+
+        class MRUpperCaseJob(MRBoringJob):
+            INTERNAL_PROTOCOL = UpperCaseJSONProtocol
+
+        mr_job = MRUpperCaseJob(['--reducer', '--json-backend', 'compact'])
+        mr_job.sandbox(stdin=StringIO('"a"\t"b"\n"a"\t"c"\n'))
+        mr_job.run_reducer()
+
+        self.assertEqual(mr_job.stdout.getvalue(), '"A"\t["B","C"]\n')
+
+    def test_option_overrides_class_attribute(self):
+        class MRCompactJob(MRBoringJob):
+
+            def internal_protocol(self):
+                return JSONProtocol(json_backend='compact')
+
+        mr_job = MRCompactJob(['--json-backend', 'default'])
+        self.assertEqual(
+            mr_job._pick_protocol_instances(0, 'mapper')[1].write('a', [1]),
+            '"a"\t[1]')
+
+    def test_unknown_backend(self):
+        mr_job = MRBoringJob(['--reducer', '--json-backend', 'yaml'])
+        mr_job.sandbox(stdin=StringIO('"US"\t1\n'))
+
+        self.assertRaises(ValueError, mr_job.run_reducer)
+
+    def test_passthrough(self):
+        mr_job = MRBoringJob(['--json-backend', 'compact'])
+        self.assertEqual(mr_job.generate_passthrough_arguments(),
+                         ['--json-backend', 'compact'])
+
+
+class StepsCacheTestCase(unittest.TestCase):
+
+    class MRCountStepsJob(MRBoringJob):
+
+        num_steps_calls = 0
+
+        def steps(self):
+            self.num_steps_calls += 1
+            return super(StepsCacheTestCase.MRCountStepsJob, self).steps()
+
+    def test_steps_computed_once(self):
+        mr_job = self.MRCountStepsJob(['--reducer'])
+        mr_job.sandbox(stdin=StringIO('"foo"\t"bar"\n'))
+        mr_job.run_reducer()
+        mr_job.pick_protocols(0, 'mapper')
+        mr_job.pick_protocols(0, 'reducer')
+        mr_job.show_steps()
+
+        self.assertEqual(mr_job.num_steps_calls, 1)
+
+    def test_protocol_instances_are_cached(self):
+        mr_job = MRBoringJob()
+        self.assertIs(mr_job._pick_protocol_instances(0, 'mapper')[0],
+                      mr_job._pick_protocol_instances(0, 'mapper')[0])
+
+    def test_cache_cleared_when_options_change(self):
+        mr_job = self.MRCountStepsJob()
+        mr_job._steps_desc()
+        protocols = mr_job._pick_protocol_instances(0, 'mapper')
+
+        mr_job.load_options(['--reducer'])
+        mr_job._steps_desc()
+
+        self.assertEqual(mr_job.num_steps_calls, 2)
+        self.assertIsNot(mr_job._pick_protocol_instances(0, 'mapper')[0],
+                         protocols[0])
+
+
 class PickProtocolsTestCase(unittest.TestCase):
 
     def _yield_none(self, *args, **kwargs):
@@ -750,6 +1608,154 @@ class StepNumTestCase(unittest.TestCase):
         self.assertRaises(ValueError, mr_job.run_reducer, -1)
 
 
+class TaskPerfCountersTestCase(unittest.TestCase):
+
+    def run_task(self, args, stdin):
+        mr_job = MRTwoStepJob(['--task-perf-counters'] + args)
+        mr_job.sandbox(stdin=StringIO(stdin))
+        mr_job.execute()
+        return mr_job.parse_counters()
+
+    def test_mapper(self):
+        counters = self.run_task(['--mapper'], 'foo\nbar\n')
+        perf = counters['mrjob.perf']
+
+        self.assertEqual(perf['mapper input records'], 2)
+        self.assertEqual(perf['mapper input bytes'], 8)
+        self.assertEqual(perf['mapper output records'], 4)
+        self.assertEqual(perf['mapper output bytes'],
+                         4 * len('null\t"foo"\n'))
+        for name in ('read and decode ms', 'user code ms',
+                     'encode and write ms', 'total ms'):
+            self.assertIn('mapper ' + name, perf)
+
+        self.assertEqual(len(perf), 8)
+
+    def test_reducer(self):
+        counters = self.run_task(
+            ['--reducer'], '"bar"\tnull\n"foo"\tnull\n"foo"\tnull\n')
+        perf = counters['mrjob.perf']
+
+        self.assertEqual(perf['reducer input records'], 3)
+        self.assertEqual(perf['reducer output records'], 2)
+        self.assertEqual(perf['reducer output bytes'],
+                         len('"bar"\t1\n"foo"\t2\n'))
+
+    def test_output_across_several_flushes(self):
+        counters = self.run_task(
+            ['--mapper', '--task-output-buffer-size', '1'],
+            'foo\n' * 100)
+        perf = counters['mrjob.perf']
+
+        self.assertEqual(perf['mapper output records'], 200)
+        self.assertEqual(perf['mapper output bytes'],
+                         200 * len('null\t"foo"\n'))
+
+    def test_undecodable_input_counts_as_input(self):
+        counters = self.run_task(
+            ['--reducer'], '"bar"\tnull\nnot JSON\n')
+
+        self.assertEqual(counters['mrjob.perf']['reducer input records'], 2)
+        self.assertEqual(counters['mrjob.perf']['reducer output records'],
+                         1)
+
+    def test_off_by_default(self):
+        mr_job = MRTwoStepJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('foo\nbar\n'))
+        mr_job.execute()
+
+        self.assertEqual(mr_job.parse_counters(), {})
+
+    def test_not_reported_when_calling_run_mapper(self):
+        mr_job = MRTwoStepJob()
+        mr_job.sandbox(stdin=StringIO('foo\nbar\n'))
+        mr_job.run_mapper()
+
+        self.assertEqual(mr_job.parse_counters(), {})
+
+
+class DecompressInBackgroundTestCase(SandboxedTestCase):
+
+    def test_read_gz_input(self):
+        gz_path = os.path.join(self.tmp_dir, 'input.gz')
+        f = gzip.GzipFile(gz_path, 'w')
+        f.write('foo\nbar\n')
+        f.close()
+
+        mr_job = MRBoringJob(['--mapper', '--decompress-in-background',
+                              gz_path])
+        mr_job.sandbox()
+
+        with patch('mrjob.util.read_file_chunks',
+                   wraps=read_file_chunks) as mock_read:
+            mr_job.run_mapper()
+
+        self.assertEqual(mr_job.parse_output(),
+                         [(None, 'foo'), (None, 'bar')])
+        self.assertEqual(
+            mock_read.call_args[1]['decompress_in_background'], True)
+
+    def test_is_passed_through(self):
+        mr_job = MRBoringJob(['--decompress-in-background'])
+        self.assertEqual(mr_job.generate_passthrough_arguments(),
+                         ['--decompress-in-background'])
+
+
+class ProfileTasksTestCase(SandboxedTestCase):
+
+    def setUp(self):
+        super(ProfileTasksTestCase, self).setUp()
+        # tasks write stats into their working dir if they can't upload them
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.tmp_dir)
+
+    def test_no_profiling_by_default(self):
+        mr_job = MRTwoStepJob(['--mapper'])
+        mr_job.sandbox(stdin=StringIO('foo\nbar\n'))
+        mr_job.execute()
+
+        self.assertEqual(os.listdir(self.tmp_dir), [])
+
+    def test_write_stats_to_profiles_dir(self):
+        profiles_dir = os.path.join(self.tmp_dir, 'profiles')
+
+        mr_job = MRTwoStepJob(['--mapper', '--step-num', '1',
+                               '--profile-tasks-dir', profiles_dir])
+        mr_job.sandbox(stdin=StringIO('1\t"foo"\n'))
+
+        with patch.dict(os.environ,
+                        {'mapreduce_task_attempt_id': 'attempt_1_m_0'}):
+            mr_job.execute()
+
+        self.assertEqual(mr_job.parse_output(), [('foo', 1)])
+        self.assertEqual(
+            os.listdir(profiles_dir),
+            ['mrjob-profile-step-1-mapper-attempt_1_m_0.prof'])
+
+        stats = pstats.Stats(os.path.join(
+            profiles_dir, 'mrjob-profile-step-1-mapper-attempt_1_m_0.prof'))
+        self.assertIn('run_mapper',
+                      [func[2] for func in stats.stats])
+
+    def test_failed_upload_does_not_fail_task(self):
+        mr_job = MRTwoStepJob(['--reducer',
+                               '--profile-tasks-dir', 'hdfs:///profiles/'])
+        mr_job.sandbox(stdin=StringIO('"foo"\t1\n'))
+
+        with patch.dict(os.environ,
+                        {'HADOOP_HOME': os.path.join(self.tmp_dir, 'nope'),
+                         'mapreduce_task_attempt_id': 'attempt_1_r_0'}):
+            mr_job.execute()
+
+        self.assertEqual(mr_job.parse_output(), [('foo', 1)])
+        self.assertIn('Could not upload task profile',
+                      mr_job.stderr.getvalue())
+        # stats stay in the task's working dir
+        self.assertEqual(
+            os.listdir(self.tmp_dir),
+            ['mrjob-profile-step-0-reducer-attempt_1_r_0.prof'])
+
+
 class FileOptionsTestCase(SandboxedTestCase):
 
     def test_end_to_end(self):
@@ -17,13 +17,16 @@
 from __future__ import with_statement
 
 from StringIO import StringIO
+import bz2
 import gzip
 import os
+import pstats
 import shutil
 import signal
 import stat
 import sys
 import tempfile
+import zlib
 
 try:
     import unittest2 as unittest
@@ -31,7 +34,13 @@ try:
 except ImportError:
     import unittest
 
+from mock import patch
+
 import mrjob
+import mrjob.splits
+from mrjob.compression import CompressionCodec
+from mrjob.compression import DEFLATE_CODEC
+from mrjob.compression import register_codec
 from mrjob.local import LocalMRJobRunner
 from mrjob.util import bash_wrap
 from mrjob.util import cmd_line
@@ -43,8 +52,10 @@ from tests.mr_exit_42_job import MRExit42Job
 from tests.mr_filter_job import FilterJob
 from tests.mr_job_where_are_you import MRJobWhereAreYou
 from tests.mr_os_walk_job import MROSWalkJob
+from tests.mr_raw_bytes_job import MRRawBytesJob
 from tests.mr_test_jobconf import MRTestJobConf
 from tests.mr_two_step_job import MRTwoStepJob
+from tests.mr_typed_bytes_job import MRTypedBytesJob
 from tests.mr_verbose_job import MRVerboseJob
 from tests.mr_word_count import MRWordCount
 from tests.quiet import no_handlers_for_logger
@@ -160,6 +171,38 @@ class LocalMRJobRunnerEndToEndTestCase(SandboxedTestCase):
                          ['bar\n', 'bar\n', 'bar\n', 'bar\n', 'foo\n',
                           'foo\n', 'foo\n', 'qux\n', 'qux\n'])
 
+    def test_get_file_splits_ranges(self):
+        input_path = os.path.join(self.tmp_dir, 'input')
+        contents = 'a\n' + 'b' * 50 + '\n' + 'c\nd\ne\nf\n' + 'no newline'
+        with open(input_path, 'w') as input_file:
+            input_file.write(contents)
+
+        runner = LocalMRJobRunner(conf_paths=[])
+        file_splits = runner._get_file_splits([input_path], 8)
+
+        # each split is a range of whole lines from the original file, at
+        # least as big as the split size (the long line gets its own split)
+        splits = sorted(file_splits.items(),
+                        key=lambda (_, s): s['task_num'])
+        self.assertEqual(
+            [(s['start'], s['length']) for _, s in splits],
+            [(0, 53), (53, 8), (61, 10)])
+        for file_name, split_info in splits:
+            with open(file_name) as f:
+                start = split_info['start']
+                self.assertEqual(
+                    f.read(), contents[start:start + split_info['length']])
+
+    def test_get_file_splits_empty_file(self):
+        input_path = os.path.join(self.tmp_dir, 'input')
+        open(input_path, 'w').close()
+
+        runner = LocalMRJobRunner(conf_paths=[])
+        file_splits = runner._get_file_splits([input_path], 3)
+
+        self.assertEqual(len(file_splits), 1)
+        self.assertEqual(file_splits.values()[0]['length'], 0)
+
     def test_get_file_splits_sorted_test(self):
         # set up input paths
         input_path = os.path.join(self.tmp_dir, 'input')
@@ -257,6 +300,50 @@ class LocalMRJobRunnerEndToEndTestCase(SandboxedTestCase):
                               {'group': {'counter_name': 2}},
                               {'group': {'counter_name': 2}}])
 
+    def test_perf_counters(self):
+        stdin = StringIO('foo\nbar\n')
+
+        mr_job = MRTwoStepJob(['-r', 'local', '--task-perf-counters', '-'])
+        mr_job.sandbox(stdin=stdin)
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+
+            perf_counters = [c['mrjob.perf'] for c in runner.counters()]
+
+        self.assertEqual(len(perf_counters), 2)
+        self.assertEqual(perf_counters[0]['mapper input records'], 2)
+        self.assertEqual(perf_counters[0]['mapper output records'], 4)
+        self.assertEqual(perf_counters[0]['reducer output records'], 3)
+        self.assertEqual(perf_counters[1]['mapper input records'], 3)
+        self.assertIn('mapper user code ms', perf_counters[1])
+
+    def test_typed_bytes(self):
+        mr_job = MRTypedBytesJob(['-r', 'local', '-'])
+        mr_job.sandbox(stdin=StringIO('a b c a\nb a\nd\n'))
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+            output = sorted(mr_job.parse_output_line(line)
+                            for line in runner.stream_output())
+
+        self.assertEqual(output, [('a', 3), ('b', 2), ('c', 1), ('d', 1)])
+
+    def test_raw_bytes(self):
+        mr_job = MRRawBytesJob(['-r', 'local', '-'])
+        mr_job.sandbox(stdin=StringIO('a b\tc a\nb a\n'))
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+            output = sorted(mr_job.parse_output_line(line)
+                            for line in runner.stream_output())
+
+        self.assertEqual(output, [
+            ('a', ['\t\n\x00\ra\n'] * 3),
+            ('b', ['\t\n\x00\rb\n'] * 2),
+            ('c', ['\t\n\x00\rc\n']),
+        ])
+
     def test_gz_split_regression(self):
         gz_path_1 = os.path.join(self.tmp_dir, '1.gz')
         gz_path_2 = os.path.join(self.tmp_dir, '2.gz')
@@ -280,6 +367,184 @@ class LocalMRJobRunnerEndToEndTestCase(SandboxedTestCase):
             self.assertEqual(
                 len(set(s['task_num'] for s in splits.values())), 3)
 
+    def test_split_multi_member_gz(self):
+        input_gz_path = os.path.join(self.tmp_dir, 'input.gz')
+        contents = []
+        # each member ends in the middle of a line
+        for i in range(4):
+            member = 'line %d\nmore %d' % (i, i) * 100
+            input_gz = gzip.GzipFile(input_gz_path, 'a')
+            input_gz.write(member)
+            input_gz.close()
+            contents.append(member)
+        all_contents = ''.join(contents)
+
+        runner = LocalMRJobRunner(conf_paths=[])
+
+        # index files next to the input aren't input
+        for _ in range(2):
+            file_splits = runner._get_file_splits([self.tmp_dir], 4)
+            self.assertEqual(len(file_splits), 4)
+
+        size = os.stat(input_gz_path)[stat.ST_SIZE]
+        splits = sorted(file_splits.items(),
+                        key=lambda (_, s): s['task_num'])
+
+        # start and length are in compressed bytes, and cover the file
+        self.assertEqual(splits[0][1]['start'], 0)
+        self.assertEqual(sum(s['length'] for _, s in splits), size)
+        for (_, s), (_, next_s) in zip(splits, splits[1:]):
+            self.assertEqual(s['start'] + s['length'], next_s['start'])
+
+        content = []
+        for file_name, split_info in splits:
+            self.assertEqual(split_info['orig_name'], input_gz_path)
+            self.assertTrue(file_name.endswith('.gz'))
+
+            lines = list(read_file(file_name))
+            # every split gets whole lines
+            self.assertTrue(lines[-1].endswith('\n') or
+                            file_name == splits[-1][0])
+            content.extend(lines)
+
+        self.assertEqual(''.join(content), all_contents)
+
+    def _make_multi_member_gz(self):
+        input_gz_path = os.path.join(self.tmp_dir, 'input.gz')
+        for i in range(4):
+            input_gz = gzip.GzipFile(input_gz_path, 'a')
+            input_gz.write('line %d\n' % i * 100)
+            input_gz.close()
+        return input_gz_path
+
+    def test_second_run_reuses_index(self):
+        input_gz_path = self._make_multi_member_gz()
+
+        with patch('mrjob.splits._index_gzip',
+                   wraps=mrjob.splits._index_gzip) as mock_index_gzip:
+            for _ in range(2):
+                runner = LocalMRJobRunner(conf_paths=[])
+                runner._get_file_splits([input_gz_path], 4)
+                runner.cleanup()
+
+        self.assertEqual(mock_index_gzip.call_count, 1)
+        self.assertTrue(
+            os.path.exists(mrjob.splits.index_path(input_gz_path)))
+
+    def test_index_in_tmp_dir_if_input_dir_not_writable(self):
+        input_gz_path = self._make_multi_member_gz()
+
+        runner = LocalMRJobRunner(conf_paths=[])
+        with patch('os.access', return_value=False):
+            file_splits = runner._get_file_splits([input_gz_path], 4)
+
+        self.assertEqual(len(file_splits), 4)
+        self.assertEqual(os.listdir(self.tmp_dir), ['input.gz'])
+        self.assertEqual(
+            len(os.listdir(os.path.join(runner._get_local_tmp_dir(),
+                                        'split_indexes'))), 1)
+
+    def test_dont_index_files_that_wont_be_split(self):
+        input_gz_path = os.path.join(self.tmp_dir, 'input.gz')
+        for i in range(4):
+            input_gz = gzip.GzipFile(input_gz_path, 'a')
+            input_gz.write('line %d\n' % i)
+            input_gz.close()
+
+        input_path = os.path.join(self.tmp_dir, 'input')
+        with open(input_path, 'w') as f:
+            f.write('x' * 10000 + '\n')
+
+        runner = LocalMRJobRunner(conf_paths=[])
+        with patch('mrjob.sim.get_index') as mock_get_index:
+            # only one split
+            runner._get_file_splits([input_gz_path], 1)
+            # input.gz is much smaller than each split
+            runner._get_file_splits([input_gz_path, input_path], 2)
+
+        self.assertFalse(mock_get_index.called)
+
+    def test_split_bz2(self):
+        input_bz2_path = os.path.join(self.tmp_dir, 'input.bz2')
+        # enough data for several 100k blocks
+        contents = ''.join('%d %s\n' % (i, hex(i * 7919) * (i % 17))
+                           for i in range(30000))
+        with open(input_bz2_path, 'wb') as f:
+            f.write(bz2.compress(contents, 1))
+
+        runner = LocalMRJobRunner(conf_paths=[])
+        file_splits = runner._get_file_splits([input_bz2_path], 3)
+
+        self.assertEqual(len(file_splits), 3)
+
+        content = []
+        for file_name in sorted(file_splits):
+            self.assertEqual(file_splits[file_name]['orig_name'],
+                             input_bz2_path)
+            self.assertTrue(file_name.endswith('.bz2'))
+            content.extend(read_file(file_name))
+
+        self.assertEqual(''.join(content), contents)
+
+    def test_dont_split_small_bz2(self):
+        input_bz2_path = os.path.join(self.tmp_dir, 'input.bz2')
+        with open(input_bz2_path, 'wb') as f:
+            f.write(bz2.compress('foo\nbar\nbaz\n'))
+
+        runner = LocalMRJobRunner(conf_paths=[])
+        file_splits = runner._get_file_splits([input_bz2_path], 3)
+
+        # one block, so decompress it and split it like an uncompressed file
+        content = []
+        for file_name in file_splits:
+            self.assertFalse(file_name.endswith('.bz2'))
+            content.extend(read_file(file_name))
+        self.assertEqual(sorted(content), ['bar\n', 'baz\n', 'foo\n'])
+
+    def test_split_other_compressed_file(self):
+        # no way to split .deflate files, so decompress them and split
+        # them like uncompressed files
+        input_path = os.path.join(self.tmp_dir, 'input.deflate')
+        with open(input_path, 'wb') as f:
+            f.write(zlib.compress('foo\nbar\nbaz\n'))
+
+        runner = LocalMRJobRunner(conf_paths=[])
+        with patch.dict('mrjob.compression._CODECS'):
+            register_codec(DEFLATE_CODEC)
+            file_splits = runner._get_file_splits([input_path], 3)
+
+        content = []
+        for file_name in file_splits:
+            self.assertFalse(file_name.endswith('.deflate'))
+            content.extend(read_file(file_name))
+        self.assertEqual(sorted(content), ['bar\n', 'baz\n', 'foo\n'])
+
+    def test_profile_tasks(self):
+        stdin = StringIO('foo\nbar\n')
+        output_dir = os.path.join(self.tmp_dir, 'output')
+
+        mr_job = MRTwoStepJob(['-r', 'local', '--profile-tasks',
+                               '--output-dir', output_dir, '-'])
+        mr_job.sandbox(stdin=stdin)
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+
+            self.assertEqual(
+                sorted(os.listdir(os.path.join(output_dir, '_profiles'))),
+                ['step-0-combiner.prof', 'step-0-mapper.prof',
+                 'step-0-reducer.prof', 'step-1-mapper.prof'])
+
+            # profiles shouldn't show up in the job's output
+            self.assertEqual(
+                sorted(mr_job.parse_output_line(line)
+                       for line in runner.stream_output()),
+                [(1, 'bar'), (1, 'foo'), (2, None)])
+
+        stats = pstats.Stats(
+            os.path.join(output_dir, '_profiles', 'step-0-reducer.prof'))
+        self.assertIn('run_reducer', [func[2] for func in stats.stats])
+
 
 class LocalMRJobRunnerNoSymlinksTestCase(LocalMRJobRunnerEndToEndTestCase):
     """Test systems without os.symlink (e.g. Windows). See Issue #46"""
@@ -539,6 +804,60 @@ class LocalMRJobRunnerTestJobConfCase(SandboxedTestCase):
         self.assertEqual(sorted(results),
                          [(input_path, 3), (input_gz_path, 1)])
 
+    def test_compress_output(self):
+        input_path = os.path.join(self.tmp_dir, 'input')
+        with open(input_path, 'w') as input_file:
+            input_file.write('bar\nqux\nfoo\n')
+
+        output_dir = os.path.join(self.tmp_dir, 'output')
+        mr_job = MRTwoStepJob(['-r', 'local', '--output-dir', output_dir,
+                               '--jobconf=mapred.reduce.tasks=2',
+                               '--jobconf=mapred.output.compress=true',
+                               '--jobconf=mapred.output.compression.codec='
+                               'org.apache.hadoop.io.compress.BZip2Codec',
+                               input_path])
+        mr_job.sandbox()
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+
+            output_files = sorted(os.listdir(output_dir))
+            self.assertTrue(output_files)
+            for name in output_files:
+                self.assertTrue(name.endswith('.bz2'))
+
+            results = sorted(mr_job.parse_output_line(line)
+                             for line in runner.stream_output())
+
+        self.assertEqual(results,
+                         [(1, 'bar'), (1, 'foo'), (1, 'qux'), (3, None)])
+
+    def test_input_file_split_gz(self):
+        input_gz_path = os.path.join(self.tmp_dir, 'input.gz')
+        for i in range(3):
+            input_gz = gzip.GzipFile(input_gz_path, 'a')
+            input_gz.write('foo bar\n' * 100)
+            input_gz.close()
+
+        mr_job = MRWordCount(['-r', 'local',
+                              '--jobconf=mapred.map.tasks=3',
+                              input_gz_path])
+        mr_job.sandbox()
+
+        results = []
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+
+            for line in runner.stream_output():
+                key, value = mr_job.parse_output_line(line)
+                results.append((key, value))
+
+            # one mapper (and combiner) per gzip member
+            self.assertEqual(runner.counters()[0]['count']['combiners'], 3)
+
+        self.assertEqual(results, [(input_gz_path, 600)])
+
     def test_others(self):
         input_path = os.path.join(self.tmp_dir, 'input')
         with open(input_path, 'w') as input_file:
@@ -649,9 +968,8 @@ class CommandSubstepTestCase(SandboxedTestCase):
                 r._get_steps(),
                 [{
                     'type': 'streaming',
-                    'mapper': {
-                        'type': 'script',
-                    },
+                    # identity mapper with the same input and output
+                    # protocol is dropped (Hadoop Streaming runs cat)
                     'reducer': {
                         'type': 'command',
                         'command': 'cat -e'}}])
@@ -661,6 +979,43 @@ class CommandSubstepTestCase(SandboxedTestCase):
             lines = list(r.stream_output())
             self.assertItemsEqual(lines, ['x$\n', 'y$\n', 'z$\n'])
 
+    def test_cat_reducer_with_gz_input(self):
+        input_gz_path = os.path.join(self.tmp_dir, 'input.gz')
+        input_gz = gzip.GzipFile(input_gz_path, 'w')
+        input_gz.write('x\ny\nz\n')
+        input_gz.close()
+
+        job = CmdJob(['--reducer-cmd', 'cat -e', '--runner=local',
+                      input_gz_path])
+        job.sandbox()
+        with job.make_runner() as r:
+            r.run()
+
+            lines = list(r.stream_output())
+            self.assertItemsEqual(lines, ['x$\n', 'y$\n', 'z$\n'])
+
+    def test_no_mapper_uses_registered_codec(self):
+        # e.g. a codec registered by the job's launcher
+        rot13 = CompressionCodec(
+            'rot13', '.rot13',
+            lambda chunks: (chunk.encode('rot13') for chunk in chunks), None)
+
+        input_path = os.path.join(self.tmp_dir, 'input.rot13')
+        with open(input_path, 'w') as f:
+            f.write('k\nl\nm\n')
+
+        step = {'type': 'streaming',
+                'reducer': {'type': 'command', 'command': 'cat -e'}}
+
+        with LocalMRJobRunner(conf_paths=[]) as r:
+            with patch.dict('mrjob.compression._CODECS'):
+                register_codec(rot13)
+                procs_args = r._mapper_arg_chain(step, 0, input_path)
+
+            self.assertEqual(procs_args[0][0], 'cat')
+            self.assertNotEqual(procs_args[0][1], input_path)
+            self.assertEqual(open(procs_args[0][1]).read(), 'x\ny\nz\n')
+
     def test_multiple(self):
         data = 'x\nx\nx\nx\nx\nx\n'
         mapper_cmd = 'cat -e'
@@ -745,9 +1100,6 @@ class FilterTestCase(SandboxedTestCase):
                 r._get_steps(),
                 [{
                     'type': 'streaming',
-                    'mapper': {
-                        'type': 'script',
-                    },
                     'reducer': {
                         'type': 'script',
                         'pre_filter': 'cat -e'}}])
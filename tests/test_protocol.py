@@ -20,14 +20,31 @@ try:
 except ImportError:
     import unittest
 
+from mrjob.protocol import BaseProtocol
+from mrjob.protocol import BinaryPickleProtocol
+from mrjob.protocol import BinaryPickleValueProtocol
+from mrjob.protocol import DelimitedProtocol
+from mrjob.protocol import DelimitedValueProtocol
+from mrjob.protocol import JSONBackend
 from mrjob.protocol import JSONProtocol
 from mrjob.protocol import JSONValueProtocol
 from mrjob.protocol import PickleProtocol
 from mrjob.protocol import PickleValueProtocol
+from mrjob.protocol import RawBytesProtocol
+from mrjob.protocol import RawBytesValueProtocol
 from mrjob.protocol import RawProtocol
 from mrjob.protocol import RawValueProtocol
 from mrjob.protocol import ReprProtocol
 from mrjob.protocol import ReprValueProtocol
+from mrjob.protocol import SparseVectorProtocol
+from mrjob.protocol import SparseVectorValueProtocol
+from mrjob.protocol import TypedBytesProtocol
+from mrjob.protocol import TypedBytesValueProtocol
+from mrjob.protocol import get_json_backend
+from mrjob.protocol import register_json_backend
+from mrjob.protocol import _JSON_BACKEND_FACTORIES
+from mrjob.sparse import SparseVector
+from mrjob.typedbytes import dumps
 
 
 # keys and values that should encode/decode properly in all protocols
@@ -68,11 +85,190 @@ class ProtocolTestCase(unittest.TestCase):
         self.assertEqual((key, value),
                          protocol.read(protocol.write(key, value)))
 
+        # batch methods should agree with read() and write()
+        lines = protocol.write_many([(key, value)] * 2)
+        self.assertEqual(lines, [protocol.write(key, value)] * 2)
+        self.assertEqual(protocol.read_many(lines), [(key, value)] * 2)
+
     def assertCantEncode(self, protocol, key, value):
         self.assertRaises(Exception, protocol.write, key, value)
+        self.assertRaises(Exception, protocol.write_many,
+                          [(key, value), (key, value)])
 
     def assertCantDecode(self, protocol, data):
         self.assertRaises(Exception, protocol.read, data)
+        self.assertRaises(Exception, protocol.read_many, [data, data])
+
+
+class BaseProtocolTestCase(ProtocolTestCase):
+
+    class UpperCaseProtocol(BaseProtocol):
+
+        def read(self, line):
+            return (None, line.lower())
+
+        def write(self, key, value):
+            return value.upper()
+
+    def test_default_batch_methods(self):
+        p = self.UpperCaseProtocol()
+        self.assertRoundTripOK(p, None, 'foo')
+        self.assertEqual(p.write_many([(None, 'foo'), (1, 'bar')]),
+                         ['FOO', 'BAR'])
+        self.assertEqual(p.read_many(['FOO', 'BAR']),
+                         [(None, 'foo'), (None, 'bar')])
+
+    def test_empty_batches(self):
+        for p in (self.UpperCaseProtocol(), JSONProtocol, JSONValueProtocol,
+                  PickleProtocol, RawProtocol(), RawValueProtocol,
+                  TypedBytesProtocol):
+            self.assertEqual(p.read_many([]), [])
+            self.assertEqual(p.write_many([]), [])
+
+
+class DecodeCacheTestCase(unittest.TestCase):
+
+    def test_disabled_by_default(self):
+        p = JSONProtocol()
+        self.assertEqual(p.read('"a"\t1'), ('a', 1))
+        self.assertEqual(p._decode_cache, None)
+
+    def test_hits_and_misses(self):
+        p = JSONValueProtocol(decode_cache_size=10)
+        self.assertEqual(p.read_many(['"US"', '"FR"', '"US"']),
+                         [(None, 'US'), (None, 'FR'), (None, 'US')])
+        self.assertEqual(p.read('"FR"'), (None, 'FR'))
+        self.assertEqual((p._decode_cache.hits, p._decode_cache.misses),
+                         (2, 2))
+
+    def test_decoded_objects_are_shared(self):
+        p = JSONValueProtocol(decode_cache_size=10)
+        self.assertIs(p.read('[1, 2]')[1], p.read('[1, 2]')[1])
+
+    def test_least_recently_used_is_discarded(self):
+        p = ReprValueProtocol(decode_cache_size=2)
+        for line in ['1', '2', '1', '3', '1', '2']:
+            p.read(line)
+        # 2 was discarded to make room for 3, and 3 to make room for 2
+        self.assertEqual((p._decode_cache.hits, p._decode_cache.misses),
+                         (2, 4))
+        self.assertEqual(sorted(p._decode_cache._links), ['1', '2'])
+
+    def test_keys_and_values_share_cache(self):
+        p = JSONProtocol(decode_cache_size=10)
+        self.assertEqual(p.read_many(['"a"\t"a"', '"b"\t"a"']),
+                         [('a', 'a'), ('b', 'a')])
+        self.assertEqual((p._decode_cache.hits, p._decode_cache.misses),
+                         (2, 2))
+
+    def test_errors_are_not_cached(self):
+        p = PickleValueProtocol(decode_cache_size=10)
+        self.assertRaises(Exception, p.read, 'bad')
+        self.assertRaises(Exception, p.read, 'bad')
+        self.assertEqual(p._decode_cache._links, {})
+
+    def test_class_attribute(self):
+        class CachingJSONProtocol(JSONProtocol):
+            decode_cache_size = 5
+
+        p = CachingJSONProtocol()
+        p.read('"a"\t1')
+        self.assertEqual(p._decode_cache.misses, 2)
+
+        # constructor argument wins
+        p = CachingJSONProtocol(decode_cache_size=0)
+        p.read('"a"\t1')
+        self.assertEqual(p._decode_cache, None)
+
+    def test_no_caching_on_class(self):
+        class CachingJSONValueProtocol(JSONValueProtocol):
+            decode_cache_size = 5
+
+        CachingJSONValueProtocol.read('1')
+        self.assertEqual(CachingJSONValueProtocol._decode_cache, None)
+
+
+class KeyCachingTestCase(unittest.TestCase):
+
+    def test_last_key_is_per_instance(self):
+        p1 = PickleProtocol()
+        p2 = PickleProtocol()
+        line = PickleProtocol.write('a', 1)
+
+        p1.read(line)
+        self.assertEqual(p1._last_key_decoded, 'a')
+        self.assertEqual(p2._last_key_decoded, None)
+
+    def test_instances_ignore_key_cached_on_class(self):
+        line = JSONProtocol.write('a', 1)
+        JSONProtocol.read(line)
+        self.assertEqual(JSONProtocol()._last_key_encoded, None)
+
+    def test_subclasses_ignore_key_cached_on_class(self):
+        class UpperCaseKeyJSONProtocol(JSONProtocol):
+            @classmethod
+            def load_from_string(cls, value):
+                return JSONProtocol.load_from_string(value).upper()
+
+        JSONProtocol.read('"a"\t"b"')
+        self.assertEqual(UpperCaseKeyJSONProtocol.read('"a"\t"b"'),
+                         ('A', 'B'))
+
+    def test_bad_key_is_not_cached(self):
+        p = JSONProtocol()
+        self.assertEqual(p.read('"a"\t1'), ('a', 1))
+        self.assertRaises(Exception, p.read, 'BAD\t2')
+        self.assertEqual(p._last_key_encoded, '"a"')
+        self.assertEqual(p.read('"a"\t3'), ('a', 3))
+
+
+class JSONBackendTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        _JSON_BACKEND_FACTORIES.pop('upper', None)
+
+    def test_default(self):
+        self.assertEqual(get_json_backend().name, 'default')
+        self.assertEqual(get_json_backend(None).name, 'default')
+        self.assertEqual(get_json_backend().dumps({'a': 1}), '{"a": 1}')
+
+    def test_compact(self):
+        backend = get_json_backend('compact')
+        self.assertEqual(backend.dumps({'a': [1, 2]}), '{"a":[1,2]}')
+        self.assertEqual(backend.loads('{"a":[1,2]}'), {'a': [1, 2]})
+
+    def test_json_module(self):
+        backend = get_json_backend('json')
+        self.assertEqual(backend.loads(backend.dumps(['a', 1])), ['a', 1])
+
+    def test_auto(self):
+        self.assertIn(get_json_backend('auto').name, ('ujson', 'compact'))
+
+    def test_backends_are_reused(self):
+        self.assertIs(get_json_backend('compact'), get_json_backend('compact'))
+
+    def test_unknown_backend(self):
+        self.assertRaises(ValueError, get_json_backend, 'yaml')
+
+    def test_register(self):
+        register_json_backend(
+            'upper', lambda: JSONBackend(
+                'upper', get_json_backend().loads,
+                lambda v: get_json_backend().dumps(v).upper()))
+
+        self.assertEqual(get_json_backend('upper').dumps('a'), '"A"')
+        self.assertEqual(JSONProtocol(json_backend='upper').write('a', 'b'),
+                         '"A"\t"B"')
+
+    def test_backend_not_installed(self):
+        def missing():
+            raise ImportError('No module named upper')
+
+        register_json_backend('upper', missing)
+
+        self.assertRaises(ImportError, get_json_backend, 'upper')
+        self.assertRaises(ImportError,
+                          JSONProtocol(json_backend='upper').write, 'a', 'b')
 
 
 class JSONProtocolTestCase(ProtocolTestCase):
@@ -102,6 +298,58 @@ class JSONProtocolTestCase(ProtocolTestCase):
     def test_bad_data(self):
         self.assertCantDecode(JSONProtocol, '{@#$@#!^&*$%^')
 
+    def test_compact_backend(self):
+        p = JSONProtocol(json_backend='compact')
+        ENCODED = '["a",1]\t{"foo":{"bar":3}}'
+
+        self.assertEqual(p.write(['a', 1], {'foo': {'bar': 3}}), ENCODED)
+        self.assertEqual(p.read(ENCODED), (['a', 1], {'foo': {'bar': 3}}))
+        self.assertEqual(p.write_many([('a', [1, 2])]), ['"a"\t[1,2]'])
+        self.assertEqual(p.read_many(['"a"\t[1,2]']), [('a', [1, 2])])
+
+        for k, v in SAFE_KEYS_AND_VALUES:
+            self.assertRoundTripOK(p, k, v)
+
+        # doesn't affect the class
+        self.assertEqual(JSONProtocol.write('a', [1, 2]), '"a"\t[1, 2]')
+
+    def test_backend_class_attribute(self):
+        class CompactJSONProtocol(JSONProtocol):
+            json_backend = 'compact'
+
+        self.assertEqual(CompactJSONProtocol.write('a', [1, 2]),
+                         '"a"\t[1,2]')
+        self.assertEqual(CompactJSONProtocol().write('a', [1, 2]),
+                         '"a"\t[1,2]')
+
+    def test_backend_with_decode_cache(self):
+        p = JSONProtocol(json_backend='compact', decode_cache_size=10)
+        self.assertEqual(p.read('"a"\t[1]'), ('a', [1]))
+        self.assertEqual(p.read('"b"\t[1]'), ('b', [1]))
+        self.assertEqual(p._decode_cache.hits, 1)
+
+    def test_bad_lines_in_batch(self):
+        self.assertRaises(Exception, JSONProtocol.read_many,
+                          ['"a"\t1', '"b"\t2\t3'])
+        # JSONs that are only valid when decoded together
+        self.assertRaises(Exception, JSONProtocol.read_many,
+                          ['"a"\t[1', '"b"\t2]'])
+        self.assertRaises(Exception, JSONProtocol.read_many,
+                          ['"a"\t1, 2'])
+        # bad JSONs that make up for each other's extra and missing values
+        self.assertRaises(Exception, JSONProtocol.read_many,
+                          ['"a"\t[1', '"b"\t2]', '"c"\t3,4'])
+        self.assertRaises(Exception, JSONValueProtocol.read_many,
+                          ['[1', '2]', '3,4'])
+
+    def test_batch_containing_marker(self):
+        # _json_loads_many() puts "\u0001" between JSONs
+        self.assertEqual(
+            JSONValueProtocol.read_many(['"\\u0001"', '[1, "\\u0001"]']),
+            [(None, u'\x01'), (None, [1, u'\x01'])])
+        self.assertRaises(Exception, JSONValueProtocol.read_many,
+                          ['1, "\\u0001", 2', '[3', '4]'])
+
     def test_bad_keys_and_values(self):
         # dictionaries have to have strings as keys
         self.assertCantEncode(JSONProtocol, {(1, 2): 3}, None)
@@ -116,6 +364,48 @@ class JSONProtocolTestCase(ProtocolTestCase):
         self.assertCantEncode(JSONProtocol, Point(2, 3), Point(1, 4))
 
 
+class UpperCaseJSONProtocol(JSONProtocol):
+
+    @classmethod
+    def load_from_string(cls, value):
+        value = JSONProtocol.load_from_string(value)
+        if isinstance(value, basestring):
+            value = value.upper()
+        return value
+
+    @classmethod
+    def dump_to_string(cls, value):
+        if isinstance(value, basestring):
+            value = value.lower()
+        return JSONProtocol.dump_to_string(value)
+
+
+class OverriddenJSONProtocolTestCase(unittest.TestCase):
+    """Calling the JSON backend directly shouldn't bypass subclasses'
+    overrides of load_from_string() and dump_to_string()."""
+
+    def assertOverridesRespected(self, p):
+        self.assertEqual(p.read('"a"\t"b"'), (u'A', u'B'))
+        self.assertEqual(p.read_many(['"a"\t"b"']), [(u'A', u'B')])
+        self.assertEqual(p.write('A', 'B'), '"a"\t"b"')
+        self.assertEqual(p.write_many([('A', 'B')]), ['"a"\t"b"'])
+
+    def test_class(self):
+        self.assertOverridesRespected(UpperCaseJSONProtocol)
+
+    def test_instance(self):
+        self.assertOverridesRespected(UpperCaseJSONProtocol())
+
+    def test_instance_with_decode_cache(self):
+        self.assertOverridesRespected(
+            UpperCaseJSONProtocol(decode_cache_size=10))
+
+    def test_compact_backend(self):
+        p = UpperCaseJSONProtocol(json_backend='compact')
+        self.assertOverridesRespected(p)
+        self.assertEqual(p.write(['A'], 'B'), '["A"]\t"b"')
+
+
 class JSONValueProtocolTestCase(ProtocolTestCase):
 
     def test_round_trip(self):
@@ -144,6 +434,16 @@ class JSONValueProtocolTestCase(ProtocolTestCase):
     def test_bad_data(self):
         self.assertCantDecode(JSONValueProtocol, '{@#$@#!^&*$%^')
 
+    def test_compact_backend(self):
+        p = JSONValueProtocol(json_backend='compact')
+
+        self.assertEqual(p.write(None, {'a': [1, 2]}), '{"a":[1,2]}')
+        self.assertEqual(p.write_many([(None, [1, 2])]), ['[1,2]'])
+        self.assertEqual(p.read('{"a":[1,2]}'), (None, {'a': [1, 2]}))
+
+        for _, v in SAFE_KEYS_AND_VALUES:
+            self.assertRoundTripOK(p, None, v)
+
     def test_bad_keys_and_values(self):
         # dictionaries have to have strings as keys
         self.assertCantEncode(JSONValueProtocol, None, {(1, 2): 3})
@@ -190,6 +490,102 @@ class PickleValueProtocolTestCase(ProtocolTestCase):
     # no tests of what encoded data looks like; pickle is an opaque protocol
 
 
+class UpperCasePickleProtocol(PickleProtocol):
+
+    @classmethod
+    def load_from_string(cls, value):
+        return PickleProtocol.load_from_string(value).upper()
+
+    @classmethod
+    def dump_to_string(cls, value):
+        return PickleProtocol.dump_to_string(value.lower())
+
+
+class UpperCasePickleValueProtocol(PickleValueProtocol):
+
+    @classmethod
+    def load_from_string(cls, value):
+        return PickleValueProtocol.load_from_string(value).upper()
+
+
+class OverriddenLoadAndDumpTestCase(unittest.TestCase):
+    """Batch methods shouldn't bypass subclasses' overrides of
+    load_from_string() and dump_to_string()."""
+
+    def test_pickle_protocol(self):
+        for p in (UpperCasePickleProtocol, UpperCasePickleProtocol()):
+            lines = p.write_many([('A', 'B')])
+            self.assertEqual(lines, [p.write('A', 'B')])
+            self.assertEqual(lines, [PickleProtocol.write('a', 'b')])
+
+            self.assertEqual(p.read(lines[0]), ('A', 'B'))
+            self.assertEqual(p.read_many(lines), [('A', 'B')])
+
+    def test_pickle_value_protocol(self):
+        line = PickleValueProtocol.write(None, 'b')
+        for p in (UpperCasePickleValueProtocol,
+                  UpperCasePickleValueProtocol()):
+            self.assertEqual(p.read(line), (None, 'B'))
+            self.assertEqual(p.read_many([line]), [(None, 'B')])
+
+    def test_base_classes_unaffected(self):
+        line = PickleProtocol.write('a', 'b')
+        self.assertEqual(PickleProtocol.read_many([line]), [('a', 'b')])
+        self.assertEqual(PickleValueProtocol.read_many([line.split('\t')[1]]),
+                         [(None, 'b')])
+
+
+class BinaryPickleProtocolTestCase(ProtocolTestCase):
+
+    def test_round_trip(self):
+        for k, v in SAFE_KEYS_AND_VALUES:
+            self.assertRoundTripOK(BinaryPickleProtocol, k, v)
+        self.assertRoundTripOK(BinaryPickleProtocol, (1, 2), (3, 4))
+        self.assertRoundTripOK(BinaryPickleProtocol, '0\xa2', '\xe9')
+        self.assertRoundTripOK(BinaryPickleProtocol, set([1]), set())
+        self.assertRoundTripOK(BinaryPickleProtocol, Point(2, 3), Point(1, 4))
+
+    def test_escaping(self):
+        # all the bytes we escape, including the escape byte itself, and
+        # sequences that look like escape sequences
+        tricky = '\t\n\r\x1b\x1b0\x1b1\r\n\x1b'
+        self.assertRoundTripOK(BinaryPickleProtocol, tricky, tricky)
+        self.assertRoundTripOK(BinaryPickleProtocol, 9, [10, 13, 27])
+
+        line = BinaryPickleProtocol.write(tricky, [9, 10, 13])
+        self.assertEqual(line.count('\t'), 1)
+        self.assertNotIn('\n', line)
+        self.assertNotIn('\r', line)
+
+    def test_smaller_than_pickle_protocol(self):
+        value = {'foo': range(100), 'bar': 'baz' * 10}
+        self.assertLess(len(BinaryPickleProtocol.write('a', value)),
+                        len(PickleProtocol.write('a', value)))
+
+    def test_bad_data(self):
+        self.assertCantDecode(BinaryPickleProtocol, '{@#$@#!^&*$%^')
+
+    # no tests of what encoded data looks like; pickle is an opaque protocol
+
+
+class BinaryPickleValueProtocolTestCase(ProtocolTestCase):
+
+    def test_round_trip(self):
+        for _, v in SAFE_KEYS_AND_VALUES:
+            self.assertRoundTripOK(BinaryPickleValueProtocol, None, v)
+        self.assertRoundTripOK(BinaryPickleValueProtocol, None, (3, 4))
+        self.assertRoundTripOK(BinaryPickleValueProtocol, None, '\t\x1b')
+        self.assertRoundTripOK(BinaryPickleValueProtocol, None, Point(1, 4))
+
+    def test_no_newlines(self):
+        line = BinaryPickleValueProtocol.write(None, range(20))
+        self.assertNotIn('\n', line)
+        self.assertNotIn('\r', line)
+
+    def test_bad_data(self):
+        self.assertCantDecode(BinaryPickleValueProtocol, '{@#$@#!^&*$%^')
+
+
 class RawValueProtocolTestCase(ProtocolTestCase):
 
     def test_dumps_keys(self):
@@ -236,6 +632,131 @@ class RawProtocolTestCase(ProtocolTestCase):
         self.assertEqual(RawProtocol().read('foo\t \n\n'),
                          ('foo', ' \n\n'))
 
+    def test_batches(self):
+        self.assertEqual(
+            RawProtocol().read_many(['foo', 'foo\tbar\tbaz', '']),
+            [('foo', None), ('foo', 'bar\tbaz'), ('', None)])
+        self.assertEqual(
+            RawProtocol().write_many([('foo', 'bar'), ('foo', None)]),
+            ['foo\tbar', 'foo'])
+
+
+class LogLineProtocol(DelimitedValueProtocol):
+
+    fields = ['time', 'user', ('status', int), ('bytes', int), 'url']
+
+
+class DelimitedValueProtocolTestCase(ProtocolTestCase):
+
+    LINE = '12:00\tdave\t200\t512\t/index.html'
+
+    def test_all_fields(self):
+        key, record = LogLineProtocol().read(self.LINE)
+
+        self.assertEqual(key, None)
+        self.assertEqual(record, ('12:00', 'dave', 200, 512, '/index.html'))
+        self.assertEqual(record.user, 'dave')
+        self.assertEqual(record.bytes, 512)
+        self.assertEqual(record._fields,
+                         ('time', 'user', 'status', 'bytes', 'url'))
+
+    def test_round_trip(self):
+        p = LogLineProtocol()
+        record = p.record_class('12:00', 'dave', 404, 0, '/missing')
+        self.assertRoundTripOK(p, None, record)
+        self.assertEqual(p.write(None, record),
+                         '12:00\tdave\t404\t0\t/missing')
+
+    def test_columns(self):
+        p = LogLineProtocol(columns=['bytes', 'user'])
+        key, record = p.read(self.LINE)
+
+        self.assertEqual(record, (512, 'dave'))
+        self.assertEqual(record.bytes, 512)
+        self.assertFalse(hasattr(record, 'url'))
+
+    def test_unused_fields_are_not_converted_or_split(self):
+        p = LogLineProtocol(columns=['user'])
+
+        # status isn't an int, and there's no url field
+        self.assertEqual(p.read('12:00\tdave\tOK'), (None, ('dave',)))
+
+    def test_too_few_fields(self):
+        self.assertCantDecode(LogLineProtocol(), '12:00\tdave\t200')
+        self.assertCantDecode(LogLineProtocol(columns=['url']), '12:00')
+
+    def test_bad_field(self):
+        self.assertCantDecode(LogLineProtocol(),
+                              '12:00\tdave\tOK\t512\t/index.html')
+
+    def test_unknown_column(self):
+        self.assertRaises(ValueError, LogLineProtocol, columns=['referrer'])
+
+    def test_no_fields(self):
+        p = DelimitedValueProtocol(delimiter=',')
+        self.assertEqual(p.read('a,b,,c'), (None, ('a', 'b', '', 'c')))
+        self.assertRoundTripOK(p, None, ('a', 'b', '', 'c'))
+
+        self.assertRaises(ValueError, DelimitedValueProtocol,
+                          columns=['a'])
+
+    def test_constructor_args(self):
+        p = DelimitedValueProtocol(
+            fields=['name', ('score', float)], delimiter=',')
+        self.assertEqual(p.read('bob,1.5'), (None, ('bob', 1.5)))
+
+        # doesn't affect the class
+        self.assertEqual(DelimitedValueProtocol.fields, None)
+
+    def test_write_converts_non_strings(self):
+        p = DelimitedValueProtocol()
+
+        self.assertEqual(p.write(None, ('a', 1, 0.1, u'\xe9', None)),
+                         'a\t1\t0.1\t\xc3\xa9\tNone')
+        # floats don't lose precision
+        self.assertEqual(p.read(p.write(None, (1 / 3.0,)))[1],
+                         (repr(1 / 3.0),))
+
+    def test_batches(self):
+        p = LogLineProtocol(columns=['user', 'status'])
+
+        self.assertEqual(
+            p.read_many([self.LINE, '1:00\tbob\t500\t0\t/']),
+            [(None, ('dave', 200)), (None, ('bob', 500))])
+        self.assertEqual(
+            p.write_many([(None, ('dave', 200)), ('foo', ('bob', 500))]),
+            ['dave\t200', 'bob\t500'])
+
+    def test_record_class(self):
+        record_class = LogLineProtocol(columns=['user', 'bytes']).record_class
+
+        self.assertEqual(record_class('dave', 512), ('dave', 512))
+        self.assertEqual(record_class('dave', 512).bytes, 512)
+        self.assertEqual(repr(record_class('dave', 512)),
+                         "LogLineProtocolRecord(user='dave', bytes=512)")
+        self.assertRaises(TypeError, record_class, 'dave')
+
+
+class DelimitedProtocolTestCase(ProtocolTestCase):
+
+    def test_round_trip(self):
+        p = DelimitedProtocol(fields=[('x', int), ('y', int)],
+                              delimiter=',')
+
+        self.assertEqual(p.read('point\t2,3'), ('point', (2, 3)))
+        self.assertEqual(p.read('point\t2,3')[1].y, 3)
+        self.assertRoundTripOK(p, 'point', p.record_class(2, 3))
+
+    def test_columns(self):
+        p = DelimitedProtocol(fields=['a', 'b', 'c'], columns=['b'])
+        self.assertEqual(p.read('k\t1\t2\t3'), ('k', ('2',)))
+
+    def test_no_key(self):
+        p = DelimitedProtocol()
+        self.assertEqual(p.write(None, ('a', 'b')), 'a\tb')
+        self.assertEqual(p.write_many([(None, ('a', 'b'))]), ['a\tb'])
+        self.assertCantDecode(p, 'a')
+
 
 class ReprProtocolTestCase(ProtocolTestCase):
 
@@ -283,3 +804,165 @@ class ReprValueProtocolTestCase(ProtocolTestCase):
     def test_can_encode_point_but_not_decode(self):
         points_encoded = ReprValueProtocol.write(None, Point(1, 4))
         self.assertCantDecode(ReprValueProtocol, points_encoded)
+
+
+class SparseVectorProtocolTestCase(ProtocolTestCase):
+
+    def test_round_trip(self):
+        self.assertRoundTripOK(SparseVectorProtocol, None, SparseVector())
+        self.assertRoundTripOK(SparseVectorProtocol, 'doc-1',
+                               SparseVector([1, 5], [0.5, 2.0]))
+        self.assertRoundTripOK(SparseVectorProtocol, [1, u'Qu\xe9bec'],
+                               SparseVector(range(100), [1.0] * 100))
+
+    def test_key_is_json(self):
+        line = SparseVectorProtocol.write({'a': 1}, SparseVector())
+        self.assertTrue(line.startswith('{"a": 1}\t'))
+
+    def test_escaping(self):
+        # 9, 10, 13, and 27 are tab, newline, carriage return, and the
+        # escape byte
+        v = SparseVector([9, 10, 13, 27], [9.0, 10.0, 13.0, 27.0])
+        self.assertRoundTripOK(SparseVectorProtocol, 'tricky', v)
+
+        line = SparseVectorProtocol.write('tricky', v)
+        self.assertEqual(line.count('\t'), 1)
+        self.assertNotIn('\n', line)
+        self.assertNotIn('\r', line)
+
+    def test_smaller_than_json(self):
+        v = SparseVector(range(0, 10000, 100), [i / 7.0 for i in range(100)])
+        self.assertLess(
+            len(SparseVectorProtocol.write('a', v)),
+            len(JSONProtocol.write('a', [v.indices.tolist(),
+                                         v.values.tolist()])))
+
+    def test_bad_data(self):
+        self.assertCantDecode(SparseVectorProtocol, '{@#$@#!^&*$%^')
+        self.assertCantDecode(SparseVectorProtocol, '"a"\t\x01\x00')
+        self.assertCantEncode(SparseVectorProtocol, 'a', {1: 2.0})
+
+
+class SparseVectorValueProtocolTestCase(ProtocolTestCase):
+
+    def test_round_trip(self):
+        self.assertRoundTripOK(SparseVectorValueProtocol, None, SparseVector())
+        self.assertRoundTripOK(SparseVectorValueProtocol, None,
+                               SparseVector([9, 10, 13, 27], [9, 10, 13, 27]))
+
+    def test_discards_key(self):
+        v = SparseVector([1], [1.0])
+        self.assertEqual(SparseVectorValueProtocol.write('foo', v),
+                         SparseVectorValueProtocol.write(None, v))
+
+    def test_no_newlines(self):
+        line = SparseVectorValueProtocol.write(
+            None, SparseVector(range(20), range(20)))
+        self.assertNotIn('\n', line)
+        self.assertNotIn('\r', line)
+
+    def test_bad_data(self):
+        self.assertCantDecode(SparseVectorValueProtocol, '{@#$@#!^&*$%^')
+
+
+class TypedBytesProtocolTestCase(ProtocolTestCase):
+
+    def test_round_trip(self):
+        for k, v in SAFE_KEYS_AND_VALUES:
+            self.assertRoundTripOK(TypedBytesProtocol, k, v)
+        self.assertRoundTripOK(TypedBytesProtocol, (1, 2), (3, 4))
+        self.assertRoundTripOK(TypedBytesProtocol, '0\xa2', '\xe9')
+        self.assertRoundTripOK(TypedBytesProtocol, set([1]), set())
+        self.assertRoundTripOK(TypedBytesProtocol, Point(2, 3), Point(1, 4))
+
+    def test_uses_typed_bytes_format(self):
+        self.assertEqual(TypedBytesProtocol.write('a', 1),
+                         '\x00\x00\x00\x00\x01a\x03\x00\x00\x00\x01')
+
+    def test_bad_data(self):
+        self.assertCantDecode(TypedBytesProtocol, '{@#$@#!^&*$%^')
+        # key but no value
+        self.assertCantDecode(TypedBytesProtocol, dumps('a'))
+        # extra data after value
+        self.assertCantDecode(TypedBytesProtocol, dumps('a') + dumps(1) + 'x')
+
+    def test_hadoop_io(self):
+        self.assertEqual(TypedBytesProtocol.hadoop_io, 'typedbytes')
+
+
+class TypedBytesValueProtocolTestCase(ProtocolTestCase):
+
+    def test_round_trip(self):
+        for _, v in SAFE_KEYS_AND_VALUES:
+            self.assertRoundTripOK(TypedBytesValueProtocol, None, v)
+        self.assertRoundTripOK(TypedBytesValueProtocol, None, (3, 4))
+        self.assertRoundTripOK(TypedBytesValueProtocol, None, Point(1, 4))
+
+    def test_ignores_key(self):
+        self.assertEqual(TypedBytesValueProtocol.read(dumps('a') + dumps(1)),
+                         (None, 1))
+        self.assertEqual(TypedBytesValueProtocol.write('a', 1),
+                         dumps('') + dumps(1))
+
+    def test_bad_data(self):
+        self.assertCantDecode(TypedBytesValueProtocol, '{@#$@#!^&*$%^')
+        self.assertCantDecode(TypedBytesValueProtocol, dumps('a'))
+
+
+class RawBytesProtocolTestCase(ProtocolTestCase):
+
+    def test_round_trip(self):
+        self.assertRoundTripOK(RawBytesProtocol, 'foo', 'bar')
+        self.assertRoundTripOK(RawBytesProtocol, '', '')
+        self.assertRoundTripOK(RawBytesProtocol, '\t\n\r', '\x00\xff\n')
+        self.assertRoundTripOK(RawBytesProtocol, 'blob', ''.join(
+            chr(i) for i in xrange(256)) * 100)
+
+    def test_uses_typed_bytes_format(self):
+        self.assertEqual(RawBytesProtocol.write('a', '\n'),
+                         dumps('a') + dumps('\n'))
+
+    def test_reads_strings_as_raw_data(self):
+        self.assertEqual(RawBytesProtocol.read(dumps('a') + dumps(u'\xe9')),
+                         ('a', '\xc3\xa9'))
+
+    def test_only_encodes_bytestrings(self):
+        self.assertCantEncode(RawBytesProtocol, 'a', 1)
+        self.assertCantEncode(RawBytesProtocol, None, 'a')
+        self.assertCantEncode(RawBytesProtocol, 'a', u'b')
+
+    def test_bad_data(self):
+        self.assertCantDecode(RawBytesProtocol, '')
+        self.assertCantDecode(RawBytesProtocol, '{@#$@#!^&*$%^')
+        # key but no value
+        self.assertCantDecode(RawBytesProtocol, dumps('a'))
+        # not bytes
+        self.assertCantDecode(RawBytesProtocol, dumps('a') + dumps(1))
+        # truncated
+        self.assertCantDecode(RawBytesProtocol, dumps('a') + dumps('bc')[:-1])
+        # extra data after value
+        self.assertCantDecode(RawBytesProtocol, dumps('a') + dumps('b') + 'x')
+
+    def test_hadoop_io(self):
+        self.assertEqual(RawBytesProtocol.hadoop_io, 'typedbytes')
+
+
+class RawBytesValueProtocolTestCase(ProtocolTestCase):
+
+    def test_round_trip(self):
+        self.assertRoundTripOK(RawBytesValueProtocol, None, 'bar')
+        self.assertRoundTripOK(RawBytesValueProtocol, None, '\t\n\x00')
+
+    def test_ignores_key(self):
+        self.assertEqual(RawBytesValueProtocol.read(dumps(1) + dumps('a')),
+                         (None, 'a'))
+        self.assertEqual(RawBytesValueProtocol.write('a', 'b'),
+                         dumps('') + dumps('b'))
+
+    def test_bad_data(self):
+        self.assertCantDecode(RawBytesValueProtocol, '{@#$@#!^&*$%^')
+        self.assertCantDecode(RawBytesValueProtocol, dumps('a'))
+        self.assertCantDecode(RawBytesValueProtocol, dumps('a') + dumps(1))
+
+    def test_hadoop_io(self):
+        self.assertEqual(RawBytesValueProtocol.hadoop_io, 'typedbytes')
@@ -513,6 +513,56 @@ class HadoopConfArgsTestCase(EmptyMrjobConfTestCase):
                           '-partitioner', partitioner,
                           ])
 
+    def test_io_typedbytes(self):
+        runner = LocalMRJobRunner(conf_paths=[])
+        step = {'mapper': {'type': 'script'},
+                'reducer': {'type': 'script'},
+                'io': {'map_input': 'typedbytes',
+                       'map_output': 'typedbytes',
+                       'reduce_input': 'typedbytes',
+                       'reduce_output': 'typedbytes'}}
+        self.assertEqual(runner._hadoop_conf_args(step, 0, 1),
+                         ['-D', 'mapred.job.name=None > None',
+                          '-io', 'typedbytes'])
+
+    def test_io_typedbytes_between_steps(self):
+        runner = LocalMRJobRunner(conf_paths=[])
+        step_1 = {'mapper': {'type': 'script'},
+                  'reducer': {'type': 'script'},
+                  'io': {'map_output': 'typedbytes',
+                         'reduce_input': 'typedbytes',
+                         'reduce_output': 'typedbytes'}}
+        step_2 = {'reducer': {'type': 'script'},
+                  'io': {'map_input': 'typedbytes',
+                         'map_output': 'typedbytes',
+                         'reduce_input': 'typedbytes'}}
+
+        self.assertEqual(
+            runner._hadoop_conf_args(step_1, 0, 2),
+            ['-D', 'mapred.job.name=None > None (step 1 of 2)',
+             '-D', 'stream.map.output=typedbytes',
+             '-D', 'stream.reduce.input=typedbytes',
+             '-D', 'stream.reduce.output=typedbytes',
+             '-outputformat',
+             'org.apache.hadoop.mapred.SequenceFileOutputFormat'])
+        self.assertEqual(
+            runner._hadoop_conf_args(step_2, 1, 2),
+            ['-D', 'mapred.job.name=None > None (step 2 of 2)',
+             '-D', 'stream.map.input=typedbytes',
+             '-D', 'stream.map.output=typedbytes',
+             '-D', 'stream.reduce.input=typedbytes',
+             '-inputformat',
+             'org.apache.hadoop.mapred.SequenceFileInputFormat'])
+
+    def test_jobconf_overrides_io(self):
+        runner = LocalMRJobRunner(
+            conf_paths=[], jobconf={'stream.map.output': 'rawbytes'})
+        step = {'mapper': {'type': 'script'},
+                'io': {'map_output': 'typedbytes'}}
+        self.assertEqual(runner._hadoop_conf_args(step, 0, 1),
+                         ['-D', 'mapred.job.name=None > None',
+                          '-D', 'stream.map.output=rawbytes'])
+
     def test_hadoop_extra_args_comes_first(self):
         runner = LocalMRJobRunner(
             cmdenv={'FOO': 'bar'},
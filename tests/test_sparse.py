@@ -0,0 +1,177 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for sparse vectors and their binary encoding."""
+from array import array
+import cPickle
+import imp
+import os.path
+from StringIO import StringIO
+
+try:
+    import unittest2 as unittest
+    unittest  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    import unittest
+
+import mrjob
+from mrjob.sparse import SparseVector
+from mrjob.sparse import dumps
+from mrjob.sparse import loads
+
+
+class SparseVectorTestCase(unittest.TestCase):
+
+    def test_empty(self):
+        v = SparseVector()
+        self.assertEqual(len(v), 0)
+        self.assertEqual(list(v), [])
+        self.assertEqual(v.max_index(), -1)
+        self.assertEqual(v.to_dict(), {})
+
+    def test_arrays(self):
+        v = SparseVector([1, 5], [0.5, 2])
+        self.assertEqual(v.indices, array('i', [1, 5]))
+        self.assertEqual(v.values, array('d', [0.5, 2.0]))
+        self.assertEqual(len(v), 2)
+        self.assertEqual(list(v), [(1, 0.5), (5, 2.0)])
+        self.assertEqual(v.max_index(), 5)
+
+    def test_from_dict(self):
+        v = SparseVector.from_dict({7: 1.0, 2: 3.0})
+        self.assertEqual(v, SparseVector([2, 7], [3.0, 1.0]))
+        self.assertEqual(v.to_dict(), {7: 1.0, 2: 3.0})
+
+    def test_getitem(self):
+        v = SparseVector([1, 5], [0.5, 2.0])
+        self.assertEqual(v[1], 0.5)
+        self.assertEqual(v[5], 2.0)
+        self.assertEqual(v[0], 0.0)
+        self.assertEqual(v[3], 0.0)
+        self.assertEqual(v[100], 0.0)
+
+    def test_bad_indices(self):
+        self.assertRaises(ValueError, SparseVector, [1, 2], [1.0])
+        self.assertRaises(ValueError, SparseVector, [2, 1], [1.0, 1.0])
+        self.assertRaises(ValueError, SparseVector, [1, 1], [1.0, 1.0])
+        self.assertRaises(ValueError, SparseVector, [-1], [1.0])
+
+    def test_equality(self):
+        self.assertEqual(SparseVector([1], [2.0]), SparseVector([1], [2.0]))
+        self.assertNotEqual(SparseVector([1], [2.0]), SparseVector([1], [3]))
+        self.assertNotEqual(SparseVector([1], [2.0]), SparseVector([2], [2]))
+        self.assertNotEqual(SparseVector([1], [2.0]), {1: 2.0})
+
+    def test_repr(self):
+        self.assertEqual(repr(SparseVector([1, 5], [0.5, 2.0])),
+                         'SparseVector([1, 5], [0.5, 2.0])')
+
+    def test_pickle(self):
+        v = SparseVector([1, 5], [0.5, 2.0])
+        for protocol in (0, cPickle.HIGHEST_PROTOCOL):
+            self.assertEqual(cPickle.loads(cPickle.dumps(v, protocol)), v)
+
+    def test_dot_sparse(self):
+        a = SparseVector([0, 2, 5, 9], [1.0, 2.0, 3.0, 4.0])
+        b = SparseVector([2, 3, 9, 10], [10.0, 100.0, 1000.0, 10000.0])
+        self.assertEqual(a.dot(b), 4020.0)
+        self.assertEqual(b.dot(a), 4020.0)
+        self.assertEqual(a.dot(SparseVector()), 0.0)
+
+    def test_dot_dense(self):
+        v = SparseVector([0, 2, 5], [1.0, 2.0, 3.0])
+        self.assertEqual(v.dot([1.0, 1.0, 1.0, 1.0, 1.0, 10.0]), 33.0)
+        self.assertEqual(v.dot(array('d', [2.0] * 6)), 12.0)
+        # entries past the end of the dense vector count as zero
+        self.assertEqual(v.dot([1.0, 1.0, 1.0]), 3.0)
+
+    def test_add_to_dense(self):
+        v = SparseVector([0, 2], [1.0, 2.0])
+        target = array('d', [1.0, 1.0, 1.0])
+        v.add_to(target)
+        self.assertEqual(target, array('d', [2.0, 1.0, 3.0]))
+        v.add_to(target, -0.5)
+        self.assertEqual(target, array('d', [1.5, 1.0, 2.0]))
+
+    def test_add_to_dense_too_short(self):
+        v = SparseVector([0, 5], [1.0, 2.0])
+        self.assertRaises(IndexError, v.add_to, [0.0, 0.0])
+
+    def test_add_to_dict(self):
+        v = SparseVector([0, 2], [1.0, 2.0])
+        target = {2: 1.0, 3: 1.0}
+        v.add_to(target, 2.0)
+        self.assertEqual(target, {0: 2.0, 2: 5.0, 3: 1.0})
+
+    def test_scaled(self):
+        v = SparseVector([0, 2], [1.0, 2.0])
+        self.assertEqual(v.scaled(3), SparseVector([0, 2], [3.0, 6.0]))
+        # original is unchanged
+        self.assertEqual(v, SparseVector([0, 2], [1.0, 2.0]))
+
+
+class EncodeDecodeTestCase(unittest.TestCase):
+
+    def assertRoundTripOK(self, vector):
+        self.assertEqual(loads(dumps(vector)), vector)
+
+    def test_round_trip(self):
+        self.assertRoundTripOK(SparseVector())
+        self.assertRoundTripOK(SparseVector([0], [0.0]))
+        self.assertRoundTripOK(SparseVector([3, 2 ** 31 - 1], [-1.5, 1e300]))
+        self.assertRoundTripOK(
+            SparseVector(range(0, 1000, 3), [i / 7.0 for i in range(334)]))
+
+    def test_encoding(self):
+        self.assertEqual(dumps(SparseVector()), '\x00\x00\x00\x00')
+        self.assertEqual(dumps(SparseVector([1], [1.0])),
+                         '\x01\x00\x00\x00' '\x01\x00\x00\x00'
+                         '\x00\x00\x00\x00\x00\x00\xf0\x3f')
+
+    def test_decoded_vector_is_usable(self):
+        v = loads(dumps(SparseVector([1, 4], [2.0, 3.0])))
+        self.assertEqual(v.dot([0.0, 1.0, 0.0, 0.0, 1.0]), 5.0)
+        self.assertEqual(v[4], 3.0)
+
+    def test_bad_data(self):
+        self.assertRaises(ValueError, loads, '')
+        self.assertRaises(ValueError, loads, '\x01\x00')
+        one_entry = dumps(SparseVector([1], [1.0]))
+        # says two entries, but only has one
+        self.assertRaises(ValueError, loads,
+                          '\x02\x00\x00\x00' + one_entry[4:])
+        # extra bytes
+        self.assertRaises(ValueError, loads, one_entry + 'x')
+
+
+class PegasosSVMExampleTestCase(unittest.TestCase):
+
+    def test_end_to_end(self):
+        # contrib isn't a package, so load the job from its file
+        path = os.path.join(os.path.dirname(mrjob.__file__),
+                            'examples', 'contrib', 'mr_pegasos_svm.py')
+        MRsvm = imp.load_source('mr_pegasos_svm', path).MRsvm
+
+        # feature 1 means positive, feature 2 means negative
+        examples = ''.join(['1 0:1 1:1\n', '-1 0:1 2:1\n'] * 50)
+
+        mr_job = MRsvm(['-r', 'inline', '--no-conf', '--lambda', '0.1', '-'])
+        mr_job.sandbox(stdin=StringIO(examples))
+
+        with mr_job.make_runner() as runner:
+            runner.run()
+            weights = dict(mr_job.parse_output_line(line)
+                           for line in runner.stream_output())
+
+        self.assertTrue(weights[1] > 0)
+        self.assertTrue(weights[2] < 0)
@@ -0,0 +1,284 @@
+# Copyright 2013 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for splitting compressed input files."""
+from __future__ import with_statement
+
+import bz2
+import gzip
+import os
+import random
+from StringIO import StringIO
+
+try:
+    import simplejson as json  # preferred because of C speedups
+    json  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    import json  # built in to Python 2.6 and later
+
+try:
+    import unittest2 as unittest
+    unittest  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    import unittest
+
+from mrjob.splits import _BitWriter
+from mrjob.splits import _find_line_start
+from mrjob.splits import _read_bits
+from mrjob.splits import get_index
+from mrjob.splits import index_path
+from mrjob.splits import is_index_path
+from mrjob.splits import plan_splits
+from mrjob.splits import write_split
+from tests.sandbox import SandboxedTestCase
+
+
+def random_lines(num_lines, seed=0):
+    rand = random.Random(seed)
+    # random hex, so that bzip2 can't squeeze it into one block
+    return ''.join('%d %x\n' % (i, rand.getrandbits(rand.randint(4, 800)))
+                   for i in xrange(num_lines))
+
+
+class IndexPathTestCase(unittest.TestCase):
+
+    def test_index_path(self):
+        self.assertEqual(index_path('foo/bar.gz'),
+                         'foo/.bar.gz.mrjob-splits')
+        self.assertEqual(index_path('bar.gz'), '.bar.gz.mrjob-splits')
+
+    def test_is_index_path(self):
+        self.assertTrue(is_index_path(index_path('/foo/bar.bz2')))
+        self.assertFalse(is_index_path('/foo/bar.bz2'))
+        self.assertFalse(is_index_path('/foo/bar.mrjob-splits'))
+
+
+class FindLineStartTestCase(unittest.TestCase):
+
+    def test_after_newline(self):
+        self.assertEqual(_find_line_start(['foo\n', 'bar'], True), (0, False))
+
+    def test_partial_line(self):
+        self.assertEqual(_find_line_start(['foo\nba', 'r\n'], False),
+                         (4, True))
+
+    def test_newline_at_end_of_piece(self):
+        self.assertEqual(_find_line_start(['foo\n', 'bar'], False),
+                         (4, False))
+
+    def test_no_line_start(self):
+        self.assertEqual(_find_line_start(['foo', 'bar\n'], False),
+                         (None, True))
+        self.assertEqual(_find_line_start([], False), (None, False))
+
+
+class BitsTestCase(unittest.TestCase):
+
+    def test_write_and_read(self):
+        out = StringIO()
+        writer = _BitWriter(out)
+        writer.write(0x5, 3)
+        writer.write(0x1234567, 27)
+        writer.write(0, 1)
+        writer.write(0x1, 1)
+        writer.flush()
+
+        f = StringIO(out.getvalue())
+        self.assertEqual(len(out.getvalue()), 4)
+        self.assertEqual(_read_bits(f, 0, 3), 0x5)
+        self.assertEqual(_read_bits(f, 3, 30), 0x1234567)
+        self.assertEqual(_read_bits(f, 30, 32), 0x1)
+
+    def test_read_past_end(self):
+        self.assertRaises(ValueError, _read_bits, StringIO('x'), 4, 12)
+
+
+class SplitTestCase(SandboxedTestCase):
+
+    def write_gz(self, members):
+        path = os.path.join(self.tmp_dir, 'input.gz')
+        for member in members:
+            f = gzip.GzipFile(path, 'a')
+            f.write(member)
+            f.close()
+        return path
+
+    def write_bz2(self, data):
+        path = os.path.join(self.tmp_dir, 'input.bz2')
+        with open(path, 'wb') as f:
+            f.write(bz2.compress(data, 1))
+        return path
+
+    def read_splits(self, path, split_size):
+        index = get_index(path)
+        plan = plan_splits(index, split_size)
+
+        # the splits should cover the whole file
+        self.assertEqual(plan[0][2], 0)
+        self.assertEqual(sum(length for _, _, _, length in plan),
+                         os.path.getsize(path))
+
+        ext = os.path.splitext(path)[1]
+        if ext == '.gz':
+            decompress = lambda p: gzip.GzipFile(p).read()
+        else:
+            decompress = lambda p: bz2.BZ2File(p).read()
+
+        contents = []
+        for i, (first, stop, _, _) in enumerate(plan):
+            out_path = os.path.join(self.tmp_dir, 'split-%d%s' % (i, ext))
+            write_split(path, index, first, stop, out_path)
+            contents.append(decompress(out_path))
+        return contents
+
+    def assertSplitsOK(self, contents, data, num_splits):
+        self.assertEqual(''.join(contents), data)
+        self.assertEqual(len(contents), num_splits)
+        for content in contents[:-1]:
+            self.assertTrue(content.endswith('\n'))
+
+    def test_gz_index(self):
+        path = self.write_gz(['foo\nba', 'r\n', 'baz\n', 'qux'])
+        index = get_index(path)
+
+        self.assertEqual(index['format'], 'gzip')
+        self.assertEqual([unit[2] for unit in index['units']],
+                         [0, None, 0, 0])
+
+        # units are contiguous byte ranges
+        units = index['units']
+        self.assertEqual(units[0][0], 0)
+        self.assertEqual(units[-1][1], os.path.getsize(path))
+        for unit, next_unit in zip(units, units[1:]):
+            self.assertEqual(unit[1], next_unit[0])
+
+    def test_split_gz(self):
+        data = random_lines(2000)
+        members = [data[i:i + 10000] for i in xrange(0, len(data), 10000)]
+        path = self.write_gz(members)
+
+        self.assertEqual(len(get_index(path)['units']), len(members))
+
+        self.assertSplitsOK(self.read_splits(path, 0), data, len(members))
+        self.assertSplitsOK(self.read_splits(path, 1000000), data, 1)
+
+        contents = self.read_splits(path, os.path.getsize(path) // 4)
+        self.assertEqual(''.join(contents), data)
+        self.assertTrue(3 <= len(contents) <= 4)
+
+    def test_gz_with_padding(self):
+        path = self.write_gz(['foo\n', 'bar\n'])
+        with open(path, 'ab') as f:
+            f.write('\x00' * 100)
+
+        self.assertEqual(len(get_index(path)['units']), 2)
+        self.assertSplitsOK(self.read_splits(path, 0),
+                            'foo\nbar\n', 2)
+
+    def test_single_member_gz(self):
+        path = self.write_gz(['foo\nbar\n'])
+        self.assertEqual(len(get_index(path)['units']), 1)
+
+    def test_bad_gz(self):
+        path = os.path.join(self.tmp_dir, 'input.gz')
+        with open(path, 'wb') as f:
+            f.write('this is not gzipped')
+
+        self.assertRaises(ValueError, get_index, path)
+
+    def test_bz2_index(self):
+        data = random_lines(5000)
+        path = self.write_bz2(data)
+        index = get_index(path)
+
+        self.assertEqual(index['format'], 'bzip2')
+        # 100k blocks, more or less
+        self.assertTrue(len(index['units']) >= len(data) // 100000)
+        self.assertEqual(index['units'][0][0], 32)  # after 'BZh1'
+
+    def test_split_bz2(self):
+        data = random_lines(5000)
+        path = self.write_bz2(data)
+        num_blocks = len(get_index(path)['units'])
+
+        self.assertSplitsOK(self.read_splits(path, 0), data, num_blocks)
+        self.assertSplitsOK(self.read_splits(path, 1000000), data, 1)
+
+    def test_split_bz2_multi_stream(self):
+        # like pbzip2 makes
+        data = random_lines(5000)
+        path = os.path.join(self.tmp_dir, 'input.bz2')
+        with open(path, 'wb') as f:
+            for i in xrange(0, len(data), 50000):
+                f.write(bz2.compress(data[i:i + 50000], 1))
+
+        self.assertSplitsOK(self.read_splits(path, 0), data,
+                            (len(data) - 1) // 50000 + 1)
+
+    def test_bad_bz2(self):
+        path = os.path.join(self.tmp_dir, 'input.bz2')
+        with open(path, 'wb') as f:
+            f.write('this is not bzipped')
+
+        self.assertRaises(ValueError, get_index, path)
+
+    def test_truncated_bz2(self):
+        path = os.path.join(self.tmp_dir, 'input.bz2')
+        with open(path, 'wb') as f:
+            f.write(bz2.compress(random_lines(5000), 1)[:-1000])
+
+        self.assertRaises(ValueError, get_index, path)
+
+    def test_not_compressed(self):
+        path = os.path.join(self.tmp_dir, 'input')
+        with open(path, 'w') as f:
+            f.write('foo\n')
+
+        self.assertEqual(get_index(path), None)
+        self.assertFalse(os.path.exists(index_path(path)))
+
+    def test_index_is_cached(self):
+        path = self.write_gz(['foo\n', 'bar\n'])
+        index = get_index(path)
+        self.assertTrue(os.path.exists(index_path(path)))
+
+        # mess with the cached index to prove we use it
+        index['units'] = index['units'][:1]
+        with open(index_path(path), 'w') as f:
+            json.dump(index, f)
+
+        self.assertEqual(len(get_index(path)['units']), 1)
+
+    def test_index_file(self):
+        path = self.write_gz(['foo\n', 'bar\n'])
+        index_file = os.path.join(self.tmp_dir, 'index')
+
+        self.assertEqual(len(get_index(path, index_file)['units']), 2)
+        self.assertTrue(os.path.exists(index_file))
+        self.assertFalse(os.path.exists(index_path(path)))
+
+    def test_index_is_rebuilt_when_file_changes(self):
+        path = self.write_gz(['foo\n', 'bar\n'])
+        self.assertEqual(len(get_index(path)['units']), 2)
+
+        self.write_gz(['baz\n'])
+        self.assertEqual(len(get_index(path)['units']), 3)
+
+    def test_cant_write_index(self):
+        path = self.write_gz(['foo\n', 'bar\n'])
+        # put a directory where the index goes
+        os.mkdir(index_path(path))
+
+        self.assertEqual(len(get_index(path)['units']), 2)
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)),
+                         [os.path.basename(index_path(path)), 'input.gz'])
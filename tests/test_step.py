@@ -19,6 +19,8 @@ except ImportError:
     from unittest import TestCase
 
 from mrjob.step import _IDENTITY_MAPPER
+from mrjob.step import DEFAULT_MAPPER_BATCH_SIZE
+from mrjob.step import DEFAULT_MAPPER_MERGE_MAX_ENTRIES
 from mrjob.step import JarStep
 from mrjob.step import MRJobStep
 
@@ -101,6 +103,36 @@ class MRJobStepInitTestCase(TestCase):
     def test_explicit_reducer_final(self):
         self._test_explicit(reducer_final=identity_reducer, r=True)
 
+    # batch
+
+    def test_explicit_mapper_batch(self):
+        self._test_explicit(mapper_batch=identity_mapper, m=True)
+
+    def test_mapper_batch_size_alone(self):
+        self.assertRaises(ValueError, MRJobStep,
+                          reducer=identity_reducer, mapper_batch_size=10)
+
+    def test_bad_mapper_batch_size(self):
+        self.assertRaises(ValueError, MRJobStep,
+                          mapper_batch=identity_mapper, mapper_batch_size=0)
+        self.assertRaises(ValueError, MRJobStep,
+                          mapper_batch=identity_mapper, mapper_batch_size='5')
+
+    def test_explicit_mapper_merge(self):
+        self._test_explicit(mapper_merge=max, m=True)
+
+    def test_mapper_merge_opts_alone(self):
+        self.assertRaises(ValueError, MRJobStep,
+                          mapper=identity_mapper, mapper_merge_max_entries=10)
+        self.assertRaises(ValueError, MRJobStep,
+                          mapper=identity_mapper, mapper_merge_max_bytes=10)
+
+    def test_bad_mapper_merge_opts(self):
+        self.assertRaises(ValueError, MRJobStep,
+                          mapper_merge=max, mapper_merge_max_entries=-1)
+        self.assertRaises(ValueError, MRJobStep,
+                          mapper_merge=max, mapper_merge_max_bytes=1.5)
+
     # init
 
     def test_explicit_mapper_init(self):
@@ -142,6 +174,16 @@ class MRJobStepInitTestCase(TestCase):
     def test_conflict_mapper(self):
         self._test_conflict(mapper_cmd='cat', mapper=identity_mapper)
 
+    def test_conflict_mapper_batch(self):
+        self._test_conflict(mapper_batch=identity_mapper,
+                            mapper=identity_mapper)
+
+    def test_conflict_mapper_batch_cmd(self):
+        self._test_conflict(mapper_cmd='cat', mapper_batch=identity_mapper)
+
+    def test_conflict_mapper_merge_cmd(self):
+        self._test_conflict(mapper_cmd='cat', mapper_merge=max)
+
     def test_conflict_combiner(self):
         self._test_conflict(combiner_cmd='cat', combiner=identity_reducer)
 
@@ -161,6 +203,21 @@ class MRJobStepGetItemTestCase(TestCase):
         self.assertEqual(MRJobStep(mapper=identity_mapper)['mapper'],
                          identity_mapper)
 
+    def test_get_default_mapper_batch_size(self):
+        self.assertEqual(
+            MRJobStep(mapper_batch=identity_mapper)['mapper_batch_size'],
+            DEFAULT_MAPPER_BATCH_SIZE)
+
+    def test_get_default_mapper_merge_opts(self):
+        step = MRJobStep(mapper=identity_mapper, mapper_merge=max)
+        self.assertEqual(step['mapper_merge_max_entries'],
+                         DEFAULT_MAPPER_MERGE_MAX_ENTRIES)
+        self.assertEqual(step['mapper_merge_max_bytes'], None)
+
+    def test_no_mapper_batch_size_without_mapper_batch(self):
+        self.assertEqual(
+            MRJobStep(mapper=identity_mapper)['mapper_batch_size'], None)
+
 
 class MRJobStepDescriptionTestCase(TestCase):
 
@@ -223,6 +280,18 @@ class MRJobStepDescriptionTestCase(TestCase):
             },
         })
 
+    def test_render_mapper_batch(self):
+        self.assertEqual(
+            MRJobStep(mapper_batch=identity_mapper,
+                      mapper_batch_size=50).description(0),
+            {
+                'type': 'streaming',
+                'mapper': {
+                    'type': 'script',
+                    'batch_size': 50,
+                },
+            })
+
     def test_render_reducer_pre_filter(self):
         self.assertEqual(
             MRJobStep(
@@ -0,0 +1,158 @@
+# Copyright 2009-2012 Yelp and Contributors
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for encoding, decoding, framing, and sorting typed bytes."""
+from StringIO import StringIO
+
+try:
+    import unittest2 as unittest
+    unittest  # quiet "redefinition of unused ..." warning from pyflakes
+except ImportError:
+    import unittest
+
+from mrjob import typedbytes
+from mrjob.typedbytes import chunks_to_record_lists
+from mrjob.typedbytes import decode
+from mrjob.typedbytes import decode_raw
+from mrjob.typedbytes import dumps
+from mrjob.typedbytes import dumps_bytes
+from mrjob.typedbytes import key_end
+from mrjob.typedbytes import loads
+from mrjob.typedbytes import sort_records
+
+
+def record(key, value):
+    return dumps(key) + dumps(value)
+
+
+class EncodeDecodeTestCase(unittest.TestCase):
+
+    def assertRoundTripOK(self, obj):
+        self.assertEqual(loads(dumps(obj)), obj)
+        # int vs. long depends on the platform
+        if not isinstance(obj, (int, long)):
+            self.assertEqual(type(loads(dumps(obj))), type(obj))
+
+    def test_round_trip(self):
+        for obj in ['', 'foo\t\n\xe9', u'Qu\xe9bec', True, False,
+                    0, -1, 2 ** 31 - 1, -2 ** 31, 2 ** 40, -2 ** 63,
+                    0.5, -1e100, (), (1, 'a'), [], [1, [2, 3]],
+                    {}, {'a': (1, 2.0), 3: [u'x']}, None, set([1])]:
+            self.assertRoundTripOK(obj)
+
+    def test_encoding(self):
+        self.assertEqual(dumps('ab'), '\x00\x00\x00\x00\x02ab')
+        self.assertEqual(dumps(1), '\x03\x00\x00\x00\x01')
+        self.assertEqual(dumps(True), '\x02\x01')
+        self.assertEqual(dumps(u'\xe9'), '\x07\x00\x00\x00\x02\xc3\xa9')
+        self.assertEqual(dumps(['a']), '\x09\x00\x00\x00\x00\x01a\xff')
+
+    def test_long_int(self):
+        self.assertEqual(dumps(2 ** 32)[0], chr(typedbytes.LONG))
+        # too big even for a long
+        self.assertEqual(dumps(2 ** 64)[0], chr(typedbytes.PICKLE))
+        self.assertEqual(loads(dumps(2 ** 64)), 2 ** 64)
+
+    def test_decode_java_only_types(self):
+        self.assertEqual(loads('\x01\xff'), -1)  # byte
+        self.assertEqual(loads('\x05\x3f\x80\x00\x00'), 1.0)  # float
+        # application-specific types are just bytes
+        self.assertEqual(loads('\x32\x00\x00\x00\x01z'), 'z')
+
+    def test_decode_at_offset(self):
+        data = dumps('foo') + dumps(7)
+        key, pos = decode(data)
+        self.assertEqual(key, 'foo')
+        self.assertEqual(decode(data, pos), (7, len(data)))
+
+    def test_bad_data(self):
+        self.assertRaises(ValueError, loads, '')
+        self.assertRaises(ValueError, loads, '\x00\x00\x00\x00\x05ab')
+        self.assertRaises(ValueError, loads, '\x03\x00')
+        self.assertRaises(ValueError, loads, '\x0b')  # unknown type code
+        self.assertRaises(ValueError, loads, dumps(1) + 'x')
+
+
+class RawBytesTestCase(unittest.TestCase):
+
+    def test_dumps_bytes(self):
+        for data in ('', 'foo', '\t\n\x00\xff' * 100):
+            self.assertEqual(dumps_bytes(data), dumps(data))
+
+    def test_dumps_bytes_only_takes_str(self):
+        self.assertRaises(TypeError, dumps_bytes, u'foo')
+        self.assertRaises(TypeError, dumps_bytes, 1)
+        self.assertRaises(TypeError, dumps_bytes, None)
+
+    def test_decode_raw(self):
+        data = dumps('foo') + dumps(u'\xe9') + '\x32\x00\x00\x00\x01z'
+        raw, pos = decode_raw(data)
+        self.assertEqual(raw, 'foo')
+        raw, pos = decode_raw(data, pos)
+        self.assertEqual(raw, '\xc3\xa9')
+        self.assertEqual(decode_raw(data, pos), ('z', len(data)))
+
+    def test_decode_raw_bad_data(self):
+        self.assertRaises(ValueError, decode_raw, '')
+        self.assertRaises(ValueError, decode_raw, dumps(1))
+        self.assertRaises(ValueError, decode_raw, dumps(['a']))
+        self.assertRaises(ValueError, decode_raw, '\x00\x00\x00')
+        self.assertRaises(ValueError, decode_raw, '\x00\x00\x00\x00\x05ab')
+
+
+class RecordsTestCase(unittest.TestCase):
+
+    def test_key_end(self):
+        r = record(('a', [1, 2], {'b': 3}), 'value')
+        self.assertEqual(loads(r[:key_end(r)]), ('a', [1, 2], {'b': 3}))
+        self.assertEqual(loads(r[key_end(r):]), 'value')
+
+    def test_key_end_truncated(self):
+        self.assertRaises(ValueError, key_end, dumps('foo')[:-1])
+
+    def test_chunks_to_record_lists(self):
+        records = [record('foo', 1), record(u'bar', [1, 2]),
+                   record(('baz',), {'x': 'y' * 100})]
+        data = ''.join(records)
+
+        self.assertEqual(list(chunks_to_record_lists([data])), [records])
+
+        # chop data into every possible chunk size
+        for chunk_size in xrange(1, len(data) + 1):
+            chunks = [data[i:i + chunk_size]
+                      for i in xrange(0, len(data), chunk_size)]
+            self.assertEqual(
+                sum(chunks_to_record_lists(chunks), []), records)
+
+    def test_empty(self):
+        self.assertEqual(list(chunks_to_record_lists([])), [])
+        self.assertEqual(list(chunks_to_record_lists(['', ''])), [])
+
+    def test_trailing_partial_record(self):
+        data = record('foo', 1) + dumps('bar')
+        self.assertEqual(list(chunks_to_record_lists([data[:5], data[5:]])),
+                         [[record('foo', 1)], [dumps('bar')]])
+
+    def test_sort_records(self):
+        records = [record('b', 1), record('a', 2), record('b', 0),
+                   record('ab', 3)]
+        # sorted by raw key; ties keep their order, like Hadoop's sort
+        self.assertEqual(sort_records(records),
+                         [record('a', 2), record('b', 1), record('b', 0),
+                          record('ab', 3)])
+
+    def test_main(self):
+        stdout = StringIO()
+        typedbytes.main(stdin=StringIO(record('b', 1) + record('a', 2)),
+                        stdout=stdout)
+        self.assertEqual(stdout.getvalue(), record('a', 2) + record('b', 1))
@@ -25,6 +25,9 @@ from subprocess import Popen
 from StringIO import StringIO
 import tarfile
 import tempfile
+import threading
+
+from mock import patch
 
 try:
     import unittest2 as unittest
@@ -32,13 +35,22 @@ try:
 except ImportError:
     import unittest
 
+from mrjob.compression import CompressionCodec
+from mrjob.util import _chunks_to_lines
+from mrjob.util import BufferedLineWriter
 from mrjob.util import buffer_iterator_to_line_iterator
+from mrjob.util import bunzip2_stream
+from mrjob.util import chunks_to_line_lists
 from mrjob.util import cmd_line
 from mrjob.util import extract_dir_for_tar
 from mrjob.util import file_ext
 from mrjob.util import parse_and_save_options
+from mrjob.util import parse_repr
 from mrjob.util import read_file
+from mrjob.util import read_file_chunks
+from mrjob.util import read_file_range
 from mrjob.util import read_input
+from mrjob.util import read_input_blocks
 from mrjob.util import safeeval
 from mrjob.util import scrape_options_into_new_groups
 from mrjob.util import tar_and_gzip
@@ -68,6 +80,150 @@ class BufferIteratorToLineIteratorTestCase(unittest.TestCase):
                                                    ' Alouette.'])),
             ['Alouette,\n', 'gentille Alouette.\n'])
 
+    def test_empty_chunks(self):
+        self.assertEqual(
+            list(buffer_iterator_to_line_iterator(
+                iter(['', 'foo\n', '', 'bar', '', '\n', '']))),
+            ['foo\n', 'bar\n'])
+
+    def test_line_spanning_many_chunks(self):
+        line = 'x' * 10000
+        chunks = [line[i:i + 7] for i in xrange(0, len(line), 7)]
+        self.assertEqual(
+            list(buffer_iterator_to_line_iterator(iter(chunks + ['\ny']))),
+            [line + '\n', 'y\n'])
+
+    def test_many_lines_per_chunk(self):
+        self.assertEqual(
+            list(buffer_iterator_to_line_iterator(iter(['a\n' * 1000]))),
+            ['a\n'] * 1000)
+
+
+class BufferedLineWriterTestCase(unittest.TestCase):
+
+    def test_empty(self):
+        output = StringIO()
+        writer = BufferedLineWriter(output)
+        writer.flush()
+        self.assertEqual(output.getvalue(), '')
+
+    def test_lines_are_buffered(self):
+        output = StringIO()
+        writer = BufferedLineWriter(output)
+        writer.write_line('foo')
+        writer.write_line('bar')
+        self.assertEqual(output.getvalue(), '')
+
+        writer.flush()
+        self.assertEqual(output.getvalue(), 'foo\nbar\n')
+
+    def test_flush_when_buffer_is_full(self):
+        output = StringIO()
+        writer = BufferedLineWriter(output, buffer_size=8)
+        writer.write_line('foo')
+        self.assertEqual(output.getvalue(), '')
+        # 'foo\n' + 'bar\n' is 8 bytes
+        writer.write_line('bar')
+        self.assertEqual(output.getvalue(), 'foo\nbar\n')
+        writer.write_line('baz')
+        self.assertEqual(output.getvalue(), 'foo\nbar\n')
+
+        writer.flush()
+        self.assertEqual(output.getvalue(), 'foo\nbar\nbaz\n')
+
+    def test_zero_buffer_size(self):
+        output = StringIO()
+        writer = BufferedLineWriter(output, buffer_size=0)
+        writer.write_line('foo')
+        self.assertEqual(output.getvalue(), 'foo\n')
+
+    def test_non_ascii_unicode(self):
+        writer = BufferedLineWriter(StringIO())
+        writer.write_line(u'foo')
+        self.assertRaises(UnicodeEncodeError, writer.write_line, u'caf\xe9')
+
+    def test_no_newline(self):
+        output = StringIO()
+        writer = BufferedLineWriter(output, buffer_size=6, newline='')
+        writer.write_line('foo')
+        self.assertEqual(output.getvalue(), '')
+        writer.write_line('bar')
+        self.assertEqual(output.getvalue(), 'foobar')
+
+    def test_write_lines(self):
+        output = StringIO()
+        writer = BufferedLineWriter(output, buffer_size=12)
+        writer.write_line('foo')
+        writer.write_lines([])
+        writer.write_lines(['bar', u'baz'])
+        self.assertEqual(output.getvalue(), 'foo\nbar\nbaz\n')
+
+        writer.write_lines(['qux'])
+        self.assertEqual(output.getvalue(), 'foo\nbar\nbaz\n')
+        writer.flush()
+        self.assertEqual(output.getvalue(), 'foo\nbar\nbaz\nqux\n')
+
+    def test_lines_and_bytes_written(self):
+        writer = BufferedLineWriter(StringIO(), buffer_size=8)
+        writer.write_line('foo')
+        self.assertEqual((writer.lines_written, writer.bytes_written), (0, 0))
+
+        writer.write_lines(['bar', 'baz'])
+        self.assertEqual((writer.lines_written, writer.bytes_written),
+                         (3, 12))
+
+        writer.write_line('qux')
+        writer.flush()
+        self.assertEqual((writer.lines_written, writer.bytes_written),
+                         (4, 16))
+
+    def test_write_lines_is_all_or_nothing(self):
+        output = StringIO()
+        writer = BufferedLineWriter(output)
+        self.assertRaises(UnicodeEncodeError,
+                          writer.write_lines, ['foo', u'caf\xe9'])
+        writer.flush()
+        self.assertEqual(output.getvalue(), '')
+
+
+class ChunksToLineListsTestCase(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(list(chunks_to_line_lists([])), [])
+        self.assertEqual(list(chunks_to_line_lists(['', ''])), [])
+
+    def test_lines_span_chunks(self):
+        self.assertEqual(
+            list(chunks_to_line_lists(['The quick\nbrown fox\nju',
+                                       'mped over\nthe lazy\ndog',
+                                       's.\n'])),
+            [['The quick', 'brown fox'], ['jumped over', 'the lazy'],
+             ['dogs.']])
+
+    def test_line_spans_many_chunks(self):
+        self.assertEqual(
+            list(chunks_to_line_lists(['a', 'b', 'c', 'd\ne', 'f'])),
+            [['abcd'], ['ef']])
+
+    def test_blank_lines(self):
+        self.assertEqual(
+            list(chunks_to_line_lists(['\n\nfoo\n', '\n'])),
+            [['', '', 'foo'], ['']])
+
+    def test_no_trailing_newline(self):
+        self.assertEqual(
+            list(chunks_to_line_lists(['Alouette,\ngentille', ' Alouette.'])),
+            [['Alouette,'], ['gentille Alouette.']])
+
+    def test_strip_cr(self):
+        chunks = ['foo\r\nbar\r', '\nbaz\r\r\nqux\r']
+        self.assertEqual(
+            list(chunks_to_line_lists(chunks)),
+            [['foo\r'], ['bar\r', 'baz\r\r'], ['qux\r']])
+        self.assertEqual(
+            list(chunks_to_line_lists(chunks, strip_cr=True)),
+            [['foo'], ['bar', 'baz'], ['qux']])
+
 
 class CmdLineTestCase(unittest.TestCase):
 
@@ -254,6 +410,262 @@ class ReadInputTestCase(unittest.TestCase):
                           read_input(os.path.join(self.tmpdir, 'lions*')))
 
 
+class ReadInputBlocksTestCase(unittest.TestCase):
+
+    DATA = 'Beavers mate\r\nfor life.\n' * 100
+    LINES = ['Beavers mate', 'for life.'] * 100
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        def write_data_and_close(f):
+            f.write(self.DATA)
+            f.close()
+
+        write_data_and_close(
+            open(os.path.join(self.tmpdir, 'beavers.txt'), 'w'))
+        write_data_and_close(
+            gzip.GzipFile(os.path.join(self.tmpdir, 'beavers.gz'), 'w'))
+        write_data_and_close(
+            bz2.BZ2File(os.path.join(self.tmpdir, 'beavers.bz2'), 'w'))
+
+        os.mkdir(os.path.join(self.tmpdir, 'beavers'))
+        write_data_and_close(
+            open(os.path.join(self.tmpdir, 'beavers/README.txt'), 'w'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def lines(self, path, **kwargs):
+        # use a small chunk size so lines span chunks
+        kwargs.setdefault('chunk_size', 7)
+        return sum(read_input_blocks(path, **kwargs), [])
+
+    def test_stdin(self):
+        self.assertEqual(self.lines('-', stdin=StringIO(self.DATA)),
+                         self.LINES)
+
+    def test_stdin_can_be_iterator(self):
+        self.assertEqual(self.lines('-', stdin=StringIO(self.DATA).readlines()),
+                         self.LINES)
+
+    def test_normal_file(self):
+        self.assertEqual(self.lines(os.path.join(self.tmpdir, 'beavers.txt')),
+                         self.LINES)
+
+    def test_gz_file(self):
+        self.assertEqual(self.lines(os.path.join(self.tmpdir, 'beavers.gz')),
+                         self.LINES)
+
+    def test_bz2_file(self):
+        self.assertEqual(self.lines(os.path.join(self.tmpdir, 'beavers.bz2')),
+                         self.LINES)
+
+    def test_glob_including_dir(self):
+        self.assertEqual(self.lines(os.path.join(self.tmpdir, 'beavers*')),
+                         self.LINES * 4)
+
+    def test_default_chunk_size(self):
+        self.assertEqual(
+            list(read_input_blocks(os.path.join(self.tmpdir, 'beavers.txt'))),
+            [self.LINES])
+
+    def test_chunks_to_records(self):
+        def chunks_to_words(chunks):
+            for chunk in chunks:
+                yield [chunk.upper()]
+
+        self.assertEqual(
+            self.lines(os.path.join(self.tmpdir, 'beavers.gz'),
+                       chunk_size=len(self.DATA),
+                       chunks_to_records=chunks_to_words),
+            [self.DATA.upper()])
+        self.assertEqual(
+            self.lines('-', stdin=StringIO(self.DATA),
+                       chunks_to_records=chunks_to_words),
+            [self.DATA[i:i + 7].upper()
+             for i in xrange(0, len(self.DATA), 7)])
+
+    def test_chunks_to_records_stdin_iterator(self):
+        self.assertEqual(
+            self.lines('-', stdin=['ab', 'c'],
+                       chunks_to_records=lambda chunks: [list(chunks)]),
+            ['ab', 'c'])
+
+    def test_bad_path(self):
+        # read_input_blocks is a generator, so we won't get an error
+        # until we try to read from it
+        self.assertRaises(IOError, list,
+                          read_input_blocks(os.path.join(self.tmpdir, 'lions')))
+
+
+class ReadFileRangeTestCase(unittest.TestCase):
+
+    DATA = 'The quick\nbrown fox\njumped over\nthe lazy\ndogs.'
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+
+        self.path = os.path.join(self.tmpdir, 'fox.txt')
+        with open(self.path, 'w') as f:
+            f.write(self.DATA)
+
+    def read(self, *args, **kwargs):
+        return ''.join(read_file_range(self.path, *args, **kwargs))
+
+    def test_whole_file(self):
+        self.assertEqual(self.read(), self.DATA)
+
+    def test_chunks_end_on_lines(self):
+        chunks = list(read_file_range(self.path, chunk_size=4))
+        self.assertEqual(chunks, ['The quick\n', 'brown fox\n',
+                                  'jumped over\n', 'the lazy\n', 'dogs.'])
+
+        chunks = list(read_file_range(self.path, chunk_size=12))
+        self.assertEqual(chunks, ['The quick\nbrown fox\n',
+                                  'jumped over\n', 'the lazy\ndogs.'])
+
+    def test_start_in_middle_of_line(self):
+        # like Hadoop, skip to the next line
+        self.assertEqual(self.read(3), self.DATA[10:])
+
+    def test_start_at_line(self):
+        self.assertEqual(self.read(10), self.DATA[10:])
+
+    def test_finish_last_line(self):
+        self.assertEqual(self.read(0, 12), 'The quick\nbrown fox\n')
+        self.assertEqual(self.read(3, 12), 'brown fox\n')
+
+    def test_ranges_add_up(self):
+        for split_size in xrange(1, len(self.DATA) + 1):
+            self.assertEqual(
+                ''.join(self.read(start, split_size) for start in
+                        xrange(0, len(self.DATA), split_size)),
+                self.DATA)
+
+    def test_past_end(self):
+        self.assertEqual(self.read(len(self.DATA)), '')
+        self.assertEqual(self.read(len(self.DATA) + 10, 10), '')
+
+    def test_empty_file(self):
+        with open(self.path, 'w'):
+            pass
+        self.assertEqual(self.read(), '')
+
+    def test_pipe(self):
+        fifo_path = os.path.join(self.tmpdir, 'fifo')
+        os.mkfifo(fifo_path)
+
+        def write_data():
+            with open(fifo_path, 'w') as f:
+                f.write(self.DATA)
+
+        thread = threading.Thread(target=write_data)
+        thread.start()
+        try:
+            self.assertEqual(''.join(read_file_range(fifo_path)), self.DATA)
+        finally:
+            thread.join()
+
+    def test_range_of_non_regular_file(self):
+        self.assertEqual(list(read_file_range('/dev/null')), [])
+        self.assertRaises(ValueError, list, read_file_range('/dev/null', 3))
+        self.assertRaises(ValueError, list,
+                          read_file_range('/dev/null', 0, 10))
+
+
+class DecompressInBackgroundTestCase(unittest.TestCase):
+
+    DATA = ''.join('line %d\n' % i for i in xrange(10000))
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+        self.gz_path = os.path.join(self.tmpdir, 'data.gz')
+        f = gzip.GzipFile(self.gz_path, 'w')
+        f.write(self.DATA)
+        f.close()
+
+        self.bz2_path = os.path.join(self.tmpdir, 'data.bz2')
+        f = bz2.BZ2File(self.bz2_path, 'w')
+        f.write(self.DATA)
+        f.close()
+
+        # two gzip members, like "cat a.gz b.gz"
+        self.multi_gz_path = os.path.join(self.tmpdir, 'multi.gz')
+        with open(self.multi_gz_path, 'wb') as multi:
+            for part in ('foo\n', 'bar\n'):
+                gz_part_path = os.path.join(self.tmpdir, 'part.gz')
+                f = gzip.GzipFile(gz_part_path, 'w')
+                f.write(part)
+                f.close()
+                multi.write(open(gz_part_path, 'rb').read())
+
+        self.bad_gz_path = os.path.join(self.tmpdir, 'bad.gz')
+        with open(self.bad_gz_path, 'wb') as f:
+            f.write('this is not gzipped')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self, path, chunk_size=1000):
+        return ''.join(read_file_chunks(path, chunk_size=chunk_size,
+                                        decompress_in_background=True))
+
+    def test_in_process(self):
+        with patch.dict('mrjob.util.BACKGROUND_DECOMPRESS_COMMANDS',
+                        {'.gz': [['gzip', '-dc']],
+                         '.bz2': [['bzip2', '-dc']]}):
+            with patch('mrjob.compression.Popen', wraps=Popen) as mock_popen:
+                self.assertEqual(self.read(self.gz_path), self.DATA)
+                self.assertEqual(self.read(self.bz2_path), self.DATA)
+                self.assertEqual(self.read(self.multi_gz_path), 'foo\nbar\n')
+
+            self.assertEqual(mock_popen.call_count, 3)
+            self.assertRaises(IOError, self.read, self.bad_gz_path)
+
+    def test_in_thread(self):
+        # no commands found
+        with patch.dict('mrjob.util.BACKGROUND_DECOMPRESS_COMMANDS',
+                        {'.gz': [['no-such-gunzip']],
+                         '.bz2': [['no-such-bunzip2']]}):
+            with patch('mrjob.compression.Popen') as mock_popen:
+                self.assertEqual(self.read(self.gz_path), self.DATA)
+                self.assertEqual(self.read(self.bz2_path), self.DATA)
+                self.assertEqual(self.read(self.multi_gz_path), 'foo\nbar\n')
+                # small chunks
+                self.assertEqual(self.read(self.gz_path, chunk_size=7),
+                                 self.DATA)
+
+            self.assertFalse(mock_popen.called)
+            # errors in the thread are re-raised in the caller
+            self.assertRaises(Exception, self.read, self.bad_gz_path)
+
+    def test_stop_early(self):
+        for commands in ([['gzip', '-dc']], [['no-such-gunzip']]):
+            with patch.dict('mrjob.util.BACKGROUND_DECOMPRESS_COMMANDS',
+                            {'.gz': commands}):
+                chunks = read_file_chunks(self.gz_path, chunk_size=10,
+                                          decompress_in_background=True)
+                self.assertTrue(self.DATA.startswith(chunks.next()))
+                chunks.close()
+
+    def test_uncompressed_file(self):
+        path = os.path.join(self.tmpdir, 'data.txt')
+        with open(path, 'w') as f:
+            f.write(self.DATA)
+
+        with patch('mrjob.compression.Popen') as mock_popen:
+            self.assertEqual(self.read(path), self.DATA)
+        self.assertFalse(mock_popen.called)
+
+    def test_read_input_blocks(self):
+        lines = sum(read_input_blocks(self.gz_path,
+                                      decompress_in_background=True), [])
+        self.assertEqual(lines, self.DATA.splitlines())
+
+
 class SafeEvalTestCase(unittest.TestCase):
 
     def test_simple_data_structure(self):
@@ -273,6 +685,53 @@ class SafeEvalTestCase(unittest.TestCase):
             safeeval('abs(a)', globals={'abs': abs}, locals={'a': a}))
 
 
+class ParseReprTestCase(unittest.TestCase):
+
+    def assertParsesLikeSafeEval(self, expr):
+        value = parse_repr(expr)
+        self.assertEqual(value, safeeval(expr))
+        self.assertEqual(type(value), type(safeeval(expr)))
+
+    def test_basic_types(self):
+        for x in (None, True, False, 0, -7, 10 ** 30, 5L, 1.5, -0.25, 1e100,
+                  1e-100, '', 'foo', "it's", 'say "hi"', '\t\n\\\x00\xe9',
+                  u'', u'Qu\xe9bec', u'Ph\u1ede', u'\U0001f600'):
+            self.assertParsesLikeSafeEval(repr(x))
+
+    def test_containers(self):
+        for x in ([], (), {}, [1, 'a'], (1,), (1, 2), {'a': [1, (2, 3)]},
+                  [[[]]], {(1, 'a'): {None: True}}):
+            self.assertParsesLikeSafeEval(repr(x))
+
+    def test_not_quite_reprs(self):
+        for expr in ('(1)', '[1,]', '(1, 2,)', '{1: 2,}', ' 1 ', '-0',
+                     '1.', '.5', '1E5', "b'a'", "U'a'", '"a"', '"\\""',
+                     '010', '0x10', '-1L', '[1,\n 2]'):
+            self.assertParsesLikeSafeEval(expr)
+
+    def test_falls_back_to_safeeval(self):
+        for expr in ('set([1, 2])', "{'a'}", '1 + 2', '1j', "r'\\n'",
+                     "'a' 'b'", '- 1', '--1', '1, 2'):
+            self.assertParsesLikeSafeEval(expr)
+
+    def test_fast_paths_dont_compile(self):
+        with patch('mrjob.util.safeeval') as mock_safeeval:
+            self.assertEqual(parse_repr("'foo'"), 'foo')
+            self.assertEqual(parse_repr('123'), 123)
+            self.assertEqual(parse_repr("{'a': (1, [u'b', None])}"),
+                             {'a': (1, [u'b', None])})
+            self.assertFalse(mock_safeeval.called)
+
+    def test_bad_reprs(self):
+        for expr in ('', '(,)', '[1 2]', '{1: 2: 3}', '[1, 2)', "'a",
+                     'inf', 'nan', '1.5L'):
+            self.assertRaises(Exception, parse_repr, expr)
+            self.assertRaises(Exception, safeeval, expr)
+
+    def test_no_mischief(self):
+        self.assertRaises(NameError, parse_repr, "open('/tmp')")
+
+
 class ArchiveTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -427,6 +886,22 @@ class ArchiveTestCase(unittest.TestCase):
             unarchive, join(self.tmp_dir, 'a', 'foo'), join(self.tmp_dir, 'b'))
 
 
+class ChunksToLinesTestCase(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(list(_chunks_to_lines([])), [])
+        self.assertEqual(list(_chunks_to_lines(['', ''])), [])
+
+    def test_lines_span_chunks(self):
+        self.assertEqual(
+            list(_chunks_to_lines(['foo\nb', 'a', 'r\nbaz\n', '\nqux'])),
+            ['foo\n', 'bar\n', 'baz\n', '\n', 'qux'])
+
+    def test_only_split_on_newlines(self):
+        self.assertEqual(list(_chunks_to_lines(['a\rb\r\n', 'c'])),
+                         ['a\rb\r\n', 'c'])
+
+
 class read_fileTest(unittest.TestCase):
 
     def setUp(self):
@@ -508,3 +983,63 @@ class read_fileTest(unittest.TestCase):
             output.append(line)
 
         self.assertEqual(output, ['bar\n', 'bar\n', 'foo\n'])
+
+    def test_read_file_chunks(self):
+        input_path = os.path.join(self.tmp_dir, 'input')
+        with open(input_path, 'w') as input_file:
+            input_file.write('bar\nfoo\n')
+
+        self.assertEqual(list(read_file_chunks(input_path, chunk_size=3)),
+                         ['bar', '\nfo', 'o\n'])
+
+    def test_read_file_chunks_compressed_stream(self):
+        input_gz_path = os.path.join(self.tmp_dir, 'input.gz')
+        input_gz = gzip.GzipFile(input_gz_path, 'w')
+        input_gz.write('foo\nbar\n')
+        input_gz.close()
+
+        self.assertEqual(
+            ''.join(read_file_chunks(input_gz_path,
+                                     fileobj=open(input_gz_path))),
+            'foo\nbar\n')
+
+        input_bz2_path = os.path.join(self.tmp_dir, 'input.bz2')
+        input_bz2 = bz2.BZ2File(input_bz2_path, 'w')
+        input_bz2.write('bar\nbar\nfoo\n')
+        input_bz2.close()
+
+        self.assertEqual(
+            ''.join(read_file_chunks(input_bz2_path,
+                                     fileobj=open(input_bz2_path),
+                                     chunk_size=5)),
+            'bar\nbar\nfoo\n')
+
+    def test_read_file_compressed_iterable(self):
+        # e.g. a stream of lines from hadoop fs -cat
+        data = bz2.compress('bar\nfoo')
+        chunks = [data[i:i + 10] for i in xrange(0, len(data), 10)]
+
+        self.assertEqual(list(read_file('input.bz2', fileobj=chunks)),
+                         ['bar\n', 'foo'])
+
+    def test_read_file_custom_codec(self):
+        def rot13_chunks(chunks):
+            for chunk in chunks:
+                yield chunk.encode('rot13')
+
+        input_path = os.path.join(self.tmp_dir, 'input.rot13')
+        with open(input_path, 'w') as input_file:
+            input_file.write('one\ngjb\n')
+
+        rot13 = CompressionCodec('rot13', '.rot13', rot13_chunks, rot13_chunks)
+        with patch.dict('mrjob.compression._CODECS', {'.rot13': rot13}):
+            self.assertEqual(list(read_file(input_path)), ['bar\n', 'two\n'])
+            self.assertEqual(
+                list(read_input_blocks(input_path)), [['bar', 'two']])
+
+        self.assertEqual(list(read_file(input_path)), ['one\n', 'gjb\n'])
+
+    def test_bunzip2_stream(self):
+        data = bz2.compress('bar\nbar\nfoo')
+        self.assertEqual(bunzip2_stream(StringIO(data)),
+                         ['bar\n', 'bar\n', 'foo'])